@@ -0,0 +1,91 @@
+"""
+过滤条件 (src/filters.py) 的基准测试: 在同一份日志上分别不带过滤条件、带各组过滤条件读取并解析，
+记录每组条件的耗时、保留的行数、相对不过滤时的加速比，以及预检 (正则匹配之前) 与精确判断各丢弃的行数。
+读取 (含解压) 的耗时计入每一组，加速比因此反映端到端的解析阶段。
+
+用法: python -m benchmarks.bench_filters --lines 1000000
+      python -m benchmarks.bench_filters --input ./logs/example.gz --filter "domains=img.example.com;statuses=5xx" --output filters.json
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+from benchmarks.generate_logs import write_logs
+from src.config import AppConfig, FiltersConfig, ParserConfig
+from src.input_handler import read_log_batches
+from src.log_parser import LogParser
+from src.metrics import metrics
+
+# 默认测量的过滤条件 (对应模拟日志的域名、时间与路径)
+DEFAULT_FILTERS = {
+    'domain': {'domains': ['cdn0.example.com']},
+    'status 5xx': {'statuses': ['5xx']},
+    'status 404,500-502': {'statuses': ['404', '500-502']},
+    'since/until (1h)': {'since': '2025-11-16T06:00', 'until': '2025-11-16T07:00'},
+    'path prefix': {'path_prefixes': ['/d1/']},
+    'ip /8': {'ips': ['20.0.0.0/8']},
+    'domain + 4xx + since': {'domains': ['cdn1.example.com'], 'statuses': ['4xx'], 'since': '2025-11-16T12:00'},
+}
+
+
+def _parse_filter(spec: str) -> dict:
+    """命令行中的过滤条件: 以分号分隔的 键=值，值可用逗号分隔多个，例如 "domains=a.com;statuses=5xx,404" """
+    options = {}
+    for item in spec.split(';'):
+        key, _, value = item.partition('=')
+        key = key.strip()
+        options[key] = value.strip() if key in ('since', 'until') else [v.strip() for v in value.split(',')]
+    return options
+
+
+def _run(path: Path, filters: dict) -> dict:
+    metrics.reset()
+    parser = LogParser(AppConfig.model_construct(parser=ParserConfig(format='huawei_cdn'),
+                                                 filters=FiltersConfig(**filters)))
+    start = time.perf_counter()
+    rows = sum(len(chunk) for chunk in parser.parse_line_batches(read_log_batches(path)))
+    seconds = time.perf_counter() - start
+    counters = metrics.snapshot()['counters']
+    return {
+        'seconds': round(seconds, 3),
+        'rows': rows,
+        'lines_per_second': round(counters.get('lines.read', 0) / seconds),
+        'discarded': {name: value for name, value in counters.items() if name.startswith('filter.')},
+    }
+
+
+@click.command()
+@click.option('--input', 'input_path', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Log file to parse (.gz or plain). A synthetic log is generated when omitted.')
+@click.option('--lines', default=1_000_000, help='Number of lines in the synthetic log.')
+@click.option('--filter', 'filter_specs', multiple=True,
+              help='Filter to measure instead of the defaults, e.g. "domains=a.com;statuses=5xx" (repeatable).')
+@click.option('--output', type=click.Path(), default=None, help='Write results as JSON to this file.')
+def main(input_path, lines, filter_specs, output):
+    filters = {spec: _parse_filter(spec) for spec in filter_specs} if filter_specs else DEFAULT_FILTERS
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(input_path) if input_path else write_logs(Path(tmp) / 'synthetic.gz', lines)[0]
+        # 预热文件系统缓存
+        _run(path, {})
+        baseline = _run(path, {})
+        results = {
+            'input': str(input_path) if input_path else f'synthetic ({lines} lines)',
+            'unfiltered': baseline,
+            'filters': {},
+        }
+        for label, options in filters.items():
+            result = _run(path, options)
+            result['speedup'] = round(baseline['seconds'] / result['seconds'], 2)
+            results['filters'][label] = {'filters': options, **result}
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
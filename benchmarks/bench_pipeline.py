@@ -0,0 +1,263 @@
+"""
+端到端基准测试: 对 generate_logs 生成的 (或指定的) 日志依次流式执行读取、正则解析、构造数据块、
+各分析器的更新与汇总、各报告器，分别记录每个阶段的耗时、吞吐量 (行/秒) 与阶段运行期间的峰值 RSS。
+
+各阶段在同一个流式循环中交替执行 (与实际运行相同，内存占用与日志量无关)，耗时按阶段累计。
+结果写为 JSON，附带提交号与运行环境，可用 --baseline 与之前的结果对比各阶段吞吐量的变化。
+
+用法: python -m benchmarks.bench_pipeline --lines 1000000 --lines 10000000 --output results.json
+      python -m benchmarks.bench_pipeline --lines 1000000 --baseline results_main.json
+      python -m benchmarks.bench_pipeline --input ./logs/ --config-file config/config.yaml
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import click
+
+from benchmarks.generate_logs import write_logs
+from src.analysis_engine import AnalysisEngine
+from src.config import AnalysisConfig, AppConfig, InputConfig, OutputConfig, ParserConfig, load_config
+from src.input_handler import read_log_batches
+from src.log_parser import LogParser
+from src.main import generate_reports
+
+# 峰值 RSS 的采样间隔 (秒)
+SAMPLE_INTERVAL = 0.005
+
+
+def _current_rss() -> int:
+    """当前进程的常驻内存 (字节)，无 /proc 时退化为进程启动以来的峰值"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageTimer:
+    """
+    按阶段累计耗时，并由后台线程采样 RSS，记录每个阶段运行期间观察到的峰值。
+    进程级的 ru_maxrss 只能给出整个运行的峰值，无法区分阶段。
+    """
+    def __init__(self):
+        self.seconds: dict[str, float] = {}
+        self.peak_rss: dict[str, int] = {}
+        self._stage: str | None = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            stage = self._stage
+            if stage is not None:
+                rss = _current_rss()
+                if rss > self.peak_rss.get(stage, 0):
+                    self.peak_rss[stage] = rss
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        previous = self._stage
+        self._stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+            rss = _current_rss()
+            if rss > self.peak_rss.get(name, 0):
+                self.peak_rss[name] = rss
+            self._stage = previous
+
+    def __enter__(self) -> 'StageTimer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def _timed_batches(files: list[Path], timer: StageTimer):
+    """读取阶段: 只把从文件取出下一批行的时间计入 read"""
+    for path in files:
+        batches = read_log_batches(path)
+        while True:
+            with timer.stage('read'):
+                batch = next(batches, None)
+            if batch is None:
+                break
+            yield batch
+
+
+def run_pipeline(config: AppConfig, files: list[Path]) -> dict:
+    """流式运行完整流程，返回各阶段的耗时、吞吐量与峰值 RSS"""
+    parser = LogParser(config)
+    engine = AnalysisEngine(config)
+    analyzers = {name: a for name, a in engine.available_analyzers.items() if a.supports_streaming}
+    states = {name: analyzer.init_state() for name, analyzer in analyzers.items()}
+    match = parser.bytes_pattern.match
+    lines = rows = 0
+
+    with StageTimer() as timer:
+        started = time.perf_counter()
+        for batch in _timed_batches(files, timer):
+            lines += len(batch)
+            for start in range(0, len(batch), parser.chunk_size):
+                part = batch[start:start + parser.chunk_size]
+                with timer.stage('parse'):
+                    groups = [m.groups() for m in map(match, part) if m]
+                with timer.stage('dataframe'):
+                    chunk = parser._rows_to_frame(groups, decode=True)
+                rows += len(chunk)
+                for name, analyzer in analyzers.items():
+                    with timer.stage(f'analyzer.{name}'):
+                        states[name] = analyzer.update(states[name], chunk)
+
+        results = {}
+        for name, analyzer in analyzers.items():
+            with timer.stage(f'analyzer.{name}'):
+                results[name] = analyzer.finalize(states[name])
+        analysis_seconds = time.perf_counter() - started
+
+        for reporter in config.output.reporters:
+            report_config = config.model_copy(update={'output': config.output.model_copy(update={'reporters': [reporter]})})
+            # 命令行报告的输出不计入终端，只测量生成的耗时
+            with timer.stage(f'reporter.{reporter}'), contextlib.redirect_stdout(io.StringIO()):
+                generate_reports(results, report_config)
+
+    stages = {}
+    for name, seconds in timer.seconds.items():
+        stages[name] = {
+            'seconds': round(seconds, 3),
+            'lines_per_second': round(lines / seconds) if seconds else None,
+            'peak_rss_mb': round(timer.peak_rss.get(name, 0) / 1024 / 1024, 1),
+        }
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'lines': lines,
+        'rows_parsed': rows,
+        'rejected_lines': lines - rows,
+        'analysis_wall_seconds': round(analysis_seconds, 3),
+        'analysis_lines_per_second': round(lines / analysis_seconds) if analysis_seconds else None,
+        'process_peak_rss_mb': round((peak if sys.platform == 'darwin' else peak * 1024) / 1024 / 1024, 1),
+        'stages': stages,
+    }
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def _compare(results: list[dict], baseline_path: str) -> None:
+    """按行数对应，打印各阶段吞吐量相对基线结果的变化"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    baseline = {run['lines']: run for run in previous['runs']}
+    for run in results:
+        base = baseline.get(run['lines'])
+        if base is None:
+            print(f"基线结果中没有 {run['lines']} 行的测量，跳过对比。")
+            continue
+        print(f"\n{run['lines']} 行 (基线提交 {previous.get('commit')}):")
+        for name, stage in run['stages'].items():
+            old = base['stages'].get(name)
+            if not old or not old['lines_per_second'] or not stage['lines_per_second']:
+                continue
+            change = (stage['lines_per_second'] / old['lines_per_second'] - 1) * 100
+            print(f"  {name:<24} {old['lines_per_second']:>12,} -> {stage['lines_per_second']:>12,} 行/秒 "
+                  f"({change:+.1f}%)")
+
+
+@click.command()
+@click.option('--lines', 'line_counts', multiple=True, type=int,
+              help='Synthetic log sizes to benchmark (repeatable, default 1000000).')
+@click.option('--input', 'input_path', type=click.Path(exists=True), default=None,
+              help='Benchmark existing .gz/.log files (a file or a directory) instead of synthetic logs.')
+@click.option('--config-file', type=click.Path(exists=True), default=None,
+              help='Take parser, analysis and reporter settings from this configuration file.')
+@click.option('--modules', default='basic_stats,latency', help='Analyzers to run when no config file is given.')
+@click.option('--reporters', default='cli,excel,html', help='Reporters to run when no config file is given.')
+@click.option('--approximate', is_flag=True, help='Use sketches for high-cardinality dimensions.')
+@click.option('--files', default=1, type=click.IntRange(min=1), help='Split each synthetic log over this many files.')
+@click.option('--keep-logs', type=click.Path(file_okay=False), default=None,
+              help='Generate synthetic logs into this directory and reuse them on later runs.')
+@click.option('--output', type=click.Path(), default=None, help='Write results as JSON to this file.')
+@click.option('--baseline', type=click.Path(exists=True), default=None,
+              help='Compare per-stage throughput with an earlier JSON result.')
+def main(line_counts, input_path, config_file, modules, reporters, approximate, files, keep_logs, output, baseline):
+    with tempfile.TemporaryDirectory() as tmp:
+        if config_file:
+            config = load_config(config_file)
+            config = config.model_copy(update={'output': config.output.model_copy(update={'report_path': tmp})})
+        else:
+            config = AppConfig.model_construct(
+                input=InputConfig(path=tmp),
+                parser=ParserConfig(format='huawei_cdn'),
+                analysis=AnalysisConfig(modules=modules.split(','), approximate=approximate,
+                                        group_by_dimensions=['client_ip', 'domain', 'path', 'cache_hit_status']),
+                output=OutputConfig(reporters=reporters.split(','), report_path=tmp),
+            )
+
+        if input_path:
+            path = Path(input_path)
+            inputs = [('input', sorted(p for p in path.iterdir() if p.suffix in ('.gz', '.log')) if path.is_dir()
+                       else [path])]
+        else:
+            log_dir = Path(keep_logs) if keep_logs else Path(tmp)
+            inputs = []
+            for count in line_counts or (1_000_000,):
+                name = log_dir / f"synthetic_{count}.gz"
+                existing = sorted(log_dir.glob(f"synthetic_{count}*.gz"))
+                if keep_logs and existing:
+                    inputs.append((count, existing))
+                    continue
+                start = time.perf_counter()
+                generated = write_logs(name, count, files=files)
+                print(f"已生成 {count} 行模拟日志 ({time.perf_counter() - start:.1f} 秒)", file=sys.stderr)
+                inputs.append((count, generated))
+
+        runs = []
+        for label, paths in inputs:
+            run = run_pipeline(config, paths)
+            run['input'] = [str(p) for p in paths] if label == 'input' else f"synthetic ({len(paths)} files)"
+            runs.append(run)
+
+    report = {
+        **_environment(),
+        'analysis': config.analysis.model_dump(mode='json'),
+        'reporters': list(config.output.reporters),
+        'runs': runs,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if baseline:
+        _compare(runs, baseline)
+
+
+if __name__ == '__main__':
+    main()
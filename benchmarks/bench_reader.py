@@ -0,0 +1,104 @@
+"""
+对比逐行文本读取 (read_log_lines + parse_chunks) 与按块字节读取 (read_log_batches + parse_line_batches)
+的单核吞吐量，分别测量只读取和读取加解析两种情况，吞吐量按解压后的字节数计算。
+
+用法: python -m benchmarks.bench_reader --lines 1000000
+      python -m benchmarks.bench_reader --input ./logs/example.gz --input ./logs/example.log
+"""
+import gzip
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import click
+
+from src.bulk_reader import INFLATE_BACKEND
+from src.config import AppConfig, ParserConfig
+from src.input_handler import read_log_batches, read_log_lines
+from src.log_parser import LogParser
+
+
+def _write_sample(path: Path, lines: int, seed: int) -> None:
+    """生成华为 CDN 格式的模拟日志，写入 .gz 与同名的未压缩文件"""
+    rng = random.Random(seed)
+    ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+           for _ in range(5000)]
+    paths = [f"/static/{i}/image.png" for i in range(2000)]
+    base = datetime(2025, 11, 16, 10, 0, 0, tzinfo=timezone(timedelta(hours=8)))
+    rows = []
+    for i in range(lines):
+        t = (base + timedelta(seconds=i // 20)).strftime("%d/%b/%Y:%H:%M:%S %z")
+        rows.append(
+            f'[{t}] {rng.choice(ips)} {rng.randint(1, 3000)} "-" "HTTP/1.1" "GET" "img.example.com" '
+            f'"{rng.choice(paths)}" {rng.choice((200, 200, 200, 304, 404))} {rng.randint(100, 100000)} '
+            f'{rng.choice(("HIT", "MISS"))} "Mozilla/5.0 (Windows NT 10.0; Win64; x64)" "-" 10.0.0.1\n'
+        )
+    data = ''.join(rows).encode('utf-8')
+    path.with_suffix('.log').write_bytes(data)
+    with gzip.open(path, 'wb', compresslevel=6) as f:
+        f.write(data)
+
+
+def _uncompressed_size(path: Path) -> int:
+    if path.suffix != '.gz':
+        return path.stat().st_size
+    with gzip.open(path, 'rb') as f:
+        return sum(len(block) for block in iter(lambda: f.read(1024 * 1024), b''))
+
+
+def _measure(func, size: int, repeat: int) -> dict:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines = func()
+        best = min(best, time.perf_counter() - start)
+    return {'seconds': round(best, 3), 'mb_per_second': round(size / 1024 / 1024 / best, 1), 'lines': lines}
+
+
+@click.command()
+@click.option('--input', 'inputs', multiple=True, type=click.Path(exists=True, dir_okay=False),
+              help='Log files to read (.gz or plain). A synthetic sample is generated when omitted.')
+@click.option('--lines', default=500_000, help='Number of lines in the synthetic sample.')
+@click.option('--repeat', default=3, help='Repetitions per measurement; the fastest run is reported.')
+@click.option('--output', type=click.Path(), default=None, help='Write results as JSON to this file.')
+def main(inputs, lines, repeat, output):
+    # LogParser 只使用解析相关的配置
+    config = AppConfig.model_construct(parser=ParserConfig(format='huawei_cdn'))
+    with tempfile.TemporaryDirectory() as tmp:
+        if inputs:
+            files = [Path(p) for p in inputs]
+        else:
+            sample = Path(tmp) / 'sample.gz'
+            _write_sample(sample, lines, seed=42)
+            files = [sample, sample.with_suffix('.log')]
+
+        results = {'inflate_backend': INFLATE_BACKEND, 'files': []}
+        for path in files:
+            size = _uncompressed_size(path)
+            parser_text, parser_bytes = LogParser(config), LogParser(config)
+            measurements = {
+                'read_text': _measure(lambda: sum(1 for _ in read_log_lines(path)), size, repeat),
+                'read_bytes': _measure(lambda: sum(len(b) for b in read_log_batches(path)), size, repeat),
+                'parse_text': _measure(
+                    lambda: sum(len(c) for c in parser_text.parse_chunks(read_log_lines(path))), size, repeat),
+                'parse_bytes': _measure(
+                    lambda: sum(len(c) for c in parser_bytes.parse_line_batches(read_log_batches(path))),
+                    size, repeat),
+            }
+            for stage in ('read', 'parse'):
+                measurements[f'{stage}_speedup'] = round(
+                    measurements[f'{stage}_text']['seconds'] / measurements[f'{stage}_bytes']['seconds'], 2)
+            results['files'].append({'file': path.name, 'uncompressed_mb': round(size / 1024 / 1024, 1),
+                                     **measurements})
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
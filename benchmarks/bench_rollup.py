@@ -0,0 +1,88 @@
+"""
+测量汇总存储回答长时间范围查询的耗时: 模拟 N 天、每小时一个分区的汇总库，
+对比合并全部分区生成报告结果的时间与重新解析同样数量原始日志的 (按单核吞吐量估算的) 时间。
+
+用法: python -m benchmarks.bench_rollup --days 90 --lines-per-hour 5000
+      python -m benchmarks.bench_rollup --days 90 --approximate
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+from benchmarks.bench_reader import _write_sample
+from src.config import AnalysisConfig, AppConfig, InputConfig, ParserConfig, RollupConfig
+from src.input_handler import read_log_batches
+from src.log_parser import LogParser
+from src.rollup_store import RollupRunner
+
+# 循环使用的不同样本数，使各小时的 IP、路径等键不完全相同
+_SAMPLES = 6
+
+
+@click.command()
+@click.option('--days', default=90, help='Number of simulated days (one partition per hour).')
+@click.option('--lines-per-hour', default=5000, help='Log lines in each hourly partition.')
+@click.option('--approximate', is_flag=True, help='Use sketches for high-cardinality dimensions.')
+@click.option('--output', type=click.Path(), default=None, help='Write results as JSON to this file.')
+def main(days, lines_per_hour, approximate, output):
+    with tempfile.TemporaryDirectory() as tmp:
+        config = AppConfig.model_construct(
+            input=InputConfig(path=tmp, rollup=RollupConfig(path=str(Path(tmp) / 'rollup.sqlite'))),
+            parser=ParserConfig(format='huawei_cdn'),
+            analysis=AnalysisConfig(modules=['basic_stats', 'latency'], approximate=approximate,
+                                    group_by_dimensions=['client_ip', 'domain', 'path', 'cache_hit_status']),
+        )
+        parser = LogParser(config)
+        samples, parse_seconds = [], 0.0
+        for seed in range(_SAMPLES):
+            path = Path(tmp) / f'sample{seed}.gz'
+            _write_sample(path, lines_per_hour, seed=seed)
+            start = time.perf_counter()
+            samples.append((path, list(parser.parse_line_batches(read_log_batches(path)))))
+            parse_seconds += time.perf_counter() - start
+
+        runner = RollupRunner(config)
+        start = time.perf_counter()
+        first_hour = int(samples[0][1][0]['timestamp'].min()) // 3600 * 3600
+        for hour in range(days * 24):
+            path, chunks = samples[hour % _SAMPLES]
+            shifted = []
+            for chunk in chunks:
+                chunk = chunk.copy()
+                # 每个样本的数据移动到同一个小时内
+                chunk['timestamp'] = first_hour + hour * 3600 + chunk['timestamp'] % 3600
+                shifted.append(chunk)
+            runner.store.write_file(path, runner._partition(shifted), runner.engine.merge_states)
+        ingest_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = runner.results()
+        query_seconds = time.perf_counter() - start
+        runner.store.close()
+
+        total_lines = days * 24 * lines_per_hour
+        raw_seconds = parse_seconds / (_SAMPLES * lines_per_hour) * total_lines
+        report = {
+            'days': days,
+            'partitions': days * 24,
+            'lines': total_lines,
+            'approximate': approximate,
+            'rollup_mb': round(Path(config.input.rollup.path).stat().st_size / 1024 / 1024, 1),
+            'ingest_seconds': round(ingest_seconds, 2),
+            'query_seconds': round(query_seconds, 2),
+            'raw_parse_seconds_estimate': round(raw_seconds, 2),
+            'speedup': round(raw_seconds / query_seconds, 1),
+            'analyzers': sorted(results),
+        }
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
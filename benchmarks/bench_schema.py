@@ -0,0 +1,98 @@
+"""
+紧凑表结构 (src/log_schema.py) 的基准测试: 对比解析得到的紧凑数据块与还原为字符串列的表 (decode_frame，
+即改用紧凑表之前数据块的结构) 每行占用的内存，以及两种结构上按维度分组求和、按 IP 计数的耗时。
+
+用法: python -m benchmarks.bench_schema --lines 1000000
+      python -m benchmarks.bench_schema --input ./logs/example.gz --output schema.json
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import pandas as pd
+
+from benchmarks.generate_logs import write_logs
+from src.config import AppConfig, ParserConfig
+from src.input_handler import read_log_batches
+from src.log_parser import LogParser
+from src.log_schema import decode_frame, dimension_keys, group_sums, ip_keys, key_counts
+
+# 参与分组测量的维度
+DIMENSIONS = ['client_ip', 'domain', 'path', 'user_agent', 'cache_hit_status']
+
+
+def _bytes_per_row(chunks: list[pd.DataFrame]) -> float:
+    rows = sum(len(chunk) for chunk in chunks)
+    return round(sum(int(chunk.memory_usage(deep=True).sum()) for chunk in chunks) / rows, 1)
+
+
+def _best(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _group_sums_plain(chunks: list[pd.DataFrame], dim: str) -> None:
+    for chunk in chunks:
+        chunk[['response_size_bytes', 'response_time_ms']].groupby(chunk[dim], sort=False).sum()
+
+
+def _group_sums_compact(chunks: list[pd.DataFrame], dim: str) -> None:
+    for chunk in chunks:
+        group_sums(chunk[['response_size_bytes', 'response_time_ms']], dimension_keys(chunk, dim))
+
+
+@click.command()
+@click.option('--input', 'input_path', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Log file to parse (.gz or plain). A synthetic log is generated when omitted.')
+@click.option('--lines', default=1_000_000, help='Number of lines in the synthetic log.')
+@click.option('--repeat', default=3, help='Repetitions per measurement; the fastest run is reported.')
+@click.option('--output', type=click.Path(), default=None, help='Write results as JSON to this file.')
+def main(input_path, lines, repeat, output):
+    # LogParser 只使用解析相关的配置
+    parser = LogParser(AppConfig.model_construct(parser=ParserConfig(format='huawei_cdn')))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(input_path) if input_path else write_logs(Path(tmp) / 'synthetic.gz', lines)[0]
+        compact = list(parser.parse_line_batches(read_log_batches(path)))
+    plain = [decode_frame(chunk) for chunk in compact]
+    rows = sum(len(chunk) for chunk in compact)
+
+    compact_bytes, plain_bytes = _bytes_per_row(compact), _bytes_per_row(plain)
+    results = {
+        'input': str(input_path) if input_path else f'synthetic ({lines} lines)',
+        'rows': rows,
+        'chunks': len(compact),
+        'bytes_per_row': {'compact': compact_bytes, 'plain': plain_bytes,
+                          'reduction': round(plain_bytes / compact_bytes, 2)},
+        'columns_bytes_per_row': {
+            column: round(int(sum(chunk[column].memory_usage(deep=True, index=False) for chunk in compact)) / rows, 2)
+            for column in compact[0].columns
+        },
+        'group_by_seconds': {},
+    }
+    for dim in DIMENSIONS:
+        plain_seconds = _best(lambda: _group_sums_plain(plain, dim), repeat)
+        compact_seconds = _best(lambda: _group_sums_compact(compact, dim), repeat)
+        results['group_by_seconds'][dim] = {
+            'plain': round(plain_seconds, 3),
+            'compact': round(compact_seconds, 3),
+            'speedup': round(plain_seconds / compact_seconds, 2),
+        }
+    plain_seconds = _best(lambda: [chunk['client_ip'].value_counts() for chunk in plain], repeat)
+    compact_seconds = _best(lambda: [key_counts(ip_keys(chunk)) for chunk in compact], repeat)
+    results['ip_counts_seconds'] = {'plain': round(plain_seconds, 3), 'compact': round(compact_seconds, 3),
+                                    'speedup': round(plain_seconds / compact_seconds, 2)}
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
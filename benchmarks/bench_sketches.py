@@ -0,0 +1,103 @@
+"""
+对比近似模式所用草图与精确统计的准确度和内存占用。
+
+用法: python -m benchmarks.bench_sketches --rows 5000000 --keys 2000000
+"""
+import json
+import time
+
+import click
+import numpy as np
+import pandas as pd
+
+from src.sketches.count_min import CountMinSketch
+from src.sketches.hashing import hash_values
+from src.sketches.hyperloglog import HyperLogLog
+from src.sketches.space_saving import SpaceSaving
+
+
+def _zipf_keys(rows: int, keys: int, exponent: float, seed: int) -> pd.Series:
+    """生成服从 Zipf 分布的 IP 样式的键"""
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(exponent, rows), keys) - 1
+    ips = ranks.astype(np.uint64) * np.uint64(2654435761) & np.uint64(0xFFFFFFFF)
+    octets = [pd.Series((ips >> np.uint64(shift)) & np.uint64(255)).astype(str) for shift in (24, 16, 8, 0)]
+    return octets[0] + '.' + octets[1] + '.' + octets[2] + '.' + octets[3]
+
+
+@click.command()
+@click.option('--rows', default=2_000_000, help='Number of simulated log rows.')
+@click.option('--keys', default=500_000, help='Maximum number of distinct keys.')
+@click.option('--exponent', default=1.2, help='Zipf exponent of the key distribution.')
+@click.option('--chunk-size', default=100_000, help='Rows per chunk fed to the sketches.')
+@click.option('--top-n', default=50, help='Size of the top-N list that is compared.')
+@click.option('--capacity', default=10_000, help='Space-Saving capacity.')
+@click.option('--cms-width', default=16384, help='Count-Min width.')
+@click.option('--cms-depth', default=4, help='Count-Min depth.')
+@click.option('--hll-precision', default=14, help='HyperLogLog precision.')
+@click.option('--output', type=click.Path(), default=None, help='Write results as JSON to this file.')
+def main(rows, keys, exponent, chunk_size, top_n, capacity, cms_width, cms_depth, hll_precision, output):
+    data = _zipf_keys(rows, keys, exponent, seed=42)
+
+    # --- 精确统计 ---
+    start = time.perf_counter()
+    exact = data.value_counts()
+    exact_seconds = time.perf_counter() - start
+    exact_bytes = int(exact.memory_usage(deep=True))
+
+    # --- 草图统计 (按块更新，与分析器的使用方式一致) ---
+    start = time.perf_counter()
+    ss = SpaceSaving(capacity)
+    cms = CountMinSketch(cms_width, cms_depth)
+    hll = HyperLogLog(hll_precision)
+    for begin in range(0, rows, chunk_size):
+        chunk = data.iloc[begin:begin + chunk_size]
+        counts = chunk.value_counts()
+        ss.add(counts)
+        cms.update(hash_values(counts.index), counts.to_numpy())
+        hll.update(hash_values(chunk))
+    sketch_seconds = time.perf_counter() - start
+
+    # --- 准确度 ---
+    exact_top = exact.sort_index().sort_values(ascending=False, kind='stable').head(top_n)
+    approx_top = ss.top(top_n)
+    recall = len(exact_top.index.intersection(approx_top.index)) / max(len(exact_top), 1)
+    ss_abs_error = (approx_top['count'] - exact.reindex(approx_top.index).fillna(0)).abs()
+    cms_error = cms.query(hash_values(exact_top.index)) - exact_top.to_numpy()
+    distinct = len(exact)
+    hll_error = abs(hll.estimate() - distinct) / distinct
+
+    results = {
+        'rows': rows,
+        'distinct_keys': distinct,
+        'exact': {'seconds': round(exact_seconds, 3), 'bytes': exact_bytes},
+        'space_saving': {
+            'capacity': capacity,
+            'bytes': ss.nbytes,
+            'top_n_recall': round(recall, 4),
+            'max_abs_error_top_n': int(ss_abs_error.max()),
+            'guaranteed_error_bound': ss.max_error,
+        },
+        'count_min': {
+            'width': cms.width,
+            'depth': cms.depth,
+            'bytes': cms.nbytes,
+            'max_overestimate_top_n': int(cms_error.max()),
+            'error_bound': round(cms.error_bound, 1),
+        },
+        'hyperloglog': {
+            'precision': hll_precision,
+            'bytes': hll.nbytes,
+            'relative_error': round(hll_error, 5),
+            'expected_relative_error': round(hll.relative_error, 5),
+        },
+        'sketch_seconds': round(sketch_seconds, 3),
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+命令行启动耗时的基准测试: 在新的解释器进程中多次运行 --help、--list-plugins 与 --check-config，
+记录每条命令的最短与中位耗时，并用 -X importtime 列出导入耗时最多的顶层模块
+(用于确认 pandas、各 SDK 与报告器不会在这些快速路径中被导入)。
+
+用法: python -m benchmarks.bench_startup
+      python -m benchmarks.bench_startup --config-file config/config.yaml --repeat 10 --output startup.json
+"""
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _run(args: list[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def _top_imports(args: list[str], top: int) -> list[dict]:
+    """-X importtime 输出中累计耗时最多的顶层模块 (不含嵌套导入的子模块)"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=ROOT, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 模块名前的缩进表示导入的嵌套层级
+        if name.startswith(' ') and not name.startswith('  '):
+            modules.append({'module': name.strip(), 'ms': round(int(cumulative) / 1000, 1)})
+    return sorted(modules, key=lambda m: m['ms'], reverse=True)[:top]
+
+
+@click.command()
+@click.option('--config-file', type=click.Path(exists=True), default='config/config.yaml',
+              help='Configuration used for the --check-config run.')
+@click.option('--repeat', default=5, type=click.IntRange(min=1), help='Runs per command.')
+@click.option('--top', default=8, help='Number of slowest top-level imports to report per command.')
+@click.option('--output', type=click.Path(), default=None, help='Write results as JSON to this file.')
+def main(config_file, repeat, top, output):
+    commands = {
+        'python -c pass': ['-c', 'pass'],
+        '--help': ['-m', 'src.main', '--help'],
+        '--list-plugins': ['-m', 'src.main', '--list-plugins'],
+        '--check-config': ['-m', 'src.main', '--check-config', '--config-file', str(Path(config_file).resolve())],
+    }
+    results = {}
+    for label, args in commands.items():
+        _run(args)  # 预热文件系统缓存与 __pycache__
+        seconds = [_run(args) for _ in range(repeat)]
+        results[label] = {
+            'min_seconds': round(min(seconds), 3),
+            'median_seconds': round(statistics.median(seconds), 3),
+            'top_imports': _top_imports(args, top) if args[0] == '-m' else [],
+        }
+        print(f"{label:<16} 最短 {min(seconds):.3f} 秒  中位 {statistics.median(seconds):.3f} 秒", file=sys.stderr)
+
+    report = {'python': sys.version.split()[0], 'repeat': repeat, 'commands': results}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
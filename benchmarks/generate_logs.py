@@ -0,0 +1,198 @@
+"""
+生成华为 CDN 格式 (HUAWEI_CDN_PATTERN) 的模拟日志，用于基准测试与手工测试。
+
+客户端 IP、路径与域名服从 Zipf 分布 (少数热点占大部分请求)，状态码、缓存命中、响应大小与
+响应时间按接近真实 CDN 的比例生成，时间均匀分布在指定的时间段内且按行递增。
+按批生成并写入 gzip 文件，内存占用与行数无关，相同的参数与种子生成完全相同的文件。
+
+用法: python -m benchmarks.generate_logs --lines 10000000 --output ./logs/synthetic.gz
+      python -m benchmarks.generate_logs --lines 100000000 --files 8 --output ./logs/synthetic.gz
+"""
+import gzip
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+
+import click
+import numpy as np
+
+# 每批生成的行数
+BATCH_LINES = 100_000
+
+# (取值, 比例)
+STATUS_MIX = [(200, 0.80), (206, 0.04), (304, 0.07), (301, 0.01), (302, 0.01), (403, 0.005), (404, 0.035),
+              (499, 0.005), (500, 0.005), (502, 0.005), (503, 0.005), (504, 0.005)]
+METHOD_MIX = [('GET', 0.95), ('HEAD', 0.03), ('POST', 0.02)]
+PROTOCOL_MIX = [('HTTP/1.1', 0.6), ('HTTP/2.0', 0.4)]
+CACHE_HIT_RATIO = 0.85
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
+    'okhttp/4.12.0',
+    'curl/8.4.0',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+]
+EXTENSIONS = ['.png', '.jpg', '.webp', '.js', '.css', '.mp4', '.m3u8', '.ts', '.json', '.html']
+
+
+def _zipf_cdf(size: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, size + 1, dtype=np.float64) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def _sample(rng: np.random.Generator, cdf: np.ndarray, n: int) -> np.ndarray:
+    return np.minimum(np.searchsorted(cdf, rng.random(n)), len(cdf) - 1)
+
+
+def _mix(rng: np.random.Generator, mix: list[tuple], n: int) -> np.ndarray:
+    p = np.array([weight for _, weight in mix])
+    return rng.choice(len(mix), n, p=p / p.sum())
+
+
+def _make_ips(rng: np.random.Generator, count: int, ipv6_ratio: float) -> list[str]:
+    """按热度排序的客户端 IP 池，排名靠前的 IP 在 Zipf 分布下请求最多"""
+    ips = []
+    for is_v6 in rng.random(count) < ipv6_ratio:
+        if is_v6:
+            groups = rng.integers(0, 65536, 4)
+            ips.append(f"2408:{groups[0]:x}:{groups[1]:x}:{groups[2]:x}::{groups[3]:x}")
+        else:
+            octets = rng.integers(1, 255, 4)
+            ips.append(f"{octets[0] % 223 + 1}.{octets[1]}.{octets[2]}.{octets[3]}")
+    return ips
+
+
+def _make_paths(rng: np.random.Generator, count: int) -> list[str]:
+    extensions = rng.choice(len(EXTENSIONS), count)
+    depths = rng.integers(1, 4, count)
+    return [
+        '/' + '/'.join(f"d{(i * 31 + level) % 97}" for level in range(depth)) + f"/f{i}{EXTENSIONS[ext]}"
+        for i, (depth, ext) in enumerate(zip(depths, extensions))
+    ]
+
+
+class LogGenerator:
+    """按批生成日志行，第 i 行的时间为 start + i * span / lines"""
+    def __init__(self, lines: int, ips: int = 100_000, paths: int = 50_000, domains: int = 5,
+                 exponent: float = 1.1, start: datetime | None = None, span_hours: float = 24.0,
+                 ipv6_ratio: float = 0.05, bad_line_ratio: float = 0.0, seed: int = 42):
+        self.lines = lines
+        self.rng = np.random.default_rng(seed)
+        self.start = start or datetime.fromisoformat('2025-11-16T00:00:00+08:00')
+        self.seconds_per_line = span_hours * 3600 / max(lines, 1)
+        self.bad_line_ratio = bad_line_ratio
+        self.ips = np.array(_make_ips(self.rng, ips, ipv6_ratio), dtype=object)
+        self.paths = np.array(_make_paths(self.rng, paths), dtype=object)
+        self.domains = np.array([f"cdn{i}.example.com" for i in range(domains)], dtype=object)
+        self.ip_cdf = _zipf_cdf(ips, exponent)
+        self.path_cdf = _zipf_cdf(paths, exponent)
+        self.domain_cdf = _zipf_cdf(domains, 1.5)
+        self.agent_cdf = _zipf_cdf(len(USER_AGENTS), 1.0)
+        self.referers = np.array(['-'] + [f"https://www{i}.example.org/" for i in range(20)], dtype=object)
+        self._time_cache: dict[int, str] = {}
+
+    def _time_str(self, second: int) -> str:
+        text = self._time_cache.get(second)
+        if text is None:
+            if len(self._time_cache) > 100_000:
+                self._time_cache.clear()
+            text = (self.start + timedelta(seconds=second)).strftime('%d/%b/%Y:%H:%M:%S %z')
+            self._time_cache[second] = text
+        return text
+
+    def batches(self) -> Iterator[list[str]]:
+        """按批产出日志行 (每行以换行符结尾)，每批 BATCH_LINES 行"""
+        rng = self.rng
+        for first in range(0, self.lines, BATCH_LINES):
+            n = min(BATCH_LINES, self.lines - first)
+            seconds = ((first + np.arange(n)) * self.seconds_per_line).astype(np.int64)
+            times = [self._time_str(s) for s in seconds.tolist()]
+            ips = self.ips[_sample(rng, self.ip_cdf, n)]
+            paths = self.paths[_sample(rng, self.path_cdf, n)]
+            domains = self.domains[_sample(rng, self.domain_cdf, n)]
+            status = np.array([code for code, _ in STATUS_MIX])[_mix(rng, STATUS_MIX, n)]
+            methods = np.array([m for m, _ in METHOD_MIX], dtype=object)[_mix(rng, METHOD_MIX, n)]
+            protocols = np.array([p for p, _ in PROTOCOL_MIX], dtype=object)[_mix(rng, PROTOCOL_MIX, n)]
+            hit = rng.random(n) < CACHE_HIT_RATIO
+            # 回源 (MISS) 的请求更慢；304 与 HEAD 请求不返回响应体
+            latency = np.maximum(1, rng.lognormal(np.where(hit, 3.0, 4.5), 0.9)).astype(np.int64)
+            sizes = rng.lognormal(9.5, 1.8, n).astype(np.int64)
+            sizes[(status == 304) | (methods == 'HEAD')] = 0
+            referers = self.referers[np.where(rng.random(n) < 0.7, 0, rng.integers(1, len(self.referers), n))]
+            agents = np.array(USER_AGENTS, dtype=object)[_sample(rng, self.agent_cdf, n)]
+            cache = np.where(hit, 'HIT', 'MISS')
+            rows = [
+                f'[{t}] {ip} {lat} "{ref}" "{proto}" "{method}" "{domain}" "{path}" {code} {size} {c} "{ua}" "-" 10.0.0.1\n'
+                for t, ip, lat, ref, proto, method, domain, path, code, size, c, ua in zip(
+                    times, ips, latency.tolist(), referers, protocols, methods, domains, paths,
+                    status.tolist(), sizes.tolist(), cache, agents)
+            ]
+            if self.bad_line_ratio:
+                # 不符合格式的行 (被截断的行)，解析时应被丢弃
+                for i in np.flatnonzero(rng.random(n) < self.bad_line_ratio).tolist():
+                    rows[i] = rows[i][:len(rows[i]) // 3] + '\n'
+            yield rows
+
+
+def write_logs(output: Path, lines: int, files: int = 1, compresslevel: int = 6, **options) -> list[Path]:
+    """
+    生成 lines 行日志，按时间顺序平均写入 files 个 gzip 文件 (文件名为 output 的主名加序号)，
+    返回写入的文件列表。options 传给 LogGenerator。
+    """
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if files == 1:
+        paths = [output]
+    else:
+        stem = output.name[:-len('.gz')] if output.name.endswith('.gz') else output.stem
+        paths = [output.with_name(f"{stem}_{i:03d}.gz") for i in range(files)]
+    # 每个文件 lines // files 行，余下的行写入最后一个文件；跨文件的批在文件边界处切开
+    counts = [lines // files] * files
+    counts[-1] += lines % files
+    batches = LogGenerator(lines, **options).batches()
+    pending: list[str] = []
+    for path, remaining in zip(paths, counts):
+        with gzip.open(path, 'wb', compresslevel=compresslevel) as f:
+            while remaining:
+                if not pending:
+                    pending = next(batches)
+                taken = min(remaining, len(pending))
+                f.write(''.join(pending[:taken]).encode('utf-8'))
+                pending = pending[taken:]
+                remaining -= taken
+    return paths
+
+
+@click.command()
+@click.option('--lines', default=1_000_000, help='Total number of log lines.')
+@click.option('--output', type=click.Path(dir_okay=False), required=True,
+              help='Output .gz file (numbered <name>_NNN.gz files when --files > 1).')
+@click.option('--files', default=1, type=click.IntRange(min=1), help='Split the lines over this many files.')
+@click.option('--ips', default=100_000, help='Size of the client IP population.')
+@click.option('--paths', default=50_000, help='Number of distinct URL paths.')
+@click.option('--domains', default=5, help='Number of distinct domains.')
+@click.option('--exponent', default=1.1, help='Zipf exponent of the IP and path popularity.')
+@click.option('--start', default='2025-11-16T00:00:00+08:00', help='Timestamp of the first line (ISO 8601).')
+@click.option('--span-hours', default=24.0, help='Time span covered by the lines.')
+@click.option('--ipv6-ratio', default=0.05, help='Share of IPv6 addresses in the IP population.')
+@click.option('--bad-line-ratio', default=0.0, help='Share of truncated lines that do not match the format.')
+@click.option('--seed', default=42, help='Random seed.')
+@click.option('--compresslevel', default=6, type=click.IntRange(1, 9), help='gzip compression level.')
+def main(lines, output, files, ips, paths, domains, exponent, start, span_hours, ipv6_ratio, bad_line_ratio,
+         seed, compresslevel):
+    written = write_logs(Path(output), lines, files=files, compresslevel=compresslevel, ips=ips, paths=paths,
+                         domains=domains, exponent=exponent, start=datetime.fromisoformat(start),
+                         span_hours=span_hours, ipv6_ratio=ipv6_ratio, bad_line_ratio=bad_line_ratio, seed=seed)
+    print(json.dumps({
+        'lines': lines,
+        'files': [str(p) for p in written],
+        'compressed_mb': round(sum(p.stat().st_size for p in written) / 1024 / 1024, 1),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
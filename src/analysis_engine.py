@@ -1,46 +1,214 @@
+import hashlib
+import json
 import logging
+import time
 import pandas as pd
-from typing import Dict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable
+from src import plugins
 from src.config import AppConfig
+from src.log_parser import PARSER_VERSION
+from src.log_schema import decode_frame
+from src.metrics import metrics
 from src.analyzers.base import BaseAnalyzer
-from src.analyzers.basic_stats_analyzer import BasicStatsAnalyzer
-from src.analyzers.geo_analyzer import GeoAnalyzer
-from src.analyzers.api_geo_analyzer import ApiGeoAnalyzer
 
 class AnalysisEngine:
-    def __init__(self, df: pd.DataFrame, config: AppConfig):
+    """
+    加载并运行配置的分析器。
+
+    各分析器在线程池中并发执行: 每个数据块只构造一次，各分析器只读地共享它，并只收到自己声明的列
+    (pandas 的写时复制保证分析器对其视图的修改不会影响其他分析器)。等待网络的分析器 (在线 GeoIP)
+    与 CPU 密集的分析器互相重叠，后者的向量化计算在 numpy 中释放 GIL 时也能并行。
+    同一分析器对各数据块的更新仍按顺序进行，结果与顺序执行完全一致。
+    """
+    def __init__(self, config: AppConfig, df: pd.DataFrame | None = None):
         self.df = df
         self.config = config
         self.results = {}
+        self.rows_processed = 0
         self.available_analyzers = self._load_analyzers()
+        # 各分析器累计的耗时 (秒)，并发执行时为各自线程中的耗时
+        self.analyzer_seconds: Dict[str, float] = {name: 0.0 for name in self.available_analyzers}
+        threads = min(config.analysis.analyzer_threads, len(self.available_analyzers))
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='analyzer') \
+            if threads > 1 else None
+
+    def close(self) -> None:
+        """关闭分析器线程池 (等待正在执行的任务完成)"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> 'AnalysisEngine':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def _load_analyzers(self) -> Dict[str, BaseAnalyzer]:
-        """根据配置动态加载分析器"""
+        """根据配置从插件注册表加载分析器，只导入启用的分析器模块"""
         analyzers = {}
-        
-        # 始终加载基础统计模块
-        if "basic_stats" in self.config.analysis.modules:
-            analyzers["basic_stats"] = BasicStatsAnalyzer(self.config)
-
-        # 根据 provider 智能选择地理位置分析器
-        if "geo_ip" in self.config.analysis.modules:
-            provider = self.config.analysis.geoip.provider
-            if provider == 'api':
-                logging.info("使用 API 地理位置分析器。")
-                analyzers["geo_ip"] = ApiGeoAnalyzer(self.config)
-            elif provider == 'local':
-                logging.info("使用本地数据地理位置分析器。")
-                analyzers["geo_ip"] = GeoAnalyzer(self.config)
-            else:
-                logging.warning(f"未知的 GeoIP provider: '{provider}'。跳过地理位置分析。")
-        
+        modules = self.config.analysis.modules
+        # 内置分析器按注册表中的顺序执行，第三方分析器按配置中的顺序排在其后
+        builtin = [name for name in plugins.BUILTIN_PLUGINS['analyzers'] if name in modules]
+        ordered = builtin + ['geo_ip'] * ('geo_ip' in modules) + \
+            [name for name in modules if name not in builtin and name != 'geo_ip']
+
+        for name in dict.fromkeys(ordered):
+            group, plugin = 'analyzers', name
+            if name == 'geo_ip':
+                # 根据 provider 选择地理位置分析器
+                group, plugin = 'geoip_providers', self.config.analysis.geoip.provider if self.config.analysis.geoip else None
+                if plugins.find_plugin(group, plugin) is None:
+                    logging.warning(f"未知的 GeoIP provider: '{plugin}'。跳过地理位置分析。")
+                    continue
+                logging.info(f"使用 GeoIP provider '{plugin}' 的地理位置分析器。")
+            elif plugins.find_plugin(group, plugin) is None:
+                logging.warning(f"配置了未知的分析模块 '{name}'，已跳过。")
+                continue
+            analyzer_class = plugins.load_plugin(group, plugin)
+            if analyzer_class is None:
+                logging.warning(f"分析模块 '{name}' 无法加载，已跳过。")
+                continue
+            analyzers[name] = analyzer_class(self.config)
+
         return analyzers
 
+    def _columns(self, name: str, chunk: pd.DataFrame) -> pd.DataFrame:
+        """分析器所需列的视图 (写时复制，不复制数据)"""
+        columns = self.available_analyzers[name].required_columns
+        if columns is None:
+            return chunk
+        return chunk[[c for c in columns if c in chunk.columns]]
+
+    def _timed(self, name: str, stage: str, func: Callable, *args) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            seconds = time.perf_counter() - start
+            self.analyzer_seconds[name] += seconds
+            metrics.add_time(f'analyzer.{name}.{stage}', seconds)
+
+    def _update_one(self, name: str, state: Any, chunk: pd.DataFrame) -> Any:
+        return self._timed(name, 'update', self.available_analyzers[name].update, state, self._columns(name, chunk))
+
+    def _map(self, func: Callable, names: list[str], *args_per_name) -> Dict[str, Any]:
+        """对每个分析器调用 func(name, ...)，有线程池时并发执行，返回 {name: 结果}"""
+        if self._executor is None or len(names) < 2:
+            return {name: func(name, *(args[i] for args in args_per_name)) for i, name in enumerate(names)}
+        futures = {name: self._executor.submit(func, name, *(args[i] for args in args_per_name))
+                   for i, name in enumerate(names)}
+        return {name: future.result() for name, future in futures.items()}
+
+    def init_states(self) -> Dict[str, Any]:
+        """为所有支持流式约定的分析器创建空的中间状态"""
+        return {
+            name: analyzer.init_state()
+            for name, analyzer in self.available_analyzers.items()
+            if analyzer.supports_streaming
+        }
+
+    def update_states(self, states: Dict[str, Any], chunk: pd.DataFrame) -> Dict[str, Any]:
+        """用一个数据块更新所有分析器的中间状态 (各分析器并发执行)"""
+        names = list(states)
+        states.update(self._map(lambda name, state: self._update_one(name, state, chunk), names,
+                                [states[name] for name in names]))
+        self.rows_processed += len(chunk)
+        return states
+
+    def merge_states(self, a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+        """合并两组中间状态 (例如来自不同进程或机器的部分结果)"""
+        return {name: self.available_analyzers[name].merge(a[name], b[name]) for name in a}
+
+    def merge_all(self, parts: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        按顺序合并多组中间状态 (例如按小时分区保存的汇总)。
+        相邻的状态两两归并，合并次数与逐个合并相同，但每个状态只参与 O(log n) 次合并，
+        不会反复复制不断增大的累计状态。
+        """
+        # (归并层数, 状态)，层数自底向上递减，栈中靠前的状态在数据顺序上也靠前
+        stack: list[tuple[int, Dict[str, Any]]] = []
+        for states in parts:
+            level = 0
+            while stack and stack[-1][0] == level:
+                states = self.merge_states(stack.pop()[1], states)
+                level += 1
+            stack.append((level, states))
+        merged = self.init_states()
+        for _, states in stack:
+            merged = self.merge_states(merged, states)
+        return merged
+
+    def state_key(self) -> str:
+        """中间状态的兼容性标识: 分析或解析相关的配置变化后，之前保存的中间状态不能再与新的状态合并"""
+        key = {
+            # 线程数不影响中间状态
+            'analysis': self.config.analysis.model_dump(mode='json', exclude={'analyzer_threads'}),
+            'parser': self.config.parser.model_dump(mode='json'),
+            'parser_version': PARSER_VERSION,
+        }
+        # 过滤后的中间状态只能与相同过滤条件的状态合并 (未设置过滤条件时不改变标识，已保存的状态仍然可用)
+        filters = self.config.filters.model_dump(mode='json', exclude_defaults=True)
+        if filters:
+            key['filters'] = filters
+        key = json.dumps(key, sort_keys=True)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def finalize_states(self, states: Dict[str, Any]) -> Dict[str, dict]:
+        """由中间状态生成所有分析器的最终结果 (各分析器并发执行，例如在线 GeoIP 查询与其他分析器的汇总重叠)"""
+        def _finalize(name: str, state: Any) -> dict:
+            logging.info(f"正在汇总分析器结果: {name}...")
+            return self._timed(name, 'finalize', self.available_analyzers[name].finalize, state)
+
+        names = list(states)
+        self.results.update(self._map(_finalize, names, [states[name] for name in names]))
+        return self.results
+
+    def run_chunks(self, chunks: Iterable[pd.DataFrame]) -> Dict[str, dict]:
+        """
+        逐块消费解析器产出的数据并运行所有分析模块。
+        流式分析器只保留中间状态；仅实现了 run(df) 的分析器会退化为缓存全部数据块。
+        """
+        states = self.init_states()
+        legacy = [name for name, analyzer in self.available_analyzers.items() if not analyzer.supports_streaming]
+        if legacy:
+            logging.warning(f"分析器 {legacy} 不支持流式分析，将在内存中保留全部日志数据。")
+        legacy_chunks = []
+
+        # 每个分析器尚未完成的更新: 解析下一个数据块的同时，各分析器在线程池中处理上一个数据块，
+        # 同一分析器的下一次更新在上一次完成后才提交
+        pending: Dict[str, Future] = {}
+        for chunk in chunks:
+            if self._executor is None:
+                states = self.update_states(states, chunk)
+            else:
+                for name in states:
+                    if name in pending:
+                        states[name] = pending[name].result()
+                    pending[name] = self._executor.submit(self._update_one, name, states[name], chunk)
+                self.rows_processed += len(chunk)
+            if legacy:
+                # 一次性约定的分析器收到字符串列的表 (client_ip 为 IP 字符串)
+                legacy_chunks.append(decode_frame(chunk))
+        for name, future in pending.items():
+            states[name] = future.result()
+
+        self.finalize_states(states)
+        if legacy:
+            df = pd.concat(legacy_chunks, ignore_index=True) if legacy_chunks else pd.DataFrame()
+
+            def _run(name: str) -> dict:
+                logging.info(f"正在运行分析器: {name}...")
+                analyzer = self.available_analyzers[name]
+                return self._timed(name, 'run', analyzer.run, self._columns(name, df))
+
+            self.results.update(self._map(_run, legacy))
+
+        logging.info("所有分析模块执行完毕，各分析器耗时: " +
+                     ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.analyzer_seconds.items()))
+        return self.results
+
     def run(self):
-        """运行所有已加载的分析模块"""
-        for name, analyzer in self.available_analyzers.items():
-            logging.info(f"正在运行分析器: {name}...")
-            self.results[name] = analyzer.run(self.df)
-        
-        logging.info("所有分析模块执行完毕。")
-        return self.results
\ No newline at end of file
+        """对构造时传入的 DataFrame 运行所有已加载的分析模块"""
+        return self.run_chunks([self.df])
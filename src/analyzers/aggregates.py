@@ -0,0 +1,287 @@
+import numpy as np
+import pandas as pd
+from src.log_schema import dimension_keys, group_sums, pair_counts
+from src.sketches.count_min import CountMinSketch
+from src.sketches.hashing import hash_values
+from src.sketches.histogram import LogBuckets
+from src.sketches.space_saving import SpaceSaving
+
+# 累积的未合并分块数量上限，超过后压缩合并一次
+_MAX_PENDING_PARTS = 32
+
+
+class _PartsTable:
+    """
+    按键累加的可合并聚合表的基类。
+    分块增量更新时先暂存各块的部分结果，累积到一定数量后再统一合并，
+    避免每个分块都与整张大表重新对齐索引。
+    """
+    def __init__(self, parts: list | None = None):
+        self._parts = list(parts or [])
+
+    def add(self, part) -> None:
+        if len(part):
+            self._parts.append(part)
+            if len(self._parts) > _MAX_PENDING_PARTS:
+                self._compact()
+
+    def merge(self, other: '_PartsTable') -> '_PartsTable':
+        merged = type(self)(self._parts + other._parts)
+        if len(merged._parts) > _MAX_PENDING_PARTS:
+            merged._compact()
+        return merged
+
+    def __getstate__(self) -> dict:
+        # 序列化 (汇总分区、增量状态) 前先合并暂存的部分结果，重复的键只保存一次
+        self._compact()
+        return self.__dict__
+
+    def _compact(self):
+        if len(self._parts) <= 1:
+            return self._parts[0] if self._parts else None
+        combined = pd.concat(self._parts)
+        merged = combined.groupby(level=list(range(combined.index.nlevels)), sort=False).sum()
+        merged.index.names = combined.index.names
+        self._parts = [merged]
+        return merged
+
+    def __len__(self) -> int:
+        merged = self._compact()
+        return 0 if merged is None else len(merged)
+
+
+class CountTable(_PartsTable):
+    """可合并的计数表: 按键累加计数"""
+    def to_series(self) -> pd.Series:
+        """返回合并后的计数 Series (未排序)"""
+        merged = self._compact()
+        if merged is None:
+            return pd.Series(dtype='int64', name='count')
+        merged.name = 'count'
+        return merged
+
+
+class SumTable(_PartsTable):
+    """可合并的多列求和表: 按键对每一列分别累加"""
+    def __init__(self, parts: list | None = None, columns: list[str] | None = None):
+        super().__init__(parts)
+        self.columns = columns if columns is not None else (list(self._parts[0].columns) if self._parts else [])
+
+    def merge(self, other: 'SumTable') -> 'SumTable':
+        merged = SumTable(self._parts + other._parts, self.columns or other.columns)
+        if len(merged._parts) > _MAX_PENDING_PARTS:
+            merged._compact()
+        return merged
+
+    def to_frame(self) -> pd.DataFrame:
+        merged = self._compact()
+        if merged is None:
+            return pd.DataFrame(columns=self.columns, dtype='int64')
+        return merged
+
+
+def new_key_counter(approximate: bool, capacity: int) -> 'CountTable | SpaceSaving':
+    """按键计数的状态: 精确模式下为 CountTable，近似模式下为 Space-Saving 草图 (两者接口一致)"""
+    return SpaceSaving(capacity) if approximate else CountTable()
+
+
+def key_counter_bounds(counter: 'CountTable | SpaceSaving', label: str) -> pd.DataFrame | None:
+    """近似计数的误差界，精确计数时返回 None"""
+    if not isinstance(counter, SpaceSaving):
+        return None
+    return pd.DataFrame([{
+        'item': f'{label} (Space-Saving)',
+        'error_bound': counter.max_error,
+        'description': f'跟踪 {len(counter.counts)} 个键，估计值最多高估该值，总数 {counter.total}',
+    }])
+
+
+def top_n(counts: pd.Series, n: int) -> pd.Series:
+    """按计数降序取前 n 项，计数相同时按键升序，保证结果与分块和合并顺序无关"""
+    return counts.sort_index().sort_values(ascending=False, kind='stable').head(n)
+
+
+# --- 延迟分桶 ---
+# 分组统计中估计 P95 延迟所用的对数分桶，相对误差不超过 LATENCY_RELATIVE_ACCURACY
+LATENCY_RELATIVE_ACCURACY = 0.02
+LATENCY_BUCKETS = LogBuckets(LATENCY_RELATIVE_ACCURACY, min_value=0.5, max_value=1e8)
+
+
+# --- 多维分组聚合 ---
+# 支持分组的维度
+GROUP_BY_DIMENSIONS = ('client_ip', 'domain', 'path', 'user_agent', 'referer', 'cache_hit_status', 'method')
+# 高基数维度，近似模式下改用草图统计
+HIGH_CARDINALITY_DIMENSIONS = ('client_ip', 'path', 'user_agent', 'referer')
+STATUS_CLASSES = (2, 3, 4, 5)
+_SUM_COLUMNS = ['requests'] + [f'{c}xx' for c in STATUS_CLASSES] + ['bytes', 'latency_ms_sum']
+
+
+def _check_dimensions(dimensions: list[str]) -> list[str]:
+    unknown = [d for d in dimensions if d not in GROUP_BY_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"不支持的分组维度: {unknown}，可选值: {list(GROUP_BY_DIMENSIONS)}")
+    return list(dict.fromkeys(dimensions))
+
+
+def _metrics_frame(chunk: pd.DataFrame) -> pd.DataFrame:
+    """构造一次分组即可求和得到所有指标的数值列"""
+    status_class = (chunk['status_code'] // 100).to_numpy()
+    metrics = {'requests': np.ones(len(chunk), dtype=np.int64)}
+    for c in STATUS_CLASSES:
+        metrics[f'{c}xx'] = (status_class == c).astype(np.int64)
+    metrics['bytes'] = chunk['response_size_bytes'].to_numpy(dtype=np.int64)
+    metrics['latency_ms_sum'] = chunk['response_time_ms'].to_numpy(dtype=np.int64)
+    return pd.DataFrame(metrics, index=chunk.index)
+
+
+def _dimension_keys(chunk: pd.DataFrame, dim: str) -> pd.Series:
+    return dimension_keys(chunk, dim, fill='-' if dim == 'referer' else None)
+
+
+class GroupByAggregator:
+    """
+    单次扫描的多维分组聚合。
+
+    每个数据块对每个维度只做一次 groupby，累计请求数、各类状态码数量、字节数、
+    延迟总和以及延迟的对数分桶直方图；Top N 只在 finalize 时选取，
+    因此开销与 N 无关。状态可跨分块、文件和进程合并。
+    """
+    def __init__(self, dimensions: list[str]):
+        self.dimensions = _check_dimensions(dimensions)
+
+    def init_state(self) -> dict:
+        return {
+            dim: {"sums": SumTable(columns=_SUM_COLUMNS), "latency_hist": CountTable()}
+            for dim in self.dimensions
+        }
+
+    def update(self, state: dict, chunk: pd.DataFrame) -> dict:
+        metrics = _metrics_frame(chunk)
+        buckets = LATENCY_BUCKETS.index(chunk['response_time_ms'].to_numpy())
+        for dim in self.dimensions:
+            keys = _dimension_keys(chunk, dim)
+            state[dim]["sums"].add(group_sums(metrics, keys))
+            state[dim]["latency_hist"].add(pair_counts(keys, buckets, LATENCY_BUCKETS.size, 'latency_bucket'))
+        return state
+
+    def merge(self, a: dict, b: dict) -> dict:
+        return {
+            dim: {
+                "sums": a[dim]["sums"].merge(b[dim]["sums"]),
+                "latency_hist": a[dim]["latency_hist"].merge(b[dim]["latency_hist"]),
+            }
+            for dim in self.dimensions
+        }
+
+    @staticmethod
+    def _quantile_from_hist(hist: pd.Series, keys: pd.Index, q: float) -> pd.Series:
+        """由 (键, 桶) -> 计数 的直方图计算指定键的分位数"""
+        if hist.empty or keys.empty:
+            return pd.Series(np.nan, index=keys)
+        hist = hist[hist.index.get_level_values(0).isin(keys)].sort_index()
+        cum = hist.groupby(level=0, sort=False).cumsum()
+        total = hist.groupby(level=0, sort=False).transform('sum')
+        reached = hist[(cum >= q * total).to_numpy()]
+        first = reached[~reached.index.get_level_values(0).duplicated()]
+        values = pd.Series(LATENCY_BUCKETS.value(first.index.get_level_values(1).to_numpy()),
+                           index=first.index.get_level_values(0))
+        return values.reindex(keys)
+
+    def top_table(self, state: dict, dim: str, n: int) -> pd.DataFrame:
+        """取某一维度按请求数排序的 Top N 统计表"""
+        sums = state[dim]["sums"].to_frame()
+        if sums.empty:
+            return pd.DataFrame(columns=[dim, 'requests'])
+        top_keys = top_n(sums['requests'], n).index
+        top = sums.loc[top_keys]
+        requests = top['requests'].to_numpy()
+        table = pd.DataFrame({dim: top_keys.astype(str), 'requests': requests})
+        for c in STATUS_CLASSES:
+            table[f'{c}xx'] = top[f'{c}xx'].to_numpy()
+            table[f'{c}xx_ratio(%)'] = (top[f'{c}xx'].to_numpy() / requests * 100).round(2)
+        table['bytes'] = top['bytes'].to_numpy()
+        table['avg_latency_ms'] = (top['latency_ms_sum'].to_numpy() / requests).round(2)
+        p95 = self._quantile_from_hist(state[dim]["latency_hist"].to_series(), top_keys, 0.95)
+        table['p95_latency_ms'] = p95.to_numpy().round(2)
+        return table
+
+
+class ApproxGroupByAggregator:
+    """
+    近似模式下高基数维度的分组聚合，内存占用与键的数量无关。
+
+    请求数由 Space-Saving 草图跟踪 Top 键 (附带最大高估量)，
+    各类状态码数量、字节数和延迟总和由 Count-Min 草图做点查询 (只会偏高)。
+    每个数据块先在块内精确分组求和，再批量写入草图。
+    """
+    _CMS_COLUMNS = [f'{c}xx' for c in STATUS_CLASSES] + ['bytes', 'latency_ms_sum']
+
+    def __init__(self, dimensions: list[str], capacity: int, cms_width: int, cms_depth: int):
+        self.dimensions = _check_dimensions(dimensions)
+        self.capacity = capacity
+        self.cms_width = cms_width
+        self.cms_depth = cms_depth
+
+    def init_state(self) -> dict:
+        return {
+            dim: {
+                "top": SpaceSaving(self.capacity),
+                "cms": {col: CountMinSketch(self.cms_width, self.cms_depth) for col in self._CMS_COLUMNS},
+            }
+            for dim in self.dimensions
+        }
+
+    def update(self, state: dict, chunk: pd.DataFrame) -> dict:
+        metrics = _metrics_frame(chunk)
+        for dim in self.dimensions:
+            sums = group_sums(metrics, _dimension_keys(chunk, dim))
+            state[dim]["top"].add(sums['requests'])
+            hashes = hash_values(sums.index)
+            for col, sketch in state[dim]["cms"].items():
+                sketch.update(hashes, sums[col].to_numpy())
+        return state
+
+    def merge(self, a: dict, b: dict) -> dict:
+        return {
+            dim: {
+                "top": a[dim]["top"].merge(b[dim]["top"]),
+                "cms": {col: a[dim]["cms"][col].merge(b[dim]["cms"][col]) for col in self._CMS_COLUMNS},
+            }
+            for dim in self.dimensions
+        }
+
+    def top_table(self, state: dict, dim: str, n: int) -> pd.DataFrame:
+        """取某一维度估计请求数最高的 N 个键，requests_error 为请求数的最大高估量"""
+        top = state[dim]["top"].top(n)
+        if top.empty:
+            return pd.DataFrame(columns=[dim, 'requests', 'requests_error'])
+        requests = top['count'].to_numpy()
+        hashes = hash_values(top.index)
+        estimates = {col: sketch.query(hashes) for col, sketch in state[dim]["cms"].items()}
+        table = pd.DataFrame({dim: top.index.astype(str), 'requests': requests,
+                              'requests_error': top['error'].to_numpy()})
+        for c in STATUS_CLASSES:
+            # Count-Min 的估计值只会偏高，占比最多按 100% 计
+            table[f'{c}xx'] = np.minimum(estimates[f'{c}xx'], requests)
+            table[f'{c}xx_ratio(%)'] = (table[f'{c}xx'] / requests * 100).round(2)
+        table['bytes'] = estimates['bytes']
+        table['avg_latency_ms'] = (estimates['latency_ms_sum'] / requests).round(2)
+        return table
+
+    def error_bounds(self, state: dict) -> list[dict]:
+        """各维度草图的误差界，供报告展示"""
+        bounds = []
+        for dim in self.dimensions:
+            top = state[dim]["top"]
+            cms = state[dim]["cms"]['2xx']
+            bounds.append({
+                'item': f'{dim} 请求数 (Space-Saving)',
+                'error_bound': top.max_error,
+                'description': f'跟踪 {len(top.counts)} 个键，估计值最多高估该值，总请求数 {top.total}',
+            })
+            bounds.append({
+                'item': f'{dim} 状态码/流量/延迟 (Count-Min)',
+                'error_bound': round(cms.epsilon, 6),
+                'description': f'以 {1 - cms.delta:.2%} 的概率，估计值最多高估 (该值 × 对应指标的总量)',
+            })
+        return bounds
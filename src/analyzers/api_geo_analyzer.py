@@ -1,10 +1,13 @@
 # src/analyzers/api_geo_analyzer.py (已修正地区归属问题)
 import logging
 import pandas as pd
-import requests
-from typing import List, Dict, Any
 from src.config import AppConfig
 from src.analyzers.base import BaseAnalyzer
+from src.analyzers.aggregates import CountTable, key_counter_bounds, new_key_counter
+from src.clients.ip_api_client import IpApiBatchClient
+from src.geo_cache import GEO_FIELDS, GeoCache
+from src.log_schema import IP_COLUMNS, ip_keys, key_counts
+from src.sketches.space_saving import SpaceSaving
 
 CHINA_REGIONS = {'Hong Kong', 'Taiwan', 'Macao'}
 
@@ -20,45 +23,63 @@ class ApiGeoAnalyzer(BaseAnalyzer):
     def name(self) -> str:
         return "geo_ip_api"
 
-    def _query_batch(self, ip_batch: List[str]) -> List[Dict[str, Any]]:
-        try:
-            response = requests.post(
-                str(self.api_config.endpoint),
-                json=ip_batch,
-                timeout=self.api_config.timeout
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"IP API 请求失败: {e}")
-            return []
-
-    def run(self, df: pd.DataFrame) -> dict:
-        ip_counts = df['client_ip'].value_counts()
+    @property
+    def required_columns(self) -> list[str]:
+        return IP_COLUMNS
+
+    def init_state(self) -> CountTable | SpaceSaving:
+        # 近似模式下只跟踪请求数最多的 IP，内存占用与独立 IP 数无关
+        return new_key_counter(self.config.analysis.approximate, self.config.analysis.sketch.capacity)
+
+    def update(self, state: CountTable | SpaceSaving, chunk: pd.DataFrame) -> CountTable | SpaceSaving:
+        # 分块阶段只累计每个 IP 的请求数，API 查询在 finalize 中对去重后的 IP 进行
+        state.add(key_counts(ip_keys(chunk)))
+        return state
+
+    def merge(self, a: CountTable | SpaceSaving, b: CountTable | SpaceSaving) -> CountTable | SpaceSaving:
+        return a.merge(b)
+
+    def finalize(self, state: CountTable | SpaceSaving) -> dict:
+        ip_counts = state.to_series().sort_values(ascending=False)
         unique_ips = [str(ip) for ip in ip_counts.index]
-        geo_data = []
-        
-        ip_chunks = [
-            unique_ips[i:i + self.api_config.batch_size]
-            for i in range(0, len(unique_ips), self.api_config.batch_size)
-        ]
-        
-        logging.info(f"将向 API 发送 {len(ip_chunks)} 个批量请求...")
-
-        for chunk in ip_chunks:
-            api_results = self._query_batch(chunk)
-            for result in api_results:
-                if result.get('status') == 'success':
-                    country_name = result.get('country', 'Unknown')
-                    if country_name in CHINA_REGIONS:
-                        country_name = 'China'
-
-                    geo_data.append({
-                        'ip': result.get('query'),
-                        'country': country_name, # 修正
-                        'city': result.get('city', 'Unknown'),
-                        'isp': result.get('isp', 'Unknown')
-                    })
+
+        # 先查询本地缓存，只有未命中的 IP 才发送给 API
+        cache = GeoCache.from_config(self.config, f"api:{self.api_config.endpoint}")
+        locations = cache.get_many(unique_ips) if cache else {}
+        missing_ips = [ip for ip in unique_ips if ip not in locations]
+
+        client = IpApiBatchClient(self.api_config)
+        logging.info(f"将向 API 查询 {len(missing_ips)} 个 IP (并发数 {self.api_config.concurrency})...")
+        try:
+            api_results, query_stats = client.query(missing_ips)
+        finally:
+            client.close()
+        if query_stats.failed_batches:
+            logging.warning(f"{query_stats.failed_batches}/{query_stats.batches} 个批量请求失败，"
+                            f"{len(query_stats.failed_ips)} 个 IP 未能查询到地理位置。")
+
+        queried = []
+        for result in api_results:
+            if result.get('status') == 'success':
+                country_name = result.get('country', 'Unknown')
+                if country_name in CHINA_REGIONS:
+                    country_name = 'China'
+
+                queried.append({
+                    'ip': result.get('query'),
+                    'country': country_name, # 修正
+                    'city': result.get('city', 'Unknown'),
+                    'isp': result.get('isp', 'Unknown')
+                })
+        if cache:
+            # 只缓存查询成功的结果，失败的 IP 下次运行时重新查询
+            cache.put_many(queried)
+            cache.log_stats()
+            cache.close()
+        locations.update((record['ip'], record) for record in queried)
+
+        geo_data = [{'ip': ip, **{field: locations[ip][field] for field in GEO_FIELDS}}
+                    for ip in unique_ips if ip in locations]
 
         if not geo_data:
             logging.warning("未能从 API 获取任何地理位置数据。")
@@ -66,16 +87,23 @@ class ApiGeoAnalyzer(BaseAnalyzer):
 
         geo_df = pd.DataFrame(geo_data)
         
-        ip_counts_df = ip_counts.reset_index()
-        ip_counts_df.columns = ['ip_obj', 'count']
-        ip_counts_df['ip'] = ip_counts_df['ip_obj'].astype(str)
-        
-        ip_geo_details_df = pd.merge(geo_df, ip_counts_df[['ip', 'count']], on='ip', how='left')
+        ip_counts_df = pd.DataFrame({'ip': unique_ips, 'count': ip_counts.to_numpy()})
+
+        ip_geo_details_df = pd.merge(geo_df, ip_counts_df, on='ip', how='left')
         ip_geo_details_df = ip_geo_details_df.sort_values(by='count', ascending=False).fillna('N/A')
 
         country_counts = ip_geo_details_df.groupby('country')['count'].sum().sort_values(ascending=False)
 
-        return {
+        results = {
             "ip_geo_details": ip_geo_details_df.head(200),
-            "country_counts": country_counts.head(self.config.analysis.top_n_count)
-        }
\ No newline at end of file
+            "country_counts": country_counts.head(self.config.analysis.top_n_count),
+            "query_stats": pd.DataFrame(query_stats.summary(), dtype=object),
+        }
+        bounds = key_counter_bounds(state, 'IP 请求数')
+        if bounds is not None:
+            # 近似模式: 国家/地区统计只覆盖被跟踪的 IP，每个 IP 的计数最多高估 count_error
+            results["ip_geo_details"] = results["ip_geo_details"].assign(
+                count_error=lambda df: df['ip'].map(state.errors).fillna(0).astype('int64')
+            )
+            results["approximation"] = bounds
+        return results
\ No newline at end of file
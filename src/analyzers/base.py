@@ -1,10 +1,26 @@
 # src/analyzers/base.py
 from abc import ABC, abstractmethod
+from typing import Any
 import pandas as pd
 from src.config import AppConfig
 
 class BaseAnalyzer(ABC):
-    """所有分析器模块的抽象基类"""
+    """
+    所有分析器模块的抽象基类。
+
+    分析器可以实现两种约定之一:
+    - 一次性约定: 实现 run(df)，对完整的 DataFrame 进行分析。
+    - 流式约定: 实现 init_state / update / merge / finalize。引擎逐块调用 update
+      累积中间状态，内存占用只取决于聚合结果的大小，而与日志量无关；
+      merge 用于合并不同分块、进程或机器上得到的中间状态。
+    流式约定收到的数据块为 src/log_schema.py 中定义的紧凑表 (与 LogParser.parse_batch 的输出一致):
+    timestamp 为 Unix 秒级时间戳，客户端 IP 为数值列 ip_family / ip_hi / ip_lo，字符串字段为 category 列，
+    可用 log_schema 中的 ip_keys / dimension_keys / key_counts 分组计数；run(df) 收到的是还原为字符串列的表。
+
+    引擎在多个线程中并发执行各分析器，所有分析器共享同一个只读的数据块；
+    分析器通过 required_columns 声明所需的列 (紧凑表中的列名，client_ip 可用 physical_columns 转换)，
+    只会收到这些列 (不复制数据)。
+    """
     def __init__(self, config: AppConfig):
         self.config = config
 
@@ -14,7 +30,34 @@ class BaseAnalyzer(ABC):
         """为分析器提供一个唯一的名称, 例如 'basic_stats'"""
         pass
 
-    @abstractmethod
+    @property
+    def required_columns(self) -> list[str] | None:
+        """update / run 读取的列，None 表示需要全部列"""
+        return None
+
+    @property
+    def supports_streaming(self) -> bool:
+        """是否实现了流式约定"""
+        return type(self).update is not BaseAnalyzer.update
+
     def run(self, df: pd.DataFrame) -> dict:
         """执行分析并返回一个包含结果的字典"""
-        pass
\ No newline at end of file
+        if not self.supports_streaming:
+            raise NotImplementedError(f"分析器 '{self.name}' 需要实现 run 方法或流式约定。")
+        return self.finalize(self.update(self.init_state(), df))
+
+    def init_state(self) -> Any:
+        """创建一个空的中间状态"""
+        raise NotImplementedError
+
+    def update(self, state: Any, chunk: pd.DataFrame) -> Any:
+        """用一个数据块更新中间状态，并返回更新后的状态"""
+        raise NotImplementedError
+
+    def merge(self, a: Any, b: Any) -> Any:
+        """合并两个中间状态。合并需满足结合律，a 中的数据视为排在 b 之前"""
+        raise NotImplementedError
+
+    def finalize(self, state: Any) -> dict:
+        """由中间状态生成最终的结果字典"""
+        raise NotImplementedError
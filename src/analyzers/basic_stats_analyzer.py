@@ -1,59 +1,178 @@
 import pandas as pd
 from src.config import AppConfig
 from src.analyzers.base import BaseAnalyzer
+from src.analyzers.aggregates import (
+    HIGH_CARDINALITY_DIMENSIONS, ApproxGroupByAggregator, CountTable, GroupByAggregator,
+)
+from src.analyzers.raw_logs import RawLogSample
+from src.log_parser import to_datetime_column
+from src.log_schema import ip_keys, physical_columns
+from src.sketches.hashing import hash_values
+from src.sketches.hyperloglog import HyperLogLog
+
+# 报告中时间展示使用的时区
+REPORT_TIMEZONE = 'Asia/Shanghai'
 
 class BasicStatsAnalyzer(BaseAnalyzer):
     """
     执行基础的统计分析，包括:
     - 状态码统计
     - Top N IP 及其 2xx 成功率
+    - 按配置维度 (IP、域名、路径等) 的 Top N 多维统计
     - 每小时访问量
+    - 每小时独立访客数 (仅近似模式)
+    近似模式下高基数维度改用草图统计，结果中附带误差界。
     """
+    def __init__(self, config: AppConfig):
+        super().__init__(config)
+        self.approximate = config.analysis.approximate
+        self.dimensions = list(config.analysis.group_by_dimensions)
+        # client_ip 维度始终参与聚合，用于生成 Top IP 相关结果
+        all_dimensions = list(dict.fromkeys(['client_ip'] + self.dimensions))
+        if self.approximate:
+            sketch = config.analysis.sketch
+            exact_dimensions = [d for d in all_dimensions if d not in HIGH_CARDINALITY_DIMENSIONS]
+            approx_dimensions = [d for d in all_dimensions if d in HIGH_CARDINALITY_DIMENSIONS]
+            self.approx_group_by = ApproxGroupByAggregator(
+                approx_dimensions, sketch.capacity, sketch.cms_width, sketch.cms_depth
+            )
+        else:
+            exact_dimensions, self.approx_group_by = all_dimensions, None
+        self.group_by = GroupByAggregator(exact_dimensions)
+
     @property
     def name(self) -> str:
         return "basic_stats"
 
-    def run(self, df: pd.DataFrame) -> dict:
-        df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True).dt.tz_convert('Asia/Shanghai')
+    @property
+    def required_columns(self) -> list[str] | None:
+        # 原始日志样本需要完整的行
+        if self.config.analysis.raw_logs_sample_limit != 0:
+            return None
+        return physical_columns(['timestamp', 'client_ip', 'status_code', 'response_size_bytes',
+                                 'response_time_ms'] + self.dimensions)
+
+    def init_state(self) -> dict:
+        state = {
+            "status_counts": CountTable(),
+            "group_by": self.group_by.init_state(),
+            "hourly_counts": CountTable(),
+            "sample": RawLogSample(self.config.analysis.raw_logs_sample_limit),
+        }
+        if self.approximate:
+            state["approx_group_by"] = self.approx_group_by.init_state()
+            # 以整点 Unix 时间戳为键的每小时独立访客 HyperLogLog
+            state["hourly_visitors"] = {}
+        return state
 
+    def _top_table(self, state: dict, dim: str, n: int) -> pd.DataFrame:
+        if dim in self.group_by.dimensions:
+            return self.group_by.top_table(state["group_by"], dim, n)
+        return self.approx_group_by.top_table(state["approx_group_by"], dim, n)
+
+    def update(self, state: dict, chunk: pd.DataFrame) -> dict:
         # 状态码统计
-        status_counts = df['status_code'].value_counts().sort_index()
+        state["status_counts"].add(chunk['status_code'].value_counts())
+
+        # 各维度的多维统计 (每个维度一次分组)，只在 finalize 时取 Top N
+        state["group_by"] = self.group_by.update(state["group_by"], chunk)
+
+        # 每小时访问量，以整点的 Unix 时间戳为键
+        hours = chunk['timestamp'] // 3600 * 3600
+        state["hourly_counts"].add(hours.value_counts())
+
+        if self.approximate:
+            state["approx_group_by"] = self.approx_group_by.update(state["approx_group_by"], chunk)
+            ip_hashes = hash_values(ip_keys(chunk))
+            precision = self.config.analysis.sketch.hll_precision
+            for hour in hours.unique():
+                hll = state["hourly_visitors"].setdefault(int(hour), HyperLogLog(precision))
+                hll.update(ip_hashes[(hours == hour).to_numpy()])
+
+        # --- 配置决定样本数量 (保存紧凑数据块，行数多时写入临时文件，报告时再逐批还原) ---
+        state["sample"].add(chunk)
+        return state
+
+    def merge(self, a: dict, b: dict) -> dict:
+        merged = {
+            "status_counts": a["status_counts"].merge(b["status_counts"]),
+            "group_by": self.group_by.merge(a["group_by"], b["group_by"]),
+            "hourly_counts": a["hourly_counts"].merge(b["hourly_counts"]),
+            "sample": a["sample"].merge(b["sample"]),
+        }
+        if self.approximate:
+            merged["approx_group_by"] = self.approx_group_by.merge(a["approx_group_by"], b["approx_group_by"])
+            hourly_visitors = dict(a["hourly_visitors"])
+            for hour, hll in b["hourly_visitors"].items():
+                hourly_visitors[hour] = hourly_visitors[hour].merge(hll) if hour in hourly_visitors else hll
+            merged["hourly_visitors"] = hourly_visitors
+        return merged
+
+    def finalize(self, state: dict) -> dict:
+        # 状态码统计
+        status_counts = state["status_counts"].to_series().sort_index()
+        status_counts.index.name = 'status_code'
 
         # --- Top N IP ---
-        top_n = self.config.analysis.top_n_count
-        top_ips = df['client_ip'].value_counts().head(top_n)
+        top_n_count = self.config.analysis.top_n_count
+        ip_table = self._top_table(state, 'client_ip', top_n_count)
+        top_ips = pd.Series(ip_table['requests'].to_numpy(dtype='int64'),
+                            index=pd.Index(ip_table['client_ip'], name='client_ip'), name='count')
 
         # --- Top N IP 2xx 成功率 ---
-        top_ip_status_list = []
-        for ip, total_count in top_ips.items():
-            ip_df = df[df['client_ip'] == ip]
-            count_2xx = ip_df[ip_df['status_code'].between(200, 299)].shape[0]
-            ratio = round(count_2xx / total_count * 100, 2) if total_count > 0 else 0
-            top_ip_status_list.append({
-                'ip': str(ip), 
-                'total_requests': total_count, 
-                '2xx_requests': count_2xx, 
-                '2xx_ratio(%)': ratio
-            })
-        top_ip_status_df = pd.DataFrame(top_ip_status_list)
-
-        # --- 每小时访问量 ---
-        hourly_counts = df.set_index('timestamp').resample('h').size()
-
-        # --- 配置决定样本数量 ---
-        sample_limit = self.config.analysis.raw_logs_sample_limit
-        if sample_limit == -1:
-            # -1 表示显示全部
-            raw_logs_sample_df = df.copy()
+        top_ip_status_df = pd.DataFrame({
+            'ip': ip_table['client_ip'],
+            'total_requests': ip_table['requests'],
+            '2xx_requests': ip_table.get('2xx', []),
+            '2xx_ratio(%)': ip_table.get('2xx_ratio(%)', []),
+        })
+        if self.approximate:
+            top_ip_status_df['requests_error'] = ip_table['requests_error']
+
+        # --- 各维度 Top N 多维统计 ---
+        top_by_dimension = {dim: self._top_table(state, dim, top_n_count) for dim in self.dimensions}
+
+        # --- 每小时访问量 (补齐没有请求的小时) ---
+        hourly = state["hourly_counts"].to_series().sort_index()
+        if len(hourly):
+            hourly.index = to_datetime_column(pd.Series(hourly.index)).dt.tz_convert(REPORT_TIMEZONE)
+            full_range = pd.date_range(hourly.index.min(), hourly.index.max(), freq='h')
+            hourly_counts = hourly.reindex(full_range, fill_value=0)
         else:
-            # 否则，按指定数量截取头部样本
-            raw_logs_sample_df = df.head(sample_limit)
+            hourly_counts = pd.Series(dtype='int64', index=pd.DatetimeIndex([], tz=REPORT_TIMEZONE, freq='h'))
+        hourly_counts.index.name = 'timestamp'
+        hourly_counts.name = None
 
         # --- 返回所有结果 ---
-        return {
-            "raw_logs_sample": raw_logs_sample_df, # 使用处理后的DataFrame
+        results = {
+            # 原始日志样本不合并为一张表，报告器通过 iter_frames / head 逐批读取
+            "raw_logs_sample": state["sample"],
             "status_counts": status_counts,
             "top_ips": top_ips,
             "top_ip_status": top_ip_status_df,
+            "top_by_dimension": top_by_dimension,
             "hourly_counts": hourly_counts
-        }
\ No newline at end of file
+        }
+        if self.approximate:
+            results.update(self._finalize_approximate(state))
+        return results
+
+    def _finalize_approximate(self, state: dict) -> dict:
+        """近似模式下的每小时独立访客数与误差界"""
+        visitors = pd.Series({hour: hll.estimate() for hour, hll in state["hourly_visitors"].items()},
+                             dtype='int64').sort_index()
+        visitors.index = pd.DatetimeIndex(to_datetime_column(pd.Series(visitors.index, dtype='int64')))
+        visitors.index = visitors.index.tz_convert(REPORT_TIMEZONE)
+        visitors.index.name = 'timestamp'
+
+        bounds = self.approx_group_by.error_bounds(state["approx_group_by"])
+        precision = self.config.analysis.sketch.hll_precision
+        bounds.append({
+            'item': '每小时独立访客 (HyperLogLog)',
+            'error_bound': round(HyperLogLog(precision).relative_error, 6),
+            'description': '相对标准误差',
+        })
+        return {
+            "hourly_unique_visitors": visitors,
+            "approximation": pd.DataFrame(bounds),
+        }
@@ -2,9 +2,16 @@
 import logging
 import pandas as pd
 import geoip2.database
+import maxminddb
 from pathlib import Path
 from src.config import AppConfig
 from src.analyzers.base import BaseAnalyzer
+from src.analyzers.aggregates import CountTable, key_counter_bounds, new_key_counter
+from src.geo_cache import GeoCache
+from src.geo_index import GeoRangeIndex, resolve_by_prefix
+from src.log_schema import IP_COLUMNS, ip_keys, key_counts
+from src.metrics import metrics
+from src.sketches.space_saving import SpaceSaving
 
 CHINA_REGIONS = {'Hong Kong', 'Taiwan', 'Macao'}
 
@@ -17,46 +24,105 @@ class GeoAnalyzer(BaseAnalyzer):
     def name(self) -> str:
         return "geo_ip"
 
-    def run(self, df: pd.DataFrame) -> dict:
+    @staticmethod
+    def _lookup(reader: geoip2.database.Reader, ip_str: str) -> dict:
+        try:
+            response = reader.city(ip_str)
+
+            country_name = response.country.name or 'Unknown'
+            if country_name in CHINA_REGIONS:
+                country_name = 'China'
+
+            return {
+                'ip': ip_str,
+                'country': country_name, # 修正
+                'city': response.city.name or 'Unknown',
+            }
+        except geoip2.errors.AddressNotFoundError:
+            return {'ip': ip_str, 'country': 'Unknown', 'city': 'Unknown'}
+
+    def _resolve(self, reader: geoip2.database.Reader, db_path: Path, ips: list[str]) -> pd.DataFrame:
+        """按配置的查询方式解析一批 IP，返回 ip/country/city 三列 (已做地区归属修正)"""
+        lookup = self.config.analysis.geoip.local.lookup
+        if lookup == 'reader' or not ips:
+            return pd.DataFrame([self._lookup(reader, ip) for ip in ips], columns=['ip', 'country', 'city'])
+
+        with maxminddb.open_database(str(db_path)) as mmdb:
+            if lookup == 'range_index':
+                index_dir = self.config.analysis.geoip.local.index_dir
+                index = GeoRangeIndex.load_or_build(db_path, mmdb, Path(index_dir) if index_dir else None)
+                names = index.resolve(mmdb, ips)
+            else:
+                names = resolve_by_prefix(mmdb, ips)
+
+        # 与 _lookup 相同的取值规则: 缺失或空的名称记为 Unknown，港澳台归入 China
+        country = names['country'].where(names['country'].fillna('') != '', 'Unknown')
+        country = country.where(~country.isin(CHINA_REGIONS), 'China')
+        city = names['city'].where(names['city'].fillna('') != '', 'Unknown')
+        return pd.DataFrame({'ip': names['ip'], 'country': country, 'city': city})
+
+    @property
+    def required_columns(self) -> list[str]:
+        return IP_COLUMNS
+
+    def init_state(self) -> CountTable | SpaceSaving:
+        # 近似模式下只跟踪请求数最多的 IP，内存占用与独立 IP 数无关
+        return new_key_counter(self.config.analysis.approximate, self.config.analysis.sketch.capacity)
+
+    def update(self, state: CountTable | SpaceSaving, chunk: pd.DataFrame) -> CountTable | SpaceSaving:
+        # 分块阶段只累计每个 IP 的请求数，地理位置查询在 finalize 中对去重后的 IP 进行
+        state.add(key_counts(ip_keys(chunk)))
+        return state
+
+    def merge(self, a: CountTable | SpaceSaving, b: CountTable | SpaceSaving) -> CountTable | SpaceSaving:
+        return a.merge(b)
+
+    def finalize(self, state: CountTable | SpaceSaving) -> dict:
         db_path_str = self.config.analysis.geoip.local.db_path
         if not db_path_str or not Path(db_path_str).exists():
             logging.warning(f"GeoIP 数据库文件未配置或不存在于 '{db_path_str}'，跳过地理位置分析。")
             return {}
 
-        ip_counts = df['client_ip'].value_counts()
-        geo_data = []
+        ip_counts = state.to_series().sort_values(ascending=False)
+        unique_ips = [str(ip) for ip in ip_counts.index]
 
         with geoip2.database.Reader(db_path_str) as reader:
-            for ip_obj, count in ip_counts.items():
-                ip_str = str(ip_obj)
-                try:
-                    response = reader.city(ip_str)
-                    
-                    country_name = response.country.name or 'Unknown'
-                    if country_name in CHINA_REGIONS:
-                        country_name = 'China'
-
-                    geo_data.append({
-                        'ip': ip_str,
-                        'count': count,
-                        'country': country_name, # 修正
-                        'city': response.city.name or 'Unknown',
-                    })
-                except geoip2.errors.AddressNotFoundError:
-                    geo_data.append({
-                        'ip': ip_str,
-                        'count': count,
-                        'country': 'Unknown',
-                        'city': 'Unknown',
-                    })
-
-        if not geo_data:
+            # 命名空间包含数据库的构建时间，更新 mmdb 后旧的缓存结果不会被使用
+            metadata = reader.metadata()
+            cache = GeoCache.from_config(self.config, f"local:{metadata.database_type}:{metadata.build_epoch}")
+            cached = cache.get_many(unique_ips) if cache else {}
+            missing_ips = [ip for ip in unique_ips if ip not in cached]
+            with metrics.timer('geoip.local.resolve'):
+                resolved = self._resolve(reader, Path(db_path_str), missing_ips)
+            metrics.incr('geoip.local.lookups', len(missing_ips))
+        if cache:
+            cache.put_many(resolved.to_dict('records'))
+            cache.log_stats()
+            cache.close()
+
+        locations = pd.concat([
+            pd.DataFrame([{'ip': ip, **record} for ip, record in cached.items()], columns=['ip', 'country', 'city']),
+            resolved,
+        ], ignore_index=True).set_index('ip')
+        geo_data = pd.DataFrame({'ip': unique_ips, 'count': ip_counts.to_numpy()})
+        geo_data['country'] = geo_data['ip'].map(locations['country'])
+        geo_data['city'] = geo_data['ip'].map(locations['city'])
+
+        if geo_data.empty:
             return {}
 
-        ip_geo_details_df = pd.DataFrame(geo_data)
+        ip_geo_details_df = geo_data
         country_counts = ip_geo_details_df.groupby('country')['count'].sum().sort_values(ascending=False)
 
-        return {
+        results = {
             "ip_geo_details": ip_geo_details_df.head(200),
             "country_counts": country_counts.head(self.config.analysis.top_n_count)
-        }
\ No newline at end of file
+        }
+        bounds = key_counter_bounds(state, 'IP 请求数')
+        if bounds is not None:
+            # 近似模式: 国家/地区统计只覆盖被跟踪的 IP，每个 IP 的计数最多高估 count_error
+            results["ip_geo_details"] = results["ip_geo_details"].assign(
+                count_error=lambda df: df['ip'].map(state.errors).fillna(0).astype('int64')
+            )
+            results["approximation"] = bounds
+        return results
\ No newline at end of file
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+from src.config import AppConfig
+from src.analyzers.base import BaseAnalyzer
+from src.analyzers.basic_stats_analyzer import REPORT_TIMEZONE
+from src.log_parser import to_datetime_column
+from src.sketches.histogram import KeyedHistograms, LogBuckets
+
+# 输出的分位数
+QUANTILES = [0.5, 0.9, 0.99, 0.999]
+# 统计分组: overall 为全部请求，hour 为每小时，其余为同名的日志列
+LATENCY_GROUPS = ['overall', 'hour', 'domain', 'cache_hit_status', 'path']
+# 吞吐 (字节/毫秒) 直方图的取值范围
+_THROUGHPUT_MIN = 1e-3
+_THROUGHPUT_MAX = 1e9
+
+
+class LatencyAnalyzer(BaseAnalyzer):
+    """
+    延迟与吞吐分位数分析，包括:
+    - 整体的 P50/P90/P99/P99.9 响应时间与吞吐 (响应字节数 / 响应时间)
+    - 每小时的分位数 (用于绘制分位数随时间变化的曲线)
+    - 按域名、缓存状态以及请求最多的路径统计的分位数
+    每个分组使用固定桶数的对数直方图，内存占用与日志量无关，且可在数据块、进程之间合并。
+    响应时间为 0 的请求不参与吞吐统计。
+    """
+    def __init__(self, config: AppConfig):
+        super().__init__(config)
+        latency_config = config.analysis.latency
+        accuracy = latency_config.relative_accuracy
+        self.latency_buckets = LogBuckets(accuracy, min_value=0.5, max_value=latency_config.max_latency_ms)
+        self.throughput_buckets = LogBuckets(accuracy, min_value=_THROUGHPUT_MIN, max_value=_THROUGHPUT_MAX)
+        self.path_capacity = latency_config.path_capacity
+
+    @property
+    def name(self) -> str:
+        return "latency"
+
+    @property
+    def required_columns(self) -> list[str]:
+        return ['timestamp', 'response_time_ms', 'response_size_bytes'] + \
+            [group for group in LATENCY_GROUPS if group not in ('overall', 'hour')]
+
+    def init_state(self) -> dict:
+        state = {}
+        for group in LATENCY_GROUPS:
+            max_keys = self.path_capacity if group == 'path' else None
+            state[group] = {
+                "latency": KeyedHistograms(self.latency_buckets, max_keys),
+                "throughput": KeyedHistograms(self.throughput_buckets, max_keys),
+            }
+        return state
+
+    def _group_keys(self, chunk: pd.DataFrame, group: str) -> pd.Series:
+        if group == 'overall':
+            return pd.Series(np.zeros(len(chunk), dtype=np.int64), index=chunk.index)
+        if group == 'hour':
+            # 以整点的 Unix 时间戳为键
+            return chunk['timestamp'] // 3600 * 3600
+        return chunk[group]
+
+    def update(self, state: dict, chunk: pd.DataFrame) -> dict:
+        latency = chunk['response_time_ms'].to_numpy(dtype=np.float64)
+        size = chunk['response_size_bytes'].to_numpy(dtype=np.float64)
+        timed = latency > 0
+        throughput = size[timed] / latency[timed]
+        for group in LATENCY_GROUPS:
+            keys = self._group_keys(chunk, group)
+            state[group]["latency"].update(keys, latency)
+            state[group]["throughput"].update(keys[timed], throughput)
+        return state
+
+    def merge(self, a: dict, b: dict) -> dict:
+        return {
+            group: {metric: a[group][metric].merge(b[group][metric]) for metric in ("latency", "throughput")}
+            for group in LATENCY_GROUPS
+        }
+
+    def _group_table(self, hists: dict, keys: list) -> pd.DataFrame:
+        """某个分组中各键的延迟 (ms) 与吞吐 (B/ms) 分位数表"""
+        latency = hists["latency"].quantiles(QUANTILES, keys)
+        tracked = set(hists["throughput"].keys)
+        throughput_keys = [k for k in keys if k in tracked]
+        throughput = hists["throughput"].quantiles(QUANTILES, throughput_keys).reindex(keys)
+        table = latency.rename(columns={'count': 'requests'})
+        table.columns = ['requests'] + [f"{c}_ms" for c in latency.columns[1:]]
+        for column in throughput.columns[1:]:
+            table[f"{column}_bytes_per_ms"] = throughput[column]
+        return table.round(2)
+
+    def _top_keys(self, hists: dict, n: int | None = None) -> list:
+        totals = hists["latency"].totals()
+        totals = totals.sort_values(ascending=False, kind='stable')
+        return list(totals.index if n is None else totals.index[:n])
+
+    def _hourly_table(self, hists: KeyedHistograms, unit: str) -> pd.DataFrame:
+        hours = sorted(hists.keys)
+        table = hists.quantiles(QUANTILES, hours).round(2)
+        table.columns = ['requests'] + [f"{c}_{unit}" for c in table.columns[1:]]
+        table.index = pd.DatetimeIndex(to_datetime_column(pd.Series(hours, dtype='int64'))).tz_convert(REPORT_TIMEZONE)
+        table.index.name = 'timestamp'
+        return table
+
+    def finalize(self, state: dict) -> dict:
+        top_n_count = self.config.analysis.top_n_count
+
+        # --- 整体分位数 ---
+        overall = self._group_table(state['overall'], self._top_keys(state['overall']))
+        overall.index = pd.Index(['all'][:len(overall)], name='scope')
+
+        # --- 按维度的分位数，按请求数降序 ---
+        by_dimension = {}
+        for dim in ('domain', 'cache_hit_status', 'path'):
+            table = self._group_table(state[dim], self._top_keys(state[dim], top_n_count))
+            table.index.name = dim
+            by_dimension[dim] = table.reset_index()
+
+        return {
+            "latency_overall": overall,
+            "latency_hourly": self._hourly_table(state['hour']["latency"], 'ms'),
+            "throughput_hourly": self._hourly_table(state['hour']["throughput"], 'bytes_per_ms'),
+            "latency_by_dimension": by_dimension,
+        }
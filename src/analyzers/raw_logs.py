@@ -0,0 +1,159 @@
+import os
+import tempfile
+import weakref
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+
+from src.log_parser import to_datetime_column
+from src.log_schema import decode_frame, empty_frame
+from src.parse_cache import frames_to_table, table_to_frames
+
+# 内存中暂存的样本行数超过该值后写入临时文件 (紧凑数据块每行约占几十字节)
+SPILL_ROWS = 500_000
+# 从溢写文件读取时每个数据块的行数
+READ_CHUNK_ROWS = 100_000
+
+
+def _report_timezone() -> str:
+    # basic_stats_analyzer 依赖本模块，在函数内导入以免循环导入
+    from src.analyzers.basic_stats_analyzer import REPORT_TIMEZONE
+    return REPORT_TIMEZONE
+
+
+def _present(chunk: pd.DataFrame) -> pd.DataFrame:
+    """紧凑数据块还原为报告中的原始日志 (字符串列，时间转换到报告时区)"""
+    plain = decode_frame(chunk).reset_index(drop=True)
+    plain['timestamp'] = to_datetime_column(plain['timestamp']).dt.tz_convert(_report_timezone())
+    return plain
+
+
+class _Segment:
+    """
+    溢写到临时目录的一段样本 (Arrow IPC 文件，写入后不再修改)，可被多个样本共享，最后一个引用释放时删除文件。
+    序列化 (增量状态、部分结果) 时保存文件内容，反序列化时写入新的临时文件。
+    """
+    def __init__(self, table: pa.Table | None = None, data: bytes | None = None):
+        fd, self.path = tempfile.mkstemp(prefix='cdn_raw_logs_', suffix='.arrow')
+        self._finalizer = weakref.finalize(self, _unlink, self.path)
+        with os.fdopen(fd, 'wb') as f:
+            if data is not None:
+                f.write(data)
+            else:
+                # 各数据块的字典合并为一个，字典编码的 IPC 文件要求所有批次使用同一字典
+                with pa.ipc.new_file(f, table.schema) as writer:
+                    writer.write_table(table.unify_dictionaries())
+        self.rows = self._open().num_rows if data is not None else table.num_rows
+
+    def _open(self) -> pa.Table:
+        return pa.ipc.open_file(pa.memory_map(self.path, 'r')).read_all()
+
+    def chunks(self, rows: int) -> Iterator[pd.DataFrame]:
+        """前 rows 行的紧凑数据块 (内存映射读取)"""
+        yield from table_to_frames(self._open().slice(0, rows), READ_CHUNK_ROWS)
+
+    def __reduce__(self):
+        with open(self.path, 'rb') as f:
+            return _Segment, (None, f.read())
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class RawLogSample:
+    """
+    原始日志样本 (basic_stats 的中间状态): 按日志顺序保存的紧凑数据块，最多 limit 行 (-1 表示不限)。
+
+    样本保存为紧凑数据块而不是字符串列，内存中暂存的行数超过 SPILL_ROWS 后写入临时文件，
+    合并时只拼接各段的引用而不复制数据。报告器通过 iter_frames 逐批读取还原后的样本，
+    全部样本不会同时以字符串列的形式放在内存中。
+    """
+    def __init__(self, limit: int, parts: list | None = None):
+        self.limit = limit
+        # (紧凑数据块或溢写文件, 使用的行数)
+        self._parts: list[tuple[pd.DataFrame | _Segment, int]] = list(parts or [])
+
+    def __len__(self) -> int:
+        return sum(rows for _, rows in self._parts)
+
+    def room(self) -> int | None:
+        """还能容纳的行数，None 表示不限"""
+        if self.limit == -1:
+            return None
+        return max(self.limit - len(self), 0)
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        room = self.room()
+        if room == 0 or chunk.empty:
+            return
+        part = chunk if room is None else chunk.head(room)
+        self._parts.append((part, len(part)))
+        self._maybe_spill()
+
+    def merge(self, other: 'RawLogSample') -> 'RawLogSample':
+        merged = RawLogSample(self.limit, self._parts)
+        for part, rows in other._parts:
+            room = merged.room()
+            if room == 0:
+                break
+            if room is not None and rows > room:
+                part, rows = (part.head(room) if isinstance(part, pd.DataFrame) else part), room
+            merged._parts.append((part, rows))
+        merged._maybe_spill()
+        return merged
+
+    def __deepcopy__(self, memo) -> 'RawLogSample':
+        # 数据块与溢写文件都不会被修改，副本共享它们
+        return RawLogSample(self.limit, self._parts)
+
+    def _maybe_spill(self) -> None:
+        """内存中的行数超过上限时，把相邻的内存数据块合并写入溢写文件"""
+        if sum(rows for part, rows in self._parts if isinstance(part, pd.DataFrame)) <= SPILL_ROWS:
+            return
+        parts, pending = [], []
+
+        def _flush():
+            if pending:
+                segment = _Segment(frames_to_table(pending))
+                parts.append((segment, segment.rows))
+                pending.clear()
+
+        for part, rows in self._parts:
+            if isinstance(part, pd.DataFrame):
+                pending.append(part)
+            else:
+                _flush()
+                parts.append((part, rows))
+        _flush()
+        self._parts = parts
+
+    def _chunks(self) -> Iterator[pd.DataFrame]:
+        for part, rows in self._parts:
+            if isinstance(part, pd.DataFrame):
+                yield part
+            else:
+                yield from part.chunks(rows)
+
+    def iter_frames(self, batch_rows: int) -> Iterator[pd.DataFrame]:
+        """按顺序逐批产出还原后的样本，每批最多 batch_rows 行"""
+        for chunk in self._chunks():
+            for start in range(0, len(chunk), batch_rows):
+                yield _present(chunk.iloc[start:start + batch_rows])
+
+    def head(self, n: int) -> pd.DataFrame:
+        """还原后的前 n 行 (没有样本时为带列名的空表)"""
+        frames, rows = [], 0
+        if n > 0:
+            for frame in self.iter_frames(min(n, READ_CHUNK_ROWS)):
+                frames.append(frame.iloc[:n - rows])
+                rows += len(frames[-1])
+                if rows >= n:
+                    break
+        if not frames:
+            return _present(empty_frame())
+        return pd.concat(frames, ignore_index=True)
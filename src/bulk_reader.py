@@ -0,0 +1,151 @@
+import mmap
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+
+def _load_inflate_backend():
+    """
+    选择解压实现: 优先使用 ISA-L (python-isal) 或 zlib-ng (zlib-ng)，二者的 inflate 比标准库 zlib 快数倍，
+    接口与 zlib 一致；都未安装时使用标准库 zlib。
+    """
+    try:
+        from isal import isal_zlib
+        return isal_zlib, 'isal'
+    except ImportError:
+        pass
+    try:
+        from zlib_ng import zlib_ng
+        return zlib_ng, 'zlib-ng'
+    except ImportError:
+        pass
+    return zlib, 'zlib'
+
+
+_inflate, INFLATE_BACKEND = _load_inflate_backend()
+
+# 每次从 .gz 文件读取的压缩数据大小 (解压后约为十倍)
+GZIP_READ_SIZE = 1024 * 1024
+# 未压缩文件每批切分的字节数
+READ_BLOCK_SIZE = 4 * 1024 * 1024
+# wbits=31: 只接受带 gzip 头尾的数据
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def iter_gzip_blocks(f: BinaryIO, block_size: int = GZIP_READ_SIZE,
+                     checkpoints: list[tuple[int, int, bool]] | None = None) -> Iterator[bytes]:
+    """
+    按大块解压 gzip 数据流，逐块产出解压后的字节。
+    支持多个 gzip 成员拼接的文件 (成员之间的零字节填充会被跳过，与 gzip 模块一致)，
+    数据在 gzip 尾部之前结束时抛出 EOFError。
+
+    传入 checkpoints 时，在其中记录每个 gzip 成员的起点 (压缩数据偏移, 解压后偏移, 是否位于行首)，
+    从任一成员起点都可以独立解压，用于拆分大文件。偏移相对于开始读取时 f 的位置。
+    """
+    decompressor = _inflate.decompressobj(_GZIP_WBITS)
+    started = False
+    compressed = uncompressed = 0
+    last_byte = b'\n'
+    while True:
+        data = f.read(block_size)
+        if not data:
+            break
+        compressed += len(data)
+        while data:
+            if not started:
+                # 成员之间 (以及文件末尾) 的零字节填充
+                data = data.lstrip(b'\x00')
+                if not data:
+                    break
+                started = True
+                if checkpoints is not None:
+                    checkpoints.append((compressed - len(data), uncompressed, last_byte == b'\n'))
+            block = decompressor.decompress(data)
+            if block:
+                uncompressed += len(block)
+                last_byte = block[-1:]
+                yield block
+            if not decompressor.eof:
+                break
+            # 当前成员结束，剩余数据属于下一个成员
+            data = decompressor.unused_data
+            decompressor = _inflate.decompressobj(_GZIP_WBITS)
+            started = False
+    if started:
+        raise EOFError("压缩文件在 gzip 结束标记之前结束")
+
+
+def split_lines(blocks: Iterator[bytes]) -> Iterator[list[bytes]]:
+    """
+    把连续的字节块切分为行 (不含换行符)，每个块产出一批。
+    块末尾不完整的行与下一块拼接；最后一行没有换行符时同样产出。
+    """
+    remainder = b''
+    for block in blocks:
+        lines = block.split(b'\n')
+        if remainder:
+            lines[0] = remainder + lines[0]
+        remainder = lines.pop()
+        if lines:
+            yield lines
+    if remainder:
+        yield [remainder]
+
+
+def slice_blocks(blocks: Iterator[bytes], skip: int, length: int | None = None) -> Iterator[bytes]:
+    """跳过数据流的前 skip 个字节，产出之后的 length 个字节 (为 None 时产出到末尾)"""
+    for block in blocks:
+        if skip >= len(block):
+            skip -= len(block)
+            continue
+        if length is None:
+            block = block[skip:] if skip else block
+        else:
+            block = block[skip:skip + length]
+            length -= len(block)
+        skip = 0
+        yield block
+        if length is not None and length <= 0:
+            return
+
+
+def iter_mmap_lines(mm: mmap.mmap | bytes, start: int, end: int,
+                    block_size: int = READ_BLOCK_SIZE) -> Iterator[list[bytes]]:
+    """
+    按批切分 [start, end) 范围内的行。每批在换行符处截断，不需要拼接跨块的行，
+    每行只从映射中拷贝一次。
+    """
+    position = start
+    while position < end:
+        stop = min(position + block_size, end)
+        if stop < end:
+            newline = mm.rfind(b'\n', position, stop)
+            if newline < 0:
+                # 单行超过 block_size，延伸到该行结束
+                newline = mm.find(b'\n', stop, end)
+            stop = end if newline < 0 else newline + 1
+        lines = mm[position:stop].split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+        if lines:
+            yield lines
+        position = stop
+
+
+def read_line_batches(file_path: Path) -> Iterator[list[bytes]]:
+    """
+    以字节形式按批读取日志文件的行。
+    .gz 文件按大块读取并解压，未压缩的文件通过 mmap 读取。异常由调用方处理。
+    """
+    if file_path.suffix == '.gz':
+        with open(file_path, 'rb', buffering=0) as f:
+            yield from split_lines(iter_gzip_blocks(f))
+        return
+    with open(file_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            return
+        with mm:
+            yield from iter_mmap_lines(mm, 0, len(mm))
@@ -1,5 +1,6 @@
-import gzip
+import io
 import logging
+import os
 import requests
 from typing import Iterator
 from pathlib import Path
@@ -8,8 +9,15 @@ from datetime import datetime, timezone
 from huaweicloudsdkcore.auth.credentials import GlobalCredentials
 from huaweicloudsdkcdn.v1 import CdnClient, ShowLogsRequest
 
+from src.bulk_reader import iter_gzip_blocks, split_lines
+from src.clients.log_downloader import (
+    DOWNLOAD_BUFFER_SIZE, TeeReader, etag_md5, expected_size, verify_download,
+)
 from src.config import InputApiConfig
 
+# 每页请求的日志文件数量
+LOG_PAGE_SIZE = 1000
+
 
 class HuaweiCdnApiClient:
     def __init__(self, config: InputApiConfig):
@@ -42,23 +50,33 @@ class HuaweiCdnApiClient:
                 return []
             # -----------------------------------------------------------
 
-            # 创建一个请求对象，使用转换后的时间戳
-            request = ShowLogsRequest(
-                domain_name=self.config.domain_name,
-                start_time=start_time_ms,
-                end_time=end_time_ms,
-                page_size=1000
-            )
-
             logging.info("正在通过华为云SDK请求日志链接...")
-            
-            # 调用SDK的接口方法
-            response = self.client.show_logs(request)
+
+            # 按页请求，直到取满 API 返回的总数或遇到空页
+            links = []
+            page_number = 1
+            while True:
+                request = ShowLogsRequest(
+                    domain_name=self.config.domain_name,
+                    start_time=start_time_ms,
+                    end_time=end_time_ms,
+                    page_size=LOG_PAGE_SIZE,
+                    page_number=page_number
+                )
+                response = self.client.show_logs(request)
+                logs = response.logs if hasattr(response, 'logs') and response.logs else []
+                links.extend(log.link for log in logs)
+                total = getattr(response, 'total', None)
+                # 优先以 total 判断是否取完；API 未返回 total 时以不满一页作为最后一页
+                is_last_page = len(links) >= total if total else len(logs) < LOG_PAGE_SIZE
+                if not logs or is_last_page:
+                    break
+                page_number += 1
 
             # 处理响应
-            if hasattr(response, 'logs') and response.logs:
-                logging.info(f"SDK成功获取到 {len(response.logs)} 个日志文件链接。")
-                return [log.link for log in response.logs]
+            if links:
+                logging.info(f"SDK成功获取到 {len(links)} 个日志文件链接 (共 {page_number} 页)。")
+                return links
             else:
                 logging.warning("SDK请求成功，但API未返回任何日志文件链接。")
                 return []
@@ -67,23 +85,59 @@ class HuaweiCdnApiClient:
             logging.error(f"通过华为云SDK获取日志链接失败: {e}", exc_info=True)
             return []
 
-    def download_and_stream_log_file(self, url: str, download_path: Path | None = None) -> Iterator[str]:
+    def download_and_stream_log_file(self, url: str, download_path: Path | None = None) -> Iterator[list[bytes]]:
+        """边下载边解压，按批产出日志行 (bytes，不含换行符)"""
         try:
             with requests.get(url, stream=True, timeout=180) as r:
                 r.raise_for_status()
                 if download_path:
-                    download_path.parent.mkdir(parents=True, exist_ok=True)
-                    with open(download_path, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    logging.info(f"日志已成功下载到: {download_path}")
-                    from src.input_handler import read_log_lines
-                    yield from read_log_lines(download_path)
+                    yield from self._tee_log_file(r, download_path)
                 else:
-                    with gzip.open(r.raw, 'rt', encoding='utf-8', errors='ignore') as f:
-                        for line in f:
-                            yield line
+                    raw = io.BufferedReader(_RawResponse(r.raw), buffer_size=DOWNLOAD_BUFFER_SIZE)
+                    yield from split_lines(iter_gzip_blocks(raw))
         except requests.exceptions.RequestException as e:
             logging.error(f"下载日志文件失败 {url}: {e}")
         except Exception as e:
-            logging.error(f"处理流式日志文件时出错 {url}: {e}")
\ No newline at end of file
+            logging.error(f"处理流式日志文件时出错 {url}: {e}")
+
+    def _tee_log_file(self, response: requests.Response, download_path: Path) -> Iterator[list[bytes]]:
+        """
+        边下载边解析: 响应体在一次读取中同时写入本地缓存文件并送入解压器，
+        不再先完整落盘、再读回解压。缓存文件先写入临时文件，校验大小和 ETag (MD5) 后才重命名为正式文件，
+        下载中断或提前停止时删除临时文件，skip_existing_logs 不会把不完整的文件当作缓存。
+        """
+        download_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = download_path.with_name(f"{download_path.name}.{os.getpid()}.part")
+        completed = False
+        try:
+            with open(part_path, 'wb', buffering=DOWNLOAD_BUFFER_SIZE) as sink:
+                tee = TeeReader(response.raw, sink)
+                buffered = io.BufferedReader(tee, buffer_size=DOWNLOAD_BUFFER_SIZE)
+                if download_path.suffix == '.gz':
+                    blocks = iter_gzip_blocks(buffered)
+                else:
+                    blocks = iter(lambda: buffered.read(DOWNLOAD_BUFFER_SIZE), b'')
+                yield from split_lines(blocks)
+                tee.drain()
+            verify_download(tee.bytes, expected_size(response, 0), tee.md5.hexdigest(), etag_md5(response))
+            os.replace(part_path, download_path)
+            completed = True
+            logging.info(f"日志已成功下载到: {download_path}")
+        finally:
+            if not completed:
+                part_path.unlink(missing_ok=True)
+
+
+class _RawResponse(io.RawIOBase):
+    """以原始字节读取响应体 (不做 Content-Encoding 解码)，供 BufferedReader 按大块读取"""
+    def __init__(self, raw):
+        self.raw = raw
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.raw.read(len(buffer), decode_content=False)
+        buffer[:len(data)] = data
+        return len(data)
+
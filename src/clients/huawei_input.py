@@ -0,0 +1,66 @@
+import logging
+from pathlib import Path
+from typing import Iterator
+
+from src.clients.huawei_cdn_client import HuaweiCdnApiClient
+from src.config import AppConfig
+from src.input_handler import BaseInputSource, LogSource, get_log_files
+
+
+class HuaweiApiInputSource(BaseInputSource):
+    """
+    从华为云 CDN API 拉取日志下载链接 (source_type: api)。
+    本地缓存目录中已有的文件直接读取，其余文件从云端下载 (可由后台线程预取)。
+    """
+    def __init__(self, config: AppConfig):
+        super().__init__(config)
+        self._client: HuaweiCdnApiClient | None = None
+
+    def get_sources(self) -> list[LogSource]:
+        logging.info(f"使用 'api' 模式从华为CDN API拉取日志。")
+        if not self.config.input.api:
+            logging.error("配置错误: source_type 为 'api'，但 'api' 配置块缺失。")
+            return []
+
+        api_config = self.config.input.api
+        self._client = HuaweiCdnApiClient(api_config)
+
+        # 从API获取目标任务全集
+        log_urls = self._client.get_log_download_links()
+        if not log_urls:
+            logging.warning("API 未返回任何有效的日志文件链接，分析结束。")
+            return []
+
+        logging.info(f"API返回了 {len(log_urls)} 个目标日志文件。")
+
+        # 准备本地缓存信息
+        local_log_path_str = self.config.input.path or './logs/'
+        local_log_path = Path(local_log_path_str)
+        existing_files = {f.name for f in get_log_files(local_log_path_str, self.config.input.file_pattern)}
+        logging.info(f"在本地缓存目录 '{local_log_path_str}' 找到 {len(existing_files)} 个日志文件。")
+
+        # 遍历目标任务全集，决定是从本地读还是从云端下载
+        sources = []
+        for url in log_urls:
+            file_name = url.split('?')[0].split('/')[-1]
+            local_file = local_log_path / file_name
+
+            # 决定是否使用本地缓存
+            if api_config.skip_existing_logs and file_name in existing_files:
+                sources.append(LogSource(name=file_name, path=local_file))
+            else:
+                download_target_path = local_file if api_config.download_new_logs else None
+                sources.append(LogSource(name=file_name, url=url, download_path=download_target_path))
+        return sources
+
+    def iter_ready_sources(self, sources: list[LogSource]) -> Iterator[LogSource]:
+        api_config = self.config.input.api
+        if not api_config or api_config.download_workers <= 0 or all(source.is_local for source in sources):
+            yield from sources
+            return
+        from src.clients.log_downloader import LogPrefetcher
+        logging.info(f"启用并发预取下载，下载线程数: {api_config.download_workers}")
+        yield from LogPrefetcher(api_config).iter_sources(sources)
+
+    def stream(self, source: LogSource) -> Iterator[list[bytes]]:
+        return self._client.download_and_stream_log_file(source.url, source.download_path)
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.clients.rate_limit import RETRYABLE_STATUS, TokenBucket, retry_delay
+from src.config import GeoIpApiConfig
+from src.metrics import metrics
+
+
+@dataclass
+class BatchQueryStats:
+    """一次批量查询的统计，用于在报告中说明部分失败的情况"""
+    batches: int = 0
+    failed_batches: int = 0
+    retries: int = 0
+    throttled: int = 0
+    failed_ips: list[str] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    def summary(self) -> list[dict]:
+        return [
+            {'item': '批量请求数', 'value': self.batches},
+            {'item': '失败的批量请求数', 'value': self.failed_batches},
+            {'item': '未能查询的 IP 数', 'value': len(self.failed_ips)},
+            {'item': '重试次数', 'value': self.retries},
+            {'item': '被限流次数 (HTTP 429)', 'value': self.throttled},
+            {'item': '查询耗时 (秒)', 'value': round(self.elapsed_seconds, 2)},
+        ]
+
+
+class IpApiBatchClient:
+    """
+    ip-api 风格的批量 IP 查询客户端。
+
+    多个线程共享一个保持连接的 Session 并发提交批量请求，令牌桶保证总请求速率不超过服务商配额，
+    遇到 429/5xx 或网络错误时按 Retry-After 或指数退避重试，重试耗尽的批次计入失败统计而不会中断查询。
+    """
+    def __init__(self, config: GeoIpApiConfig):
+        self.config = config
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(config.concurrency, 1))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        rate = config.rate_limit_per_minute / 60 if config.rate_limit_per_minute else None
+        self.bucket = TokenBucket(rate, config.rate_limit_burst)
+        self._lock = threading.Lock()
+
+    def _post_batch(self, ip_batch: list[str], stats: BatchQueryStats) -> list[dict[str, Any]] | None:
+        """提交一个批量请求，重试耗尽后返回 None"""
+        for attempt in range(self.config.max_retries + 1):
+            self.bucket.acquire()
+            response = None
+            try:
+                with metrics.timer('geoip.api.request'):
+                    response = self.session.post(str(self.config.endpoint), json=ip_batch, timeout=self.config.timeout)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+                reason = f"HTTP {response.status_code}"
+                if response.status_code == 429:
+                    with self._lock:
+                        stats.throttled += 1
+            except requests.exceptions.HTTPError as e:
+                # 其余 4xx 错误重试也不会成功
+                logging.error(f"IP API 请求失败: {e}")
+                return None
+            except (requests.exceptions.RequestException, ValueError) as e:
+                reason = str(e)
+            if attempt == self.config.max_retries:
+                logging.error(f"IP API 请求失败，已重试 {attempt} 次: {reason}")
+                return None
+            delay = retry_delay(attempt, response, self.config.backoff_base_seconds, self.config.backoff_max_seconds)
+            logging.debug(f"IP API 请求失败 ({reason})，{delay:.1f} 秒后重试")
+            with self._lock:
+                stats.retries += 1
+            time.sleep(delay)
+        return None
+
+    def query(self, ips: list[str]) -> tuple[list[dict[str, Any]], BatchQueryStats]:
+        """并发查询所有 IP，返回 (按提交顺序排列的查询结果, 查询统计)"""
+        batch_size = self.config.batch_size
+        batches = [ips[i:i + batch_size] for i in range(0, len(ips), batch_size)]
+        stats = BatchQueryStats(batches=len(batches))
+        started = time.perf_counter()
+        results = []
+        with ThreadPoolExecutor(max_workers=max(self.config.concurrency, 1)) as pool:
+            futures = [pool.submit(self._post_batch, batch, stats) for batch in batches]
+            for batch, future in zip(batches, futures):
+                batch_results = future.result()
+                if batch_results is None:
+                    stats.failed_batches += 1
+                    stats.failed_ips.extend(batch)
+                else:
+                    results.extend(batch_results)
+        stats.elapsed_seconds = time.perf_counter() - started
+        metrics.incr('geoip.api.lookups', len(ips))
+        metrics.incr('geoip.api.failed_lookups', len(stats.failed_ips))
+        metrics.incr('geoip.api.retries', stats.retries)
+        metrics.incr('geoip.api.throttled', stats.throttled)
+        return results, stats
+
+    def close(self) -> None:
+        self.session.close()
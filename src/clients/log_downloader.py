@@ -0,0 +1,233 @@
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Iterator
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from src.clients.rate_limit import RETRYABLE_STATUS, retry_delay
+from src.config import InputApiConfig
+from src.input_handler import LogSource
+
+# 读取响应体时每次读取的字节数
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+@dataclass
+class DownloadStats:
+    """单个文件的下载统计"""
+    name: str
+    bytes: int
+    seconds: float
+    retries: int
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 1024 / 1024 / self.seconds if self.seconds > 0 else 0.0
+
+
+def expected_size(response: requests.Response, offset: int) -> int | None:
+    """由 Content-Range 或 Content-Length 推算文件的完整大小，未知时返回 None"""
+    content_range = response.headers.get('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            return int(total)
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit():
+        return offset + int(content_length)
+    return None
+
+
+def etag_md5(response: requests.Response) -> str | None:
+    """对象存储返回的 ETag 为简单上传对象的 MD5 时返回该值，分段上传等其他格式返回 None"""
+    etag = response.headers.get('ETag', '').strip('"').lower()
+    if len(etag) == 32 and all(c in '0123456789abcdef' for c in etag):
+        return etag
+    return None
+
+
+def verify_download(written: int, expected_size: int | None, digest: str, expected_md5: str | None) -> None:
+    if expected_size is not None and written != expected_size:
+        raise DownloadError(f"文件大小不一致: 已下载 {written} 字节，应为 {expected_size} 字节")
+    if expected_md5 is not None and digest != expected_md5:
+        raise DownloadError(f"文件校验失败: MD5 {digest} 与 ETag {expected_md5} 不一致")
+
+
+class TeeReader(io.RawIOBase):
+    """
+    读取响应体的同时把读到的字节原样写入 sink 并计算 MD5，
+    用于边下载边解压解析，同时生成本地缓存文件，每个字节只经过一次网络和一次磁盘写入。
+    """
+    def __init__(self, raw, sink):
+        self.raw = raw
+        self.sink = sink
+        self.md5 = hashlib.md5()
+        self.bytes = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.raw.read(len(buffer), decode_content=False)
+        n = len(data)
+        buffer[:n] = data
+        if n:
+            self.sink.write(data)
+            self.md5.update(data)
+            self.bytes += n
+        return n
+
+    def drain(self) -> None:
+        """读完解码器未消费的剩余字节 (例如 gzip 尾部之后的填充)，保证缓存文件完整"""
+        buffer = bytearray(DOWNLOAD_BUFFER_SIZE)
+        while self.readinto(memoryview(buffer)):
+            pass
+
+
+def download_file(session: requests.Session, url: str, target: Path, timeout: float, max_retries: int) -> DownloadStats:
+    """
+    下载单个文件到 target。
+
+    先写入同目录的 .part 临时文件，校验大小 (及 ETag 为 MD5 时的校验和) 后再重命名，中断的下载不会被当作完整文件。
+    连接中断或超时后使用 HTTP Range 从已下载的位置继续，服务端不支持 Range 时从头重新下载。
+    响应体按原样保存 (不做 Content-Encoding 解码)，保证与云端的 .gz 文件逐字节一致。
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    part_path = target.with_name(f"{target.name}.{os.getpid()}.part")
+    written, retries = 0, 0
+    md5 = hashlib.md5()
+    started = time.perf_counter()
+    try:
+        while True:
+            headers = {'Range': f'bytes={written}-'} if written else {}
+            try:
+                with session.get(url, stream=True, timeout=timeout, headers=headers) as r:
+                    if r.status_code in RETRYABLE_STATUS:
+                        raise requests.exceptions.HTTPError(f"HTTP {r.status_code}", response=r)
+                    r.raise_for_status()
+                    if written and r.status_code != 206:
+                        # 服务端忽略了 Range 请求，只能从头下载
+                        written, md5 = 0, hashlib.md5()
+                    expected, expected_md5 = expected_size(r, written), etag_md5(r)
+                    with open(part_path, 'ab' if written else 'wb') as f:
+                        for block in r.raw.stream(DOWNLOAD_BUFFER_SIZE, decode_content=False):
+                            f.write(block)
+                            md5.update(block)
+                            written += len(block)
+                if expected is not None and written < expected:
+                    raise DownloadError(f"连接提前结束: 已下载 {written} 字节，应为 {expected} 字节")
+                try:
+                    verify_download(written, expected, md5.hexdigest(), expected_md5)
+                except DownloadError:
+                    # 内容已损坏，重试时从头下载
+                    written, md5 = 0, hashlib.md5()
+                    raise
+                os.replace(part_path, target)
+                return DownloadStats(target.name, written, time.perf_counter() - started, retries)
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code not in RETRYABLE_STATUS:
+                    raise
+                error = e
+            except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, DownloadError) as e:
+                error = e
+            if retries >= max_retries:
+                raise DownloadError(f"已重试 {retries} 次: {error}")
+            retries += 1
+            delay = retry_delay(retries - 1, None, 1.0, 30.0)
+            logging.warning(f"下载 {target.name} 中断 ({error})，{delay:.1f} 秒后从第 {written} 字节继续")
+            time.sleep(delay)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+
+class LogPrefetcher:
+    """
+    云端日志文件的并发预取。
+
+    多个下载线程共享一个连接池，按文件顺序提前下载后续文件，已下载但尚未被消费的文件数量有上限，
+    解析当前文件的同时后续文件仍在下载。未配置本地保存位置的文件下载到临时目录，处理完后删除。
+    """
+    def __init__(self, config: InputApiConfig):
+        self.config = config
+        self.workers = max(config.download_workers, 1)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.stats: list[DownloadStats] = []
+
+    def _download(self, source: LogSource, target: Path) -> DownloadStats:
+        stats = download_file(self.session, source.url, target, self.config.download_timeout,
+                              self.config.download_retries)
+        logging.info(f"--> 已下载 {stats.name}: {stats.bytes / 1024 / 1024:.1f} MB，"
+                     f"{stats.seconds:.1f} 秒，{stats.mb_per_second:.1f} MB/s，重试 {stats.retries} 次")
+        return stats
+
+    def iter_sources(self, sources: list[LogSource]) -> Iterator[LogSource]:
+        """
+        按原始顺序产出日志源，云端文件在下载完成后替换为本地文件 (临时文件标记为 temporary)。
+        下载失败的文件记录错误后跳过。
+        """
+        temp_dir = Path(tempfile.mkdtemp(prefix='cdn_logs_'))
+        pending: deque[tuple[LogSource, Path | None, Future | None]] = deque()
+        source_iter = iter(sources)
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                def _fill():
+                    while len(pending) < self.config.prefetch_window:
+                        source = next(source_iter, None)
+                        if source is None:
+                            return
+                        if source.is_local:
+                            pending.append((source, None, None))
+                            continue
+                        target = source.download_path or temp_dir / source.name
+                        pending.append((source, target, pool.submit(self._download, source, target)))
+
+                _fill()
+                try:
+                    while pending:
+                        source, target, future = pending.popleft()
+                        if future is None:
+                            yield source
+                        else:
+                            try:
+                                self.stats.append(future.result())
+                            except Exception as e:
+                                logging.error(f"下载日志文件失败，已跳过 {source.name}: {e}")
+                            else:
+                                yield replace(source, path=target, temporary=source.download_path is None)
+                        _fill()
+                finally:
+                    for _, _, future in pending:
+                        if future is not None:
+                            future.cancel()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            self.session.close()
+            self._log_summary(time.perf_counter() - started)
+
+    def _log_summary(self, elapsed: float) -> None:
+        if not self.stats:
+            return
+        total_bytes = sum(s.bytes for s in self.stats)
+        logging.info(f"共下载 {len(self.stats)} 个文件，{total_bytes / 1024 / 1024:.1f} MB，"
+                     f"整体 {total_bytes / 1024 / 1024 / max(elapsed, 1e-9):.1f} MB/s "
+                     f"({self.workers} 个下载线程)")
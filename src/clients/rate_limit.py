@@ -0,0 +1,54 @@
+import random
+import threading
+import time
+
+import requests
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器。
+
+    令牌以 rate 个/秒 的速度补充，最多积累 burst 个；每次请求前调用 acquire 取走一个令牌，
+    没有令牌时阻塞等待。rate 为 None 时不限流。
+    """
+    def __init__(self, rate: float | None, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# 需要重试的 HTTP 状态码: 限流与服务端错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def retry_delay(attempt: int, response: requests.Response | None, base: float, cap: float) -> float:
+    """
+    第 attempt 次 (从 0 开始) 重试前的等待时间。
+    优先使用服务端给出的 Retry-After (或 ip-api 的 X-Ttl)，否则为带随机抖动的指数退避。
+    """
+    if response is not None:
+        for header in ('Retry-After', 'X-Ttl'):
+            value = response.headers.get(header)
+            if value is not None:
+                try:
+                    return min(max(float(value), 0.0), cap)
+                except ValueError:
+                    pass
+    return random.uniform(0.5, 1.0) * min(base * 2 ** attempt, cap)
@@ -1,28 +1,80 @@
 import yaml
 from pathlib import Path
-from pydantic import BaseModel, DirectoryPath, FilePath, HttpUrl, SecretStr
+from pydantic import BaseModel, DirectoryPath, Field, FilePath, HttpUrl, SecretStr
 from pydantic_settings import BaseSettings
 
 # --- GeoIP 配置模型 ---
 class GeoIpLocalConfig(BaseModel):
     db_path: FilePath
+    # 查询方式: reader (逐个 IP 查询)、prefix (按 /24、/48 网段去重后查询)、
+    # range_index (由数据库构建有序范围索引并缓存到磁盘，整列向量化查询，适合数百万个独立 IP)
+    lookup: str = 'prefix'
+    # 范围索引的缓存目录，为空时与数据库文件放在同一目录
+    index_dir: str | None = None
 
 class GeoIpApiConfig(BaseModel):
     endpoint: HttpUrl
     batch_size: int = 100
     timeout: int = 10
+    # 并发的批量请求数
+    concurrency: int = 4
+    # 令牌桶限流: 每分钟最多的请求数与允许的突发请求数 (ip-api 免费批量接口为 15 次/分钟)，为空表示不限流
+    rate_limit_per_minute: float | None = 15
+    rate_limit_burst: int = 15
+    # 遇到 429/5xx 或网络错误时的最大重试次数与指数退避参数 (秒)
+    max_retries: int = 5
+    backoff_base_seconds: float = 1.0
+    backoff_max_seconds: float = 60.0
+
+class GeoCacheConfig(BaseModel):
+    enabled: bool = True
+    # SQLite 缓存文件路径，为空时使用 input.path 下的 .geo_cache.sqlite
+    path: str | None = None
+    # 缓存条目的有效期 (小时)
+    ttl_hours: float = 720
+    # 缓存条目数上限，超出后按最近访问时间淘汰
+    max_entries: int = 1_000_000
 
 class GeoIpConfig(BaseModel):
     provider: str
     local: GeoIpLocalConfig | None = None
     api: GeoIpApiConfig | None = None
+    # 跨运行持久化的查询结果缓存
+    cache: GeoCacheConfig = GeoCacheConfig()
+
+# --- 近似统计 (草图) 配置模型 ---
+class SketchConfig(BaseModel):
+    # Space-Saving 跟踪的键数量，越大 Top N 越准确
+    capacity: int = 10000
+    # Count-Min 草图的宽度与深度: 误差约为 e / width * 总量，置信度为 1 - e^(-depth)
+    cms_width: int = 16384
+    cms_depth: int = 4
+    # HyperLogLog 精度，相对标准误差约为 1.04 / sqrt(2^precision)
+    hll_precision: int = 14
+
+# --- 延迟分析配置模型 ---
+class LatencyConfig(BaseModel):
+    # 分位数的相对误差，直方图桶数随精度提高而增加
+    relative_accuracy: float = 0.01
+    # 超过该值 (ms) 的延迟统一计入最后一个桶
+    max_latency_ms: float = 3_600_000
+    # 按路径统计延迟时最多跟踪的路径数量 (按请求数保留最多的路径)
+    path_capacity: int = 500
 
 # --- AnalysisConfig 模型 ---
 class AnalysisConfig(BaseModel):
     modules: list[str]
     top_n_count: int = 20
+    # 需要输出 Top N 多维统计的维度，可选: client_ip, domain, path, user_agent, referer, cache_hit_status, method
+    group_by_dimensions: list[str] = ['client_ip']
     geoip: GeoIpConfig | None = None
     raw_logs_sample_limit: int = 100
+    # 近似模式: 高基数统计改用可合并的草图，内存占用与独立键的数量无关
+    approximate: bool = False
+    sketch: SketchConfig = SketchConfig()
+    latency: LatencyConfig = LatencyConfig()
+    # 并发执行各分析器的线程数，1 表示按顺序执行
+    analyzer_threads: int = 4
 
 # --- Input API 配置模型 ---
 class InputApiConfig(BaseModel):
@@ -35,6 +87,50 @@ class InputApiConfig(BaseModel):
     endpoint: str = "cdn.myhuaweicloud.com"
     skip_existing_logs: bool = True
     download_new_logs: bool = True
+    # 并发预取下载的线程数，0 表示不预取 (在解析时边下载边处理)
+    download_workers: int = 4
+    # 已提交下载但尚未被解析的文件数量上限
+    prefetch_window: int = 8
+    # 下载超时 (秒) 与中断后的断点续传重试次数
+    download_timeout: int = 180
+    download_retries: int = 3
+
+# --- 解析缓存配置模型 ---
+class ParseCacheConfig(BaseModel):
+    enabled: bool = True
+    # 缓存目录，为空时使用 input.path 下的 .parse_cache 目录
+    dir: str | None = None
+    # 缓存总大小上限 (MB)，超出后按最近使用时间淘汰
+    max_size_mb: int = 2048
+    # 忽略已有缓存并重新解析 (通常通过命令行 --rebuild-cache 指定)
+    rebuild: bool = False
+    # 缓存文件的压缩方式: 为空时不压缩，读取时内存映射、不复制数据；'lz4' 或 'zstd' 占用的磁盘空间约为三分之一，
+    # 但读取时需要完整解压到内存
+    compression: str | None = None
+
+# --- 单文件拆分配置模型 ---
+class SplitConfig(BaseModel):
+    enabled: bool = True
+    # 未压缩大小超过该值 (MB) 的文件按行对齐的字节范围拆分，由多个工作进程并行解析
+    range_size_mb: int = 256
+    # gzip 检查点索引的保存目录，为空时使用 input.path 下的 .gzip_index 目录
+    index_dir: str | None = None
+
+# --- 增量处理配置模型 ---
+class IncrementalConfig(BaseModel):
+    # 检查点与累计分析状态的保存目录，为空时使用 input.path 下的 .incremental 目录
+    state_dir: str | None = None
+    # --follow 模式下检查新数据的间隔 (秒)
+    poll_seconds: float = 5.0
+    # --follow 模式下刷新报告 (同时保存检查点) 的最短间隔 (秒)
+    refresh_seconds: float = 300.0
+    # --follow 模式下报告的固定文件名 (不含扩展名)，每次刷新覆盖同一文件
+    report_name: str = 'cdn_report_latest'
+
+# --- 汇总存储配置模型 ---
+class RollupConfig(BaseModel):
+    # SQLite 汇总库的路径，为空时使用 input.path 下的 .rollup.sqlite
+    path: str | None = None
 
 # --- InputConfig 模型 ---
 class InputConfig(BaseModel):
@@ -42,6 +138,16 @@ class InputConfig(BaseModel):
     # path 和 file_pattern 在 api 模式下可以为空
     path: str | None = None
     file_pattern: str | None = None
+    # 并行解析的工作进程数，1 表示在主进程中顺序解析
+    workers: int = 1
+    # 解析结果缓存
+    cache: ParseCacheConfig = ParseCacheConfig()
+    # 单个大文件的拆分并行解析 (workers > 1 时生效)
+    split: SplitConfig = SplitConfig()
+    # 增量处理 (--incremental / --follow)
+    incremental: IncrementalConfig = IncrementalConfig()
+    # 按域名与小时分区的汇总存储 (--rollup)
+    rollup: RollupConfig = RollupConfig()
     # api 配置
     api: InputApiConfig | None = None
 
@@ -50,11 +156,59 @@ class ParserConfig(BaseModel):
     format: str
     custom_regex: str | None = None
     time_format: str = "%d/%b/%Y:%H:%M:%S %z"
+    # 批量解析时每批处理的行数
+    chunk_size: int = 100_000
+
+# --- 过滤配置模型 ---
+class FiltersConfig(BaseModel):
+    # 只分析这些域名的日志 (完全匹配)
+    domains: list[str] = []
+    # 时间范围 [since, until)，例如 2025-11-01 或 2025-11-01T08:00 (未带时区时按报告时区解释)，
+    # until 只给出日期时包含当天的全部数据
+    since: str | None = None
+    until: str | None = None
+    # 状态码: 5xx、404 或 500-504
+    statuses: list[str | int] = []
+    # 请求路径的前缀，例如 /api/
+    path_prefixes: list[str] = []
+    # 客户端 IP 或 CIDR 网段
+    ips: list[str] = []
+    # 文件名中只带开始时间时每个文件覆盖的时长 (分钟)，用于按时间范围跳过整个文件
+    file_span_minutes: float = 60
+
+# --- HTML 仪表盘配置模型 ---
+class HtmlReportConfig(BaseModel):
+    # 每条时间序列在图表中最多保留的点数，超出时在生成报告时降采样 (LTTB 至少保留首尾两点与一个桶)
+    max_points: int = Field(2000, ge=3)
+    # 每张明细表嵌入报告的最大行数，超出部分截断 (报告中注明总行数)
+    max_table_rows: int = Field(5000, ge=1)
+    # 明细表每页显示的行数
+    page_size: int = Field(50, ge=1)
+    # 本地 echarts.min.js 的路径，配置后内联到报告中 (离线可用)；为空时从 pyecharts 的 CDN 加载
+    echarts_js: str | None = None
+
+# --- 运行指标配置模型 ---
+class MetricsConfig(BaseModel):
+    # 运行结束后写出流水线指标 (各阶段耗时、丢弃的行数、峰值内存、GeoIP 查询统计)，也可通过命令行 --metrics 开启
+    enabled: bool = False
+    # JSON 指标文件的路径，为空时写入报告目录下的 <报告名>_metrics.json
+    path: str | None = None
+    # Prometheus node_exporter textfile collector 的 .prom 文件路径，为空时不写出
+    prometheus_textfile: str | None = None
 
 # --- OutputConfig 模型 ---
 class OutputConfig(BaseModel):
     reporters: list[str]
     report_path: DirectoryPath
+    # 报告的固定文件名 (不含扩展名)，为空时使用带时间戳的文件名
+    report_name: str | None = None
+    # 原始日志样本写入与报告同名的压缩旁路文件 ('csv' 为 .csv.gz，'parquet' 为 zstd 压缩的 .parquet)，
+    # 工作簿中只保留指向该文件的链接；为空时写入工作簿 (超出单表行数上限时拆分为多个工作表)
+    raw_logs_sidecar: str | None = None
+    # html 报告器的仪表盘设置
+    html: HtmlReportConfig = HtmlReportConfig()
+    # 运行指标
+    metrics: MetricsConfig = MetricsConfig()
 
 # --- 主配置模型 ---
 class AppConfig(BaseSettings):
@@ -62,6 +216,8 @@ class AppConfig(BaseSettings):
     parser: ParserConfig
     analysis: AnalysisConfig
     output: OutputConfig
+    # 日志过滤条件 (也可通过命令行 --domain、--since、--until、--status、--path-prefix、--ip 指定)
+    filters: FiltersConfig = FiltersConfig()
 
 # --- 加载函数 ---
 def load_config(config_path: str = 'config/config.yaml') -> AppConfig:
@@ -0,0 +1,244 @@
+"""
+日志过滤 (命令行 --domain / --since / --until / --status / --path-prefix / --ip 与配置中的 filters)。
+
+过滤条件尽量下推到流水线的前端，每一级只处理上一级保留下来的数据:
+  1. 文件: 文件名中带有时间 (例如 img.example.com_20251116100000.gz) 且覆盖的时间段与 [since, until) 不相交时，
+     整个文件不读取 (见 InputHandler.get_sources)；
+  2. 正则匹配之前: 解析器对未解码的行做廉价的预检 (子串检查与行首时间)，预检只是满足条件的必要条件，
+     只会多保留不会误删 (见 LogParser._prefilter)；
+  3. 正则匹配之后、构造数据块之前: 按匹配到的字段精确判断，只为满足全部条件的行构造数据块；
+  4. 命中解析缓存的数据块 (缓存中保存的是未过滤的解析结果) 按列向量化过滤。
+
+各级丢弃的数量记入运行指标: filter.files.pruned (文件数)、filter.precheck.<条件>、filter.exact 与 filter.cached (行数)。
+"""
+import ipaddress
+import logging
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.config import AppConfig
+from src.metrics import metrics
+
+# 文件名中的时间: 8 (日期)、10 (小时)、12 (分钟) 或 14 (秒) 位数字，可选地以 "-" 或 "_" 连接结束时间
+_FILE_TIME_PATTERN = re.compile(r'(?<!\d)(\d{8}(?:\d\d){0,3})(?!\d)(?:[-_](\d{8}(?:\d\d){0,3})(?!\d))?')
+_FILE_TIME_FORMATS = {8: '%Y%m%d', 10: '%Y%m%d%H', 12: '%Y%m%d%H%M', 14: '%Y%m%d%H%M%S'}
+_FILE_TIME_UNITS = {8: timedelta(days=1), 10: timedelta(hours=1), 12: timedelta(minutes=1), 14: timedelta(seconds=1)}
+_STATUS_CLASS = re.compile(r'^([1-5])xx$', re.IGNORECASE)
+
+
+def _report_timezone():
+    # basic_stats_analyzer 依赖解析器模块，在函数内导入以免循环导入
+    from zoneinfo import ZoneInfo
+    from src.analyzers.basic_stats_analyzer import REPORT_TIMEZONE
+    return ZoneInfo(REPORT_TIMEZONE)
+
+
+def parse_time_bound(value: str, end: bool = False) -> int:
+    """
+    把命令行中的时间 (例如 2025-11-01 或 2025-11-01T08:00，未带时区时按报告时区解释) 转换为 Unix 时间戳。
+    作为结束时间且只给出日期时，包含当天的全部数据。
+    """
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize(_report_timezone())
+    if end and timestamp == timestamp.normalize() and len(value.strip()) <= 10:
+        timestamp += pd.Timedelta(days=1)
+    return int(timestamp.timestamp())
+
+
+def parse_status(spec: str | int) -> tuple[int, int]:
+    """状态码条件转换为闭区间: '5xx'、'404' 或 '500-504'"""
+    text = str(spec).strip()
+    match = _STATUS_CLASS.match(text)
+    if match:
+        first = int(match.group(1)) * 100
+        return first, first + 99
+    low, _, high = text.partition('-')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise ValueError(f"状态码条件 '{text}' 无效，可用的形式: 5xx、404 或 500-504") from None
+    if low > high:
+        raise ValueError(f"状态码范围无效: {text}")
+    return low, high
+
+
+def parse_network(spec: str) -> ipaddress.IPv4Network | ipaddress.IPv6Network:
+    """IP 条件: 单个地址或 CIDR 网段 (主机位不为零时按所在网段处理)"""
+    return ipaddress.ip_network(spec.strip(), strict=False)
+
+
+def file_time_range(name: str, span_minutes: float) -> tuple[int, int] | None:
+    """
+    由文件名中的时间推断文件覆盖的时间段 [start, end) (Unix 时间戳，按报告时区解释)，无法识别时返回 None。
+    文件名只带开始时间时，覆盖的时长取时间精度 (日期为一天) 与 span_minutes 中较大的一个。
+    """
+    match = _FILE_TIME_PATTERN.search(name)
+    if not match:
+        return None
+    tz = _report_timezone()
+    try:
+        start = datetime.strptime(match.group(1), _FILE_TIME_FORMATS[len(match.group(1))]).replace(tzinfo=tz)
+        if match.group(2):
+            text = match.group(2)
+            end = datetime.strptime(text, _FILE_TIME_FORMATS[len(text)]).replace(tzinfo=tz)
+            # 精度为分钟及以上的结束时间视为包含该时间单位
+            end += _FILE_TIME_UNITS[len(text)] if len(text) < 14 else timedelta(0)
+        else:
+            end = start + max(_FILE_TIME_UNITS[len(match.group(1))], timedelta(minutes=span_minutes))
+    except ValueError:
+        return None
+    if end <= start:
+        return None
+    return int(start.timestamp()), int(end.timestamp())
+
+
+class LogFilter:
+    """
+    一组过滤条件 (各条件之间为 "且"，同一条件的多个取值之间为 "或")。
+
+    解析器用 match_* 在构造数据块之前逐行精确判断，mask 则对已解析的数据块 (紧凑表) 向量化判断，二者结果一致。
+    """
+    def __init__(self, domains: list[str] | None = None, since: int | None = None, until: int | None = None,
+                 statuses: list[tuple[int, int]] | None = None, path_prefixes: list[str] | None = None,
+                 networks: list | None = None, file_span_minutes: float = 60):
+        self.domains = set(domains or [])
+        self.since = since
+        self.until = until
+        self.statuses = list(statuses or [])
+        self.path_prefixes = tuple(path_prefixes or [])
+        self.networks = list(networks or [])
+        self.file_span_minutes = file_span_minutes
+        # 网段按 (地址族, 起始值, 结束值) 比较，与解析器中 IP 的 (地址族, 高 64 位, 低 64 位) 表示对应
+        self._ip_ranges = [(net.version, int(net.network_address), int(net.broadcast_address))
+                           for net in self.networks]
+        self._ip_memo: dict[tuple[int, int, int], bool] = {}
+
+    @classmethod
+    def from_config(cls, config: AppConfig) -> 'LogFilter | None':
+        """根据配置创建过滤器，没有任何过滤条件时返回 None"""
+        filters = getattr(config, 'filters', None)
+        if filters is None:
+            return None
+        log_filter = cls(
+            domains=filters.domains,
+            since=parse_time_bound(filters.since) if filters.since else None,
+            until=parse_time_bound(filters.until, end=True) if filters.until else None,
+            statuses=[parse_status(spec) for spec in filters.statuses],
+            path_prefixes=filters.path_prefixes,
+            networks=[parse_network(spec) for spec in filters.ips],
+            file_span_minutes=filters.file_span_minutes,
+        )
+        return log_filter if log_filter.active else None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.domains or self.since is not None or self.until is not None or self.statuses
+                    or self.path_prefixes or self.networks)
+
+    def describe(self) -> str:
+        parts = []
+        if self.domains:
+            parts.append(f"域名 {sorted(self.domains)}")
+        if self.since is not None or self.until is not None:
+            since, until = (datetime.fromtimestamp(ts, _report_timezone()).isoformat() if ts is not None else '...'
+                            for ts in (self.since, self.until))
+            parts.append(f"时间 [{since}, {until})")
+        if self.statuses:
+            parts.append("状态码 " + ', '.join(f"{low}" if low == high else f"{low}-{high}" for low, high in self.statuses))
+        if self.path_prefixes:
+            parts.append(f"路径前缀 {list(self.path_prefixes)}")
+        if self.networks:
+            parts.append(f"IP {[str(net) for net in self.networks]}")
+        return '; '.join(parts)
+
+    # --- 文件级 ---
+
+    def keeps_file(self, name: str) -> bool:
+        """按文件名中的时间判断文件是否可能包含时间范围内的日志，无法识别时间时保留"""
+        if self.since is None and self.until is None:
+            return True
+        span = file_time_range(name, self.file_span_minutes)
+        if span is None:
+            return True
+        start, end = span
+        return not ((self.since is not None and end <= self.since) or (self.until is not None and start >= self.until))
+
+    def prune_sources(self, sources: list) -> list:
+        """去掉文件名中的时间与时间范围不相交的日志源 (LogSource)"""
+        kept = [source for source in sources if self.keeps_file(source.name)]
+        if len(kept) < len(sources):
+            metrics.incr('filter.files.pruned', len(sources) - len(kept))
+            logging.info(f"按文件名中的时间跳过 {len(sources) - len(kept)} 个不在时间范围内的文件。")
+        return kept
+
+    # --- 逐行精确判断 (正则匹配之后) ---
+
+    def match_time(self, epoch: int) -> bool:
+        return (self.since is None or epoch >= self.since) and (self.until is None or epoch < self.until)
+
+    def match_status(self, code: int) -> bool:
+        return any(low <= code <= high for low, high in self.statuses)
+
+    def match_ip(self, parsed: tuple[int, int, int] | None) -> bool:
+        """parsed 为 (地址族, 高 64 位, 低 64 位)，非法的 IP 保留 (之后由解析器记为无效行)"""
+        if parsed is None:
+            return True
+        keep = self._ip_memo.get(parsed)
+        if keep is None:
+            family, value = parsed[0], (parsed[1] << 64) | parsed[2]
+            keep = any(family == version and start <= value <= end for version, start, end in self._ip_ranges)
+            if len(self._ip_memo) >= 1_000_000:
+                self._ip_memo.clear()
+            self._ip_memo[parsed] = keep
+        return keep
+
+    # --- 数据块的向量化判断 ---
+
+    def mask(self, chunk: pd.DataFrame) -> np.ndarray:
+        """紧凑表结构的数据块中满足全部条件的行"""
+        keep = np.ones(len(chunk), dtype=bool)
+        if self.since is not None:
+            keep &= chunk['timestamp'].to_numpy() >= self.since
+        if self.until is not None:
+            keep &= chunk['timestamp'].to_numpy() < self.until
+        if self.statuses:
+            codes = chunk['status_code'].to_numpy()
+            keep &= np.logical_or.reduce([(codes >= low) & (codes <= high) for low, high in self.statuses])
+        if self.domains:
+            keep &= self._category_mask(chunk['domain'], lambda categories: categories.isin(list(self.domains)))
+        if self.path_prefixes:
+            keep &= self._category_mask(chunk['path'],
+                                        lambda categories: categories.str.startswith(self.path_prefixes))
+        if self.networks:
+            family = chunk['ip_family'].to_numpy()
+            hi, lo = chunk['ip_hi'].to_numpy(), chunk['ip_lo'].to_numpy()
+            in_any = np.zeros(len(chunk), dtype=bool)
+            for version, start, end in self._ip_ranges:
+                s_hi, s_lo, e_hi, e_lo = (np.uint64(start >> 64), np.uint64(start & 0xFFFFFFFFFFFFFFFF),
+                                          np.uint64(end >> 64), np.uint64(end & 0xFFFFFFFFFFFFFFFF))
+                after_start = (hi > s_hi) | ((hi == s_hi) & (lo >= s_lo))
+                before_end = (hi < e_hi) | ((hi == e_hi) & (lo <= e_lo))
+                in_any |= (family == version) & after_start & before_end
+            keep &= in_any
+        return keep
+
+    @staticmethod
+    def _category_mask(column: pd.Series, predicate) -> np.ndarray:
+        """对分类列的每个不同取值只判断一次，再按编码映射到各行 (缺失值不满足条件)"""
+        categories = column.cat.categories
+        hits = np.append(np.asarray(predicate(categories), dtype=bool), False)
+        # 缺失值的编码为 -1，对应末尾追加的 False
+        return hits[column.cat.codes.to_numpy()]
+
+    def apply(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """过滤已解析的数据块 (解析缓存中的未过滤结果)"""
+        keep = self.mask(chunk)
+        dropped = len(chunk) - int(keep.sum())
+        if not dropped:
+            return chunk
+        metrics.incr('filter.cached', dropped)
+        return chunk[keep].reset_index(drop=True)
@@ -0,0 +1,131 @@
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable
+
+from src.config import AppConfig
+from src.metrics import metrics
+
+# SQLite 单条语句的参数数量有上限，批量查询/删除时按此大小分批
+_SQL_BATCH = 500
+# 缓存中保存的地理位置字段
+GEO_FIELDS = ('country', 'city', 'isp')
+
+
+class GeoCache:
+    """
+    跨运行持久化的 IP 地理位置查询结果缓存 (SQLite)。
+
+    以 (命名空间, IP) 为键，命名空间区分数据来源 (例如 API 地址、本地 mmdb 数据库的构建时间)，
+    数据源变化后旧结果不会被误用。每条记录带有过期时间，条目总数超过上限时按最近访问时间淘汰。
+    分析器先查询缓存，只把未命中的 IP 交给 mmdb 或在线 API，并在日志中输出命中/未命中计数。
+    """
+    def __init__(self, db_path: Path, namespace: str, ttl_seconds: float, max_entries: int):
+        self.db_path = db_path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geo_cache (
+                namespace TEXT NOT NULL,
+                ip TEXT NOT NULL,
+                country TEXT,
+                city TEXT,
+                isp TEXT,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, ip)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS geo_cache_accessed ON geo_cache (accessed_at)")
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config: AppConfig, namespace: str) -> 'GeoCache | None':
+        """根据配置创建缓存，未启用或无法打开时返回 None (此时分析器直接查询数据源)"""
+        cache_config = config.analysis.geoip.cache
+        if not cache_config.enabled:
+            return None
+        db_path = Path(cache_config.path) if cache_config.path else \
+            Path(config.input.path or './logs/') / '.geo_cache.sqlite'
+        try:
+            return cls(db_path, namespace, cache_config.ttl_hours * 3600, cache_config.max_entries)
+        except sqlite3.Error as e:
+            logging.warning(f"无法打开 GeoIP 缓存 {db_path}，将不使用缓存: {e}")
+            return None
+
+    def get_many(self, ips: list[str]) -> dict[str, dict]:
+        """查询一批 IP，返回未过期的命中结果 {ip: {country, city, isp}}"""
+        with metrics.timer('geoip.cache.get'):
+            return self._get_many(ips)
+
+    def _get_many(self, ips: list[str]) -> dict[str, dict]:
+        now = time.time()
+        found = {}
+        for start in range(0, len(ips), _SQL_BATCH):
+            batch = ips[start:start + _SQL_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            rows = self._conn.execute(
+                f"SELECT ip, country, city, isp FROM geo_cache "
+                f"WHERE namespace = ? AND expires_at > ? AND ip IN ({placeholders})",
+                [self.namespace, now, *batch],
+            ).fetchall()
+            for ip, *values in rows:
+                found[ip] = dict(zip(GEO_FIELDS, values))
+        if found:
+            # 记录访问时间，作为 LRU 淘汰的依据
+            self._conn.executemany(
+                "UPDATE geo_cache SET accessed_at = ? WHERE namespace = ? AND ip = ?",
+                [(now, self.namespace, ip) for ip in found],
+            )
+            self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(ips) - len(found)
+        metrics.incr('geoip.cache.hits', len(found))
+        metrics.incr('geoip.cache.misses', len(ips) - len(found))
+        return found
+
+    def put_many(self, records: Iterable[dict]) -> None:
+        """写入一批查询结果，每条记录需包含 ip 以及 country/city/isp 中的字段"""
+        now = time.time()
+        rows = [
+            (self.namespace, record['ip'], *(record.get(field) for field in GEO_FIELDS),
+             now + self.ttl_seconds, now)
+            for record in records
+        ]
+        if not rows:
+            return
+        try:
+            self._conn.executemany("INSERT OR REPLACE INTO geo_cache VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self.evict()
+        except sqlite3.Error as e:
+            logging.warning(f"写入 GeoIP 缓存失败: {e}")
+
+    def evict(self) -> None:
+        """删除过期条目，条目数超过上限时按最近访问时间从旧到新删除"""
+        self._conn.execute("DELETE FROM geo_cache WHERE expires_at <= ?", (time.time(),))
+        total = self._conn.execute("SELECT COUNT(*) FROM geo_cache").fetchone()[0]
+        excess = total - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM geo_cache WHERE (namespace, ip) IN "
+                "(SELECT namespace, ip FROM geo_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            logging.info(f"GeoIP 缓存超出上限，已淘汰 {excess} 条")
+        self._conn.commit()
+
+    def log_stats(self) -> None:
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        logging.info(f"GeoIP 缓存: 命中 {self.hits}，未命中 {self.misses} (命中率 {ratio:.1f}%)")
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,218 @@
+import ipaddress
+import logging
+import os
+import socket
+from pathlib import Path
+
+import maxminddb
+import numpy as np
+import pandas as pd
+
+# 查询 IPv4/IPv6 地址时按网段去重的前缀长度
+IPV4_GROUP_PREFIX = 24
+IPV6_GROUP_PREFIX = 48
+# 范围索引文件的格式版本，格式变化时旧的索引文件不再使用
+INDEX_VERSION = 1
+
+
+def _place_name(record: dict | None, key: str) -> str | None:
+    """与 geoip2 (locales=['en']) 的 record.<key>.name 取值一致"""
+    if not record:
+        return None
+    return (record.get(key) or {}).get('names', {}).get('en')
+
+
+def lookup_names(reader: maxminddb.Reader, ip: str) -> tuple[str | None, str | None] | None:
+    """查询单个 IP 的 (国家, 城市) 名称，数据库中没有该 IP 时返回 None"""
+    record = reader.get(ip)
+    if record is None:
+        return None
+    return _place_name(record, 'country'), _place_name(record, 'city')
+
+
+def resolve_by_prefix(reader: maxminddb.Reader, ips: list[str]) -> pd.DataFrame:
+    """
+    按网段 (IPv4 /24、IPv6 /48) 去重后查询。
+
+    每个网段只查询一次，数据库返回的网络前缀不长于网段前缀时，网段内所有 IP 的结果必然相同；
+    否则 (数据库中的网络比网段更细) 逐个查询网段内的 IP，因此结果与逐个查询完全一致。
+    """
+    groups: dict[str, list[str]] = {}
+    for ip in ips:
+        if ':' in ip:
+            key = ipaddress.IPv6Network((ip, IPV6_GROUP_PREFIX), strict=False).network_address.compressed
+        else:
+            key = ip.rsplit('.', 1)[0]
+        groups.setdefault(key, []).append(ip)
+
+    results: dict[str, tuple | None] = {}
+    for members in groups.values():
+        record, prefix_len = reader.get_with_prefix_len(members[0])
+        group_prefix = IPV6_GROUP_PREFIX if ':' in members[0] else IPV4_GROUP_PREFIX
+        if prefix_len <= group_prefix:
+            names = None if record is None else (_place_name(record, 'country'), _place_name(record, 'city'))
+            for ip in members:
+                results[ip] = names
+        else:
+            for ip in members:
+                results[ip] = lookup_names(reader, ip)
+    names = [results[ip] for ip in ips]
+    return to_frame(ips, [n is not None for n in names],
+                    [n[0] if n else None for n in names], [n[1] if n else None for n in names])
+
+
+def _ipv4_to_uint32(ips: list[str]) -> np.ndarray:
+    """点分十进制 IPv4 地址批量转换为 uint32 (inet_aton 在 C 中完成解析)"""
+    return np.frombuffer(b''.join(map(socket.inet_aton, ips)), dtype='>u4').astype(np.uint32)
+
+
+def _ipv6_to_bytes(ips: list[str]) -> np.ndarray:
+    """IPv6 地址批量转换为 16 字节大端序的定长字节串"""
+    return np.frombuffer(b''.join(socket.inet_pton(socket.AF_INET6, ip) for ip in ips), dtype='S16')
+
+
+def _ipv4_alias_mask(packed: np.ndarray) -> np.ndarray:
+    """
+    在 IPv6 数据库中指向 IPv4 子树的地址 (::/96 的 IPv4 兼容地址、::ffff:0:0/96 的 IPv4 映射地址、2002::/16 的 6to4)，
+    这些地址在范围索引中没有单独的条目，需要直接查询数据库
+    """
+    octets = np.frombuffer(packed.tobytes(), dtype=np.uint8).reshape(-1, 16)
+    compatible = ~octets[:, :12].any(axis=1)
+    mapped = ~octets[:, :10].any(axis=1) & (octets[:, 10] == 0xff) & (octets[:, 11] == 0xff)
+    six_to_four = (octets[:, 0] == 0x20) & (octets[:, 1] == 0x02)
+    return compatible | mapped | six_to_four
+
+
+def _encode(names: list[str | None]) -> tuple[np.ndarray, np.ndarray]:
+    """字典编码: 返回 (每个条目的编码, 去重后的名称表)，None 编码为 -1"""
+    codes, uniques = pd.factorize(pd.Series(names, dtype=object), use_na_sentinel=True)
+    return codes.astype(np.int32), np.asarray(uniques, dtype=str)
+
+
+def _decode(codes: np.ndarray, vocabulary: np.ndarray) -> np.ndarray:
+    values = np.empty(len(codes), dtype=object)
+    found = codes >= 0
+    values[found] = vocabulary[codes[found]]
+    return values
+
+
+class GeoRangeIndex:
+    """
+    由 mmdb 构建的有序地址范围表，用于整列 IP 的向量化查询。
+
+    mmdb 中的网络互不重叠，按起始地址排序后，每个 IP 只需一次 searchsorted 即可找到所在的网络。
+    IPv4 的起止地址存为 uint32；numpy 没有 128 位整数，IPv6 的起止地址存为 16 字节大端序的定长字节串 (S16)，
+    其字典序与数值序一致。国家与城市名称做字典编码。索引按数据库的构建时间缓存到磁盘，只需构建一次。
+    """
+    def __init__(self, arrays: dict[str, np.ndarray]):
+        self.arrays = arrays
+
+    @staticmethod
+    def index_path(db_path: Path, index_dir: Path | None, metadata) -> Path:
+        directory = index_dir or db_path.parent
+        key = f"{db_path.stem}-{metadata.database_type}-{metadata.build_epoch}-{db_path.stat().st_size}-v{INDEX_VERSION}"
+        return directory / f"{key}.npz"
+
+    @classmethod
+    def build(cls, reader: maxminddb.Reader) -> 'GeoRangeIndex':
+        columns = {4: ([], [], [], []), 6: ([], [], [], [])}
+        for network, record in reader:
+            starts, ends, countries, cities = columns[network.version]
+            if network.version == 4:
+                starts.append(int(network.network_address))
+                ends.append(int(network.broadcast_address))
+            else:
+                starts.append(network.network_address.packed)
+                ends.append(network.broadcast_address.packed)
+            countries.append(_place_name(record, 'country'))
+            cities.append(_place_name(record, 'city'))
+
+        arrays = {}
+        for version, dtype in ((4, np.uint32), (6, 'S16')):
+            starts, ends, countries, cities = columns[version]
+            order = np.argsort(np.asarray(starts, dtype=dtype), kind='stable')
+            arrays[f"v{version}_starts"] = np.asarray(starts, dtype=dtype)[order]
+            arrays[f"v{version}_ends"] = np.asarray(ends, dtype=dtype)[order]
+            for field, names in (('country', countries), ('city', cities)):
+                codes, vocabulary = _encode(names)
+                arrays[f"v{version}_{field}_codes"] = codes[order]
+                arrays[f"v{version}_{field}_names"] = vocabulary
+        return cls(arrays)
+
+    @classmethod
+    def load_or_build(cls, db_path: Path, reader: maxminddb.Reader, index_dir: Path | None = None) -> 'GeoRangeIndex':
+        path = cls.index_path(db_path, index_dir, reader.metadata())
+        if path.exists():
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    return cls({name: data[name] for name in data.files})
+            except (OSError, ValueError) as e:
+                logging.warning(f"GeoIP 范围索引损坏，将重新构建: {e}")
+        logging.info(f"正在由 {db_path.name} 构建 GeoIP 范围索引 (每个数据库版本只需构建一次)...")
+        index = cls.build(reader)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+            np.savez(tmp_path, **index.arrays)
+            os.replace(tmp_path, path)
+            logging.info(f"GeoIP 范围索引已保存: {path}")
+        except OSError as e:
+            logging.warning(f"保存 GeoIP 范围索引失败: {e}")
+        return index
+
+    def _search(self, version: int, values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """返回 (是否命中, 国家名称, 城市名称)，未命中的名称为 None"""
+        starts, ends = self.arrays[f"v{version}_starts"], self.arrays[f"v{version}_ends"]
+        if not len(starts):
+            missing = np.full(len(values), None, dtype=object)
+            return np.zeros(len(values), dtype=bool), missing, missing.copy()
+        positions = np.searchsorted(starts, values, side='right') - 1
+        clipped = np.clip(positions, 0, None)
+        found = (positions >= 0) & (values <= ends[clipped])
+        names = []
+        for field in ('country', 'city'):
+            codes = np.where(found, self.arrays[f"v{version}_{field}_codes"][clipped], -1)
+            names.append(_decode(codes, self.arrays[f"v{version}_{field}_names"]))
+        return found, names[0], names[1]
+
+    def resolve(self, reader: maxminddb.Reader, ips: list[str]) -> pd.DataFrame:
+        """查询一批 IP，结果与逐个用 geoip2 查询一致 (列含义见 to_frame)"""
+        found = np.zeros(len(ips), dtype=bool)
+        countries = np.full(len(ips), None, dtype=object)
+        cities = np.full(len(ips), None, dtype=object)
+
+        is_v6 = np.fromiter((':' in ip for ip in ips), dtype=bool, count=len(ips))
+        v4_positions = np.flatnonzero(~is_v6)
+        if len(v4_positions):
+            values = _ipv4_to_uint32([ips[i] for i in v4_positions])
+            found[v4_positions], countries[v4_positions], cities[v4_positions] = self._search(4, values)
+
+        v6_positions = np.flatnonzero(is_v6)
+        if len(v6_positions):
+            packed = _ipv6_to_bytes([ips[i] for i in v6_positions])
+            if reader.metadata().ip_version == 4:
+                # IPv4 数据库中查询 IPv6 地址与 geoip2 一样抛出异常
+                fallback = np.ones(len(packed), dtype=bool)
+            else:
+                fallback = _ipv4_alias_mask(packed)
+            indexed = v6_positions[~fallback]
+            if len(indexed):
+                found[indexed], countries[indexed], cities[indexed] = self._search(6, packed[~fallback])
+            for position in v6_positions[fallback]:
+                names = lookup_names(reader, ips[position])
+                if names is not None:
+                    found[position] = True
+                    countries[position], cities[position] = names
+        return to_frame(ips, found, countries, cities)
+
+
+def to_frame(ips: list[str], found, countries, cities) -> pd.DataFrame:
+    """
+    查询结果表: ip、found (数据库中是否有该 IP)、country 与 city (英文名称，数据库中没有时为 None)
+    """
+    return pd.DataFrame({
+        'ip': pd.Series(ips, dtype=object),
+        'found': np.asarray(found, dtype=bool),
+        'country': pd.Series(countries, dtype=object),
+        'city': pd.Series(cities, dtype=object),
+    })
@@ -0,0 +1,271 @@
+import copy
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from src.analysis_engine import AnalysisEngine
+from src.bulk_reader import iter_gzip_blocks, iter_mmap_lines, slice_blocks, split_lines
+from src.config import AppConfig
+from src.input_handler import get_log_files
+from src.log_parser import create_parser
+
+# 状态文件的格式版本，格式变化时旧的状态不再使用
+STATE_VERSION = 2
+STATE_FILE = 'state.pkl'
+# 文件内容指纹的长度 (字节)。以内容而不是路径或 inode 识别文件，
+# 重命名、轮转压缩 (access.log -> access.log.1.gz) 后仍能找到原有的处理进度
+FINGERPRINT_BYTES = 1024
+
+
+def _digest(head: bytes) -> str:
+    return hashlib.sha1(head).hexdigest()
+
+
+@dataclass
+class FileCheckpoint:
+    """一个日志文件的处理进度 (偏移为解压后的字节数)"""
+    name: str
+    fingerprint: str
+    head_len: int
+    offset: int = 0
+    # .gz 文件 (轮转后不再变化) 已完整处理
+    done: bool = False
+
+
+class CheckpointStore:
+    """
+    检查点与累计的分析器中间状态。
+
+    二者保存在同一个文件中，先写临时文件再原子替换，保证状态与检查点始终一致：
+    进程在两次保存之间退出时，下次运行从上一次保存的位置继续，不会重复计数也不会遗漏。
+    分析或解析相关的配置变化后，旧的中间状态无法继续合并，状态会被重置。
+    """
+    def __init__(self, path: Path, config_key: str):
+        self.path = path
+        self.config_key = config_key
+        self.checkpoints: dict[str, FileCheckpoint] = {}
+        self.states: dict[str, Any] | None = None
+        self.rows = 0
+
+    @classmethod
+    def from_config(cls, config: AppConfig, state_key: str) -> 'CheckpointStore':
+        state_dir = config.input.incremental.state_dir
+        directory = Path(state_dir) if state_dir else Path(config.input.path or './logs/') / '.incremental'
+        return cls(directory / STATE_FILE, f"{state_key}|v{STATE_VERSION}")
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            logging.warning(f"增量状态文件损坏，将从头处理所有文件: {e}")
+            return
+        if data.get('config_key') != self.config_key:
+            logging.warning("分析配置已变化，累计状态已重置，将从头处理所有文件。")
+            return
+        self.checkpoints = data['checkpoints']
+        self.states = data['states']
+        self.rows = data['rows']
+        logging.info(f"已载入增量状态: {len(self.checkpoints)} 个文件的检查点，累计 {self.rows} 条日志")
+
+    def save(self) -> None:
+        data = {'config_key': self.config_key, 'checkpoints': self.checkpoints,
+                'states': self.states, 'rows': self.rows}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"保存增量状态失败: {e}")
+
+    def find(self, head: bytes) -> FileCheckpoint | None:
+        """按内容指纹查找检查点。之前读取时文件还不足 FINGERPRINT_BYTES 字节的，按当时的长度比对"""
+        checkpoint = self.checkpoints.get(_digest(head))
+        if checkpoint is not None:
+            return checkpoint
+        for checkpoint in self.checkpoints.values():
+            if checkpoint.head_len < len(head) and checkpoint.fingerprint == _digest(head[:checkpoint.head_len]):
+                return checkpoint
+        return None
+
+    def update(self, checkpoint: FileCheckpoint, head: bytes) -> None:
+        """记录检查点，文件增长后指纹改用更长的文件头"""
+        self.checkpoints.pop(checkpoint.fingerprint, None)
+        checkpoint.fingerprint, checkpoint.head_len = _digest(head), len(head)
+        self.checkpoints[checkpoint.fingerprint] = checkpoint
+
+
+def _read_head(path: Path) -> bytes:
+    """文件内容 (.gz 文件为解压后的内容) 的前 FINGERPRINT_BYTES 个字节"""
+    if path.suffix != '.gz':
+        with open(path, 'rb') as f:
+            return f.read(FINGERPRINT_BYTES)
+    head = b''
+    with open(path, 'rb', buffering=0) as f:
+        blocks = iter_gzip_blocks(f, block_size=64 * 1024)
+        try:
+            for block in blocks:
+                head += block
+                if len(head) >= FINGERPRINT_BYTES:
+                    break
+        finally:
+            blocks.close()
+    return head[:FINGERPRINT_BYTES]
+
+
+class IncrementalRunner:
+    """
+    增量处理 input.path 下的日志文件。
+
+    未压缩的文件从检查点记录的位置读到最后一个完整行 (正在写入的半行留到下次)，
+    .gz 文件整体处理一次后标记为已完成。每个文件先解析到独立的中间状态，完整读取成功后才合并进累计状态，
+    读取失败 (例如 .gz 文件仍在写入) 的文件下次重试。
+    """
+    def __init__(self, config: AppConfig):
+        self.config = config
+        self.engine = AnalysisEngine(config)
+        self.parser = create_parser(config)
+        self.store = CheckpointStore.from_config(config, self.engine.state_key())
+        # 本进程内已处理完的文件 (大小与修改时间未变时不再读取文件头)
+        self._unchanged: dict[tuple[int, int], tuple[int, int]] = {}
+
+        legacy = [name for name, analyzer in self.engine.available_analyzers.items()
+                  if not analyzer.supports_streaming]
+        if legacy:
+            logging.warning(f"分析器 {legacy} 不支持流式分析，增量模式下将跳过。")
+        self.store.load()
+        if self.store.states is None:
+            self.store.states = self.engine.init_states()
+
+    def _read_new(self, path: Path, checkpoint: FileCheckpoint) -> tuple[Iterator[list[bytes]], int | None]:
+        """返回 (新数据的行批次, 读完后的偏移)。.gz 文件读完后偏移为 None (标记为已完成)"""
+        if path.suffix == '.gz':
+            def _gzip_lines():
+                with open(path, 'rb', buffering=0) as f:
+                    yield from split_lines(slice_blocks(iter_gzip_blocks(f), checkpoint.offset))
+            return _gzip_lines(), None
+
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= checkpoint.offset:
+                return iter(()), checkpoint.offset
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = mm.rfind(b'\n', checkpoint.offset, size) + 1
+        if end <= checkpoint.offset:
+            return iter(()), checkpoint.offset
+
+        def _plain_lines():
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from iter_mmap_lines(mm, checkpoint.offset, end)
+        return _plain_lines(), end
+
+    def _process_file(self, path: Path) -> int:
+        """处理一个文件的新数据，返回新增的日志条数"""
+        stat = path.stat()
+        identity = (stat.st_dev, stat.st_ino)
+        if self._unchanged.get(identity) == (stat.st_size, stat.st_mtime_ns):
+            return 0
+        head = _read_head(path)
+        if not head:
+            return 0
+        checkpoint = self.store.find(head)
+        if checkpoint is None:
+            checkpoint = FileCheckpoint(path.name, _digest(head), len(head))
+        elif checkpoint.done or (path.suffix != '.gz' and checkpoint.offset >= stat.st_size):
+            self.store.update(checkpoint, head)
+            self._unchanged[identity] = (stat.st_size, stat.st_mtime_ns)
+            return 0
+        elif checkpoint.name != path.name:
+            logging.info(f"--> {path.name} 与已处理的 {checkpoint.name} 内容相同 (文件已轮转)，"
+                         f"从第 {checkpoint.offset} 字节继续")
+
+        batches, end = self._read_new(path, checkpoint)
+        states = self.engine.init_states()
+        rows = 0
+        for chunk in self.parser.parse_line_batches(batches):
+            states = self.engine.update_states(states, chunk)
+            rows += len(chunk)
+
+        self.store.states = self.engine.merge_states(self.store.states, states)
+        self.store.rows += rows
+        checkpoint.name = path.name
+        if end is None:
+            checkpoint.done = True
+        else:
+            checkpoint.offset = end
+        self.store.update(checkpoint, head)
+        if checkpoint.done or checkpoint.offset >= stat.st_size:
+            self._unchanged[identity] = (stat.st_size, stat.st_mtime_ns)
+        if rows:
+            logging.info(f"--> {path.name}: 新增 {rows} 条日志")
+        return rows
+
+    def poll(self) -> int:
+        """检查所有匹配的文件并处理新数据，返回新增的日志条数"""
+        files = []
+        for path in get_log_files(self.config.input.path, self.config.input.file_pattern):
+            try:
+                if path.is_file():
+                    files.append((path.stat().st_mtime, path.name, path))
+            except OSError:
+                continue
+        added = 0
+        # 按修改时间从旧到新处理，累计结果中的原始日志样本因此按时间先后排列
+        for _, _, path in sorted(files):
+            try:
+                added += self._process_file(path)
+            except (OSError, EOFError, ValueError) as e:
+                # 例如 .gz 文件仍在写入，下次重试
+                logging.warning(f"读取 {path.name} 失败，将在下次检查时重试: {e}")
+            except Exception as e:
+                logging.error(f"处理 {path.name} 时发生错误，将在下次检查时重试: {e}")
+        return added
+
+    def close(self) -> None:
+        self.engine.close()
+
+    def results(self) -> dict[str, dict]:
+        """由累计状态生成分析结果 (在副本上汇总，累计状态保持不变)"""
+        self.engine.rows_processed = self.store.rows
+        return self.engine.finalize_states(copy.deepcopy(self.store.states))
+
+    def run_once(self, report: Callable[[dict], None]) -> None:
+        """--incremental: 处理上次运行之后的新数据，保存状态并生成累计结果的报告"""
+        added = self.poll()
+        self.store.save()
+        logging.info(f"本次新增 {added} 条日志，累计 {self.store.rows} 条。")
+        if self.store.rows == 0:
+            logging.warning("未找到任何有效的日志条目，程序即将退出。")
+            return
+        report(self.results())
+
+    def follow(self, report: Callable[[dict], None]) -> None:
+        """--follow: 持续监视新文件与增长的文件，按间隔保存状态并刷新报告，Ctrl+C 退出"""
+        settings = self.config.input.incremental
+        logging.info(f"开始跟踪 '{self.config.input.path}'，每 {settings.poll_seconds} 秒检查一次，"
+                     f"报告至少每 {settings.refresh_seconds} 秒刷新一次 (Ctrl+C 退出)")
+        last_refresh = None
+        pending = self.store.rows > 0
+        try:
+            while True:
+                pending = self.poll() > 0 or pending
+                now = time.monotonic()
+                if pending and (last_refresh is None or now - last_refresh >= settings.refresh_seconds):
+                    self.store.save()
+                    report(self.results())
+                    last_refresh, pending = now, False
+                time.sleep(settings.poll_seconds)
+        except KeyboardInterrupt:
+            logging.info("收到中断信号，正在保存增量状态...")
+        finally:
+            self.store.save()
@@ -0,0 +1,331 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+from tqdm import tqdm
+
+from src.config import AppConfig
+from src.filters import LogFilter
+from src.input_handler import InputHandler, LogSource, read_log_batches
+from src.log_parser import LogParser, create_parser
+from src.metrics import metrics
+from src.parse_cache import ParseCache, frames_to_table, table_to_frames
+from src.range_split import FileRange, RangeSplitter, read_range
+
+# 每个工作进程持有一个独立的 LogParser，以便复用其时间与 IP 的记忆化缓存
+_worker_parser: LogParser | None = None
+_worker_cache: ParseCache | None = None
+_worker_splitter: RangeSplitter | None = None
+
+
+def _init_worker(config: AppConfig):
+    global _worker_parser, _worker_cache, _worker_splitter
+    _worker_parser = create_parser(config)
+    _worker_cache = ParseCache.from_config(config)
+    _worker_splitter = RangeSplitter.from_config(config)
+
+
+def _track_lines(batches: Iterator[list[bytes]], progress: tqdm, lock: threading.Lock) -> Iterator[list[bytes]]:
+    """在读取日志行的同时更新进度条 (每批更新一次，减少加锁开销)"""
+    for batch in batches:
+        with lock:
+            progress.update(len(batch))
+        yield batch
+
+
+def _count_lines(batches: Iterator[list[bytes]], counter: list[int]) -> Iterator[list[bytes]]:
+    for batch in batches:
+        counter[0] += len(batch)
+        yield batch
+
+
+def _filter_cached(chunks: Iterator[pd.DataFrame], log_filter: LogFilter | None) -> Iterator[pd.DataFrame]:
+    """按过滤条件过滤从解析缓存读出的数据块 (缓存中保存的是未过滤的解析结果)"""
+    if log_filter is None:
+        yield from chunks
+        return
+    for chunk in chunks:
+        chunk = log_filter.apply(chunk)
+        if not chunk.empty:
+            yield chunk
+
+
+def table_to_ipc(table: pa.Table) -> bytes:
+    """将 Arrow 表序列化为 IPC 流格式，跨进程传输时只需拷贝一块连续内存"""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def ipc_to_table(payload: bytes) -> pa.Table:
+    return pa.ipc.open_stream(payload).read_all()
+
+
+def parse_file_worker(file_path: str, use_cache: bool = True, build_index: bool = False
+                      ) -> tuple[bytes | None, int, dict]:
+    """
+    在工作进程中解压并解析单个日志文件，并写入解析缓存 (use_cache 为 False 或设置了过滤条件时不写入)。
+    build_index 为 True 时，较大的 .gz 文件在读取的同时建立检查点索引，供之后的运行按范围拆分。
+    返回 (Arrow IPC 格式的列式数据块, 读取的行数, 工作进程记录的指标)，文件中没有有效日志时数据块为 None。
+    """
+    counter = [0]
+    splitter = _worker_splitter if build_index else None
+    batches = _count_lines(read_log_batches(Path(file_path), splitter), counter)
+    chunks = list(_worker_parser.parse_line_batches(batches))
+    if not chunks:
+        return None, counter[0], metrics.drain()
+    table = frames_to_table(chunks)
+    if use_cache and _worker_cache is not None and _worker_parser.filter is None:
+        _worker_cache.store(Path(file_path), table)
+    return table_to_ipc(table), counter[0], metrics.drain()
+
+
+def parse_range_worker(file_range: FileRange) -> tuple[bytes | None, int, dict]:
+    """在工作进程中解析大文件的一个字节范围，返回值与 parse_file_worker 相同 (不写入解析缓存)"""
+    counter = [0]
+    name = f"{Path(file_range.path).name}[{file_range.start}:{file_range.end}]"
+    batches = _count_lines(metrics.track_file(name, read_range(file_range)), counter)
+    chunks = list(_worker_parser.parse_line_batches(batches))
+    if not chunks:
+        return None, counter[0], metrics.drain()
+    return table_to_ipc(frames_to_table(chunks)), counter[0], metrics.drain()
+
+
+class _Ingestor:
+    """按文件读取并解析日志，负责解析缓存的读写以及顺序/并行两种执行方式"""
+    def __init__(self, config: AppConfig, workers: int):
+        self.config = config
+        self.workers = workers
+        self.chunk_size = config.parser.chunk_size
+        self.input_handler = InputHandler(config, workers)
+        self.log_parser = create_parser(config)
+        self.cache = ParseCache.from_config(config)
+        desc = "正在解析日志" if workers <= 1 else f"正在解析日志 ({workers} 进程)"
+        self.progress = tqdm(desc=desc, unit="行", unit_scale=True)
+        self.progress_lock = threading.Lock()
+
+    def _cached_path(self, source: LogSource) -> Path | None:
+        """源文件在本地的路径 (本地文件或 API 模式下已下载的缓存文件)，预取的临时文件不缓存"""
+        if source.temporary:
+            return None
+        if source.is_local:
+            return source.path
+        return source.download_path
+
+    def _load_cached(self, source: LogSource) -> pa.Table | None:
+        if self.cache is None or not source.is_local or source.temporary:
+            return None
+        with metrics.timer('cache.load'):
+            table = self.cache.load(source.path)
+        if table is not None:
+            logging.info(f"--> 命中解析缓存: {source.name} ({table.num_rows} 条)")
+            metrics.incr('rows.from_cache', table.num_rows)
+        return table
+
+    def _parse_source(self, source: LogSource) -> Iterator[pd.DataFrame]:
+        """在当前进程中读取并解析一个源文件，完成后写入解析缓存 (过滤后的结果不完整，不写入)"""
+        batches = _track_lines(self.input_handler.read_source(source), self.progress, self.progress_lock)
+        if self.cache is None or self.log_parser.filter is not None:
+            yield from self.log_parser.parse_line_batches(batches)
+            return
+        chunks = []
+        for chunk in self.log_parser.parse_line_batches(batches):
+            chunks.append(chunk)
+            yield chunk
+        local_path = self._cached_path(source)
+        if chunks and local_path is not None and local_path.exists():
+            self.cache.store(local_path, frames_to_table(chunks))
+
+    def _release(self, source: LogSource) -> None:
+        """处理完成后删除预取的临时文件"""
+        if source.temporary:
+            source.path.unlink(missing_ok=True)
+
+    def iter_sequential(self) -> Iterator[pd.DataFrame]:
+        sources = self.input_handler.get_sources()
+        for source in self.input_handler.iter_ready_sources(sources):
+            table = self._load_cached(source)
+            if table is not None:
+                yield from _filter_cached(table_to_frames(table, self.chunk_size), self.log_parser.filter)
+            else:
+                yield from self._parse_source(source)
+            self._release(source)
+
+    def iter_parallel(self) -> Iterator[pd.DataFrame]:
+        sources = self.input_handler.get_sources()
+        if not sources:
+            return
+        splitter = self.input_handler.splitter
+
+        def _on_done(future: Future):
+            if not future.cancelled() and future.exception() is None:
+                with self.progress_lock:
+                    self.progress.update(future.result()[1])
+
+        # 最多同时提交 2 * workers 个任务，已完成但尚未被消费的数据块数量因此有界
+        max_in_flight = self.workers * 2
+        # 每个任务: (源文件, 结果, 是否为拆分后的一段, 是否为该文件的最后一个任务)
+        pending: deque[tuple[LogSource, Future | None, bool, bool]] = deque()
+        # 大文件拆分出的、尚未提交的字节范围
+        queued_ranges: deque[tuple[LogSource, FileRange, bool]] = deque()
+        # 云端文件在预取下载完成后才从迭代器中产出，并作为本地文件提交给进程池
+        source_iter = self.input_handler.iter_ready_sources(sources)
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.config,)) as pool:
+            def _fill():
+                while len(pending) < max_in_flight:
+                    if queued_ranges:
+                        source, file_range, last = queued_ranges.popleft()
+                        future = pool.submit(parse_range_worker, file_range)
+                        future.add_done_callback(_on_done)
+                        pending.append((source, future, True, last))
+                        continue
+                    source = next(source_iter, None)
+                    if source is None:
+                        return
+                    future = None
+                    # 命中解析缓存的文件直接在主进程中内存映射读取，不提交给进程池
+                    if source.is_local and (self.cache is None or source.temporary
+                                            or not self.cache.contains(source.path)):
+                        ranges = splitter.plan(source.path) if splitter is not None else None
+                        if ranges:
+                            logging.info(f"--> 拆分为 {len(ranges)} 段并行解析: {source.name}")
+                            queued_ranges.extend((source, r, i == len(ranges) - 1) for i, r in enumerate(ranges))
+                            continue
+                        future = pool.submit(parse_file_worker, str(source.path), not source.temporary,
+                                             splitter is not None and not source.temporary)
+                        future.add_done_callback(_on_done)
+                    pending.append((source, future, False, True))
+
+            _fill()
+            # 拆分解析的文件各段的结果，全部完成后合并写入解析缓存
+            split_tables: list[pa.Table] | None = []
+            try:
+                # 按文件 (及文件内各段) 的原始顺序产出结果，保证拼接顺序与顺序解析一致
+                while pending:
+                    source, future, split, last = pending.popleft()
+                    if future is None:
+                        table = self._load_cached(source)
+                        if table is not None:
+                            yield from _filter_cached(table_to_frames(table, self.chunk_size),
+                                                      self.log_parser.filter)
+                        else:
+                            # 云端文件在主进程中边下载边解析
+                            yield from self._parse_source(source)
+                    else:
+                        try:
+                            payload, _, worker_metrics = future.result()
+                            metrics.merge(worker_metrics)
+                        except Exception as e:
+                            logging.error(f"解析日志文件失败，已跳过 {source.name}: {e}")
+                            payload = None
+                            if split:
+                                # 缺少部分范围的结果不能写入缓存
+                                split_tables = None
+                        if payload is not None:
+                            table = ipc_to_table(payload)
+                            if split and split_tables is not None and self.cache is not None \
+                                    and self.log_parser.filter is None:
+                                split_tables.append(table)
+                            yield from table_to_frames(table, self.chunk_size)
+                    if last:
+                        if split and split_tables and self.cache is not None and not source.temporary:
+                            self.cache.store(source.path, pa.concat_tables(split_tables))
+                        split_tables = []
+                        self._release(source)
+                    _fill()
+            finally:
+                for _, future, _, _ in pending:
+                    if future is not None:
+                        future.cancel()
+                source_iter.close()
+
+    def close(self):
+        self.progress.close()
+
+
+def iter_parsed_chunks(config: AppConfig, workers: int | None = None) -> Iterator[pd.DataFrame]:
+    """
+    读取并解析所有输入日志，逐块产出列式数据。
+    workers > 1 时使用进程池按文件并行解析，结果仍按文件顺序产出。
+    启用解析缓存时，已缓存的文件直接读取缓存，新解析的文件会写入缓存。
+    """
+    workers = workers or config.input.workers
+    ingestor = _Ingestor(config, workers)
+    try:
+        if workers <= 1:
+            yield from ingestor.iter_sequential()
+        else:
+            logging.info(f"启用并行解析，工作进程数: {workers}")
+            yield from ingestor.iter_parallel()
+    finally:
+        ingestor.close()
+
+
+def iter_file_chunks(config: AppConfig, paths: list[Path], workers: int | None = None
+                     ) -> Iterator[tuple[Path, list[pd.DataFrame]]]:
+    """
+    逐个读取并解析本地日志文件，按 paths 的顺序产出 (文件, 该文件的数据块)，用于需要按文件区分结果的场景。
+    命中解析缓存的文件直接读取缓存 (并按过滤条件过滤)；workers > 1 时由进程池并行解析，同时提交的文件数有上限。
+    解析失败的文件记录错误后跳过。
+    """
+    workers = workers or config.input.workers
+    chunk_size = config.parser.chunk_size
+    cache = ParseCache.from_config(config)
+    parser = create_parser(config)
+
+    def _parse_local(path: Path) -> list[pd.DataFrame]:
+        """在当前进程中读取解析缓存，未命中时解析并写入缓存"""
+        table = cache.load(path) if cache is not None else None
+        if table is not None:
+            return list(_filter_cached(table_to_frames(table, chunk_size), parser.filter))
+        chunks = list(parser.parse_line_batches(read_log_batches(path)))
+        if chunks and cache is not None and parser.filter is None:
+            cache.store(path, frames_to_table(chunks))
+        return chunks
+
+    if workers <= 1:
+        for path in paths:
+            yield path, _parse_local(path)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+        pending: deque[tuple[Path, Future | None]] = deque()
+        path_iter = iter(paths)
+
+        def _fill():
+            while len(pending) < workers * 2:
+                path = next(path_iter, None)
+                if path is None:
+                    return
+                hit = cache is not None and cache.contains(path)
+                pending.append((path, None if hit else pool.submit(parse_file_worker, str(path))))
+
+        _fill()
+        try:
+            while pending:
+                path, future = pending.popleft()
+                if future is None:
+                    chunks = _parse_local(path)
+                else:
+                    try:
+                        payload, _, worker_metrics = future.result()
+                        metrics.merge(worker_metrics)
+                    except Exception as e:
+                        logging.error(f"解析日志文件失败，已跳过 {path.name}: {e}")
+                        _fill()
+                        continue
+                    chunks = [] if payload is None else list(table_to_frames(ipc_to_table(payload), chunk_size))
+                yield path, chunks
+                _fill()
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
@@ -1,16 +1,22 @@
 import gzip
 import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterator
+from src import plugins
+from src.bulk_reader import read_line_batches
 from src.config import AppConfig
-from src.clients.huawei_cdn_client import HuaweiCdnApiClient
+from src.filters import LogFilter
+from src.metrics import metrics
+from src.range_split import RangeSplitter
 
 def get_log_files(path: str, pattern: str) -> list[Path]:
-    """获取指定路径下匹配模式的所有文件"""
+    """获取指定路径下匹配模式的所有文件 (按路径排序，处理顺序因此与文件系统无关)"""
     p = Path(path)
     if not p.is_dir():
         return []
-    return list(p.glob(pattern))
+    return sorted(p.glob(pattern))
 
 def read_log_lines(file_path: Path) -> Iterator[str]:
     """逐行读取日志文件，支持 .gz 解压"""
@@ -24,67 +30,125 @@ def read_log_lines(file_path: Path) -> Iterator[str]:
     except Exception as e:
         logging.error(f"读取文件时发生错误 {file_path}: {e}")
 
-class InputHandler:
+def read_log_batches(file_path: Path, splitter: RangeSplitter | None = None) -> Iterator[list[bytes]]:
+    """
+    按批读取日志文件的行 (bytes，不含换行符)，支持 .gz 解压。
+    与 read_log_lines 相比，不对整行做 UTF-8 解码，也不为每行创建 str 对象，只解码解析时保留的字段。
+    传入 splitter 时，较大的 .gz 文件在读取的同时建立检查点索引，供之后按范围并行解析。
+    """
+    try:
+        if splitter is not None:
+            yield from metrics.track_file(file_path.name, splitter.read_batches(file_path))
+        else:
+            yield from metrics.track_file(file_path.name, read_line_batches(file_path))
+    except FileNotFoundError:
+        logging.error(f"文件未找到: {file_path}")
+    except Exception as e:
+        logging.error(f"读取文件时发生错误 {file_path}: {e}")
+
+@dataclass
+class LogSource:
+    """一个待处理的日志文件: 本地文件 (path) 或需要从云端下载的链接 (url)"""
+    name: str
+    path: Path | None = None
+    url: str | None = None
+    # 云端文件下载后在本地的保存位置，为 None 时只在内存中流式处理
+    download_path: Path | None = None
+    # 预取到临时目录的云端文件，处理完后删除，也不写入解析缓存
+    temporary: bool = False
+
+    @property
+    def is_local(self) -> bool:
+        return self.path is not None
+
+class BaseInputSource(ABC):
+    """
+    输入源插件的基类 (按 input.source_type 从插件注册表加载)。
+
+    get_sources 列出待处理的日志文件；本地文件由 InputHandler 直接读取，
+    带 url 的云端文件由 stream 边下载边产出行批次。
+    """
     def __init__(self, config: AppConfig):
         self.config = config
 
-    def get_lines(self) -> Iterator[str]:
-        """根据配置的 source_type 获取所有日志行"""
-        source_type = self.config.input.source_type
-        
-        if source_type == 'local':
-            logging.info(f"使用 'local' 模式从路径 '{self.config.input.path}' 读取日志。")
-            log_files = get_log_files(self.config.input.path, self.config.input.file_pattern)
-            if not log_files:
-                logging.warning(f"在 '{self.config.input.path}' 未找到匹配 '{self.config.input.file_pattern}' 的日志文件。")
-                return
-            logging.info(f"找到 {len(log_files)} 个日志文件进行处理。")
-            for file in log_files:
-                logging.info(f"--> 正在读取: {file.name}")
-                yield from read_log_lines(file)
-                
-        elif source_type == 'api':
-            # --- API 模式的全新的逻辑 ---
-            logging.info(f"使用 'api' 模式从华为CDN API拉取日志。")
-            if not self.config.input.api:
-                logging.error("配置错误: source_type 为 'api'，但 'api' 配置块缺失。")
-                return
-
-            api_config = self.config.input.api
-            client = HuaweiCdnApiClient(api_config)
-            
-            # 从API获取目标任务全集
-            log_urls = client.get_log_download_links()
-            if not log_urls:
-                logging.warning("API 未返回任何有效的日志文件链接，分析结束。")
-                return
-            
-            logging.info(f"API返回了 {len(log_urls)} 个目标日志文件。")
-
-            # 准备本地缓存信息
-            local_log_path_str = self.config.input.path or './logs/'
-            local_log_path = Path(local_log_path_str)
-            existing_files = {f.name for f in get_log_files(local_log_path_str, self.config.input.file_pattern)}
-            logging.info(f"在本地缓存目录 '{local_log_path_str}' 找到 {len(existing_files)} 个日志文件。")
-
-            # 遍历目标任务全集，决定是从本地读还是从云端下载
-            for url in log_urls:
-                file_name = url.split('?')[0].split('/')[-1]
-                local_file = local_log_path / file_name
-
-                # 决定是否使用本地缓存
-                use_local_cache = api_config.skip_existing_logs and file_name in existing_files
-
-                if use_local_cache:
-                    # 如果使用本地缓存，直接从本地读取
-                    logging.info(f"--> 正在从本地缓存读取: {file_name}")
-                    yield from read_log_lines(local_file)
-                else:
-                    # 否则，从云端下载并处理
-                    logging.info(f"--> 正在从云端下载并处理: {file_name}")
-                    download_target_path = local_file if api_config.download_new_logs else None
-                    yield from client.download_and_stream_log_file(url, download_target_path)
+    @abstractmethod
+    def get_sources(self) -> list[LogSource]:
+        """列出所有待处理的日志文件"""
+        pass
+
+    def iter_ready_sources(self, sources: list[LogSource]) -> Iterator[LogSource]:
+        """按顺序产出日志源，可在此提前下载云端文件"""
+        yield from sources
+
+    def stream(self, source: LogSource) -> Iterator[list[bytes]]:
+        """按批产出云端文件的行 (bytes)"""
+        raise NotImplementedError(f"输入源 '{self.config.input.source_type}' 不支持读取云端文件: {source.name}")
+
+class LocalInputSource(BaseInputSource):
+    """input.path 目录下匹配 file_pattern 的本地日志文件"""
+    def get_sources(self) -> list[LogSource]:
+        logging.info(f"使用 'local' 模式从路径 '{self.config.input.path}' 读取日志。")
+        log_files = get_log_files(self.config.input.path, self.config.input.file_pattern)
+        if not log_files:
+            logging.warning(f"在 '{self.config.input.path}' 未找到匹配 '{self.config.input.file_pattern}' 的日志文件。")
+            return []
+        logging.info(f"找到 {len(log_files)} 个日志文件进行处理。")
+        return [LogSource(name=file.name, path=file) for file in log_files]
+
+class InputHandler:
+    def __init__(self, config: AppConfig, workers: int = 1):
+        self.config = config
+        # 按范围拆分只在多进程解析时使用，单进程时也不在读取时建立 gzip 检查点索引
+        self.splitter = RangeSplitter.from_config(config) if workers > 1 else None
+        self.filter = LogFilter.from_config(config)
+        self._source: BaseInputSource | None = None
+        if plugins.find_plugin('input_sources', config.input.source_type) is None:
+            logging.error(f"不支持的 source_type: '{config.input.source_type}'。"
+                          f"可用的输入源: {plugins.plugin_names('input_sources')}。")
+            return
+        source_class = plugins.load_plugin('input_sources', config.input.source_type)
+        if source_class is not None:
+            self._source = source_class(config)
+
+    def get_sources(self) -> list[LogSource]:
+        """根据配置的 source_type 列出所有待处理的日志文件"""
+        if self._source is None:
+            return []
+        sources = self._source.get_sources()
+        if self.filter is not None:
+            sources = self.filter.prune_sources(sources)
+        return sources
+
+    def iter_ready_sources(self, sources: list[LogSource]) -> Iterator[LogSource]:
+        """
+        按顺序产出日志源。API 模式下开启预取时，云端文件由后台线程提前下载，
+        产出时已替换为本地文件，解析当前文件的同时后续文件仍在下载。
+        """
+        if self._source is None:
+            return
+        yield from self._source.iter_ready_sources(sources)
 
+    def read_source(self, source: LogSource) -> Iterator[list[bytes]]:
+        """按批读取单个日志文件的行 (bytes)"""
+        if source.is_local:
+            if source.temporary:
+                logging.info(f"--> 正在处理已预取的文件: {source.name}")
+            elif self.config.input.source_type == 'api':
+                # 如果使用本地缓存，直接从本地读取
+                logging.info(f"--> 正在从本地缓存读取: {source.name}")
+            else:
+                logging.info(f"--> 正在读取: {source.name}")
+            yield from read_log_batches(source.path, None if source.temporary else self.splitter)
         else:
-            logging.error(f"不支持的 source_type: '{source_type}'。请选择 'local' 或 'api'。")
-            return
\ No newline at end of file
+            # 否则，从云端下载并处理
+            logging.info(f"--> 正在从云端下载并处理: {source.name}")
+            yield from metrics.track_file(source.name, self._source.stream(source))
+
+    def get_lines(self) -> Iterator[str]:
+        """根据配置的 source_type 获取所有日志行"""
+        for source in self.iter_ready_sources(self.get_sources()):
+            for batch in self.read_source(source):
+                for line in batch:
+                    yield line.decode('utf-8', errors='ignore')
+            if source.temporary:
+                source.path.unlink(missing_ok=True)
@@ -1,9 +1,16 @@
 import re
+import calendar
 import logging
-from typing import Optional
+import numpy as np
+import pandas as pd
+from typing import Callable, Iterable, Iterator, Optional
 from datetime import datetime
+from src import plugins
 from src.data_models import LogEntry
 from src.config import AppConfig
+from src.filters import LogFilter
+from src.log_schema import LOG_COLUMNS, NUMERIC_DTYPES, StringPool, empty_frame, encode_frame, parse_ip
+from src.metrics import metrics
 
 # 匹配提供的格式
 HUAWEI_CDN_PATTERN = re.compile(
@@ -23,14 +30,72 @@ HUAWEI_CDN_PATTERN = re.compile(
     r'\S+'      # source_ip 字段，暂时忽略
 )
 
+# 同一格式的字节版本，直接匹配未解码的日志行。只有保留的字段会被解码，
+# 数值字段直接由字节转换为整数，丢弃的 other/source_ip 字段从不解码。
+# 占有量词 (++) 之后的字符类与之互不相交，不改变匹配结果，只省去无用的回溯
+HUAWEI_CDN_BYTES_PATTERN = re.compile(
+    rb'\[(?P<time_str>.*?)\]\s++'
+    rb'(?P<client_ip>\S++)\s++'
+    rb'(?P<response_time_ms>\d++)\s++'
+    rb'"(?P<referer>.*?)"\s++'
+    rb'"(?P<protocol>.*?)"\s++'
+    rb'"(?P<method>.*?)"\s++'
+    rb'"(?P<domain>.*?)"\s++'
+    rb'"(?P<path>.*?)"\s++'
+    rb'(?P<status_code>\d++)\s++'
+    rb'(?P<response_size_bytes>\d++)\s++'
+    rb'(?P<cache_hit_status>\S++)\s++'
+    rb'"(?P<user_agent>.*?)"\s++'
+    rb'".*?"\s++'
+    rb'\S+'
+)
+
+# 批量解析输出结构的版本号，输出的列或类型变化时需要递增 (用于使解析缓存与保存的中间状态失效)
+# 版本 2: 紧凑表结构 (见 src/log_schema.py)
+PARSER_VERSION = 2
+
+# 华为 CDN 日志的默认时间格式 (例如 16/Nov/2025:10:00:07 +0800) 与去掉秒数后的格式
+DEFAULT_TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+_MINUTE_TIME_FORMAT = '%d/%b/%Y:%H:%M %z'
+
+# 状态码列 (uint16) 的上限，超出的数值按上限截断
+_STATUS_MAX = int(np.iinfo(NUMERIC_DTYPES['status_code']).max)
+
+# 记忆化缓存的上限，超出后清空，避免长时间运行时无限增长
+_MEMO_LIMIT = 1_000_000
+
+
+def to_datetime_column(epoch_seconds: pd.Series) -> pd.Series:
+    """将批量解析得到的 Unix 秒级时间戳列转换为 UTC 时区的 datetime 列"""
+    return pd.to_datetime(epoch_seconds, unit='s', utc=True)
+
+
 class LogParser:
     def __init__(self, config: AppConfig):
         self.config = config
-        # 未来可以根据 config.parser.format 选择不同的 pattern
+        # 其他日志格式可以继承 LogParser 并替换 pattern，再通过插件注册表按 parser.format 选择
         self.pattern = HUAWEI_CDN_PATTERN
+        self.bytes_pattern = HUAWEI_CDN_BYTES_PATTERN
         self.time_format = config.parser.time_format
+        self.chunk_size = config.parser.chunk_size
+        # 同一秒内的日志时间字符串完全相同，按秒记忆化解析结果
+        self._epoch_cache: dict[str | bytes, int] = {}
+        # 默认时间格式下按分钟记忆化: 一天的日志有约 86400 个不同的时间字符串，strptime 只需调用约 1440 次
+        self._minute_cache: dict[str | bytes, int] | None = {} if self.time_format == DEFAULT_TIME_FORMAT else None
+        # 客户端 IP 高度重复，记忆化校验与转换结果 (地址族, 高 64 位, 低 64 位)，非法 IP 记为 None
+        self._ip_cache: dict[str | bytes, tuple[int, int, int] | None] = {}
+        # 字符串字段的取值在整个运行中只解码一次
+        self._strings = StringPool(_MEMO_LIMIT)
+        # 过滤条件 (见 src/filters.py)，没有过滤条件时为 None
+        self.filter = LogFilter.from_config(config)
+        if self.filter is not None:
+            # 行首时间字符串是否在时间范围内
+            self._time_keep: dict[str | bytes, bool] = {}
+            self._prechecks = {binary: self._build_prechecks(binary) for binary in (True, False)}
+            self._row_checks = {binary: self._build_row_checks(binary) for binary in (True, False)}
 
     def parse_line(self, line: str) -> Optional[LogEntry]:
+        """逐行解析的参考实现，速度较慢，仅用于校验批量解析的结果"""
         match = self.pattern.match(line)
         if not match:
             return None
@@ -39,7 +104,7 @@ class LogParser:
         try:
             # 数据清洗和类型转换
             timestamp = datetime.strptime(data['time_str'], self.time_format)
-            
+
             return LogEntry(
                 timestamp=timestamp,
                 client_ip=data['client_ip'],
@@ -56,4 +121,321 @@ class LogParser:
             )
         except (ValueError, KeyError) as e:
             logging.warning(f"解析日志行失败: {line.strip()}. 错误: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def _to_epoch(self, time_str: str | bytes) -> int:
+        epoch = self._epoch_cache.get(time_str)
+        if epoch is None:
+            epoch = self._epoch_by_minute(time_str) if self._minute_cache is not None else None
+            if epoch is None:
+                text = time_str.decode('utf-8', errors='ignore') if isinstance(time_str, bytes) else time_str
+                dt = datetime.strptime(text, self.time_format)
+                # 不含时区信息的时间按 UTC 处理，与 pd.to_datetime(..., utc=True) 的行为一致
+                epoch = int(dt.timestamp()) if dt.tzinfo else calendar.timegm(dt.timetuple())
+            if len(self._epoch_cache) >= _MEMO_LIMIT:
+                self._epoch_cache.clear()
+            self._epoch_cache[time_str] = epoch
+        return epoch
+
+    def _epoch_by_minute(self, time_str: str | bytes) -> int | None:
+        """
+        默认时间格式下，同一分钟内的时间字符串只有秒数不同: 每分钟只解析一次，再加上秒数。
+        字符串不是 "dd/Mon/YYYY:HH:MM:SS +zzzz" 的定长形式时返回 None，由 strptime 按完整格式解析。
+        """
+        seconds = time_str[18:20]
+        if len(time_str) != 26 or time_str[17:18] not in (':', b':') or not seconds.isdigit() or int(seconds) > 59:
+            return None
+        key = time_str[:17] + time_str[20:]
+        base = self._minute_cache.get(key)
+        if base is None:
+            text = key.decode('utf-8', errors='ignore') if isinstance(key, bytes) else key
+            base = int(datetime.strptime(text, _MINUTE_TIME_FORMAT).timestamp())
+            if len(self._minute_cache) >= _MEMO_LIMIT:
+                self._minute_cache.clear()
+            self._minute_cache[key] = base
+        return base + int(seconds)
+
+    def _parse_ip(self, ip_str: str | bytes) -> tuple[int, int, int] | None:
+        try:
+            return self._ip_cache[ip_str]
+        except KeyError:
+            pass
+        # ip_address 会把 bytes 当作打包的二进制地址，需先解码
+        text = ip_str.decode('utf-8', errors='ignore') if isinstance(ip_str, bytes) else ip_str
+        parsed = parse_ip(text)
+        if len(self._ip_cache) >= _MEMO_LIMIT:
+            self._ip_cache.clear()
+        self._ip_cache[ip_str] = parsed
+        return parsed
+
+    def parse_batch(self, lines: Iterable[str]) -> pd.DataFrame:
+        """
+        批量解析一组日志行，直接生成带类型的列 (不构造 LogEntry 对象)。
+        结果与逐条调用 parse_line 一致，但 timestamp 为 int64 的 Unix 秒级时间戳。
+        """
+        if self.filter is not None:
+            lines = self._prefilter(list(lines), binary=False)
+        match = self.pattern.match
+        rows = []
+        total = 0
+        with metrics.timer('parse.regex'):
+            for line in lines:
+                total += 1
+                m = match(line)
+                if m:
+                    rows.append(m.groups())
+        metrics.incr('lines.rejected.format', total - len(rows))
+        if self.filter is not None:
+            rows = self._select_rows(rows, binary=False)
+        return self._rows_to_frame(rows, decode=False)
+
+    def parse_batch_bytes(self, lines: Iterable[bytes]) -> pd.DataFrame:
+        """
+        批量解析一组未解码的日志行 (bytes，可不含换行符)，结果与对解码后的行调用 parse_batch 一致。
+        跳过整行的 UTF-8 解码，只解码保留的字符串字段，时间与 IP 只在记忆化缓存未命中时解码。
+        """
+        if self.filter is not None:
+            lines = self._prefilter(list(lines), binary=True)
+        match = self.bytes_pattern.match
+        rows = []
+        total = 0
+        with metrics.timer('parse.regex'):
+            for line in lines:
+                total += 1
+                m = match(line)
+                if m:
+                    rows.append(m.groups())
+        # 不符合日志格式的行
+        metrics.incr('lines.rejected.format', total - len(rows))
+        if self.filter is not None:
+            rows = self._select_rows(rows, binary=True)
+        return self._rows_to_frame(rows, decode=True)
+
+    def _build_prechecks(self, binary: bool) -> list[tuple[str, Callable[[list], list]]]:
+        """
+        正则匹配之前的预检 (条件名, 按条件筛选一批行的函数)，依赖华为 CDN 日志的行结构: 行首为 [时间]，
+        域名与路径是带引号的字段，状态码紧跟在路径字段的引号之后。
+        每个预检都是匹配成功且满足条件的必要条件，不满足的行一定会被精确判断排除，因此预检只会多保留不会误删。
+        其他格式的解析器继承 LogParser 时应按各自的行结构重写此方法 (返回空列表即不做预检)。
+        """
+        f = self.filter
+        text = (lambda value: value.encode('utf-8')) if binary else (lambda value: value)
+        checks = []
+
+        def _contains_any(needles: list) -> Callable[[list], list]:
+            if len(needles) == 1:
+                needle = needles[0]
+                return lambda lines: [line for line in lines if needle in line]
+            return lambda lines: [line for line in lines if any(needle in line for needle in needles)]
+
+        if f.since is not None or f.until is not None:
+            keep_time = self._line_time_checker(binary)
+            checks.append(('time', lambda lines: [line for line in lines if keep_time(line)]))
+        if f.domains:
+            checks.append(('domain', _contains_any([text(f'"{domain}"') for domain in sorted(f.domains)])))
+        if f.path_prefixes:
+            checks.append(('path', _contains_any([text(f'"{prefix}') for prefix in f.path_prefixes])))
+        # 只有全部网段都是前缀长度不小于 8 的 IPv4 网段时，才能用点分十进制的前缀做子串检查
+        # (IPv6 地址的文本形式不唯一，不做预检)
+        if f.networks and all(net.version == 4 and net.prefixlen >= 8 for net in f.networks):
+            needles = []
+            for net in f.networks:
+                octets = str(net.network_address).split('.')[:net.prefixlen // 8]
+                needles.append(text('.'.join(octets) + ('' if net.prefixlen == 32 else '.')))
+            checks.append(('ip', _contains_any(needles)))
+        # 超出取值范围的状态码截断为上限，任意位数的数字都可能满足包含上限的条件，此时不做预检
+        if f.statuses and all(high < _STATUS_MAX for low, high in f.statuses):
+            # 状态码的首位数字
+            digits = ''.join(sorted({str(code)[0] for low, high in f.statuses
+                                     for code in range(low, min(high, low + 999) + 1)}))
+            status_search = re.compile(text(rf'"\s+[{digits}]\d*\s')).search
+            checks.append(('status', lambda lines: [line for line in lines if status_search(line)]))
+        return checks
+
+    def _line_time_checker(self, binary: bool) -> Callable[[str | bytes], bool]:
+        """按行首 [时间] 判断是否在时间范围内，时间无法识别的行保留 (之后由正则匹配或时间解析记为无效行)"""
+        opening, closing = (b'[', b']') if binary else ('[', ']')
+        cache = self._time_keep
+        match_time = self.filter.match_time
+
+        def keep_time(line) -> bool:
+            end = line.find(closing)
+            if end < 0 or line[:1] != opening:
+                return True
+            time_str = line[1:end]
+            keep = cache.get(time_str)
+            if keep is None:
+                try:
+                    keep = match_time(self._to_epoch(time_str))
+                except ValueError:
+                    keep = True
+                if len(cache) >= _MEMO_LIMIT:
+                    cache.clear()
+                cache[time_str] = keep
+            return keep
+        return keep_time
+
+    def _build_row_checks(self, binary: bool) -> list[Callable[[tuple], bool]]:
+        """正则匹配之后对各字段的精确判断 (时间已在预检中精确判断)"""
+        f = self.filter
+        text = (lambda value: value.encode('utf-8')) if binary else (lambda value: value)
+        checks = []
+        if f.domains:
+            domains = {text(domain) for domain in f.domains}
+            checks.append(lambda row: row[6] in domains)
+        if f.path_prefixes:
+            prefixes = tuple(text(prefix) for prefix in f.path_prefixes)
+            checks.append(lambda row: row[7].startswith(prefixes))
+        if f.statuses:
+            # 与构造数据块时一样先按上限截断
+            checks.append(lambda row: f.match_status(min(int(row[8]), _STATUS_MAX)))
+        if f.networks:
+            checks.append(lambda row: f.match_ip(self._parse_ip(row[1])))
+        return checks
+
+    def _prefilter(self, lines: list, binary: bool) -> list:
+        """正则匹配之前按过滤条件预检一批行，按条件记录丢弃的行数"""
+        with metrics.timer('parse.prefilter'):
+            for name, check in self._prechecks[binary]:
+                kept = check(lines)
+                if len(kept) < len(lines):
+                    metrics.incr(f'filter.precheck.{name}', len(lines) - len(kept))
+                lines = kept
+        return lines
+
+    def _select_rows(self, rows: list[tuple], binary: bool) -> list[tuple]:
+        """只保留满足全部过滤条件的匹配结果，之后只为这些行构造数据块"""
+        total = len(rows)
+        for check in self._row_checks[binary]:
+            rows = [row for row in rows if check(row)]
+        if len(rows) < total:
+            metrics.incr('filter.exact', total - len(rows))
+        return rows
+
+    def _rows_to_frame(self, rows: list[tuple], decode: bool) -> pd.DataFrame:
+        """由正则匹配的分组构造数据块，decode 为 True 时分组为 bytes"""
+        with metrics.timer('parse.dataframe'):
+            chunk = self._build_frame(rows, decode)
+        metrics.incr('lines.parsed', len(chunk))
+        return chunk
+
+    def _build_frame(self, rows: list[tuple], decode: bool) -> pd.DataFrame:
+        """构造紧凑表结构的数据块 (见 src/log_schema.py)"""
+        if not rows:
+            return empty_frame()
+
+        (time_strs, client_ips, response_times, referers, protocols, methods,
+         domains, paths, status_codes, sizes, cache_statuses, user_agents) = zip(*rows)
+
+        # 时间与 IP 高度重复，每个不同的取值只转换一次，再按行映射
+        epoch_of, time_errors = {}, {}
+        for time_str in set(time_strs):
+            try:
+                epoch_of[time_str] = self._to_epoch(time_str)
+            except ValueError as e:
+                time_errors[time_str] = e
+        ip_codes, ip_uniques = pd.factorize(np.array(client_ips, dtype=object))
+        parsed_ips = [self._parse_ip(ip_str) for ip_str in ip_uniques]
+        epochs = np.array([epoch_of.get(time_str, 0) for time_str in time_strs], dtype=np.int64)
+
+        valid = np.ones(len(rows), dtype=bool)
+        if time_errors or None in parsed_ips:
+            for i, (time_str, ip_str, code) in enumerate(zip(time_strs, client_ips, ip_codes.tolist())):
+                if time_str in time_errors:
+                    valid[i] = False
+                    metrics.incr('lines.rejected.time')
+                    text = time_str.decode('utf-8', errors='ignore') if decode else time_str
+                    logging.warning(f"解析日志行失败: 时间 '{text}' 无效. 错误: {time_errors[time_str]}")
+                elif parsed_ips[code] is None:
+                    valid[i] = False
+                    metrics.incr('lines.rejected.ip')
+                    text = ip_str.decode('utf-8', errors='ignore') if decode else ip_str
+                    logging.warning(f"解析日志行失败: 客户端 IP '{text}' 无效。")
+            parsed_ips = [ip or (0, 0, 0) for ip in parsed_ips]
+        family, hi, lo = (np.array(part, dtype=NUMERIC_DTYPES[column])[ip_codes]
+                          for part, column in zip(zip(*parsed_ips), ('ip_family', 'ip_hi', 'ip_lo')))
+
+        encode = self._strings.encode
+        chunk = pd.DataFrame({
+            'timestamp': epochs,
+            'ip_family': family,
+            'ip_hi': hi,
+            'ip_lo': lo,
+            # 超出取值范围的数值按上限截断
+            'response_time_ms': np.minimum(np.array(response_times).astype(np.int64), np.iinfo(np.uint32).max
+                                           ).astype(np.uint32),
+            'status_code': np.minimum(np.array(status_codes).astype(np.int64), np.iinfo(np.uint16).max
+                                      ).astype(np.uint16),
+            'response_size_bytes': np.array(sizes).astype(np.int64),
+            'method': encode(methods),
+            'domain': encode(domains),
+            'path': encode(paths),
+            'protocol': encode(protocols),
+            'user_agent': encode(user_agents),
+            'referer': encode(referers, null='-'),
+            'cache_hit_status': encode(cache_statuses),
+        })
+        if not valid.all():
+            chunk = chunk[valid].reset_index(drop=True)
+        return chunk
+
+    def parse_chunks(self, lines: Iterable[str], chunk_size: int | None = None) -> Iterator[pd.DataFrame]:
+        """按 chunk_size 行一批地解析日志行，逐批产出列式数据块"""
+        chunk_size = chunk_size or self.chunk_size
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= chunk_size:
+                chunk = self.parse_batch(batch)
+                batch = []
+                if not chunk.empty:
+                    yield chunk
+        if batch:
+            chunk = self.parse_batch(batch)
+            if not chunk.empty:
+                yield chunk
+
+    def parse_line_batches(self, batches: Iterable[list[bytes]], chunk_size: int | None = None) -> Iterator[pd.DataFrame]:
+        """
+        解析 read_log_batches 产出的字节行批次，重新按 chunk_size 行分块，
+        数据块的划分与对同样的行调用 parse_chunks 一致。
+        """
+        chunk_size = chunk_size or self.chunk_size
+        pending: list[bytes] = []
+        for batch in batches:
+            pending.extend(batch)
+            while len(pending) >= chunk_size:
+                chunk = self.parse_batch_bytes(pending[:chunk_size])
+                del pending[:chunk_size]
+                if not chunk.empty:
+                    yield chunk
+        if pending:
+            chunk = self.parse_batch_bytes(pending)
+            if not chunk.empty:
+                yield chunk
+
+    def parse_batch_reference(self, lines: Iterable[str]) -> pd.DataFrame:
+        """使用 parse_line 构造与 parse_batch 相同结构 (紧凑表) 的数据块，用于校验快速路径"""
+        entries = []
+        for line in lines:
+            entry = self.parse_line(line)
+            if entry:
+                row = entry.model_dump()
+                ts = row['timestamp']
+                row['timestamp'] = int(ts.timestamp()) if ts.tzinfo else calendar.timegm(ts.timetuple())
+                row['client_ip'] = str(row['client_ip'])
+                entries.append(row)
+        if not entries:
+            return empty_frame()
+        return encode_frame(pd.DataFrame(entries)[LOG_COLUMNS])
+
+
+def create_parser(config: AppConfig) -> LogParser:
+    """按 parser.format 从插件注册表创建解析器，未知的格式记录警告后使用内置的华为 CDN 格式"""
+    parser_class = None
+    if plugins.find_plugin('parsers', config.parser.format) is not None:
+        parser_class = plugins.load_plugin('parsers', config.parser.format)
+    if parser_class is None:
+        logging.warning(f"解析格式 '{config.parser.format}' 不可用，使用默认的 huawei_cdn 格式。")
+        parser_class = LogParser
+    return parser_class(config)
@@ -0,0 +1,276 @@
+"""
+解析结果数据块的紧凑表结构，解析器、解析缓存与各分析器共用。
+
+- timestamp: int64，UTC 的 Unix 秒级时间戳 (只在报告中转换到展示时区)
+- ip_family / ip_hi / ip_lo: 客户端 IP 的地址族 (4 或 6) 与 128 位地址的高、低 64 位 (IPv4 只使用 ip_lo)
+- response_time_ms: uint32，status_code: uint16，response_size_bytes: int64
+- STRING_COLUMNS: 字典编码的 category 列，每个数据块的字典只包含块内出现的取值，referer 为 '-' 时记为缺失值
+
+与逐行保存字符串相比每行占用的内存约为五分之一，分组统计直接按整数编码进行而不必哈希字符串。
+分析器通过 dimension_keys / key_counts / group_sums / pair_counts 按编码分组，得到以字符串为键的结果
+(聚合状态与数据块的字典无关)，decode_frame 把数据块还原为字符串列的表 (报告中的原始日志样本)，encode_frame 则相反。
+"""
+import ipaddress
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# 地址族
+IPV4, IPV6 = 4, 6
+IP_COLUMNS = ['ip_family', 'ip_hi', 'ip_lo']
+STRING_COLUMNS = ['method', 'domain', 'path', 'protocol', 'user_agent', 'referer', 'cache_hit_status']
+NUMERIC_DTYPES = {
+    'timestamp': np.int64,
+    'ip_family': np.uint8,
+    'ip_hi': np.uint64,
+    'ip_lo': np.uint64,
+    'response_time_ms': np.uint32,
+    'status_code': np.uint16,
+    'response_size_bytes': np.int64,
+}
+# 紧凑数据块的列顺序
+COMPACT_COLUMNS = list(NUMERIC_DTYPES) + STRING_COLUMNS
+
+# 还原为字符串列后的列顺序，与 LogEntry 的字段保持一致
+LOG_COLUMNS = [
+    'timestamp', 'client_ip', 'response_time_ms', 'status_code', 'response_size_bytes',
+    'method', 'domain', 'path', 'protocol', 'user_agent', 'referer', 'cache_hit_status',
+]
+
+# 128 位地址中低 64 位的掩码
+_LOW_MASK = (1 << 64) - 1
+# float64 能精确表示的整数上限
+_FLOAT_EXACT = 2 ** 53
+
+# IPv6 地址的格式化较慢，同一地址在各数据块中反复出现，记忆化格式化结果 (超过上限后清空)
+_IPV6_CACHE_LIMIT = 100_000
+_ipv6_texts: dict[int, str] = {}
+
+
+class StringPool:
+    """
+    解析器的字符串池: 每个不同的原始取值 (bytes 或 str) 在整个运行中只解码一次，
+    各数据块字典中的同一取值共用一个 str 对象。条目数超过上限后清空，避免长时间运行时无限增长。
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._strings: dict[bytes | str, str] = {}
+
+    def encode(self, values: tuple, null: str | None = None) -> pd.Categorical:
+        """把一列原始取值编码为 category 列 (字典只包含本块出现的取值)，None 与等于 null 的取值记为缺失值"""
+        raw_values = np.empty(len(values), dtype=object)
+        raw_values[:] = values
+        # 按原始取值 (未解码的 bytes) 编码，None 的编码为 -1
+        codes, uniques = pd.factorize(raw_values)
+        strings = self._strings
+        if len(strings) + len(uniques) > self.limit:
+            strings.clear()
+        texts = []
+        for raw in uniques:
+            text = strings.get(raw)
+            if text is None:
+                text = raw.decode('utf-8', errors='ignore') if isinstance(raw, bytes) else raw
+                strings[raw] = text
+            texts.append(text)
+        return _categorical(codes, texts, null)
+
+
+def _categorical(codes: np.ndarray, texts: list[str], null: str | None = None) -> pd.Categorical:
+    # 不同的字节解码后可能得到相同的字符串 (无效的 UTF-8 字节被忽略)，按字符串再去重一次
+    position: dict[str, int] = {}
+    # 末尾追加的 -1 使编码 -1 (缺失值) 映射后仍为 -1
+    remap = np.array([-1 if text is None or text == null else position.setdefault(text, len(position))
+                      for text in texts] + [-1], dtype=np.int32)
+    if len(codes):
+        codes = remap[codes]
+    return _release_engine(pd.Categorical.from_codes(codes, categories=pd.Index(list(position), dtype='str')))
+
+
+def _release_engine(values: pd.Categorical) -> pd.Categorical:
+    # 校验取值唯一时为字典建立的哈希表比字典本身还大，数据块中用不到 (分组按编码进行)，构造后即释放。
+    # Index._cache 是 pandas 的私有属性 (pandas 2.x 与 3.0 中为 cache_readonly 的缓存字典)，
+    # 以后的版本中不存在或类型不同时跳过，只是少释放一部分内存，不影响结果
+    cache = getattr(values.categories, '_cache', None)
+    if isinstance(cache, dict):
+        cache.pop('_engine', None)
+    return values
+
+
+def trim_categories(keys: pd.Series) -> pd.Series:
+    """去掉 category 列字典中未出现的取值 (例如从整张 Arrow 表切出的数据块)"""
+    trimmed = keys.cat.remove_unused_categories()
+    _release_engine(trimmed.array)
+    return trimmed
+
+
+def parse_ip(text: str) -> tuple[int, int, int] | None:
+    """IP 字符串转换为 (地址族, 高 64 位, 低 64 位)，非法的 IP 返回 None"""
+    try:
+        ip = ipaddress.ip_address(text)
+    except ValueError:
+        return None
+    value = int(ip)
+    return ip.version, value >> 64, value & _LOW_MASK
+
+
+def format_ips(family: np.ndarray, hi: np.ndarray, lo: np.ndarray) -> pd.Index:
+    """数值地址还原为规范的 IP 字符串 (与 str(ipaddress.ip_address(...)) 一致)"""
+    v4 = family == IPV4
+    # IPv4 地址由 pyarrow 向量化地拼接四段十进制数，IPv6 地址 (通常很少) 逐个格式化
+    octets = [pc.cast(pa.array(((lo >> shift) & 255).astype(np.uint8)), pa.string()) for shift in (24, 16, 8, 0)]
+    texts = pc.binary_join_element_wise(*octets, '.')
+    if not v4.all():
+        v6 = [None] * len(family)
+        if len(_ipv6_texts) > _IPV6_CACHE_LIMIT:
+            _ipv6_texts.clear()
+        for i in np.flatnonzero(~v4).tolist():
+            value = (int(hi[i]) << 64) | int(lo[i])
+            text = _ipv6_texts.get(value)
+            if text is None:
+                text = _ipv6_texts[value] = str(ipaddress.IPv6Address(value))
+            v6[i] = text
+        texts = pc.if_else(pa.array(v4), texts, pa.array(v6, type=pa.string()))
+    return pd.Index(pd.array(texts, dtype='str'))
+
+
+def ip_keys(chunk: pd.DataFrame) -> pd.Series:
+    """客户端 IP 的 category 列: 按数值地址分组编码，只有块内不同的地址才转换为字符串"""
+    family = chunk['ip_family'].to_numpy()
+    hi = chunk['ip_hi'].to_numpy()
+    lo = chunk['ip_lo'].to_numpy()
+    if not len(family):
+        return pd.Series(pd.Categorical([], categories=pd.Index([], dtype='str')), index=chunk.index, name='client_ip')
+    keys, v6 = lo, family == IPV6
+    if v6.any():
+        # IPv6 地址 (通常只占少数行) 先在其所在行内按 (高, 低) 64 位编码，
+        # 编码加上 2^32 后与 IPv4 地址 (小于 2^32) 放在同一列，再对整列统一编码一次
+        lo_codes, lo_uniques = pd.factorize(lo[v6])
+        hi_codes, _ = pd.factorize(hi[v6])
+        v6_codes, _ = pd.factorize(hi_codes.astype(np.int64) * len(lo_uniques) + lo_codes)
+        keys = lo.copy()
+        keys[v6] = v6_codes.astype(np.uint64) + np.uint64(1 << 32)
+    codes, _ = pd.factorize(keys)
+    # 每个编码第一次出现的行
+    first = np.empty(codes.max() + 1, dtype=np.int64)
+    first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+    categories = format_ips(family[first], hi[first], lo[first])
+    return pd.Series(_release_engine(pd.Categorical.from_codes(codes, categories=categories)),
+                     index=chunk.index, name='client_ip')
+
+
+def dimension_keys(chunk: pd.DataFrame, dim: str, fill: str | None = None) -> pd.Series:
+    """分组用的键列 (category)，fill 非空时缺失值替换为 fill"""
+    keys = ip_keys(chunk) if dim == 'client_ip' else chunk[dim]
+    if fill is not None and keys.hasnans:
+        if fill not in keys.cat.categories:
+            keys = keys.cat.add_categories([fill])
+        keys = keys.fillna(fill)
+    return keys.rename(dim)
+
+
+def key_counts(keys: pd.Series) -> pd.Series:
+    """
+    category 键列中各取值的计数 (不含缺失值与未出现的取值)，按编码直接计数。
+    结果与对字符串列调用 value_counts() 相同: 以字符串为索引，按计数降序排列，计数相同的按首次出现的顺序。
+    """
+    codes = keys.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(keys.cat.categories))
+    observed = np.flatnonzero(counts)
+    index = pd.Index(keys.cat.categories[observed], name=keys.name)
+    return pd.Series(counts[observed], index=index, name='count').sort_values(ascending=False, kind='stable')
+
+
+def group_sums(values: pd.DataFrame, keys: pd.Series) -> pd.DataFrame:
+    """
+    整数列按 category 键列分组求和 (不含缺失值)，以字符串为索引，行按字典顺序 (解析器产出的数据块中即首次出现的顺序)。
+    按编码直接 bincount，比 groupby 少一次哈希分组。
+    """
+    codes = keys.cat.codes.to_numpy()
+    data = values.to_numpy(dtype=np.int64)
+    if keys.hasnans:
+        valid = codes >= 0
+        codes, data = codes[valid], data[valid]
+    size = len(keys.cat.categories)
+    # bincount 以 float64 累加，总和不超过 2^53 时结果精确，否则退回 groupby
+    if len(data) and np.abs(data).sum(axis=0).max() >= _FLOAT_EXACT:
+        sums = pd.DataFrame(data, columns=values.columns).groupby(codes, sort=True).sum()
+        observed, totals = sums.index.to_numpy(), sums.to_numpy()
+    else:
+        observed = np.flatnonzero(np.bincount(codes, minlength=size))
+        totals = np.column_stack([np.bincount(codes, weights=data[:, i], minlength=size)[observed]
+                                  for i in range(data.shape[1])]).astype(np.int64)
+    index = pd.Index(keys.cat.categories[observed], name=keys.name)
+    return pd.DataFrame(totals.reshape(len(observed), data.shape[1]), index=index, columns=values.columns)
+
+
+def pair_counts(keys: pd.Series, values: np.ndarray, size: int, name: str) -> pd.Series:
+    """
+    (键, 取值) 组合的计数，键为 category 列 (不含缺失值)，values 为 [0, size) 内的整数 (例如延迟分桶)。
+    两者合并为一个 int64 后计数，结果为 (字符串键, 取值) 的多级索引，名称为 count。
+    """
+    codes = keys.cat.codes.to_numpy().astype(np.int64)
+    combined = codes * size + values
+    if keys.hasnans:
+        combined = combined[codes >= 0]
+    counts = pd.Series(combined).value_counts(sort=False)
+    pairs = counts.index.to_numpy()
+    index = pd.MultiIndex.from_arrays([keys.cat.categories[pairs // size], pairs % size], names=[keys.name, name])
+    return pd.Series(counts.to_numpy(), index=index, name='count')
+
+
+def physical_columns(columns: list[str]) -> list[str]:
+    """逻辑列名 (client_ip 等) 对应的紧凑表中的列"""
+    physical = []
+    for column in columns:
+        physical.extend(IP_COLUMNS if column == 'client_ip' else [column])
+    return list(dict.fromkeys(physical))
+
+
+def empty_frame() -> pd.DataFrame:
+    """没有任何行的紧凑数据块"""
+    frame = {column: np.array([], dtype=dtype) for column, dtype in NUMERIC_DTYPES.items()}
+    for column in STRING_COLUMNS:
+        frame[column] = pd.Categorical([], categories=pd.Index([], dtype='str'))
+    return pd.DataFrame(frame)
+
+
+def decode_frame(chunk: pd.DataFrame) -> pd.DataFrame:
+    """紧凑数据块还原为字符串列的表 (列顺序为 LOG_COLUMNS，数值列为 int64)"""
+    plain = {}
+    for column in LOG_COLUMNS:
+        if column == 'client_ip':
+            plain[column] = ip_keys(chunk).astype('str')
+        elif column in STRING_COLUMNS:
+            plain[column] = chunk[column].astype('str')
+        else:
+            plain[column] = chunk[column].astype(np.int64)
+    return pd.DataFrame(plain, index=chunk.index)
+
+
+def encode_frame(plain: pd.DataFrame) -> pd.DataFrame:
+    """字符串列的表 (LOG_COLUMNS) 编码为紧凑数据块，非法的 IP 所在的行被丢弃"""
+    pool = StringPool(limit=len(plain) * len(STRING_COLUMNS) + 1)
+    ip_of = {text: parse_ip(str(text)) for text in plain['client_ip'].unique()}
+    ips = [ip_of[text] for text in plain['client_ip']]
+    valid = np.array([ip is not None for ip in ips], dtype=bool)
+    parsed = [ip for ip in ips if ip is not None]
+    frame = {
+        'timestamp': plain['timestamp'].to_numpy(dtype=np.int64)[valid],
+        'ip_family': np.array([ip[0] for ip in parsed], dtype=np.uint8),
+        'ip_hi': np.array([ip[1] for ip in parsed], dtype=np.uint64),
+        'ip_lo': np.array([ip[2] for ip in parsed], dtype=np.uint64),
+    }
+    for column in ('response_time_ms', 'status_code', 'response_size_bytes'):
+        values = plain[column].to_numpy(dtype=np.int64)[valid]
+        dtype = NUMERIC_DTYPES[column]
+        if np.issubdtype(dtype, np.unsignedinteger):
+            # 超出取值范围的数值按上限截断 (与解析器一致)
+            values = np.minimum(values, np.iinfo(dtype).max)
+        frame[column] = values.astype(dtype)
+    for column in STRING_COLUMNS:
+        values = plain[column].to_numpy(dtype=object)[valid]
+        frame[column] = pool.encode(tuple(None if pd.isna(v) else v for v in values),
+                                    null='-' if column == 'referer' else None)
+    return pd.DataFrame(frame)
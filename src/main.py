@@ -1,74 +1,371 @@
 import click
 import logging
-import pandas as pd
-from tqdm import tqdm
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-from src.config import load_config
-from src.input_handler import InputHandler
-from src.log_parser import LogParser
-from src.analysis_engine import AnalysisEngine
-from src.reporters.cli_reporter import CliReporter
-from src.reporters.excel_reporter import ExcelReporter
+from src import plugins
+from src.metrics import metrics
+
+# pandas、各 SDK、分析器与报告器只在实际运行分析时导入 (见 run_analysis 与插件注册表)，
+# --help、--list-plugins 与 --check-config 不需要加载它们
+if TYPE_CHECKING:
+    from src.config import AppConfig
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-@click.command()
+def generate_reports(analysis_results: dict, config: 'AppConfig') -> None:
+    """根据配置生成报告 (报告器从插件注册表按名称加载)"""
+    enabled_reporters = config.output.reporters
+    logging.info(f"将要生成的报告类型: {enabled_reporters}")
+
+    for reporter_name in enabled_reporters:
+        if plugins.find_plugin('reporters', reporter_name) is None:
+            logging.warning(f"配置了未知的报告器 '{reporter_name}'，已跳过。")
+            continue
+        reporter_class = plugins.load_plugin('reporters', reporter_name)
+        if reporter_class:
+            reporter = reporter_class(analysis_results, config)
+            with metrics.timer(f'reporter.{reporter_name}'):
+                reporter.generate()
+        else:
+            logging.warning(f"报告器 '{reporter_name}' 无法加载，已跳过。")
+
+def run_analysis(config: 'AppConfig', workers: int | None, incremental: bool, follow: bool, rollup: bool,
+                 since: str | None, until: str | None) -> None:
+    """按命令行选择的模式 (全量 / 增量 / 持续跟踪 / 汇总存储) 运行分析并生成报告"""
+    if incremental or follow:
+        if config.input.source_type != 'local':
+            logging.error("增量处理 (--incremental / --follow) 仅支持 'local' 模式。")
+            exit(1)
+        # 仅在增量模式下才需要
+        from src.incremental import IncrementalRunner
+        runner = IncrementalRunner(config)
+        try:
+            if follow:
+                # 持续运行时报告写入固定的文件名，每次刷新覆盖
+                config.output.report_name = config.output.report_name or config.input.incremental.report_name
+                runner.follow(lambda results: generate_reports(results, config))
+            else:
+                runner.run_once(lambda results: generate_reports(results, config))
+        finally:
+            runner.close()
+        return
+
+    if rollup:
+        if config.input.source_type != 'local':
+            logging.error("汇总存储 (--rollup) 仅支持 'local' 模式。")
+            exit(1)
+        # 仅在汇总模式下才需要
+        from src.filters import parse_time_bound
+        from src.rollup_store import RollupRunner
+        RollupRunner(config, workers).run(
+            lambda results: generate_reports(results, config),
+            since=parse_time_bound(since) if since else None,
+            until=parse_time_bound(until, end=True) if until else None,
+        )
+        return
+
+    from src.analysis_engine import AnalysisEngine
+    from src.ingestion import iter_parsed_chunks
+
+    # 数据输入和解析
+    # 运行分析引擎，解析出的数据块直接流入各分析器，不在内存中保留全部日志
+    with AnalysisEngine(config) as engine:
+        analysis_results = engine.run_chunks(iter_parsed_chunks(config, workers))
+
+    if engine.rows_processed == 0:
+        logging.warning("未找到任何有效的日志条目，程序即将退出。")
+        return
+    logging.info(f"成功解析并分析 {engine.rows_processed} 条日志。")
+
+    generate_reports(analysis_results, config)
+    logging.info("所有报告生成完毕，程序正常结束。")
+
+def apply_filter_options(config: 'AppConfig', domains: tuple[str, ...], statuses: tuple[str, ...],
+                         path_prefixes: tuple[str, ...], ips: tuple[str, ...], since: str | None, until: str | None,
+                         rollup: bool) -> bool:
+    """
+    用命令行的过滤条件覆盖配置中的 filters (--domain、--status、--ip 可重复指定，也可用逗号分隔多个取值)，
+    --rollup 模式下 --since/--until 是报告的时间范围，不作为过滤条件。返回过滤条件是否有效。
+    """
+    from src.filters import LogFilter
+
+    def _split(values: tuple[str, ...]) -> list[str]:
+        return [item.strip() for value in values for item in value.split(',') if item.strip()]
+
+    filters = config.filters
+    if domains:
+        filters.domains = _split(domains)
+    if statuses:
+        filters.statuses = _split(statuses)
+    if path_prefixes:
+        filters.path_prefixes = list(path_prefixes)
+    if ips:
+        filters.ips = _split(ips)
+    if not rollup:
+        filters.since = since or filters.since
+        filters.until = until or filters.until
+    try:
+        log_filter = LogFilter.from_config(config)
+    except ValueError as e:
+        logging.error(f"过滤条件无效: {e}")
+        return False
+    if log_filter is not None:
+        logging.info(f"只分析满足过滤条件的日志: {log_filter.describe()}")
+    return True
+
+def write_metrics(config: 'AppConfig', report_stem: str) -> None:
+    """写出本次运行的流水线指标 (JSON，以及可选的 Prometheus textfile)"""
+    metrics_config = config.output.metrics
+    json_path = Path(metrics_config.path) if metrics_config.path else \
+        Path(config.output.report_path) / f"{report_stem}_metrics.json"
+    try:
+        metrics.write_json(json_path)
+        logging.info(f"运行指标已写入: {json_path}")
+        if metrics_config.prometheus_textfile:
+            metrics.write_prometheus(Path(metrics_config.prometheus_textfile))
+            logging.info(f"Prometheus 指标已写入: {metrics_config.prometheus_textfile}")
+    except OSError as e:
+        logging.warning(f"写出运行指标失败: {e}")
+
+def list_available_plugins() -> None:
+    """列出所有已注册的插件 (内置与通过 entry points 安装的第三方插件)"""
+    for group in plugins.BUILTIN_PLUGINS:
+        click.echo(f"{group}:")
+        for spec in plugins.list_plugins(group):
+            click.echo(f"  {spec.name:<14} {spec.target}  [{spec.origin}]")
+
+def check_config(config_file: str) -> bool:
+    """校验配置文件并检查启用的插件都已注册且模块存在 (不导入插件模块)，返回是否通过"""
+    from pydantic import ValidationError
+    from src.config import load_config
+
+    try:
+        config = load_config(config_file)
+    except (ValidationError, OSError, ValueError, KeyError, TypeError) as e:
+        click.echo(f"❌ 配置文件无效: {config_file}\n{e}")
+        return False
+    ok = True
+    for group, name in plugins.enabled_plugins(config):
+        spec = plugins.find_plugin(group, name)
+        if spec is None:
+            click.echo(f"❌ {group}: 未注册的插件 '{name}'，可用: {plugins.plugin_names(group)}")
+            ok = False
+        elif not plugins.is_importable(spec):
+            click.echo(f"❌ {group}: 插件 '{name}' 的模块 {spec.module} 不存在")
+            ok = False
+        else:
+            click.echo(f"✅ {group}: {name} ({spec.target})")
+    click.echo(f"{'✅ 配置检查通过' if ok else '❌ 配置检查未通过'}: {config_file}")
+    return ok
+
+def filter_options(func):
+    """main 与 map 共用的过滤条件选项"""
+    options = [
+        click.option('--since', default=None,
+                     help='Only analyze entries at or after this time, e.g. 2025-11-01 (the reported range for --rollup).'),
+        click.option('--until', default=None,
+                     help='Only analyze entries before this time; a date includes that whole day '
+                          '(the reported range for --rollup).'),
+        click.option('--domain', 'domains', multiple=True, help='Only analyze requests for this domain (repeatable).'),
+        click.option('--status', 'statuses', multiple=True,
+                     help='Only analyze these status codes, e.g. 5xx, 404 or 500-504 (repeatable or comma-separated).'),
+        click.option('--path-prefix', 'path_prefixes', multiple=True,
+                     help='Only analyze requests whose path starts with this prefix (repeatable).'),
+        click.option('--ip', 'ips', multiple=True,
+                     help='Only analyze requests from this client IP or CIDR range (repeatable).'),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+def report_stem_for(config: 'AppConfig', follow: bool = False) -> str:
+    """报告、指标与性能分析文件共用的主名"""
+    return config.output.report_name or (config.input.incremental.report_name if follow else
+                                         f"cdn_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+@click.group(invoke_without_command=True)
 @click.option(
     '--config-file',
     default='config/config.yaml',
     help='Path to the configuration file.',
-    type=click.Path(exists=True)
+    type=click.Path()
 )
-def main(config_file: str):
+@click.option(
+    '--workers',
+    default=None,
+    type=click.IntRange(min=1),
+    help='Number of worker processes used to parse log files (overrides input.workers).'
+)
+@click.option('--rebuild-cache', is_flag=True, help='Ignore existing parse cache entries and re-parse every log file.')
+@click.option('--no-cache', is_flag=True, help='Disable the parse cache for this run.')
+@click.option('--incremental', is_flag=True,
+              help='Only process data added since the last incremental run and report the accumulated results.')
+@click.option('--follow', is_flag=True,
+              help='Keep watching input.path, process new and growing files and refresh reports periodically.')
+@click.option('--rollup', is_flag=True,
+              help='Add unseen log files to the hourly rollup store and report from the merged partitions.')
+@filter_options
+@click.option('--metrics', 'write_run_metrics', is_flag=True,
+              help='Write per-stage timings, rejected lines, peak memory and GeoIP statistics (overrides output.metrics.enabled).')
+@click.option('--profile', is_flag=True, help='Run under cProfile and save the stats next to the reports.')
+@click.option('--check-config', 'check_only', is_flag=True,
+              help='Validate the configuration and the enabled plugins without running the analysis.')
+@click.option('--list-plugins', is_flag=True, help='List the registered input sources, parsers, analyzers and reporters.')
+@click.pass_context
+def main(ctx: click.Context, config_file: str, workers: int | None, rebuild_cache: bool, no_cache: bool,
+         incremental: bool, follow: bool, rollup: bool, since: str | None, until: str | None,
+         domains: tuple[str, ...], statuses: tuple[str, ...], path_prefixes: tuple[str, ...], ips: tuple[str, ...],
+         write_run_metrics: bool, profile: bool, check_only: bool, list_plugins: bool):
     """一个模块化、可扩展的CDN日志分析工具"""
+    # 子命令 (map / reduce) 使用各自的选项
+    if ctx.invoked_subcommand is not None:
+        return
+    # 快速路径: 只需要配置模型与插件注册表
+    if list_plugins:
+        list_available_plugins()
+        return
+    # 子命令不使用这里的 --config-file，因此在这里而不是由 click 检查文件是否存在
+    if not Path(config_file).exists():
+        raise click.BadParameter(f"Path '{config_file}' does not exist.", param_hint="'--config-file'")
+    if check_only:
+        sys.exit(0 if check_config(config_file) else 1)
+
+    import cProfile
+    from src.config import load_config
+
     try:
         logging.info("程序启动...")
         config = load_config(config_file)
         logging.info(f"成功加载配置: {config_file}")
+        if no_cache:
+            config.input.cache.enabled = False
+        if rebuild_cache:
+            config.input.cache.rebuild = True
+        if not apply_filter_options(config, domains, statuses, path_prefixes, ips, since, until, rollup):
+            exit(1)
 
-        # 数据输入和解析
-        input_handler = InputHandler(config)
-        log_parser = LogParser(config)
-        log_entries = [
-            entry.model_dump() for line in tqdm(input_handler.get_lines(), desc="正在解析日志")
-            if (entry := log_parser.parse_line(line))
-        ]
-
-        if not log_entries:
-            logging.warning("未找到任何有效的日志条目，程序即将退出。")
-            return
-        logging.info(f"成功解析 {len(log_entries)} 条日志。")
-
-        df = pd.DataFrame(log_entries)
-        logging.info("日志数据已成功加载到DataFrame。")
-        
-        # 运行分析引擎
-        engine = AnalysisEngine(df, config)
-        analysis_results = engine.run()
-
-        # 根据配置生成报告
-        # 在这里注册所有可用的报告器
-        available_reporters = {
-            "cli": CliReporter,
-            "excel": ExcelReporter,
-        }
-        
-        enabled_reporters = config.output.reporters
-        logging.info(f"将要生成的报告类型: {enabled_reporters}")
-
-        for reporter_name in enabled_reporters:
-            reporter_class = available_reporters.get(reporter_name)
-            if reporter_class:
-                reporter = reporter_class(analysis_results, config)
-                reporter.generate()
+        if write_run_metrics:
+            config.output.metrics.enabled = True
+
+        # 指标与性能分析文件和报告放在同一目录，固定报告名时使用相同的主名
+        report_stem = report_stem_for(config, follow)
+        metrics.reset()
+        profiler = cProfile.Profile() if profile else None
+        try:
+            if profiler is not None:
+                profiler.runcall(run_analysis, config, workers, incremental, follow, rollup, since, until)
             else:
-                logging.warning(f"配置了未知的报告器 '{reporter_name}'，已跳过。")
+                run_analysis(config, workers, incremental, follow, rollup, since, until)
+        finally:
+            if profiler is not None:
+                profile_path = Path(config.output.report_path) / f"{report_stem}.prof"
+                profiler.dump_stats(str(profile_path))
+                logging.info(f"性能分析结果已写入: {profile_path} (可用 python -m pstats 或 snakeviz 查看)")
+            if config.output.metrics.enabled:
+                write_metrics(config, report_stem)
+
+    except Exception as e:
+        logging.error(f"发生未处理的错误: {e}", exc_info=True)
+        exit(1)
+
+@main.command('map')
+@click.option('--config-file', default='config/config.yaml', help='Path to the configuration file.',
+              type=click.Path(exists=True))
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False),
+              help='Partial result file to write.')
+@click.option('--glob', 'pattern', default=None,
+              help='Only process files under input.path matching this pattern (defaults to input.file_pattern).')
+@click.option('--files-from', type=click.File('r'), default=None,
+              help='Read the files to process from this list, one path per line ("-" for stdin).')
+@click.option('--shard-index', default=0, type=click.IntRange(min=0),
+              help='Process only the files assigned to this shard (0-based).')
+@click.option('--shard-count', default=1, type=click.IntRange(min=1),
+              help='Number of shards the sorted file list is split into (round-robin).')
+@click.option('--workers', default=None, type=click.IntRange(min=1),
+              help='Number of worker processes used to parse log files (overrides input.workers).')
+@click.option('--no-cache', is_flag=True, help='Disable the parse cache for this run.')
+@filter_options
+@click.option('--metrics', 'write_run_metrics', is_flag=True,
+              help='Write per-stage timings next to the partial result file (overrides output.metrics.enabled).')
+def map_command(config_file: str, output: str, pattern: str | None, files_from, shard_index: int, shard_count: int,
+                workers: int | None, no_cache: bool, since: str | None, until: str | None, domains: tuple[str, ...],
+                statuses: tuple[str, ...], path_prefixes: tuple[str, ...], ips: tuple[str, ...],
+                write_run_metrics: bool):
+    """解析一部分日志文件，把分析器的中间状态写入部分结果文件"""
+    if shard_index >= shard_count:
+        raise click.BadParameter(f"must be less than --shard-count ({shard_count}).", param_hint="'--shard-index'")
+    from src.config import load_config
+    from src.map_reduce import MapRunner, select_files
+
+    try:
+        config = load_config(config_file)
+        logging.info(f"成功加载配置: {config_file}")
+        if config.input.source_type != 'local':
+            logging.error("分片处理 (map) 仅支持 'local' 模式。")
+            exit(1)
+        if no_cache:
+            config.input.cache.enabled = False
+        if not apply_filter_options(config, domains, statuses, path_prefixes, ips, since, until, False):
+            exit(1)
+        if write_run_metrics:
+            config.output.metrics.enabled = True
+
+        metrics.reset()
+        paths = select_files(config, pattern, files_from, shard_index, shard_count)
+        output_path = Path(output)
+        runner = MapRunner(config, workers)
+        try:
+            runner.run(paths, output_path)
+        finally:
+            runner.close()
+        if config.output.metrics.enabled:
+            config.output.report_path = str(output_path.parent)
+            write_metrics(config, output_path.stem)
+
+    except Exception as e:
+        logging.error(f"发生未处理的错误: {e}", exc_info=True)
+        exit(1)
+
+@main.command('reduce')
+@click.option('--config-file', default='config/config.yaml', help='Path to the configuration file.',
+              type=click.Path(exists=True))
+@click.argument('partials', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', '-o', default=None, type=click.Path(dir_okay=False),
+              help='Write the merged states as a partial result file instead of generating reports.')
+@click.option('--metrics', 'write_run_metrics', is_flag=True,
+              help='Write per-stage timings next to the reports (overrides output.metrics.enabled).')
+def reduce_command(config_file: str, partials: tuple[str, ...], output: str | None, write_run_metrics: bool):
+    """合并任意数量的部分结果文件并生成报告 (或写出合并后的部分结果)"""
+    from src.config import load_config
+    from src.map_reduce import ReduceRunner
+
+    try:
+        config = load_config(config_file)
+        logging.info(f"成功加载配置: {config_file}")
+        if write_run_metrics:
+            config.output.metrics.enabled = True
 
-        logging.info("所有报告生成完毕，程序正常结束。")
+        report_stem = report_stem_for(config)
+        metrics.reset()
+        runner = ReduceRunner(config)
+        try:
+            if not runner.load([Path(path) for path in partials]):
+                exit(1)
+            if output:
+                runner.write(Path(output))
+                return
+            runner.run(lambda results: generate_reports(results, config))
+        finally:
+            runner.close()
+        if config.output.metrics.enabled:
+            write_metrics(config, report_stem)
 
     except Exception as e:
         logging.error(f"发生未处理的错误: {e}", exc_info=True)
         exit(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
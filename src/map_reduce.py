@@ -0,0 +1,260 @@
+"""
+多机分片处理 (python -m src.main map / reduce)。
+
+map 解析一部分本地日志文件 (按 glob、分片序号/分片数或文件列表选择)，把每个文件的分析器中间状态写入一个
+带版本号的部分结果文件；reduce 合并任意数量的部分结果文件并运行报告器，也可以把合并结果再写为部分结果，
+供下一级 reduce 使用。
+
+部分结果按文件保存中间状态，reduce 按文件在日志目录中的排序位置 (与单进程运行处理文件的顺序相同) 合并，
+因此分片的划分方式、部分结果文件的数量与传入顺序都不影响结果，报告与单进程运行相同。
+
+部分结果文件的第一行是 JSON 文件头 (格式标识、版本、配置标识等)，其后是 pickle 格式的中间状态。
+reduce 先校验文件头，再以白名单方式反序列化中间状态: 只允许分析器状态与草图的类、numpy/pandas/pyarrow
+重建数组所需的函数，其他对象 (如 os.system) 一律拒绝，构造的文件不能借反序列化执行任意代码。
+"""
+import json
+import logging
+import os
+import pickle
+import socket
+import time
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, Iterable
+
+from src.analysis_engine import AnalysisEngine
+from src.config import AppConfig, FiltersConfig
+from src.filters import LogFilter
+from src.ingestion import iter_file_chunks
+from src.input_handler import get_log_files
+
+# 部分结果文件的格式标识与版本，格式变化时旧版本的文件不再被 reduce 接受
+PARTIAL_FORMAT = 'cdn-log-analysis/partial'
+PARTIAL_VERSION = 3
+# 文件头的最大长度 (字节)
+HEADER_LIMIT = 64 * 1024
+
+# 中间状态中允许出现的全局对象 (模块 -> 名称)。numpy 1.x 与 2.x 的模块路径不同，两者都列出
+_SAFE_GLOBALS = {
+    'builtins': {'bytearray', 'complex', 'frozenset', 'range', 'set', 'slice'},
+    'collections': {'Counter', 'OrderedDict', 'defaultdict', 'deque'},
+    'numpy': {'dtype', 'ndarray'},
+    'numpy._core.multiarray': {'_reconstruct', 'scalar'},
+    'numpy._core.numeric': {'_frombuffer'},
+    'numpy.core.multiarray': {'_reconstruct', 'scalar'},
+    'numpy.core.numeric': {'_frombuffer'},
+    'pandas': {'Categorical', 'CategoricalDtype', 'DataFrame', 'DatetimeTZDtype', 'Index', 'MultiIndex',
+               'RangeIndex', 'Series', 'StringDtype', 'Timestamp'},
+    'pandas.arrays': {'ArrowStringArray', 'DatetimeArray', 'StringArray'},
+    'pandas._libs.arrays': {'__pyx_unpickle_NDArrayBacked'},
+    'pandas._libs.internals': {'_unpickle_block'},
+    'pandas._libs.tslibs.timestamps': {'_unpickle_timestamp'},
+    'pandas.core.indexes.base': {'_new_Index'},
+    'pandas.core.internals.managers': {'BlockManager', 'SingleBlockManager'},
+    'pyarrow.lib': {'_restore_array', 'py_buffer', 'type_for_alias'},
+    # 分析器中间状态与草图的类 (按定义所在的模块列出，分析器模块中导入的其他类不能借其模块名通过)
+    'src.analyzers.aggregates': {'CountTable', 'SumTable'},
+    'src.analyzers.raw_logs': {'RawLogSample', '_Segment'},
+    'src.sketches.count_min': {'CountMinSketch'},
+    'src.sketches.histogram': {'KeyedHistograms', 'LogBuckets'},
+    'src.sketches.hyperloglog': {'HyperLogLog'},
+    'src.sketches.space_saving': {'SpaceSaving'},
+}
+
+
+class _StateUnpickler(pickle.Unpickler):
+    """只允许白名单中的全局对象的反序列化器"""
+    def find_class(self, module: str, name: str) -> Any:
+        if name in _SAFE_GLOBALS.get(module, ()):
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"部分结果中不允许出现 {module}.{name}")
+
+
+def file_key(path: Path, root: str | None) -> str:
+    """部分结果中文件的标识: 相对 input.path 的路径 (不在其下时为文件名)，各机器上日志目录的位置可以不同"""
+    if root:
+        try:
+            return path.resolve().relative_to(Path(root).resolve()).as_posix()
+        except ValueError:
+            pass
+    return path.name
+
+
+def _order(key: str) -> tuple[str, ...]:
+    # 与单进程运行中按 Path 排序的顺序一致 (逐级比较路径的各部分)
+    return PurePosixPath(key).parts
+
+
+def select_files(config: AppConfig, pattern: str | None = None, files: Iterable[str] | None = None,
+                 shard_index: int = 0, shard_count: int = 1) -> list[Path]:
+    """
+    选择本次 map 处理的文件: files (文件列表) 或 input.path 下匹配 pattern (默认为 input.file_pattern) 的文件，
+    按排序后的位置轮流分配给 shard_count 个分片，返回第 shard_index 个分片的文件。
+    设置了时间范围的过滤条件时，文件名中的时间不在范围内的文件不处理。
+    """
+    if files is not None:
+        paths = [Path(line.strip()) for line in files if line.strip()]
+    else:
+        paths = get_log_files(config.input.path, pattern or config.input.file_pattern)
+    root = config.input.path
+    paths = sorted({path for path in paths if path.is_file()}, key=lambda path: _order(file_key(path, root)))
+    selected = [path for i, path in enumerate(paths) if i % shard_count == shard_index]
+    log_filter = LogFilter.from_config(config)
+    if log_filter is not None:
+        kept = [path for path in selected if log_filter.keeps_file(path.name)]
+        if len(kept) < len(selected):
+            logging.info(f"按文件名中的时间跳过 {len(selected) - len(kept)} 个不在时间范围内的文件。")
+        selected = kept
+    logging.info(f"分片 {shard_index}/{shard_count}: 共 {len(paths)} 个文件，本分片处理 {len(selected)} 个。")
+    return selected
+
+
+def write_partial(path: Path, state_key: str, filters: dict, segments: list[dict]) -> None:
+    """写出部分结果文件: 一行 JSON 文件头加 pickle 格式的各文件中间状态 (先写临时文件再原子替换)"""
+    header = {
+        'format': PARTIAL_FORMAT,
+        'version': PARTIAL_VERSION,
+        'state_key': state_key,
+        # reduce 按相同的过滤条件计算兼容性标识
+        'filters': filters,
+        'host': socket.gethostname(),
+        'created_at': time.time(),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+        pickle.dump(segments, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_partial(path: Path) -> dict | None:
+    """
+    读取部分结果文件，文件头不符、格式版本不符或中间状态中有白名单以外的对象时记录错误并返回 None。
+    返回文件头的内容，各文件的中间状态在 'segments' 中。
+    """
+    try:
+        with open(path, 'rb') as f:
+            try:
+                header = json.loads(f.readline(HEADER_LIMIT))
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get('format') != PARTIAL_FORMAT:
+                logging.error(f"{path} 不是部分结果文件。")
+                return None
+            if header.get('version') != PARTIAL_VERSION:
+                logging.error(f"部分结果文件 {path} 的格式版本为 {header.get('version')}，"
+                              f"当前版本为 {PARTIAL_VERSION}，请重新运行 map。")
+                return None
+            segments = _StateUnpickler(f).load()
+    except Exception as e:
+        logging.error(f"读取部分结果文件失败 {path}: {e}")
+        return None
+    if not isinstance(segments, list) or not all(isinstance(segment, dict) for segment in segments):
+        logging.error(f"部分结果文件 {path} 的内容无效。")
+        return None
+    return {**header, 'segments': segments}
+
+
+class MapRunner:
+    """map: 逐个解析选中的文件，每个文件的中间状态单独保存"""
+    def __init__(self, config: AppConfig, workers: int | None = None):
+        self.config = config
+        self.workers = workers
+        self.engine = AnalysisEngine(config)
+
+        legacy = [name for name, analyzer in self.engine.available_analyzers.items()
+                  if not analyzer.supports_streaming]
+        if legacy:
+            logging.warning(f"分析器 {legacy} 不支持流式分析，分片处理时将跳过。")
+
+    def run(self, paths: list[Path], output: Path) -> int:
+        """解析 paths 并写出部分结果文件，返回日志条数"""
+        segments = []
+        for path, chunks in iter_file_chunks(self.config, paths, self.workers):
+            states = self.engine.init_states()
+            rows = 0
+            for chunk in chunks:
+                states = self.engine.update_states(states, chunk)
+                rows += len(chunk)
+            stat = path.stat()
+            segments.append({'key': file_key(path, self.config.input.path), 'size': stat.st_size,
+                             'mtime_ns': stat.st_mtime_ns, 'rows': rows, 'states': states})
+            logging.info(f"--> {path.name}: {rows} 条日志")
+        write_partial(output, self.engine.state_key(),
+                      self.config.filters.model_dump(mode='json', exclude_defaults=True), segments)
+        total = sum(segment['rows'] for segment in segments)
+        logging.info(f"部分结果已写入: {output} ({len(segments)} 个文件，{total} 条日志)")
+        return total
+
+    def close(self) -> None:
+        self.engine.close()
+
+
+class ReduceRunner:
+    """reduce: 合并部分结果文件中各文件的中间状态"""
+    def __init__(self, config: AppConfig):
+        self.config = config
+        self.engine: AnalysisEngine | None = None
+        self.state_key: str | None = None
+        self.filters: dict = {}
+        self.segments: list[dict] = []
+
+    def load(self, paths: list[Path]) -> bool:
+        """读取并校验所有部分结果文件，同一文件出现在多个部分结果中时只计入一次，返回是否成功"""
+        partials = []
+        for path in paths:
+            data = read_partial(path)
+            if data is None:
+                return False
+            partials.append((path, data))
+        if len({data['state_key'] for _, data in partials}) > 1:
+            logging.error("部分结果文件由不同的分析或解析配置生成，无法合并: " +
+                          ", ".join(f"{path} ({data['state_key'][:8]})" for path, data in partials))
+            return False
+
+        _, first = partials[0]
+        self.state_key, self.filters = first['state_key'], first['filters']
+        # 过滤条件是中间状态兼容性标识的一部分，reduce 沿用 map 时的过滤条件
+        self.config.filters = FiltersConfig(**self.filters)
+        self.engine = AnalysisEngine(self.config)
+        if self.engine.state_key() != self.state_key:
+            logging.error("reduce 使用的分析或解析配置与生成部分结果时的配置不一致 (analysis / parser 需相同)。")
+            return False
+
+        seen: dict[str, dict] = {}
+        for path, data in partials:
+            for segment in data['segments']:
+                if segment['key'] in seen:
+                    logging.warning(f"文件 {segment['key']} 出现在多个部分结果中，已忽略 {path} 中的重复结果。")
+                    continue
+                seen[segment['key']] = segment
+        self.segments = sorted(seen.values(), key=lambda segment: _order(segment['key']))
+        logging.info(f"已读取 {len(partials)} 个部分结果文件，共 {len(self.segments)} 个日志文件。")
+        return True
+
+    @property
+    def rows(self) -> int:
+        return sum(segment['rows'] for segment in self.segments)
+
+    def write(self, output: Path) -> None:
+        """把合并后的部分结果写为一个部分结果文件 (多级 reduce)"""
+        write_partial(output, self.state_key, self.filters, self.segments)
+        logging.info(f"合并后的部分结果已写入: {output} ({len(self.segments)} 个文件，{self.rows} 条日志)")
+
+    def results(self) -> dict[str, dict]:
+        """按文件顺序合并中间状态并生成分析结果"""
+        started = time.perf_counter()
+        states = self.engine.merge_all(segment['states'] for segment in self.segments)
+        logging.info(f"已合并 {len(self.segments)} 个文件的中间状态，用时 {time.perf_counter() - started:.2f} 秒")
+        self.engine.rows_processed = self.rows
+        return self.engine.finalize_states(states)
+
+    def close(self) -> None:
+        if self.engine is not None:
+            self.engine.close()
+
+    def run(self, report: Callable[[dict], Any]) -> None:
+        if self.rows == 0:
+            logging.warning("部分结果中没有任何有效的日志条目，程序即将退出。")
+            return
+        report(self.results())
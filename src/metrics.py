@@ -0,0 +1,203 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，峰值内存改由 psutil 获取 (未安装时不记录)
+    resource = None
+
+# Prometheus 指标名的前缀
+PROMETHEUS_PREFIX = 'cdn_log'
+
+
+def _rss_bytes(children: bool = False) -> int | None:
+    """本进程 (或已结束的子进程中最大) 的峰值 RSS，无法获取时为 None"""
+    if resource is not None:
+        # ru_maxrss 在 Linux 上以 KB 为单位，在 macOS 上以字节为单位
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if children:
+        return None
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    # Windows 上 peak_wset 为峰值工作集
+    return getattr(memory, 'peak_wset', memory.rss)
+
+
+class PipelineMetrics:
+    """
+    一次运行的流水线指标: 各阶段的累计耗时与调用次数 (timers)、事件计数 (counters) 以及按文件的读取统计。
+
+    记录只是在字典中累加，开销可以忽略，因此始终开启；是否写出由 output.metrics 决定。
+    工作进程中记录的指标由 drain() 取出并随解析结果返回，主进程通过 merge() 汇总。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.timers: dict[str, list] = {}
+            self.counters: dict[str, int] = {}
+            self.files: list[dict] = []
+
+    def add_time(self, name: str, seconds: float, calls: int = 1) -> None:
+        with self._lock:
+            timer = self.timers.setdefault(name, [0.0, 0])
+            timer[0] += seconds
+            timer[1] += calls
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def track_file(self, name: str, batches: Iterable[list[bytes]]) -> Iterator[list[bytes]]:
+        """透传一个文件的行批次，累计读取 (含解压) 的耗时与行数，读完 (或中途停止) 后记录该文件的统计"""
+        iterator = iter(batches)
+        seconds, lines = 0.0, 0
+        try:
+            while True:
+                start = time.perf_counter()
+                batch = next(iterator, None)
+                seconds += time.perf_counter() - start
+                if batch is None:
+                    break
+                lines += len(batch)
+                yield batch
+        finally:
+            self.add_time('read', seconds)
+            self.incr('lines.read', lines)
+            with self._lock:
+                self.files.append({
+                    'name': name,
+                    'lines': lines,
+                    'read_seconds': round(seconds, 4),
+                    'read_lines_per_second': round(lines / seconds) if seconds else None,
+                })
+
+    def drain(self) -> dict:
+        """取出并清空已记录的指标 (工作进程每完成一个任务调用一次)"""
+        with self._lock:
+            data = {'timers': self.timers, 'counters': self.counters, 'files': self.files}
+            self.timers, self.counters, self.files = {}, {}, []
+        return data
+
+    def merge(self, data: dict | None) -> None:
+        if not data:
+            return
+        for name, (seconds, calls) in data['timers'].items():
+            self.add_time(name, seconds, calls)
+        for name, value in data['counters'].items():
+            self.incr(name, value)
+        with self._lock:
+            self.files.extend(data['files'])
+
+    def snapshot(self) -> dict:
+        """当前的全部指标，附带由计数推导出的吞吐量、丢弃行数与 GeoIP 缓存命中率"""
+        with self._lock:
+            timers = {name: {'seconds': round(seconds, 4), 'calls': calls}
+                      for name, (seconds, calls) in sorted(self.timers.items())}
+            counters = dict(sorted(self.counters.items()))
+            files = list(self.files)
+
+        def seconds_of(name: str) -> float:
+            return timers.get(name, {}).get('seconds', 0.0)
+
+        parse_seconds = seconds_of('parse.regex') + seconds_of('parse.dataframe')
+        lines_parsed = counters.get('lines.parsed', 0)
+        geo_lookups = counters.get('geoip.cache.hits', 0) + counters.get('geoip.cache.misses', 0)
+        api_requests = timers.get('geoip.api.request', {})
+        api_lookups = counters.get('geoip.api.lookups', 0)
+        local_lookups = counters.get('geoip.local.lookups', 0)
+        derived = {
+            'parse_lines_per_second': round(lines_parsed / parse_seconds) if parse_seconds else None,
+            'read_lines_per_second': round(counters.get('lines.read', 0) / seconds_of('read'))
+            if seconds_of('read') else None,
+            'lines_rejected': sum(v for k, v in counters.items() if k.startswith('lines.rejected.')),
+            # 被过滤条件丢弃的行 (不含按文件名跳过的文件中的行)
+            'lines_filtered': sum(v for k, v in counters.items()
+                                  if k.startswith('filter.') and not k.startswith('filter.files.')),
+            'geoip_cache_hit_ratio': round(counters.get('geoip.cache.hits', 0) / geo_lookups, 4)
+            if geo_lookups else None,
+            'geoip_api_mean_request_seconds': round(api_requests['seconds'] / api_requests['calls'], 4)
+            if api_requests.get('calls') else None,
+            'geoip_api_success_ratio': round(1 - counters.get('geoip.api.failed_lookups', 0) / api_lookups, 4)
+            if api_lookups else None,
+            'geoip_local_lookups_per_second': round(local_lookups / seconds_of('geoip.local.resolve'))
+            if local_lookups and seconds_of('geoip.local.resolve') else None,
+        }
+        return {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started)),
+            'wall_seconds': round(time.time() - self.started, 3),
+            'peak_rss_bytes': _rss_bytes(),
+            # 并行解析的工作进程中最大的峰值 RSS
+            'peak_rss_children_bytes': _rss_bytes(children=True),
+            'timers': timers,
+            'counters': counters,
+            'derived': derived,
+            'files': files,
+        }
+
+    def write_json(self, path: Path) -> None:
+        _write_atomic(path, json.dumps(self.snapshot(), indent=2, ensure_ascii=False))
+
+    def write_prometheus(self, path: Path) -> None:
+        """写出 node_exporter textfile collector 格式的指标 (先写临时文件再替换，采集时不会读到一半的文件)"""
+        snapshot = self.snapshot()
+        p = PROMETHEUS_PREFIX
+        lines = [
+            f'# HELP {p}_stage_seconds Time spent in each pipeline stage during the last run.',
+            f'# TYPE {p}_stage_seconds gauge',
+        ]
+        lines += [f'{p}_stage_seconds{{stage="{name}"}} {timer["seconds"]}' for name, timer in snapshot['timers'].items()]
+        lines += [f'# HELP {p}_stage_calls Number of calls of each pipeline stage during the last run.',
+                  f'# TYPE {p}_stage_calls gauge']
+        lines += [f'{p}_stage_calls{{stage="{name}"}} {timer["calls"]}' for name, timer in snapshot['timers'].items()]
+        lines += [f'# HELP {p}_events Event counts (lines read, rejected lines, GeoIP lookups) of the last run.',
+                  f'# TYPE {p}_events gauge']
+        lines += [f'{p}_events{{name="{name}"}} {value}' for name, value in snapshot['counters'].items()]
+        gauges = {
+            'run_duration_seconds': snapshot['wall_seconds'],
+            'peak_rss_bytes': snapshot['peak_rss_bytes'],
+            'peak_rss_children_bytes': snapshot['peak_rss_children_bytes'],
+            'last_run_timestamp_seconds': round(time.time()),
+            **snapshot['derived'],
+        }
+        for name, value in gauges.items():
+            # 无法获取的指标 (如 Windows 上的峰值内存) 不写出
+            if value is None:
+                continue
+            name = re.sub(r'[^a-zA-Z0-9_]', '_', name)
+            lines += [f'# TYPE {p}_{name} gauge', f'{p}_{name} {value}']
+        _write_atomic(path, '\n'.join(lines) + '\n')
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(text, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+# 进程内共享的指标记录器
+metrics = PipelineMetrics()
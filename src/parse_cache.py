@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+
+from src.config import AppConfig
+from src.log_parser import PARSER_VERSION
+from src.log_schema import COMPACT_COLUMNS, NUMERIC_DTYPES, STRING_COLUMNS, trim_categories
+
+# 缓存文件的扩展名 (Arrow IPC 文件格式，即 Feather v2)
+CACHE_SUFFIX = '.arrow'
+# Arrow IPC 支持的缓冲区压缩方式
+COMPRESSIONS = ('lz4', 'zstd')
+
+# 紧凑数据块对应的 Arrow 表结构，字符串列保存为字典编码
+ARROW_SCHEMA = pa.schema(
+    [pa.field(column, pa.from_numpy_dtype(NUMERIC_DTYPES[column])) if column in NUMERIC_DTYPES
+     else pa.field(column, pa.dictionary(pa.int32(), pa.string()))
+     for column in COMPACT_COLUMNS]
+)
+
+
+class ParseCache:
+    """
+    按源日志文件持久化解析结果的列式缓存。
+
+    每个源文件以 (文件名, 大小, 修改时间, 解析格式与版本) 为键，
+    首次解析后写入一个 Arrow IPC 文件，后续运行直接内存映射读取，跳过解压、正则匹配和时间解析。
+    默认不压缩，读取时各列直接引用映射的文件内容而不复制；配置 compression 后缓存文件更小，
+    但读取时需要把整个文件解压到内存。缓存总大小超过上限时按最近使用时间淘汰。
+    """
+    def __init__(self, cache_dir: Path, max_bytes: int, parser_key: str, rebuild: bool = False,
+                 compression: str | None = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.parser_key = parser_key
+        self.rebuild = rebuild
+        self.compression = compression
+
+    @classmethod
+    def from_config(cls, config: AppConfig) -> 'ParseCache | None':
+        """根据配置创建缓存，未启用时返回 None"""
+        cache_config = config.input.cache
+        if not cache_config.enabled:
+            return None
+        cache_dir = Path(cache_config.dir) if cache_config.dir else Path(config.input.path or './logs/') / '.parse_cache'
+        parser_key = f"{config.parser.format}|{config.parser.time_format}|v{PARSER_VERSION}"
+        compression = cache_config.compression
+        if compression is not None and compression not in COMPRESSIONS:
+            logging.warning(f"解析缓存不支持压缩方式 '{compression}' (可选: {', '.join(COMPRESSIONS)})，将不压缩。")
+            compression = None
+        return cls(cache_dir, cache_config.max_size_mb * 1024 * 1024, parser_key, cache_config.rebuild, compression)
+
+    def _entry_path(self, source_path: Path) -> Path | None:
+        try:
+            stat = source_path.stat()
+        except OSError:
+            return None
+        key = f"{source_path.name}|{stat.st_size}|{stat.st_mtime_ns}|{self.parser_key}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f"{source_path.name}-{digest}{CACHE_SUFFIX}"
+
+    def contains(self, source_path: Path) -> bool:
+        """源文件是否存在可用的缓存"""
+        if self.rebuild:
+            return False
+        entry = self._entry_path(source_path)
+        return entry is not None and entry.exists()
+
+    def load(self, source_path: Path) -> pa.Table | None:
+        """读取源文件对应的缓存，未命中时返回 None"""
+        if self.rebuild:
+            return None
+        entry = self._entry_path(source_path)
+        if entry is None or not entry.exists():
+            return None
+        try:
+            table = pa.ipc.open_file(pa.memory_map(str(entry), 'r')).read_all()
+            # 更新修改时间，作为 LRU 淘汰的依据
+            os.utime(entry)
+            return table
+        except (OSError, pa.ArrowInvalid) as e:
+            logging.warning(f"解析缓存损坏，将重新解析 {source_path.name}: {e}")
+            entry.unlink(missing_ok=True)
+            return None
+
+    def store(self, source_path: Path, table: pa.Table) -> None:
+        """写入源文件对应的缓存 (先写临时文件再重命名，避免留下不完整的缓存)"""
+        entry = self._entry_path(source_path)
+        if entry is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            # 各批次的字典合并为一个，字典编码的 IPC 文件要求所有批次使用同一字典
+            table = table.unify_dictionaries()
+            with pa.OSFile(str(tmp_path), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, entry)
+        except OSError as e:
+            logging.warning(f"写入解析缓存失败 {source_path.name}: {e}")
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """缓存总大小超过上限时，按最近使用时间从旧到新删除缓存文件"""
+        entries = []
+        for entry in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+            logging.info(f"解析缓存超出上限，已淘汰: {entry.name}")
+
+
+def table_to_frames(table: pa.Table, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """将 Arrow 表按 chunk_size 行切分为 DataFrame 数据块 (字符串列的字典只保留块内出现的取值)"""
+    for batch in table.to_batches(max_chunksize=chunk_size):
+        if batch.num_rows:
+            chunk = batch.to_pandas()
+            for column in STRING_COLUMNS:
+                chunk[column] = trim_categories(chunk[column])
+            yield chunk
+
+
+def frames_to_table(chunks: list[pd.DataFrame]) -> pa.Table:
+    # 各数据块的字典不同，逐块转换后再拼接 (pd.concat 会把字典不同的分类列退化为 object 列)
+    tables = [pa.Table.from_pandas(chunk, schema=ARROW_SCHEMA, preserve_index=False) for chunk in chunks]
+    if not tables:
+        return ARROW_SCHEMA.empty_table()
+    return pa.concat_tables(tables)
@@ -0,0 +1,131 @@
+"""
+插件注册表: 输入源、解析格式、分析器、GeoIP 提供方与报告器按名称登记为 "模块:属性" 字符串，
+只有配置启用某个插件时才导入它的模块，未使用的 SDK 与依赖库 (华为云 SDK、geoip2、pyecharts 等) 不会被加载。
+
+第三方包可以通过 entry points 注册插件，组名为 "cdn_log_analysis.<分组>"，例如在 pyproject.toml 中:
+
+    [project.entry-points."cdn_log_analysis.reporters"]
+    json = "my_package.json_reporter:JsonReporter"
+
+内置插件与第三方插件同名时以内置插件为准。
+"""
+import importlib
+import importlib.util
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+# 第三方插件的 entry point 组名前缀
+ENTRY_POINT_PREFIX = 'cdn_log_analysis.'
+
+# 各分组对应的配置项与内置插件，按登记顺序运行 (例如分析器的执行顺序)
+BUILTIN_PLUGINS: dict[str, dict[str, str]] = {
+    # input.source_type
+    'input_sources': {
+        'local': 'src.input_handler:LocalInputSource',
+        'api': 'src.clients.huawei_input:HuaweiApiInputSource',
+    },
+    # parser.format
+    'parsers': {
+        'huawei_cdn': 'src.log_parser:LogParser',
+    },
+    # analysis.modules (geo_ip 按 analysis.geoip.provider 在 geoip_providers 中选择)
+    'analyzers': {
+        'basic_stats': 'src.analyzers.basic_stats_analyzer:BasicStatsAnalyzer',
+        'latency': 'src.analyzers.latency_analyzer:LatencyAnalyzer',
+    },
+    # analysis.geoip.provider
+    'geoip_providers': {
+        'local': 'src.analyzers.geo_analyzer:GeoAnalyzer',
+        'api': 'src.analyzers.api_geo_analyzer:ApiGeoAnalyzer',
+    },
+    # output.reporters
+    'reporters': {
+        'cli': 'src.reporters.cli_reporter:CliReporter',
+        'excel': 'src.reporters.excel_reporter:ExcelReporter',
+        'html': 'src.reporters.html_reporter:HtmlReporter',
+    },
+}
+
+
+@dataclass(frozen=True)
+class PluginSpec:
+    group: str
+    name: str
+    # "模块:属性"
+    target: str
+    # 'builtin' 或提供该插件的发行包名
+    origin: str = 'builtin'
+
+    @property
+    def module(self) -> str:
+        return self.target.partition(':')[0]
+
+
+@lru_cache(maxsize=None)
+def _entry_point_specs(group: str) -> dict[str, PluginSpec]:
+    """第三方插件 (扫描已安装发行包的元数据，只在需要时执行一次)"""
+    # importlib.metadata 的导入本身也不便宜，只在查找内置插件以外的名称时才需要
+    from importlib.metadata import entry_points
+
+    specs = {}
+    for ep in entry_points(group=ENTRY_POINT_PREFIX + group):
+        origin = ep.dist.name if getattr(ep, 'dist', None) is not None else 'entry point'
+        specs[ep.name] = PluginSpec(group, ep.name, ep.value, origin)
+    return specs
+
+
+def find_plugin(group: str, name: str) -> PluginSpec | None:
+    """按名称查找插件 (不导入插件模块)，内置插件中没有时才查找 entry points"""
+    target = BUILTIN_PLUGINS[group].get(name)
+    if target is not None:
+        return PluginSpec(group, name, target)
+    return _entry_point_specs(group).get(name)
+
+
+def list_plugins(group: str) -> list[PluginSpec]:
+    """分组中的全部插件，内置插件在前"""
+    builtin = [PluginSpec(group, name, target) for name, target in BUILTIN_PLUGINS[group].items()]
+    return builtin + [spec for name, spec in _entry_point_specs(group).items() if name not in BUILTIN_PLUGINS[group]]
+
+
+def plugin_names(group: str) -> list[str]:
+    return [spec.name for spec in list_plugins(group)]
+
+
+def is_importable(spec: PluginSpec) -> bool:
+    """插件模块是否存在 (只查找模块文件，不执行模块代码)"""
+    try:
+        return importlib.util.find_spec(spec.module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def load_plugin(group: str, name: str) -> Any | None:
+    """导入并返回插件对象 (通常是类)。名称未注册或导入失败时记录错误并返回 None，由调用方决定跳过或退化"""
+    spec = find_plugin(group, name)
+    if spec is None:
+        logging.error(f"未注册的插件 '{name}' (分组 {group})，可用: {plugin_names(group)}")
+        return None
+    module_name, _, attr = spec.target.partition(':')
+    try:
+        obj = importlib.import_module(module_name)
+        for part in attr.split('.') if attr else []:
+            obj = getattr(obj, part)
+    except (ImportError, AttributeError) as e:
+        logging.error(f"加载插件 '{name}' ({spec.target}) 失败: {e}")
+        return None
+    return obj
+
+
+def enabled_plugins(config) -> list[tuple[str, str | None]]:
+    """配置 (AppConfig) 启用的全部插件，(分组, 名称)"""
+    enabled = [('input_sources', config.input.source_type), ('parsers', config.parser.format)]
+    for module in config.analysis.modules:
+        if module == 'geo_ip':
+            enabled.append(('geoip_providers', config.analysis.geoip.provider if config.analysis.geoip else None))
+        else:
+            enabled.append(('analyzers', module))
+    enabled += [('reporters', reporter) for reporter in config.output.reporters]
+    return enabled
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from src.bulk_reader import (
+    GZIP_READ_SIZE, iter_gzip_blocks, iter_mmap_lines, read_line_batches, slice_blocks, split_lines,
+)
+from src.config import AppConfig
+
+try:
+    import indexed_gzip
+except ImportError:
+    indexed_gzip = None
+
+# 检查点索引的格式版本，格式变化时旧的索引不再使用
+INDEX_VERSION = 1
+# 索引文件的扩展名 (元数据为 JSON，indexed_gzip 的检查点另存为二进制文件)
+INDEX_SUFFIX = '.gzindex.json'
+ZRAN_SUFFIX = '.zran'
+# indexed_gzip 的检查点间隔 (解压后的字节数)，每个检查点保存 32KB 的解压窗口。
+# 间隔需小于 indexed_gzip 的读缓冲区 (默认 16MB)，否则不会生成检查点
+SEEK_POINT_SPACING = 4 * 1024 * 1024
+# 估算 .gz 文件解压后大小时使用的压缩比下限，文本日志的压缩比通常远高于此
+MIN_COMPRESSION_RATIO = 4
+
+
+@dataclass(frozen=True)
+class FileRange:
+    """
+    日志文件中的一段 [start, end) (解压后的字节偏移)，start 与 end 都位于行首，
+    各段可以在不同的工作进程中独立读取，依次拼接后与顺序读取整个文件的结果完全一致。
+    """
+    path: str
+    start: int
+    end: int
+    # gzip 成员检查点: 从压缩数据的 compressed_offset 处开始解压，解压出的数据从 checkpoint_offset 开始
+    compressed_offset: int | None = None
+    checkpoint_offset: int = 0
+    # indexed_gzip 导出的检查点索引文件，有该文件时直接定位到 start
+    zran_index: str | None = None
+
+
+def _read_zran(f, length: int) -> Iterator[bytes]:
+    while length > 0:
+        block = f.read(min(GZIP_READ_SIZE * 8, length))
+        if not block:
+            return
+        length -= len(block)
+        yield block
+
+
+def read_range(file_range: FileRange) -> Iterator[list[bytes]]:
+    """按批读取一个字节范围内的行 (bytes，不含换行符)"""
+    path = Path(file_range.path)
+    length = file_range.end - file_range.start
+    if path.suffix != '.gz':
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter_mmap_lines(mm, file_range.start, file_range.end)
+    elif file_range.zran_index is not None:
+        with indexed_gzip.IndexedGzipFile(str(path), spacing=SEEK_POINT_SPACING) as f:
+            f.import_index(file_range.zran_index)
+            f.seek(file_range.start)
+            yield from split_lines(_read_zran(f, length))
+    else:
+        with open(path, 'rb', buffering=0) as f:
+            f.seek(file_range.compressed_offset)
+            blocks = iter_gzip_blocks(f)
+            yield from split_lines(slice_blocks(blocks, file_range.start - file_range.checkpoint_offset, length))
+
+
+class RangeSplitter:
+    """
+    把单个大文件拆分为按行对齐的字节范围，由多个工作进程并行读取和解析。
+
+    未压缩的文件直接在换行符处切分，各进程通过 mmap 读取同一文件 (共享操作系统的页缓存)。
+    .gz 文件无法从任意位置开始解压，需要检查点索引: 安装 indexed_gzip 时，在首次顺序读取的同时建立
+    zran 风格的检查点 (每个检查点保存解压窗口，可从任意位置开始解压)；否则 (标准库 zlib 不提供从任意比特位置
+    恢复解压的接口) 记录 gzip 成员的边界，多成员的文件 (例如分段压缩或拼接的日志) 可按成员拆分。
+    索引按文件名、大小和修改时间缓存，之后的运行直接按索引拆分。
+    """
+    def __init__(self, index_dir: Path, range_size: int):
+        self.index_dir = index_dir
+        self.range_size = max(range_size, 1)
+
+    @classmethod
+    def from_config(cls, config: AppConfig) -> 'RangeSplitter | None':
+        """根据配置创建拆分器，未启用时返回 None"""
+        split_config = config.input.split
+        if not split_config.enabled or split_config.range_size_mb <= 0:
+            return None
+        index_dir = Path(split_config.index_dir) if split_config.index_dir else \
+            Path(config.input.path or './logs/') / '.gzip_index'
+        return cls(index_dir, split_config.range_size_mb * 1024 * 1024)
+
+    def _index_path(self, path: Path) -> Path | None:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        key = f"{path.name}|{stat.st_size}|{stat.st_mtime_ns}|v{INDEX_VERSION}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return self.index_dir / f"{path.name}-{digest}{INDEX_SUFFIX}"
+
+    def _load_index(self, path: Path) -> dict | None:
+        index_path = self._index_path(path)
+        if index_path is None or not index_path.exists():
+            return None
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"gzip 检查点索引损坏，将在下次读取时重建 {path.name}: {e}")
+            index_path.unlink(missing_ok=True)
+            return None
+        if index.get('zran_index') and (indexed_gzip is None or not Path(index['zran_index']).exists()):
+            return None
+        return index
+
+    def _save_index(self, path: Path, index: dict) -> None:
+        index_path = self._index_path(path)
+        if index_path is None:
+            return
+        try:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            logging.warning(f"保存 gzip 检查点索引失败 {path.name}: {e}")
+
+    def _wants_index(self, path: Path) -> bool:
+        if path.suffix != '.gz':
+            return False
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return False
+        return size * MIN_COMPRESSION_RATIO >= self.range_size * 2 and self._load_index(path) is None
+
+    def read_batches(self, path: Path) -> Iterator[list[bytes]]:
+        """顺序读取整个文件 (与 read_line_batches 相同)，较大的 .gz 文件在读取的同时建立检查点索引"""
+        if not self._wants_index(path):
+            yield from read_line_batches(path)
+            return
+        size = [0]
+
+        def _counted(blocks: Iterator[bytes]) -> Iterator[bytes]:
+            for block in blocks:
+                size[0] += len(block)
+                yield block
+
+        if indexed_gzip is not None:
+            zran_path = self._index_path(path).with_suffix(ZRAN_SUFFIX)
+            with indexed_gzip.IndexedGzipFile(str(path), spacing=SEEK_POINT_SPACING) as f:
+                yield from split_lines(_counted(iter(lambda: f.read(GZIP_READ_SIZE * 8), b'')))
+                try:
+                    self.index_dir.mkdir(parents=True, exist_ok=True)
+                    f.export_index(str(zran_path))
+                except OSError as e:
+                    logging.warning(f"保存 gzip 检查点索引失败 {path.name}: {e}")
+                    return
+            self._save_index(path, {'version': INDEX_VERSION, 'size': size[0], 'zran_index': str(zran_path)})
+        else:
+            checkpoints = []
+            with open(path, 'rb', buffering=0) as f:
+                yield from split_lines(_counted(iter_gzip_blocks(f, checkpoints=checkpoints)))
+            self._save_index(path, {'version': INDEX_VERSION, 'size': size[0], 'checkpoints': checkpoints})
+
+    def plan(self, path: Path) -> list[FileRange] | None:
+        """把文件拆分为按行对齐的字节范围，文件较小或 (.gz 文件) 尚无可用的检查点索引时返回 None"""
+        try:
+            if path.suffix != '.gz':
+                ranges = self._plan_plain(path)
+            else:
+                index = self._load_index(path)
+                if index is None:
+                    return None
+                if index.get('zran_index'):
+                    ranges = self._plan_zran(path, index)
+                else:
+                    ranges = self._plan_members(path, index)
+                    if not ranges and index['size'] >= self.range_size * 2:
+                        logging.warning(f"{path.name} 只有一个 gzip 成员，将由单个进程顺序解压 "
+                                        f"(安装 indexed_gzip 后可按范围并行解压: pip install indexed_gzip)")
+        except (OSError, ValueError, EOFError) as e:
+            logging.warning(f"拆分文件失败，将整体解析 {path.name}: {e}")
+            return None
+        return ranges if ranges and len(ranges) > 1 else None
+
+    def _targets(self, size: int) -> list[int]:
+        """等分文件得到的 (尚未对齐的) 分界位置"""
+        parts = math.ceil(size / self.range_size)
+        if parts < 2:
+            return []
+        return [size * k // parts for k in range(1, parts)]
+
+    @staticmethod
+    def _ranges(path: Path, bounds: list[int], size: int, **kwargs) -> list[FileRange]:
+        """由对齐后的分界位置构造范围，去掉对齐后重合的分界"""
+        starts = sorted({0, *(b for b in bounds if 0 < b < size)})
+        return [FileRange(str(path), start, end, **kwargs)
+                for start, end in zip(starts, [*starts[1:], size])]
+
+    def _plan_plain(self, path: Path) -> list[FileRange]:
+        size = path.stat().st_size
+        targets = self._targets(size)
+        if not targets:
+            return []
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # 分界对齐到 target - 1 处或之后的第一个换行符之后，分界前一个字节恰好是换行符时位置不变
+            bounds = [mm.find(b'\n', target - 1) + 1 for target in targets]
+        return self._ranges(path, [b for b in bounds if b > 0], size)
+
+    def _plan_zran(self, path: Path, index: dict) -> list[FileRange]:
+        size = index['size']
+        targets = self._targets(size)
+        bounds = []
+        with indexed_gzip.IndexedGzipFile(str(path), spacing=SEEK_POINT_SPACING) as f:
+            f.import_index(index['zran_index'])
+            for target in targets:
+                f.seek(target - 1)
+                position = target - 1
+                while True:
+                    block = f.read(64 * 1024)
+                    if not block:
+                        break
+                    newline = block.find(b'\n')
+                    if newline >= 0:
+                        bounds.append(position + newline + 1)
+                        break
+                    position += len(block)
+        return [FileRange(r.path, r.start, r.end, zran_index=index['zran_index'])
+                for r in self._ranges(path, bounds, size)]
+
+    def _plan_members(self, path: Path, index: dict) -> list[FileRange]:
+        size, checkpoints = index['size'], index['checkpoints']
+        if len(checkpoints) < 2:
+            return []
+        # 在成员边界中选取分界，使每段的解压后大小接近 range_size
+        chosen = [checkpoints[0]]
+        for checkpoint in checkpoints[1:]:
+            if checkpoint[1] - chosen[-1][1] >= self.range_size and size - checkpoint[1] >= self.range_size // 2:
+                chosen.append(checkpoint)
+        ranges = []
+        starts = [(0, checkpoints[0][0], 0)]
+        with open(path, 'rb', buffering=0) as f:
+            for compressed_offset, offset, at_line_start in chosen[1:]:
+                start = offset if at_line_start else self._next_line_start(f, compressed_offset, offset, size)
+                if starts[-1][0] < start < size:
+                    starts.append((start, compressed_offset, offset))
+        for (start, compressed_offset, offset), end in zip(starts, [*(s[0] for s in starts[1:]), size]):
+            ranges.append(FileRange(str(path), start, end, compressed_offset=compressed_offset,
+                                    checkpoint_offset=offset))
+        return ranges
+
+    @staticmethod
+    def _next_line_start(f, compressed_offset: int, offset: int, size: int) -> int:
+        """从成员起点解压，找到该位置之后第一个行首"""
+        f.seek(compressed_offset)
+        position = offset
+        blocks = iter_gzip_blocks(f)
+        try:
+            for block in blocks:
+                newline = block.find(b'\n')
+                if newline >= 0:
+                    return position + newline + 1
+                position += len(block)
+        finally:
+            blocks.close()
+        return size
@@ -1,3 +1,4 @@
+import pandas as pd
 from src.config import AppConfig
 from src.reporters.base import BaseReporter
 
@@ -18,9 +19,17 @@ class CliReporter(BaseReporter):
 
             print(f"\n[+] Top {self.config.analysis.top_n_count} IP 2xx成功率:")
             print(stats['top_ip_status'].to_string())
+
+            for dim, table in stats.get('top_by_dimension', {}).items():
+                print(f"\n[+] Top {self.config.analysis.top_n_count} {dim} 多维统计:")
+                print(table.to_string())
             
             print("\n[+] 每小时请求数:")
             print(stats['hourly_counts'].to_string())
+
+            if 'hourly_unique_visitors' in stats:
+                print("\n[+] 每小时独立访客数 (近似):")
+                print(stats['hourly_unique_visitors'].to_string())
         
         if 'geo_ip' in self.results and self.results['geo_ip']:
             geo_stats = self.results['geo_ip']
@@ -33,5 +42,28 @@ class CliReporter(BaseReporter):
 
             print(f"\n[+] Top {self.config.analysis.top_n_count} 来源国家/地区:")
             print(geo_stats['country_counts'].to_string())
+
+            if 'query_stats' in geo_stats:
+                print("\n[+] GeoIP API 查询统计:")
+                print(geo_stats['query_stats'].to_string(index=False))
+
+        if 'latency' in self.results:
+            latency = self.results['latency']
+
+            print("\n[+] 整体延迟 (ms) 与吞吐 (字节/ms) 分位数:")
+            print(latency['latency_overall'].to_string())
+
+            for dim, table in latency['latency_by_dimension'].items():
+                print(f"\n[+] 按 {dim} 的延迟与吞吐分位数:")
+                print(table.to_string())
+
+            print("\n[+] 每小时延迟分位数 (ms):")
+            print(latency['latency_hourly'].to_string())
+
+        # --- 近似统计的误差界 ---
+        bounds = [r['approximation'] for r in self.results.values() if r and 'approximation' in r]
+        if bounds:
+            print("\n[+] 近似统计误差界:")
+            print(pd.concat(bounds, ignore_index=True).to_string())
         
         print("\n--- 报告结束 ---\n")
\ No newline at end of file
@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留的点的下标 (升序)。
+
+    首尾两点始终保留，其余点等分为 threshold - 2 个桶，每个桶保留与上一个保留点、下一个桶的均值点
+    构成的三角形面积最大的点，折线的形状 (峰值、突变) 在点数大幅减少后仍能保持。
+    threshold 小于 3 时无法分桶，只保留首尾两点，返回的点数不会超过 max(threshold, 2)。
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.unique(np.array([0, n - 1], dtype=np.int64))
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个桶的均值点 (最后一个桶之后为末尾的点)
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax_indices(values: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    按桶保留最小值与最大值的降采样，用于同一坐标轴上的多条曲线 (例如各分位数)。
+    values 的每一列为一条曲线，各列在每个桶中的最小、最大值所在的点都会保留 (NaN 忽略)，
+    返回升序的下标，点数不超过 2 * buckets * 列数 + 2 (buckets 小于 1 时按 1 个桶计)。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    n = len(values)
+    buckets = max(buckets, 1)
+    if n <= 2 * buckets * values.shape[1]:
+        return np.arange(n)
+    keep = {0, n - 1}
+    bounds = np.linspace(0, n, buckets + 1).astype(np.int64)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        block = values[start:end]
+        valid = ~np.isnan(block)
+        for col in range(block.shape[1]):
+            if not valid[:, col].any():
+                continue
+            column = block[:, col]
+            keep.add(start + int(np.nanargmin(column)))
+            keep.add(start + int(np.nanargmax(column)))
+    return np.array(sorted(keep), dtype=np.int64)
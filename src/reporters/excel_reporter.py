@@ -1,32 +1,181 @@
 # src/reporters/excel_reporter.py (已集成 GeoIP 功能)
+import gzip
+import logging
+import os
+import xlsxwriter
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 from datetime import datetime
 from src.config import AppConfig
 from src.reporters.base import BaseReporter
 
+# Excel 单个工作表的最大行数 (含表头)，原始日志超出后写入 RawLogsSample_2、_3 ...
+EXCEL_MAX_ROWS = 1_048_576
+# 写入大表时每批转换为 Python 对象的行数
+WRITE_BATCH_ROWS = 50_000
+# 原始日志旁路文件的格式与扩展名 (均为压缩格式)
+SIDECAR_SUFFIXES = {'csv': '.csv.gz', 'parquet': '.parquet'}
+
+
+# Excel 日期序列号的起点 (1900 日期系统，1900-03-01 之后的日期)
+_EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+
+def _is_datetime(dtype) -> bool:
+    return isinstance(dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_any_dtype(dtype)
+
+
+def _column_values(series: pd.Series) -> list:
+    """
+    把一列转换为可直接写入单元格的 Python 对象，缺失值为 None (写为空单元格)。
+    时间列 (去掉时区) 整列向量化转换为 Excel 日期序列号，避免逐个单元格转换。
+    """
+    if _is_datetime(series.dtype):
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            series = series.dt.tz_localize(None)
+        series = (series - _EXCEL_EPOCH) / pd.Timedelta(days=1)
+    values = series.tolist()
+    if series.hasnans:
+        values = [None if pd.isna(v) else v for v in values]
+    return values
+
+
 class ExcelReporter(BaseReporter):
-    """将详细分析结果和图表输出到 Excel 文件"""
+    """
+    将详细分析结果和图表输出到 Excel 文件。
+
+    工作簿以 xlsxwriter 的 constant_memory 模式逐行写入 (每写完一行即刷新到临时文件)，
+    各表按批转换后直接写入，不复制整张表，写入时额外占用的内存与表的行数无关。
+    原始日志超出单个工作表的行数上限时自动拆分到多个工作表，也可以配置为写入压缩的 CSV/Parquet 旁路文件。
+    """
+    def _add_sheet(self, sheet_name: str, df: pd.DataFrame, index: bool = True):
+        """新建工作表并写入 df 的表头 (与 DataFrame.to_excel 的布局一致)，返回工作表与各列的写入方法"""
+        worksheet = self.workbook.add_worksheet(sheet_name)
+        offset = 1 if index else 0
+        if index:
+            worksheet.write(0, 0, df.index.name)
+        for col, name in enumerate(df.columns):
+            worksheet.write(0, col + offset, name)
+
+        # 按列的类型直接调用对应的写入方法，省去逐个单元格的类型判断
+        writers = []
+        for dtype in ([df.index.dtype] if index else []) + list(df.dtypes):
+            if _is_datetime(dtype):
+                writers.append((worksheet.write_number, self.datetime_format))
+            elif pd.api.types.is_bool_dtype(dtype):
+                writers.append((worksheet.write_boolean, None))
+            elif pd.api.types.is_numeric_dtype(dtype):
+                writers.append((worksheet.write_number, None))
+            elif pd.api.types.is_string_dtype(dtype) and not pd.api.types.is_object_dtype(dtype):
+                writers.append((worksheet.write_string, None))
+            else:
+                writers.append((worksheet.write, None))
+        if index and not _is_datetime(df.index.dtype):
+            writers[0] = (worksheet.write, None)
+        return worksheet, writers
+
+    def _write_rows(self, writers: list, df: pd.DataFrame, row: int, index: bool = True) -> int:
+        """从第 row 行开始按批写入 df 的所有行，返回下一个空行的行号"""
+        for batch_start in range(0, len(df), WRITE_BATCH_ROWS):
+            batch = df.iloc[batch_start:batch_start + WRITE_BATCH_ROWS]
+            columns = [_column_values(batch.iloc[:, i]) for i in range(batch.shape[1])]
+            if index:
+                columns.insert(0, _column_values(batch.index.to_series()))
+            for values in zip(*columns) if columns else ([()] * len(batch)):
+                for col, value in enumerate(values):
+                    if value is not None:
+                        writer, cell_format = writers[col]
+                        writer(row, col, value, cell_format)
+                row += 1
+        return row
+
+    def _write_frame(self, sheet_name: str, df: pd.DataFrame, index: bool = True):
+        """按行写入 df，返回工作表"""
+        worksheet, writers = self._add_sheet(sheet_name, df, index)
+        self._write_rows(writers, df, 1, index)
+        return worksheet
+
+    def _write_raw_logs(self, sample, sidecar_path: Path | None, sidecar_name: str | None,
+                        sidecar_format: str | None = None) -> None:
+        """
+        原始日志样本 (RawLogSample): 写入旁路文件并在工作簿中链接，或按工作表行数上限拆分写入多个工作表。
+        样本逐批还原后写入，不会合并为一张完整的表。
+        """
+        if sidecar_path is not None:
+            self._write_sidecar(sample, sidecar_path, sidecar_format)
+            worksheet = self.workbook.add_worksheet('RawLogsSample')
+            worksheet.write(0, 0, f"原始日志共 {len(sample)} 行，已写入旁路文件:")
+            worksheet.write_url(1, 0, f"external:{sidecar_name}", string=sidecar_name)
+            return
+        rows_per_sheet = EXCEL_MAX_ROWS - 1
+        header = sample.head(0)
+        part, row = 1, 1
+        _, writers = self._add_sheet('RawLogsSample', header, index=False)
+        for frame in sample.iter_frames(WRITE_BATCH_ROWS):
+            while len(frame):
+                if row > rows_per_sheet:
+                    part, row = part + 1, 1
+                    _, writers = self._add_sheet(f'RawLogsSample_{part}', header, index=False)
+                batch = frame.iloc[:rows_per_sheet + 1 - row]
+                row = self._write_rows(writers, batch, row, index=False)
+                frame = frame.iloc[len(batch):]
+
+    def _write_sidecar(self, sample, path: Path, sidecar_format: str) -> None:
+        """分批写入压缩的 CSV (gzip) 或 Parquet (zstd) 文件 (path 可能是临时文件名，格式不能由扩展名判断)"""
+        header = sample.head(0)
+        if sidecar_format == 'parquet':
+            schema = pa.Schema.from_pandas(header, preserve_index=False)
+            with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+                for batch in sample.iter_frames(WRITE_BATCH_ROWS):
+                    writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+            return
+        with gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6) as f:
+            header.to_csv(f, index=False)
+            for batch in sample.iter_frames(WRITE_BATCH_ROWS):
+                batch.to_csv(f, index=False, header=False)
+
     def generate(self):
-        timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = Path(self.config.output.report_path) / f"cdn_report_{timestamp_str}.xlsx"
+        report_name = self.config.output.report_name
+        if report_name:
+            # 固定文件名的报告会被反复覆盖，先写入临时文件再替换，读取方不会看到写了一半的文件
+            output_path = Path(self.config.output.report_path) / f"{report_name}.xlsx"
+            write_path = output_path.with_name(f".{report_name}.{os.getpid()}.tmp.xlsx")
+        else:
+            timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = write_path = Path(self.config.output.report_path) / f"cdn_report_{timestamp_str}.xlsx"
 
-        with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-            workbook = writer.book
+        sidecar_format = self.config.output.raw_logs_sidecar
+        if sidecar_format and sidecar_format not in SIDECAR_SUFFIXES:
+            logging.warning(f"未知的原始日志旁路文件格式 '{sidecar_format}' (可选 csv、parquet)，将写入工作簿。")
+            sidecar_format = None
+        sidecar_path = sidecar_write_path = None
+        if sidecar_format and 'basic_stats' in self.results:
+            sidecar_path = output_path.with_name(f"{output_path.stem}_raw_logs{SIDECAR_SUFFIXES[sidecar_format]}")
+            sidecar_write_path = sidecar_path if write_path == output_path else \
+                sidecar_path.with_name(f".{sidecar_path.name}.{os.getpid()}.tmp")
 
+        self.workbook = workbook = xlsxwriter.Workbook(str(write_path), {
+            'constant_memory': True,
+            # 日志中的 URL、以 = 开头的字符串等按原样写为文本，不转换为超链接或公式
+            'strings_to_urls': False,
+            'strings_to_formulas': False,
+        })
+        # 与 DataFrame.to_excel 相同: 表头不加样式，时间显示为 YYYY-MM-DD HH:MM:SS
+        self.datetime_format = workbook.add_format({'num_format': 'YYYY-MM-DD HH:MM:SS'})
+        try:
             # --- 基础统计分析 (basic_stats) ---
             if 'basic_stats' in self.results:
                 stats = self.results['basic_stats']
                 
-                # --- 原始日志样本 ---
-                df_raw_logs = stats['raw_logs_sample'].copy()
-                df_raw_logs['timestamp'] = df_raw_logs['timestamp'].dt.tz_localize(None)
-                df_raw_logs.to_excel(writer, sheet_name='RawLogsSample', index=False)
+                # --- 原始日志样本 (逐批还原并写入，不合并为整张表) ---
+                self._write_raw_logs(stats['raw_logs_sample'], sidecar_write_path,
+                                     sidecar_path.name if sidecar_path is not None else None, sidecar_format)
                 
                 # --- 状态码分布 ---
                 status_counts = stats['status_counts']
-                status_counts.to_frame('count').to_excel(writer, sheet_name='StatusCounts')
-                worksheet = writer.sheets['StatusCounts']
+                worksheet = self._write_frame('StatusCounts', status_counts.to_frame('count'))
                 chart1 = workbook.add_chart({'type': 'column'})
                 chart1.add_series({
                     'categories': ['StatusCounts', 1, 0, len(status_counts), 0],
@@ -38,8 +187,7 @@ class ExcelReporter(BaseReporter):
 
                 # --- Top IP ---
                 top_ips = stats['top_ips']
-                top_ips.to_frame('count').to_excel(writer, sheet_name='TopIPs')
-                worksheet = writer.sheets['TopIPs']
+                worksheet = self._write_frame('TopIPs', top_ips.to_frame('count'))
                 chart2 = workbook.add_chart({'type': 'bar'})
                 chart2.add_series({
                     'categories': ['TopIPs', 1, 0, len(top_ips), 0],
@@ -51,8 +199,7 @@ class ExcelReporter(BaseReporter):
 
                 # --- Top IP 2XX 占比 ---
                 top_ip_status_df = stats['top_ip_status']
-                top_ip_status_df.to_excel(writer, sheet_name='TopIP_2XX', index=False)
-                worksheet = writer.sheets['TopIP_2XX']
+                worksheet = self._write_frame('TopIP_2XX', top_ip_status_df, index=False)
                 chart3 = workbook.add_chart({'type': 'column'})
                 chart3.add_series({
                     'categories': ['TopIP_2XX', 1, 0, len(top_ip_status_df), 0],
@@ -62,11 +209,15 @@ class ExcelReporter(BaseReporter):
                 chart3.set_title({'name': 'Top IP 2XX Ratio (%)'})
                 worksheet.insert_chart('E2', chart3)
 
+                # --- 各维度 Top N 多维统计 ---
+                for dim, table in stats.get('top_by_dimension', {}).items():
+                    # Excel 工作表名最长 31 个字符
+                    self._write_frame(f'Top_{dim}'[:31], table, index=False)
+
                 # --- 按小时访问量 ---
                 df_hourly = stats['hourly_counts'].copy()
                 df_hourly.index = df_hourly.index.tz_localize(None)
-                df_hourly.to_frame('count').to_excel(writer, sheet_name='HourlyCounts')
-                worksheet = writer.sheets['HourlyCounts']
+                worksheet = self._write_frame('HourlyCounts', df_hourly.to_frame('count'))
                 chart4 = workbook.add_chart({'type': 'line'})
                 chart4.add_series({
                     'categories': ['HourlyCounts', 1, 0, len(df_hourly), 0],
@@ -76,6 +227,12 @@ class ExcelReporter(BaseReporter):
                 chart4.set_title({'name': 'Hourly Requests'})
                 worksheet.insert_chart('D2', chart4)
 
+                # --- 每小时独立访客数 (近似模式) ---
+                if 'hourly_unique_visitors' in stats:
+                    df_visitors = stats['hourly_unique_visitors'].copy()
+                    df_visitors.index = df_visitors.index.tz_localize(None)
+                    self._write_frame('HourlyUniqueVisitors', df_visitors.to_frame('unique_visitors'))
+
             # --- 地理位置分析 (geo_ip) ---
             # 检查 geo_ip 结果是否存在且不为空
             if 'geo_ip' in self.results and self.results['geo_ip']:
@@ -84,8 +241,7 @@ class ExcelReporter(BaseReporter):
                 # --- 写入运营商统计 ---
                 if 'isp' in geo_stats['ip_geo_details'].columns:
                     isp_counts = geo_stats['ip_geo_details'].groupby('isp')['count'].sum().sort_values(ascending=False).head(20)
-                    isp_counts.to_frame('count').to_excel(writer, sheet_name='ISPCounts')
-                    worksheet = writer.sheets['ISPCounts']
+                    worksheet = self._write_frame('ISPCounts', isp_counts.to_frame('count'))
                     chart_isp = workbook.add_chart({'type': 'bar'})
                     chart_isp.add_series({
                         'categories': ['ISPCounts', 1, 0, len(isp_counts), 0],
@@ -97,8 +253,7 @@ class ExcelReporter(BaseReporter):
 
                 # --- 写入来源国家/地区统计 ---
                 country_counts = geo_stats['country_counts']
-                country_counts.to_frame('count').to_excel(writer, sheet_name='CountryCounts')
-                worksheet = writer.sheets['CountryCounts']
+                worksheet = self._write_frame('CountryCounts', country_counts.to_frame('count'))
                 # 使用饼图展示来源分布
                 chart5 = workbook.add_chart({'type': 'pie'})
                 chart5.add_series({
@@ -111,6 +266,49 @@ class ExcelReporter(BaseReporter):
 
                 # --- 写入IP与地理位置的详细映射表 ---
                 if 'ip_geo_details' in geo_stats:
-                    geo_stats['ip_geo_details'].to_excel(writer, sheet_name='IP_Geo_Details', index=False)
+                    self._write_frame('IP_Geo_Details', geo_stats['ip_geo_details'], index=False)
+
+                # --- API 查询统计 (部分失败时可据此判断结果的完整性) ---
+                if 'query_stats' in geo_stats:
+                    self._write_frame('GeoApiQueryStats', geo_stats['query_stats'], index=False)
+
+            # --- 延迟与吞吐分位数 (latency) ---
+            if 'latency' in self.results:
+                latency = self.results['latency']
+                self._write_frame('LatencyOverall', latency['latency_overall'])
+
+                # --- 每小时延迟分位数，折线图展示各分位数随时间的变化 ---
+                for sheet_name, key, title in [('LatencyHourly', 'latency_hourly', 'Hourly Latency Percentiles (ms)'),
+                                               ('ThroughputHourly', 'throughput_hourly',
+                                                'Hourly Throughput Percentiles (bytes/ms)')]:
+                    df_percentiles = latency[key].copy()
+                    df_percentiles.index = df_percentiles.index.tz_localize(None)
+                    worksheet = self._write_frame(sheet_name, df_percentiles)
+                    chart = workbook.add_chart({'type': 'line'})
+                    # 第 0 列为时间，第 1 列为请求数，之后为各分位数
+                    for col, column_name in enumerate(df_percentiles.columns[1:], start=2):
+                        chart.add_series({
+                            'categories': [sheet_name, 1, 0, len(df_percentiles), 0],
+                            'values':     [sheet_name, 1, col, len(df_percentiles), col],
+                            'name': column_name
+                        })
+                    chart.set_title({'name': title})
+                    worksheet.insert_chart(1, len(df_percentiles.columns) + 2, chart)
+
+                for dim, table in latency['latency_by_dimension'].items():
+                    self._write_frame(f'Latency_{dim}'[:31], table, index=False)
+
+            # --- 近似统计的误差界 ---
+            bounds = [r['approximation'] for r in self.results.values() if r and 'approximation' in r]
+            if bounds:
+                self._write_frame('ApproxErrorBounds', pd.concat(bounds, ignore_index=True), index=False)
+        finally:
+            workbook.close()
 
+        if sidecar_write_path is not None and sidecar_write_path != sidecar_path:
+            os.replace(sidecar_write_path, sidecar_path)
+        if write_path != output_path:
+            os.replace(write_path, output_path)
+        if sidecar_path is not None:
+            print(f"\n✅ 原始日志已写入: {sidecar_path}")
         print(f"\n✅ Excel 报告已生成: {output_path}")
\ No newline at end of file
@@ -0,0 +1,208 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from jinja2 import Environment, FileSystemLoader
+from pyecharts import options as opts
+from pyecharts.charts import Bar, Line, Pie
+from pyecharts.globals import CurrentConfig
+
+from src.reporters.base import BaseReporter
+from src.reporters.downsampling import lttb_indices, minmax_indices
+
+TEMPLATE_DIR = Path(__file__).parent / 'templates'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _json_dumps(data) -> str:
+    """紧凑 JSON，可直接嵌入 <script> 标签 ('</' 转义，避免提前结束脚本)"""
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str, allow_nan=False)
+    return text.replace('</', '<\\/')
+
+
+def _plain(values: np.ndarray) -> list:
+    """数值数组转换为 JSON 可用的列表，NaN 为 null"""
+    values = np.asarray(values, dtype=np.float64)
+    return [None if np.isnan(v) else (int(v) if v.is_integer() else v) for v in values.tolist()]
+
+
+def _time_labels(index: pd.DatetimeIndex) -> list[str]:
+    # 以报告时区的本地时间字符串作为横轴，浏览器按原样显示，与 Excel 报告一致
+    return list(index.strftime(TIME_FORMAT))
+
+
+def _table_rows(df: pd.DataFrame) -> list[list]:
+    """按列转换为 Python 对象后转置为行，时间列格式化为字符串，缺失值为 None"""
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = series.dt.strftime(TIME_FORMAT).tolist()
+        else:
+            values = series.tolist()
+        if series.hasnans:
+            values = [None if pd.isna(v) else v for v in values]
+        columns.append(values)
+    return [list(row) for row in zip(*columns)]
+
+
+class HtmlReporter(BaseReporter):
+    """
+    将分析结果输出为单个 HTML 仪表盘 (ECharts 图表 + 可翻页的明细表)。
+
+    报告的大小与数据量无关: 时间序列在生成时降采样 (请求数用 LTTB，多条分位数曲线按桶保留最小/最大值)，
+    明细表最多嵌入 max_table_rows 行并以紧凑 JSON 存放，浏览器每次只渲染一页。
+    """
+    def _line_options(self, line: Line, title: str) -> dict:
+        line.set_global_opts(
+            title_opts=opts.TitleOpts(is_show=False),
+            xaxis_opts=opts.AxisOpts(type_='time'),
+            yaxis_opts=opts.AxisOpts(type_='value'),
+            tooltip_opts=opts.TooltipOpts(trigger='axis'),
+            legend_opts=opts.LegendOpts(pos_top='0'),
+            datazoom_opts=[opts.DataZoomOpts(type_='inside'), opts.DataZoomOpts(type_='slider')],
+        )
+        return json.loads(line.dump_options_with_quotes())
+
+    def _add_chart(self, title: str, options: dict, note: str | None = None) -> None:
+        self.charts.append({'title': title, 'note': note, 'options': options})
+
+    def _add_table(self, title: str, df: pd.DataFrame, index: bool = False, total: int | None = None) -> None:
+        """total 为完整表的行数 (df 只包含前几行时传入)"""
+        if index:
+            df = df.reset_index()
+        total = len(df) if total is None else total
+        limit = self.config.output.html.max_table_rows
+        df = df.iloc[:limit]
+        self.tables.append({
+            'title': title,
+            'columns': [str(c) for c in df.columns],
+            'rows': _table_rows(df),
+            'total': total,
+            'truncated': total > len(df),
+        })
+
+    def _bar_chart(self, title: str, series: pd.Series, horizontal: bool = False) -> None:
+        bar = Bar().add_xaxis([str(k) for k in series.index]).add_yaxis(
+            'count', _plain(series.to_numpy()), label_opts=opts.LabelOpts(is_show=False))
+        if horizontal:
+            bar.reversal_axis()
+        bar.set_global_opts(title_opts=opts.TitleOpts(is_show=False), legend_opts=opts.LegendOpts(is_show=False),
+                            tooltip_opts=opts.TooltipOpts(trigger='axis'))
+        self._add_chart(title, json.loads(bar.dump_options_with_quotes()))
+
+    def _hourly_chart(self, title: str, named_series: list[tuple[str, pd.Series]]) -> None:
+        """每条序列分别以 LTTB 降采样到 max_points 个点"""
+        max_points = self.config.output.html.max_points
+        line = Line()
+        note = None
+        for name, series in named_series:
+            series = series.sort_index()
+            values = series.to_numpy(dtype=np.float64)
+            keep = lttb_indices(series.index.asi8.astype(np.float64), np.nan_to_num(values), max_points)
+            if len(keep) < len(series):
+                note = f"时间序列已降采样 (LTTB)，每条最多 {max_points} 个点"
+            line.add_xaxis(_time_labels(series.index[keep]))
+            line.add_yaxis(name, _plain(values[keep]), is_symbol_show=False,
+                           label_opts=opts.LabelOpts(is_show=False))
+        self._add_chart(title, self._line_options(line, title), note)
+
+    def _percentile_chart(self, title: str, table: pd.DataFrame) -> None:
+        """第 0 列为请求数，之后为各分位数；按桶保留各分位数曲线的最小/最大值"""
+        table = table.sort_index()
+        percentiles = table.iloc[:, 1:]
+        max_points = self.config.output.html.max_points
+        buckets = max(1, max_points // (2 * max(1, percentiles.shape[1])))
+        keep = minmax_indices(percentiles.to_numpy(dtype=np.float64), buckets)
+        note = f"时间序列已按桶保留最小/最大值降采样 ({len(keep)}/{len(table)} 个点)" if len(keep) < len(table) else None
+        line = Line().add_xaxis(_time_labels(table.index[keep]))
+        for name in percentiles.columns:
+            line.add_yaxis(name, _plain(percentiles[name].to_numpy()[keep]), is_symbol_show=False,
+                           label_opts=opts.LabelOpts(is_show=False))
+        self._add_chart(title, self._line_options(line, title), note)
+
+    def generate(self):
+        self.charts, self.tables = [], []
+        top_n_count = self.config.analysis.top_n_count
+
+        # --- 基础统计分析 (basic_stats) ---
+        if 'basic_stats' in self.results:
+            stats = self.results['basic_stats']
+            self._bar_chart('状态码分布', stats['status_counts'])
+            self._bar_chart(f'Top {top_n_count} IP', stats['top_ips'].iloc[::-1], horizontal=True)
+            hourly = [('requests', stats['hourly_counts'])]
+            if 'hourly_unique_visitors' in stats:
+                hourly.append(('unique_visitors (近似)', stats['hourly_unique_visitors']))
+            self._hourly_chart('每小时请求数', hourly)
+
+            self._add_table(f'Top {top_n_count} IP 2XX 占比', stats['top_ip_status'])
+            for dim, table in stats.get('top_by_dimension', {}).items():
+                self._add_table(f'Top {top_n_count} {dim} 多维统计', table)
+
+        # --- 地理位置分析 (geo_ip) ---
+        if 'geo_ip' in self.results and self.results['geo_ip']:
+            geo_stats = self.results['geo_ip']
+            country_counts = geo_stats['country_counts']
+            pie = Pie().add('count', [(str(k), int(v)) for k, v in country_counts.items()],
+                            radius=['35%', '65%'])
+            pie.set_global_opts(title_opts=opts.TitleOpts(is_show=False),
+                                legend_opts=opts.LegendOpts(type_='scroll', pos_top='0'))
+            self._add_chart('来源国家/地区分布', json.loads(pie.dump_options_with_quotes()))
+
+            if 'isp' in geo_stats['ip_geo_details'].columns:
+                isp_counts = geo_stats['ip_geo_details'].groupby('isp')['count'].sum()
+                isp_counts = isp_counts.sort_values(ascending=False).head(20)
+                self._bar_chart('Top 20 运营商', isp_counts.iloc[::-1], horizontal=True)
+
+            self._add_table('IP 地理位置明细', geo_stats['ip_geo_details'])
+            if 'query_stats' in geo_stats:
+                self._add_table('GeoIP API 查询统计', geo_stats['query_stats'])
+
+        # --- 延迟与吞吐分位数 (latency) ---
+        if 'latency' in self.results:
+            latency = self.results['latency']
+            self._percentile_chart('每小时延迟分位数 (ms)', latency['latency_hourly'])
+            self._percentile_chart('每小时吞吐分位数 (字节/ms)', latency['throughput_hourly'])
+            self._add_table('整体延迟与吞吐分位数', latency['latency_overall'], index=True)
+            for dim, table in latency['latency_by_dimension'].items():
+                self._add_table(f'按 {dim} 的延迟与吞吐分位数', table)
+
+        # --- 近似统计的误差界 ---
+        bounds = [r['approximation'] for r in self.results.values() if r and 'approximation' in r]
+        if bounds:
+            self._add_table('近似统计误差界', pd.concat(bounds, ignore_index=True))
+
+        if 'basic_stats' in self.results:
+            # 只还原需要嵌入的前 max_table_rows 行
+            sample = self.results['basic_stats']['raw_logs_sample']
+            self._add_table('原始日志样本', sample.head(self.config.output.html.max_table_rows), total=len(sample))
+
+        html_config = self.config.output.html
+        echarts_inline = None
+        if html_config.echarts_js:
+            echarts_inline = Path(html_config.echarts_js).read_text(encoding='utf-8').replace('</script', '<\\/script')
+        payload = _json_dumps({'page_size': html_config.page_size, 'charts': self.charts, 'tables': self.tables})
+        env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True)
+        html = env.get_template('dashboard.html').render(
+            title='CDN 日志分析报告',
+            generated_at=datetime.now().strftime(TIME_FORMAT),
+            echarts_inline=echarts_inline,
+            echarts_src=f"{CurrentConfig.ONLINE_HOST}echarts.min.js",
+            payload=payload,
+        )
+
+        report_name = self.config.output.report_name
+        if report_name:
+            # 与 Excel 报告相同: 固定文件名的报告先写入临时文件再替换
+            output_path = Path(self.config.output.report_path) / f"{report_name}.html"
+            write_path = output_path.with_name(f".{report_name}.{os.getpid()}.tmp.html")
+        else:
+            timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = write_path = Path(self.config.output.report_path) / f"cdn_report_{timestamp_str}.html"
+        write_path.write_text(html, encoding='utf-8')
+        if write_path != output_path:
+            os.replace(write_path, output_path)
+        print(f"\n✅ HTML 报告已生成: {output_path} ({output_path.stat().st_size / 1024:.0f} KB)")
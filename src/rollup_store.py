@@ -0,0 +1,236 @@
+import logging
+import pickle
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import pandas as pd
+
+from src.analysis_engine import AnalysisEngine
+from src.analyzers.basic_stats_analyzer import REPORT_TIMEZONE
+from src.config import AppConfig
+from src.ingestion import iter_file_chunks
+from src.input_handler import get_log_files
+from src.log_schema import dimension_keys
+from src.map_reduce import file_key
+
+# 汇总库的格式版本，格式变化时旧的分区不再使用
+# 版本 3: 文件以相对 input.path 的路径 (而不是文件名) 记录，不同子目录中的同名文件不再冲突
+ROLLUP_VERSION = 3
+# 分区粒度: 每小时一个分区，另按报告时区的自然日汇总一份日分区。
+# 查询时完整覆盖的日期直接读取日分区，只有范围两端不足一天的部分读取小时分区
+HOUR, DAY = 'hour', 'day'
+_DAY_SECONDS = 86400
+
+
+def day_start(hour: int) -> int:
+    """某个小时在报告时区中所属自然日的起始时间戳"""
+    return int(pd.Timestamp(hour, unit='s', tz='UTC').tz_convert(REPORT_TIMEZONE).normalize().timestamp())
+
+
+class RollupStore:
+    """
+    按 (域名, 小时) 与 (域名, 日) 分区保存分析器中间状态的汇总库 (SQLite)。
+
+    每个日志文件解析一次，各分析器的中间状态 (计数表、直方图、草图等) 按数据所属的域名和小时拆分后
+    序列化写入对应的小时分区，并合并进所属的日分区，同一分区的多个文件在写入时合并。
+    查询时间范围时只读取范围内的分区并合并，不再读取原始日志，90 天的范围只需合并约 90 个日分区。分区以中间状态的兼容性标识区分，分析配置变化后旧的分区不会被误用。
+    已写入的文件记录在 rollup_files 表中，与分区在同一事务中提交。
+    """
+    def __init__(self, db_path: Path, state_key: str):
+        self.db_path = db_path
+        self.state_key = state_key
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_partitions (
+                state_key TEXT NOT NULL,
+                level TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                state BLOB NOT NULL,
+                UNIQUE (state_key, level, start, domain)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_files (
+                state_key TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                ingested_at REAL NOT NULL,
+                PRIMARY KEY (state_key, name)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config: AppConfig, state_key: str) -> 'RollupStore':
+        rollup_config = config.input.rollup
+        db_path = Path(rollup_config.path) if rollup_config.path else \
+            Path(config.input.path or './logs/') / '.rollup.sqlite'
+        return cls(db_path, f"{state_key}|v{ROLLUP_VERSION}")
+
+    def ingested_files(self) -> dict[str, tuple[int, int]]:
+        """已写入汇总的文件 {相对 input.path 的路径: (大小, 修改时间)}"""
+        rows = self._conn.execute(
+            "SELECT name, size, mtime_ns FROM rollup_files WHERE state_key = ?", (self.state_key,)
+        ).fetchall()
+        return {name: (size, mtime_ns) for name, size, mtime_ns in rows}
+
+    def _merge_into(self, level: str, domain: str, start: int, rows: int, states: Any,
+                    merge: Callable[[Any, Any], Any]) -> None:
+        existing = self._conn.execute(
+            "SELECT rows, state FROM rollup_partitions "
+            "WHERE state_key = ? AND level = ? AND start = ? AND domain = ?",
+            (self.state_key, level, start, domain),
+        ).fetchone()
+        if existing is not None:
+            rows += existing[0]
+            states = merge(pickle.loads(existing[1]), states)
+        day = start if level == DAY else day_start(start)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO rollup_partitions VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.state_key, level, domain, start, day, rows, pickle.dumps(states, protocol=pickle.HIGHEST_PROTOCOL)),
+        )
+
+    def write_file(self, path: Path, key: str, partitions: dict[tuple[str, int], tuple[int, Any]],
+                   merge: Callable[[Any, Any], Any]) -> None:
+        """
+        把一个文件的各小时分区状态合并写入汇总库 (同时更新所属的日分区)，并以 key (相对 input.path 的路径)
+        记录该文件 (同一事务)
+        """
+        stat = path.stat()
+        days: dict[tuple[str, int], tuple[int, Any]] = {}
+        for (domain, hour), (rows, states) in sorted(partitions.items(), key=lambda item: item[0][1]):
+            day = (domain, day_start(hour))
+            if day in days:
+                day_rows, day_states = days[day]
+                days[day] = (day_rows + rows, merge(day_states, states))
+            else:
+                days[day] = (rows, states)
+        try:
+            with self._conn:
+                for (domain, hour), (rows, states) in partitions.items():
+                    self._merge_into(HOUR, domain, hour, rows, states, merge)
+                for (domain, day), (rows, states) in days.items():
+                    self._merge_into(DAY, domain, day, rows, states, merge)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rollup_files VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.state_key, key, stat.st_size, stat.st_mtime_ns,
+                     sum(rows for rows, _ in partitions.values()), time.time()),
+                )
+        except sqlite3.Error as e:
+            logging.error(f"写入汇总库失败 {key}: {e}")
+
+    def iter_partitions(self, since: int | None = None, until: int | None = None) -> Iterator[tuple[int, Any]]:
+        """
+        按时间顺序产出 [since, until) 范围内各分区的 (日志条数, 中间状态)。
+        范围完整覆盖的自然日读取日分区，其余部分读取小时分区 (范围以小时为单位，不足一小时的部分按整小时计入)。
+        """
+        since = since if since is not None else -2 ** 62
+        until = until if until is not None else 2 ** 62
+        rows = self._conn.execute(
+            "SELECT rows, state FROM rollup_partitions WHERE state_key = ? AND ("
+            "(level = ? AND start >= ? AND start + ? <= ?) OR "
+            "(level = ? AND start + 3600 > ? AND start < ? AND NOT (day >= ? AND day + ? <= ?))"
+            ") ORDER BY start, level, domain",
+            (self.state_key, DAY, since, _DAY_SECONDS, until,
+             HOUR, since, until, since, _DAY_SECONDS, until),
+        )
+        for count, state in rows:
+            yield count, pickle.loads(state)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RollupRunner:
+    """
+    --rollup: 把尚未写入汇总库的本地日志文件解析后按分区写入，再由时间范围内的分区合并生成报告。
+    已写入的文件之后发生变化 (大小或修改时间不同) 时不会重复计入，需删除汇总库后重建。
+    """
+    def __init__(self, config: AppConfig, workers: int | None = None):
+        self.config = config
+        self.workers = workers
+        self.engine = AnalysisEngine(config)
+        self.store = RollupStore.from_config(config, self.engine.state_key())
+
+        legacy = [name for name, analyzer in self.engine.available_analyzers.items()
+                  if not analyzer.supports_streaming]
+        if legacy:
+            logging.warning(f"分析器 {legacy} 不支持流式分析，汇总模式下将跳过。")
+
+    def _partition(self, chunks: list[pd.DataFrame]) -> dict[tuple[str, int], tuple[int, Any]]:
+        """把一个文件的数据块按 (域名, 小时) 拆分，分别更新各分区的中间状态"""
+        partitions: dict[tuple[str, int], tuple[int, Any]] = {}
+        for chunk in chunks:
+            hours = chunk['timestamp'] // 3600 * 3600
+            domains = dimension_keys(chunk, 'domain', fill='')
+            for (domain, hour), index in chunk.groupby([domains, hours], sort=False, observed=True).indices.items():
+                key = (str(domain), int(hour))
+                part = chunk.iloc[index]
+                rows, states = partitions.get(key, (0, None))
+                states = self.engine.update_states(states or self.engine.init_states(), part)
+                partitions[key] = (rows + len(part), states)
+        return partitions
+
+    def ingest(self) -> int:
+        """解析尚未写入汇总库的文件，返回新写入的日志条数"""
+        ingested = self.store.ingested_files()
+        missing = []
+        for path in sorted(get_log_files(self.config.input.path, self.config.input.file_pattern)):
+            # 汇总库本身位于日志目录中时 (默认位置)，不作为日志文件处理
+            if not path.is_file() or path.name.startswith(self.store.db_path.name):
+                continue
+            # 以相对 input.path 的路径识别文件，不同子目录中的同名文件互不影响
+            key = file_key(path, self.config.input.path)
+            recorded = ingested.get(key)
+            if recorded is None:
+                missing.append(path)
+            elif recorded != (path.stat().st_size, path.stat().st_mtime_ns):
+                logging.warning(f"{key} 在写入汇总库后发生了变化，已跳过 (如需重新统计请删除汇总库)")
+        logging.info(f"汇总库中已有 {len(ingested)} 个文件，需要解析 {len(missing)} 个新文件。")
+
+        added = 0
+        for path, chunks in iter_file_chunks(self.config, missing, self.workers):
+            partitions = self._partition(chunks)
+            self.store.write_file(path, file_key(path, self.config.input.path), partitions, self.engine.merge_states)
+            rows = sum(rows for rows, _ in partitions.values())
+            added += rows
+            logging.info(f"--> {path.name}: {rows} 条日志写入 {len(partitions)} 个分区")
+        return added
+
+    def results(self, since: int | None = None, until: int | None = None) -> dict[str, dict] | None:
+        """合并时间范围内的分区并生成分析结果，范围内没有数据时返回 None"""
+        counter = [0]
+
+        def _states() -> Iterator[Any]:
+            for rows, states in self.store.iter_partitions(since, until):
+                counter[0] += rows
+                yield states
+
+        started = time.perf_counter()
+        states = self.engine.merge_all(_states())
+        logging.info(f"已合并 {counter[0]} 条日志的汇总分区，用时 {time.perf_counter() - started:.2f} 秒")
+        if counter[0] == 0:
+            return None
+        self.engine.rows_processed = counter[0]
+        return self.engine.finalize_states(states)
+
+    def run(self, report: Callable[[dict], None], since: int | None = None, until: int | None = None) -> None:
+        try:
+            self.ingest()
+            results = self.results(since, until)
+        finally:
+            self.store.close()
+            self.engine.close()
+        if results is None:
+            logging.warning("所选时间范围内没有任何日志数据，程序即将退出。")
+            return
+        report(results)
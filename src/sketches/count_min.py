@@ -0,0 +1,65 @@
+import math
+import numpy as np
+
+# 生成各行哈希乘数的固定种子，保证同样参数的草图在不同进程间可以合并
+_SEED = 0x5EED_C0DE
+
+
+class CountMinSketch:
+    """
+    Count-Min 草图，用于点查询 (估计任意键的累计权重)。
+
+    估计值只会偏高: 真实值 <= 估计值 <= 真实值 + epsilon * 总权重 的概率至少为 1 - delta，
+    其中 epsilon = e / width, delta = e^(-depth)。同参数的草图按元素相加即可合并。
+    """
+    def __init__(self, width: int = 2 ** 16, depth: int = 4):
+        # 宽度取 2 的幂，以便使用乘法移位哈希
+        self.width = 1 << max(int(math.ceil(math.log2(width))), 1)
+        self.depth = depth
+        self._shift = np.uint64(64 - int(math.log2(self.width)))
+        rng = np.random.default_rng(_SEED)
+        self._multipliers = rng.integers(1, 2 ** 63, size=depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.table = np.zeros((depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    def _indexes(self, hashes: np.ndarray) -> np.ndarray:
+        return ((hashes[None, :] * self._multipliers[:, None]) >> self._shift).astype(np.int64)
+
+    def update(self, hashes: np.ndarray, weights: np.ndarray | None = None) -> None:
+        if len(hashes) == 0:
+            return
+        weights = np.ones(len(hashes), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+        for row, idx in enumerate(self._indexes(hashes)):
+            self.table[row] += np.bincount(idx, weights=weights, minlength=self.width).astype(np.int64)
+        self.total += int(weights.sum())
+
+    def query(self, hashes: np.ndarray) -> np.ndarray:
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        idx = self._indexes(hashes)
+        return np.min(self.table[np.arange(self.depth)[:, None], idx], axis=0)
+
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("只能合并参数相同的 Count-Min 草图。")
+        merged = CountMinSketch(self.width, self.depth)
+        merged.table = self.table + other.table
+        merged.total = self.total + other.total
+        return merged
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+    @property
+    def error_bound(self) -> float:
+        """以 1 - delta 的概率成立的单点估计最大高估量"""
+        return self.epsilon * self.total
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.table.nbytes)
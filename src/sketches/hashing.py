@@ -0,0 +1,13 @@
+import numpy as np
+import pandas as pd
+
+
+def hash_values(values: pd.Series | pd.Index) -> np.ndarray:
+    """
+    将一列值映射为 64 位哈希。
+    使用 pandas 的固定密钥哈希，结果在不同进程和机器之间保持一致，
+    因此基于它构建的草图 (sketch) 可以跨分块、文件和进程合并。
+    """
+    if isinstance(values, pd.Index):
+        values = values.to_series(index=None)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
@@ -0,0 +1,157 @@
+import math
+import numpy as np
+import pandas as pd
+
+
+class LogBuckets:
+    """
+    对数分桶方案 (DDSketch 风格)。
+
+    桶 i 覆盖 (gamma^(i-1), gamma^i]，其中 gamma = (1 + a) / (1 - a)，
+    以桶的代表值估计桶内任意值时相对误差不超过 a。
+    小于等于 min_value 的值落入 0 号桶 (代表值为 0)，大于 max_value 的值落入最后一个桶，
+    因此桶的数量固定，直方图占用的内存与数据量无关。
+    """
+    def __init__(self, relative_accuracy: float, min_value: float, max_value: float):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        self.size = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 2
+
+    def index(self, values: np.ndarray) -> np.ndarray:
+        v = np.asarray(values, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            raw = np.ceil(np.log(v) / self._log_gamma) - self._offset + 1
+        raw = np.where(v > self.min_value, raw, 0)
+        return np.clip(raw, 0, self.size - 1).astype(np.int64)
+
+    def value(self, indexes: np.ndarray) -> np.ndarray:
+        """桶的代表值"""
+        i = np.asarray(indexes, dtype=np.float64) + self._offset - 1
+        return np.where(np.asarray(indexes) > 0, 2 * self.gamma ** i / (self.gamma + 1), 0.0)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, LogBuckets) and (self.relative_accuracy, self.min_value, self.max_value) == \
+            (other.relative_accuracy, other.min_value, other.max_value)
+
+
+def quantiles_from_counts(buckets: LogBuckets, counts: np.ndarray, qs: list[float]) -> np.ndarray:
+    """
+    由直方图计数计算分位数。counts 可以是一维 (单个直方图) 或二维 (每行一个直方图)，
+    返回形状为 (..., len(qs)) 的数组，空直方图的分位数为 NaN。
+    """
+    counts = np.atleast_2d(counts)
+    cum = np.cumsum(counts, axis=1)
+    total = cum[:, -1:]
+    result = np.full((counts.shape[0], len(qs)), np.nan)
+    for j, q in enumerate(qs):
+        # 与 DDSketch 一致: 取累计计数首次超过 q * (n - 1) 的桶
+        rank = q * (total - 1)
+        idx = np.argmax(cum > rank, axis=1)
+        result[:, j] = np.where(total[:, 0] > 0, buckets.value(idx), np.nan)
+    return result
+
+
+class KeyedHistograms:
+    """
+    按键分组的一组固定大小直方图，可合并。
+
+    每个数据块通过一次 bincount 更新所有键的直方图。
+    设置 max_keys 时只保留计数最多的 max_keys 个键 (用于路径等高基数维度)，
+    被淘汰后重新进入的键只统计其重新进入之后的数据。
+    """
+    def __init__(self, buckets: LogBuckets, max_keys: int | None = None):
+        self.buckets = buckets
+        self.max_keys = max_keys
+        self.keys: list = []
+        self._rows: dict = {}
+        self.counts = np.zeros((0, buckets.size), dtype=np.int64)
+
+    def _ensure_rows(self, keys) -> np.ndarray:
+        new_keys = [k for k in keys if k not in self._rows]
+        if new_keys:
+            for k in new_keys:
+                self._rows[k] = len(self.keys)
+                self.keys.append(k)
+            self.counts = np.vstack([self.counts, np.zeros((len(new_keys), self.buckets.size), dtype=np.int64)])
+        return np.array([self._rows[k] for k in keys], dtype=np.int64)
+
+    def _evict(self) -> None:
+        if self.max_keys is None or len(self.keys) <= self.max_keys:
+            return
+        totals = self.counts.sum(axis=1)
+        keep = np.sort(np.argsort(-totals, kind='stable')[:self.max_keys])
+        self.keys = [self.keys[i] for i in keep]
+        self.counts = self.counts[keep]
+        self._rows = {k: i for i, k in enumerate(self.keys)}
+
+    def update(self, keys: pd.Series, values: np.ndarray) -> None:
+        if len(keys) == 0:
+            return
+        values = np.asarray(values)
+        if self.max_keys is not None:
+            # 只有已跟踪的键和本块中计数最多的 max_keys 个键参与统计，避免为大量长尾键分配直方图
+            candidates = set(self.keys) | set(keys.value_counts().index[:self.max_keys])
+            mask = keys.isin(candidates).to_numpy()
+            keys, values = keys[mask], values[mask]
+        codes, uniques = pd.factorize(keys, sort=False)
+        rows = self._ensure_rows(list(uniques))
+        flat = rows[codes] * self.buckets.size + self.buckets.index(values)
+        added = np.bincount(flat, minlength=len(self.keys) * self.buckets.size)
+        self.counts += added.reshape(len(self.keys), self.buckets.size)
+        self._evict()
+
+    def merge(self, other: 'KeyedHistograms') -> 'KeyedHistograms':
+        if self.buckets != other.buckets:
+            raise ValueError("只能合并分桶方案相同的直方图。")
+        merged = KeyedHistograms(self.buckets, self.max_keys)
+        new_keys = [k for k in other.keys if k not in self._rows]
+        merged.keys = self.keys + new_keys
+        merged._rows = dict(self._rows)
+        merged._rows.update((k, len(self.keys) + i) for i, k in enumerate(new_keys))
+        # 一次分配合并后的计数矩阵 (合并大量分区时避免逐次扩展和复制)
+        merged.counts = np.zeros((len(merged.keys), self.buckets.size), dtype=np.int64)
+        merged.counts[:len(self.keys)] = self.counts
+        if other.keys:
+            merged.counts[[merged._rows[k] for k in other.keys]] += other.counts
+        merged._evict()
+        return merged
+
+    def __getstate__(self) -> dict:
+        # 序列化 (汇总分区、增量状态) 时只保存非零的桶，每个键的直方图通常只有少数几个桶有计数
+        state = self.__dict__.copy()
+        flat = self.counts.ravel()
+        nonzero = np.flatnonzero(flat)
+        state['counts'] = (self.counts.shape, nonzero, flat[nonzero])
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        shape, nonzero, values = state['counts']
+        counts = np.zeros(shape, dtype=np.int64)
+        counts.ravel()[nonzero] = values
+        state['counts'] = counts
+        self.__dict__.update(state)
+
+    def totals(self) -> pd.Series:
+        return pd.Series(self.counts.sum(axis=1), index=self.keys, dtype='int64')
+
+    def quantiles(self, qs: list[float], keys: list | None = None) -> pd.DataFrame:
+        """每个键的分位数表，列为各分位数，另附 count 列"""
+        keys = self.keys if keys is None else keys
+        rows = [self._rows[k] for k in keys]
+        counts = self.counts[rows] if rows else np.zeros((0, self.buckets.size), dtype=np.int64)
+        values = quantiles_from_counts(self.buckets, counts, qs) if rows else np.zeros((0, len(qs)))
+        table = pd.DataFrame(values, index=keys, columns=[_quantile_label(q) for q in qs])
+        table.insert(0, 'count', counts.sum(axis=1))
+        return table
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.counts.nbytes)
+
+
+def _quantile_label(q: float) -> str:
+    return f"p{q * 100:g}"
@@ -0,0 +1,60 @@
+import math
+import numpy as np
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """计算 uint64 数组每个元素的有效位数 (分成高低 32 位，以保证浮点运算精确)"""
+    hi = (values >> np.uint64(32)).astype(np.float64)
+    lo = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    hi_bits = np.frexp(hi)[1]
+    lo_bits = np.frexp(lo)[1]
+    return np.where(hi > 0, hi_bits + 32, lo_bits)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog 基数估计草图，用于统计独立访客数。
+
+    使用 2^precision 个寄存器，相对标准误差约为 1.04 / sqrt(2^precision)。
+    同精度的草图按寄存器取最大值即可合并。
+    """
+    def __init__(self, precision: int = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog 的精度需在 4 到 18 之间。")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray) -> None:
+        if len(hashes) == 0:
+            return
+        p = np.uint64(self.precision)
+        idx = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = hashes << p
+        # rank = 剩余位中第一个 1 出现的位置 (从 1 开始计数)
+        rank = np.where(rest == 0, 64 - self.precision + 1, 64 - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        if self.precision != other.precision:
+            raise ValueError("只能合并精度相同的 HyperLogLog 草图。")
+        merged = HyperLogLog(self.precision)
+        merged.registers = np.maximum(self.registers, other.registers)
+        return merged
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # 小基数时使用线性计数修正
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.registers.nbytes)
@@ -0,0 +1,74 @@
+import pandas as pd
+
+
+class SpaceSaving:
+    """
+    Space-Saving 重频项 (heavy hitters) 草图。
+
+    最多跟踪 capacity 个键，每个键记录估计计数与最大高估量 (error)，
+    对任意被跟踪的键有: count - error <= 真实计数 <= count，且 error <= 总数 / capacity。
+    更新时先对数据块做精确计数，再按 "并行 Space-Saving" 的方式与现有摘要合并，
+    因此分块更新与跨进程合并使用同一套规则，结果满足结合律。
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype='int64')
+        self.errors = pd.Series(dtype='int64')
+        self.total = 0
+
+    @property
+    def min_count(self) -> int:
+        """摘要已满时的最小计数，即未被跟踪的键的计数上界"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return int(self.counts.min())
+
+    def _combine(self, counts: pd.Series, errors: pd.Series, min_count: int, total: int) -> None:
+        own_min = self.min_count
+        keys = self.counts.index.union(counts.index)
+        # 未出现在某一摘要中的键，其在该摘要中的计数最多为该摘要的最小计数
+        merged_counts = (self.counts.reindex(keys, fill_value=own_min)
+                         + counts.reindex(keys, fill_value=min_count))
+        merged_errors = (self.errors.reindex(keys, fill_value=own_min)
+                         + errors.reindex(keys, fill_value=min_count))
+        if len(merged_counts) > self.capacity:
+            merged_counts = merged_counts.sort_index().sort_values(ascending=False, kind='stable').head(self.capacity)
+            merged_errors = merged_errors.reindex(merged_counts.index)
+        self.counts = merged_counts.astype('int64')
+        self.errors = merged_errors.astype('int64')
+        self.total += total
+
+    def add(self, counts: pd.Series) -> None:
+        """用一个数据块中各键的精确计数更新摘要 (与 CountTable.add 的接口一致)"""
+        if len(counts):
+            counts = counts.astype('int64')
+            self._combine(counts, pd.Series(0, index=counts.index, dtype='int64'), 0, int(counts.sum()))
+
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+        merged = SpaceSaving(self.capacity)
+        merged.counts, merged.errors, merged.total = self.counts, self.errors, self.total
+        merged._combine(other.counts, other.errors, other.min_count, other.total)
+        return merged
+
+    def to_series(self) -> pd.Series:
+        """被跟踪键的估计计数 (未排序)"""
+        return self.counts.rename('count')
+
+    def top(self, n: int) -> pd.DataFrame:
+        """估计计数最高的 n 个键，包含估计计数、最大高估量与保证的最小计数"""
+        top_counts = self.counts.sort_index().sort_values(ascending=False, kind='stable').head(n)
+        errors = self.errors.reindex(top_counts.index)
+        return pd.DataFrame({
+            'count': top_counts,
+            'error': errors,
+            'guaranteed': top_counts - errors,
+        })
+
+    @property
+    def max_error(self) -> int:
+        """任意键估计计数的最大高估量"""
+        return int(self.errors.max()) if len(self.errors) else 0
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.counts.memory_usage(deep=True) + self.errors.memory_usage(deep=True))
@@ -0,0 +1,32 @@
+"""分析器线程池在运行结束后关闭"""
+import threading
+from pathlib import Path
+
+import pytest
+
+from src.analysis_engine import AnalysisEngine
+from src.config import load_config
+from tests.test_raw_logs import _chunk
+
+
+@pytest.fixture
+def config():
+    config = load_config(str(Path(__file__).parents[1] / 'config' / 'config.yaml'))
+    config.analysis.modules = ['basic_stats', 'latency']
+    config.analysis.analyzer_threads = 2
+    config.analysis.raw_logs_sample_limit = 10
+    return config
+
+
+def _analyzer_threads() -> list[threading.Thread]:
+    return [t for t in threading.enumerate() if t.name.startswith('analyzer')]
+
+
+def test_executor_shut_down_after_run(config):
+    with AnalysisEngine(config) as engine:
+        results = engine.run_chunks([_chunk(0, 20), _chunk(20, 20)])
+        assert _analyzer_threads()
+    assert engine.rows_processed == 40 and len(results['basic_stats']['raw_logs_sample']) == 10
+    assert engine._executor is None and not _analyzer_threads()
+    # 重复关闭不报错
+    engine.close()
@@ -0,0 +1,71 @@
+"""HTML 仪表盘的降采样 (LTTB 与按桶保留最小/最大值) 与点数、行数配置的下限"""
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from src.config import HtmlReportConfig
+from src.reporters.downsampling import lttb_indices, minmax_indices
+
+
+def _series(n: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(3)
+    y = np.cumsum(rng.normal(size=n))
+    # 单点的峰值
+    y[n // 3] += 1_000
+    return np.arange(n, dtype=np.float64) * 60, y
+
+
+def test_lttb_keeps_shape_within_budget():
+    x, y = _series(10_000)
+    for threshold in (3, 50, 2_000):
+        keep = lttb_indices(x, y, threshold)
+        assert len(keep) == threshold
+        assert keep[0] == 0 and keep[-1] == len(x) - 1 and (np.diff(keep) > 0).all()
+        assert len(x) // 3 in keep
+    # 每个桶恰好保留一个点
+    keep = lttb_indices(x, y, 50)
+    every = (len(x) - 2) / 48
+    for i, index in enumerate(keep[1:-1]):
+        assert int(i * every) + 1 <= index < int((i + 1) * every) + 1
+
+
+def test_lttb_small_thresholds():
+    x, y = _series(100)
+    assert (lttb_indices(x, y, 100) == np.arange(100)).all()
+    assert (lttb_indices(x, y, 500) == np.arange(100)).all()
+    # 点数不足 3 时只保留首尾两点，而不是全部保留
+    for threshold in (2, 1, 0, -5):
+        assert lttb_indices(x, y, threshold).tolist() == [0, 99]
+    assert lttb_indices(x[:1], y[:1], 0).tolist() == [0]
+
+
+def test_minmax_keeps_extremes_of_every_column():
+    x, y = _series(5_000)
+    values = np.column_stack([y, -y, np.full(len(y), np.nan)])
+    values[100:200, 0] = np.nan
+    keep = minmax_indices(values, 20)
+    assert len(keep) <= 2 * 20 * 3 + 2
+    assert keep[0] == 0 and keep[-1] == len(y) - 1 and (np.diff(keep) > 0).all()
+    for column in values[:, :2].T:
+        assert np.nanargmin(column) in keep and np.nanargmax(column) in keep
+    # 每个桶中各列的最小、最大值
+    bounds = np.linspace(0, len(y), 21).astype(np.int64)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        assert start + np.nanargmax(values[start:end, 0]) in keep
+    # 一维输入、点数未超出预算与桶数小于 1
+    assert (minmax_indices(y, 20) == minmax_indices(y[:, None], 20)).all()
+    assert (minmax_indices(y[:40], 20) == np.arange(40)).all()
+    assert len(minmax_indices(y, 0)) <= 4
+
+
+@pytest.mark.parametrize('field, value', [('max_points', 2), ('max_points', 0), ('max_table_rows', 0),
+                                          ('max_table_rows', -1), ('page_size', 0)])
+def test_html_limits_rejected(field, value):
+    with pytest.raises(ValidationError):
+        HtmlReportConfig(**{field: value})
+
+
+def test_html_limits_defaults():
+    config = HtmlReportConfig(max_points=3, max_table_rows=1, page_size=1)
+    assert (config.max_points, config.max_table_rows, config.page_size) == (3, 1, 1)
+    assert HtmlReportConfig().max_points == 2000
@@ -0,0 +1,144 @@
+"""过滤下推: 预检与逐行精确判断的结果等于先完整解析再过滤，按文件名中的时间跳过文件时不丢弃时间范围内的文件"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+import pytest
+
+from src.config import AppConfig, FiltersConfig, ParserConfig
+from src.filters import LogFilter, parse_time_bound
+from src.input_handler import LogSource
+from src.log_parser import LogParser
+from src.log_schema import decode_frame
+
+
+def _line(time_str: str, ip: str = '1.2.3.4', domain: str = 'img.example.com', path: str = '/img/1.png',
+          status: int | str = 200) -> str:
+    return (f'[{time_str}] {ip} 12 "-" "HTTP/1.1" "GET" "{domain}" "{path}" {status} 100 HIT '
+            f'"Mozilla/5.0 (X)" "-" 10.0.0.1')
+
+
+LINES = [
+    # 时间范围 [10:00:00, 10:00:05) 的边界 (+0800)
+    _line('16/Nov/2025:09:59:59 +0800'),
+    _line('16/Nov/2025:10:00:00 +0800'),
+    _line('16/Nov/2025:10:00:04 +0800', domain='api.example.com', path='/api/v1', status=503),
+    _line('16/Nov/2025:10:00:05 +0800'),
+    # 其他时区表示的同一时刻 (10:00:02 +0800 与 10:00:05 +0800)
+    _line('15/Nov/2025:21:00:02 -0500', ip='10.1.2.3', status=404),
+    _line('16/Nov/2025:02:00:05 +0000', ip='10.1.2.3'),
+    # 一个域名是另一个的子串，路径前缀只在路径中间出现
+    _line('16/Nov/2025:10:00:01 +0800', domain='img.example.com.cn', path='/static/api/x', status=500),
+    _line('16/Nov/2025:10:00:01 +0800', domain='api.example.com', path='/apix', status=599),
+    # 状态码的首位数字与路径字段相邻的数字
+    _line('16/Nov/2025:10:00:02 +0800', path='/api/5', status=200),
+    _line('16/Nov/2025:10:00:02 +0800', ip='10.255.0.1', status=502),
+    _line('16/Nov/2025:10:00:03 +0800', ip='110.1.2.3', status=500),
+    # IPv6 与 IPv4 映射地址
+    _line('16/Nov/2025:10:00:03 +0800', ip='2001:db8::7', status=500),
+    _line('16/Nov/2025:10:00:03 +0800', ip='::ffff:10.1.2.3', path='/api/v2'),
+    # 超出取值范围的状态码 (截断为 65535)
+    _line('16/Nov/2025:10:00:03 +0800', ip='10.0.0.9', status=99999),
+    # 无效的时间、IP 与格式不符的行
+    _line('16/Nov/2025:10:00:60 +0800'),
+    _line('16/Nov/2025:10:00:01 +0800', ip='999.1.1.1'),
+    '[16/Nov/2025:10:00:01 +0800] 1.2.3.4 1 "-" "HTTP/1.1" "GET" "img.example.com" "/a" 2',
+    'garbage',
+    '',
+]
+
+FILTERS = [
+    {'since': '2025-11-16T10:00:00', 'until': '2025-11-16T10:00:05'},
+    {'since': '2025-11-16T10:00:02'},
+    {'until': '2025-11-16'},
+    {'domains': ['img.example.com']},
+    {'domains': ['api.example.com', 'img.example.com.cn'], 'path_prefixes': ['/api']},
+    {'statuses': ['5xx']},
+    {'statuses': ['404', '500-502', 65535]},
+    {'ips': ['10.0.0.0/8']},
+    {'ips': ['10.1.2.3']},
+    {'ips': ['2001:db8::/32', '1.2.3.0/24']},
+    {'since': '2025-11-16T10:00:01', 'until': '2025-11-16T10:00:04', 'statuses': ['5xx'], 'ips': ['10.0.0.0/8']},
+]
+
+
+def _parser(filters: dict | None = None) -> LogParser:
+    return LogParser(AppConfig.model_construct(parser=ParserConfig(format='huawei_cdn', chunk_size=4),
+                                               filters=FiltersConfig(**(filters or {}))))
+
+
+def _expected(filters: dict) -> pd.DataFrame:
+    """完整解析后再对数据块做向量化过滤"""
+    log_filter = LogFilter.from_config(AppConfig.model_construct(filters=FiltersConfig(**filters)))
+    return decode_frame(log_filter.apply(_parser().parse_batch_reference(LINES)))
+
+
+@pytest.mark.parametrize('filters', FILTERS, ids=lambda filters: ','.join(filters))
+def test_pushdown_matches_filter_after_parse(filters):
+    expected = _expected(filters)
+    parser = _parser(filters)
+    batches = [[line.encode('utf-8') for line in LINES[:7]], [line.encode('utf-8') for line in LINES[7:]]]
+    fast = pd.concat([decode_frame(chunk) for chunk in parser.parse_line_batches(batches)] + [expected.iloc[:0]],
+                     ignore_index=True)
+    pd.testing.assert_frame_equal(fast, expected)
+    text = pd.concat([decode_frame(chunk) for chunk in parser.parse_chunks(LINES)] + [expected.iloc[:0]],
+                     ignore_index=True)
+    pd.testing.assert_frame_equal(text, expected)
+
+    # 预检只会多保留: 完整解析后满足条件的每一行都通过预检
+    reference = _parser()
+    for line in LINES:
+        if len(parser.filter.apply(reference.parse_batch_reference([line]))):
+            for raw in (line, line.encode('utf-8')):
+                assert parser._prefilter([raw], binary=isinstance(raw, bytes)) == [raw], line
+
+
+def test_time_boundaries():
+    # 不带时区的时间按报告时区解释，结束时间只给出日期时包含当天
+    assert parse_time_bound('2025-11-16T10:00:00') == 1763258400
+    assert parse_time_bound('2025-11-16', end=True) == parse_time_bound('2025-11-17')
+    # 起始时间包含在内，结束时间不包含
+    timestamps = _expected(FILTERS[0])['timestamp']
+    assert timestamps.min() == 1763258400 and timestamps.max() == 1763258404
+
+
+# (文件名, 文件中最早的日志时间, 最晚的日志时间)；文件名中的时间按报告时区解释
+TZ = ZoneInfo('Asia/Shanghai')
+FILES = [
+    ('img.example.com_20251116100000.gz', datetime(2025, 11, 16, 10, 0, tzinfo=TZ),
+     datetime(2025, 11, 16, 10, 59, 59, tzinfo=TZ)),
+    ('img.example.com_2025111611.gz', datetime(2025, 11, 16, 11, 0, tzinfo=TZ),
+     datetime(2025, 11, 16, 11, 59, 59, tzinfo=TZ)),
+    ('cdn_20251115.log', datetime(2025, 11, 15, 0, 0, tzinfo=TZ), datetime(2025, 11, 15, 23, 59, 59, tzinfo=TZ)),
+    ('cdn_202511161200-202511161229.gz', datetime(2025, 11, 16, 12, 0, tzinfo=TZ),
+     datetime(2025, 11, 16, 12, 29, 59, tzinfo=TZ)),
+]
+
+
+def _windows() -> list[tuple[datetime | None, datetime | None]]:
+    """以各文件的首尾时间为边界的时间范围 (含边界前后一秒)"""
+    points = set()
+    for _, first, last in FILES:
+        for moment in (first, last):
+            points |= {moment - timedelta(seconds=1), moment, moment + timedelta(seconds=1)}
+    points = sorted(points)
+    windows = [(since, None) for since in points] + [(None, until) for until in points]
+    return windows + [(since, until) for since in points for until in points if since < until]
+
+
+def test_file_pruning_keeps_files_in_range():
+    sources = [LogSource(name=name) for name, _, _ in FILES] + [LogSource(name='access.log.1.gz')]
+    for since, until in _windows():
+        log_filter = LogFilter(since=int(since.timestamp()) if since else None,
+                               until=int(until.timestamp()) if until else None, file_span_minutes=60)
+        kept = {source.name for source in log_filter.prune_sources(sources)}
+        # 文件名中没有时间的文件总是保留
+        assert 'access.log.1.gz' in kept
+        for name, first, last in FILES:
+            overlaps = (since is None or last >= since) and (until is None or first < until)
+            if overlaps:
+                assert name in kept, (name, since, until)
+    # 完全在时间范围之外的文件被跳过
+    log_filter = LogFilter(since=int(datetime(2025, 11, 16, 11, 0, tzinfo=TZ).timestamp()))
+    assert [source.name for source in log_filter.prune_sources(sources)] == [
+        'img.example.com_2025111611.gz', 'cdn_202511161200-202511161229.gz', 'access.log.1.gz']
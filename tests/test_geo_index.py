@@ -0,0 +1,136 @@
+"""按网段去重的查询 (resolve_by_prefix) 与范围索引 (GeoRangeIndex) 的结果与逐个 IP 用 geoip2 查询一致"""
+import ipaddress
+import random
+
+import geoip2.database
+import geoip2.errors
+import maxminddb
+import pytest
+
+from src.geo_index import GeoRangeIndex, resolve_by_prefix
+
+mmdb_writer = pytest.importorskip('mmdb_writer')
+netaddr = pytest.importorskip('netaddr')
+
+# (网络, 国家, 城市)，None 表示记录中没有该字段
+NETWORKS = [
+    ('1.0.0.0/16', 'China', 'Alpha'),
+    # 比 /24 网段更细的网络，同一网段内的 IP 结果不同
+    ('2.0.0.0/26', 'Japan', 'Beta'),
+    ('2.0.0.64/27', 'Japan', None),
+    ('2.0.0.128/25', None, 'NoCountry'),
+    ('3.3.3.3/32', 'Germany', 'Gamma'),
+    ('8.0.0.0/8', 'United States', None),
+    ('223.255.255.0/24', 'China', 'Omega'),
+    ('2001:db8::/32', 'Taiwan', 'Taipei'),
+    # 比 /48 网段更细的 IPv6 网络
+    ('2400:1:2::/56', 'Japan', 'Delta'),
+    ('2400:1:2:100::/56', 'Japan', 'Epsilon'),
+    ('2400:ffff::/48', 'Hong Kong', None),
+]
+
+
+def _ipv4_aliases(network: str) -> list[str]:
+    """与 GeoLite2 一样，IPv4 网络同时写入 ::ffff:0:0/96 映射地址与 2002::/16 的 6to4 地址 (::/96 由 ipv4_compatible 生成)"""
+    network = ipaddress.ip_network(network)
+    if network.version == 6:
+        return []
+    start = int(network.network_address)
+    return [str(ipaddress.IPv6Network((0xffff << 32 | start, 96 + network.prefixlen))),
+            str(ipaddress.IPv6Network((0x2002 << 112 | start << 80, 16 + network.prefixlen)))]
+
+
+def _record(country: str | None, city: str | None) -> dict:
+    record = {}
+    if country:
+        record['country'] = {'names': {'en': country, 'zh-CN': '国家'}, 'iso_code': 'XX'}
+    if city:
+        record['city'] = {'names': {'en': city}}
+    return record or {'other': 1}
+
+
+@pytest.fixture(scope='module', params=[6, 4], ids=['ipv6-db', 'ipv4-db'])
+def database(request, tmp_path_factory):
+    version = request.param
+    writer = mmdb_writer.MMDBWriter(ip_version=version, database_type='GeoLite2-City', languages=['en'],
+                                    ipv4_compatible=version == 6)
+    for network, country, city in NETWORKS:
+        if version == 4 and ':' in network:
+            continue
+        aliases = _ipv4_aliases(network) if version == 6 else []
+        for cidr in [network] + aliases:
+            writer.insert_network(netaddr.IPSet([netaddr.IPNetwork(cidr)]), _record(country, city))
+    path = tmp_path_factory.mktemp('geo') / f'test-v{version}.mmdb'
+    writer.to_db_file(str(path))
+    return path, version
+
+
+def _sample_ips(version: int) -> list[str]:
+    rng = random.Random(5)
+    ips = set()
+    for network, _, _ in NETWORKS:
+        network = ipaddress.ip_network(network)
+        if version == 4 and network.version == 6:
+            continue
+        last = int(network.broadcast_address)
+        ips |= {str(network.network_address), str(network.broadcast_address),
+                str(network[rng.randrange(network.num_addresses)])}
+        if last < (2 ** 32 if network.version == 4 else 2 ** 128) - 1:
+            # 紧邻网络之后的地址 (通常不在数据库中)
+            ips.add(str(ipaddress.ip_address(last + 1)))
+    ips |= {str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(200)}
+    ips |= {'0.0.0.0', '255.255.255.255', '2.0.0.63', '2.0.0.100'}
+    if version == 6:
+        # 未知的 IPv6 地址与指向 IPv4 子树的地址 (IPv4 映射、IPv4 兼容与 6to4)
+        ips |= {'fe80::1', '2400:1:2:200::1', '::ffff:1.0.3.4', '::ffff:2.0.0.70', '::1.0.0.1',
+                '::ffff:9.9.9.9', '2002:0300:0000::1', '2002:0303:0303::1', '2002:0808:0808::5'}
+    return sorted(ips)
+
+
+def _reference(reader: geoip2.database.Reader, ip: str) -> tuple[bool, str | None, str | None]:
+    try:
+        response = reader.city(ip)
+    except geoip2.errors.AddressNotFoundError:
+        return False, None, None
+    return True, response.country.name, response.city.name
+
+
+def _rows(frame) -> list[tuple]:
+    return list(zip(frame['found'].tolist(), frame['country'].tolist(), frame['city'].tolist()))
+
+
+def test_prefix_and_range_index_match_geoip2(database, tmp_path):
+    path, version = database
+    ips = _sample_ips(version)
+    with geoip2.database.Reader(str(path)) as geo_reader:
+        expected = [_reference(geo_reader, ip) for ip in ips]
+    # 样本覆盖命中、未命中与比网段更细的网络
+    assert any(found for found, _, _ in expected) and not all(found for found, _, _ in expected)
+
+    with maxminddb.open_database(str(path)) as reader:
+        by_prefix = resolve_by_prefix(reader, ips)
+        assert by_prefix['ip'].tolist() == ips
+        assert _rows(by_prefix) == expected
+
+        index = GeoRangeIndex.load_or_build(path, reader, tmp_path)
+        assert _rows(index.resolve(reader, ips)) == expected
+        # 从磁盘上的索引文件加载后结果相同
+        cached = GeoRangeIndex.load_or_build(path, reader, tmp_path)
+        assert _rows(cached.resolve(reader, ips)) == expected
+
+
+def test_ipv4_aliases_resolve_through_ipv4_tree(database):
+    path, version = database
+    if version != 6:
+        pytest.skip('只有 IPv6 数据库中存在 IPv4 别名')
+    aliases = {'::ffff:1.0.3.4': '1.0.3.4', '::1.0.0.1': '1.0.0.1', '2002:0303:0303::1': '3.3.3.3',
+               '::ffff:2.0.0.70': '2.0.0.70', '2002:0200:0081::1': '2.0.0.129', '::ffff:9.9.9.9': '9.9.9.9'}
+    with maxminddb.open_database(str(path)) as reader:
+        for resolved in (resolve_by_prefix(reader, list(aliases) + list(aliases.values())),
+                         GeoRangeIndex.build(reader).resolve(reader, list(aliases) + list(aliases.values()))):
+            rows = _rows(resolved)
+            # 别名地址的结果与对应的 IPv4 地址相同
+            assert rows[:len(aliases)] == rows[len(aliases):]
+            assert rows[:len(aliases)] == [(True, 'China', 'Alpha'), (True, 'China', 'Alpha'),
+                                           (True, 'Germany', 'Gamma'), (True, 'Japan', None),
+                                           (True, None, 'NoCountry'), (False, None, None)]
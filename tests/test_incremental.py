@@ -0,0 +1,128 @@
+"""增量处理: 追加、半行、文件增长超过指纹长度与轮转压缩之后，累计结果与一次完整运行相同"""
+import gzip
+import os
+from pathlib import Path
+
+import pytest
+
+from benchmarks.generate_logs import write_logs
+from src import incremental
+from src.analysis_engine import AnalysisEngine
+from src.incremental import FINGERPRINT_BYTES, IncrementalRunner
+from src.ingestion import iter_parsed_chunks
+from tests.test_map_reduce import _config, _report
+
+
+@pytest.fixture(scope='module')
+def lines(tmp_path_factory) -> list[bytes]:
+    path = tmp_path_factory.mktemp('generated') / 'lines.gz'
+    write_logs(path, 3_000, ipv6_ratio=0.1, bad_line_ratio=0.01, seed=11)
+    with gzip.open(path, 'rb') as f:
+        return f.read().splitlines(keepends=True)
+
+
+def _incremental_config(log_dir: Path, tmp_path: Path, name: str):
+    config = _config(log_dir, tmp_path, name)
+    config.input.file_pattern = 'access.log*'
+    config.input.incremental.state_dir = str(tmp_path / 'state')
+    return config
+
+
+def _append(path: Path, data: bytes, mtime: int) -> None:
+    with open(path, 'ab') as f:
+        f.write(data)
+    os.utime(path, (mtime, mtime))
+
+
+def _poll(config, expected_rows: int) -> None:
+    """模拟一次新的运行 (重新载入检查点与累计状态)"""
+    runner = IncrementalRunner(config)
+    try:
+        runner.poll()
+        runner.store.save()
+        assert runner.store.rows == expected_rows
+    finally:
+        runner.close()
+
+
+def _valid_rows(config, data: bytes) -> int:
+    runner = IncrementalRunner(config)
+    try:
+        return sum(len(chunk) for chunk in runner.parser.parse_line_batches([data.splitlines()]))
+    finally:
+        runner.close()
+
+
+def test_appends_and_rotation_match_full_run(lines, tmp_path, capsys):
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    config = _incremental_config(log_dir, tmp_path, 'incremental')
+    active = log_dir / 'access.log'
+
+    # 1. 文件还不足 FINGERPRINT_BYTES 字节
+    _append(active, b''.join(lines[:2]), 1_000)
+    assert active.stat().st_size < FINGERPRINT_BYTES
+    _poll(config, _valid_rows(config, b''.join(lines[:2])))
+
+    # 2. 文件增长超过指纹长度，末尾是正在写入的半行 (留到下次)
+    half = len(lines[800]) // 2
+    _append(active, b''.join(lines[2:800]) + lines[800][:half], 1_010)
+    _poll(config, _valid_rows(config, b''.join(lines[:800])))
+
+    # 3. 补全半行后继续追加
+    _append(active, lines[800][half:] + b''.join(lines[801:1500]), 1_020)
+    _poll(config, _valid_rows(config, b''.join(lines[:1500])))
+
+    # 4. 轮转前又写入了未处理的数据，随后压缩为 access.log.1.gz，并开始写入新的 access.log
+    _append(active, b''.join(lines[1500:2000]), 1_030)
+    with gzip.open(log_dir / 'access.log.1.gz', 'wb') as f:
+        f.write(active.read_bytes())
+    os.utime(log_dir / 'access.log.1.gz', (1_030, 1_030))
+    active.unlink()
+    _append(active, b''.join(lines[2000:]), 1_040)
+    _poll(config, _valid_rows(config, b''.join(lines)))
+    # 没有新数据时不重复计数
+    _poll(config, _valid_rows(config, b''.join(lines)))
+
+    runner = IncrementalRunner(config)
+    try:
+        incremental_report = _report(runner.results(), config, capsys)
+    finally:
+        runner.close()
+
+    full_dir = tmp_path / 'full'
+    full_dir.mkdir()
+    (full_dir / 'access.log').write_bytes(b''.join(lines))
+    config = _incremental_config(full_dir, tmp_path, 'full')
+    with AnalysisEngine(config) as engine:
+        full_report = _report(engine.run_chunks(iter_parsed_chunks(config, 1)), config, capsys)
+    assert incremental_report == full_report
+
+
+def test_state_reset_when_config_changes(lines, tmp_path, monkeypatch):
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    _append(log_dir / 'access.log', b''.join(lines[:500]), 1_000)
+    config = _incremental_config(log_dir, tmp_path, 'r')
+    total = _valid_rows(config, b''.join(lines[:500]))
+    _poll(config, total)
+
+    # 分析配置变化: 旧的累计状态不能继续合并，从头处理所有文件
+    changed = _incremental_config(log_dir, tmp_path, 'r')
+    changed.analysis.modules = ['basic_stats']
+    runner = IncrementalRunner(changed)
+    try:
+        assert runner.store.rows == 0 and not runner.store.checkpoints
+        runner.poll()
+        assert runner.store.rows == total
+        runner.store.save()
+    finally:
+        runner.close()
+
+    # 状态文件的格式版本变化时同样重置
+    monkeypatch.setattr(incremental, 'STATE_VERSION', incremental.STATE_VERSION + 1)
+    runner = IncrementalRunner(changed)
+    try:
+        assert runner.store.rows == 0
+    finally:
+        runner.close()
@@ -0,0 +1,170 @@
+"""IpApiBatchClient 对本地模拟 HTTP 服务的重试、退避、限流与部分失败统计"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.clients.ip_api_client import IpApiBatchClient
+from src.clients.rate_limit import TokenBucket, retry_delay
+from src.config import GeoIpApiConfig
+
+
+class StubApi:
+    """
+    ip-api 批量接口的模拟服务: 按请求体中的第一个 IP 取出预设的响应序列 (状态码, 响应头)，
+    序列用完后返回每个 IP 的成功结果，并记录每个请求的到达时间。
+    """
+    def __init__(self):
+        self.plans: dict[str, list[tuple[int, dict]]] = {}
+        self.requests: list[tuple[float, list[str]]] = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                ips = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests.append((time.monotonic(), ips))
+                    plan = stub.plans.get(ips[0])
+                    status, headers = plan.pop(0) if plan else (200, {})
+                body = b'{}'
+                if status == 200:
+                    body = json.dumps([{'status': 'success', 'query': ip, 'country': 'China', 'city': 'X', 'isp': 'Y'}
+                                       for ip in ips]).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/batch"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubApi()
+    yield server
+    server.close()
+
+
+def _client(stub: StubApi, **overrides) -> IpApiBatchClient:
+    options = dict(endpoint=stub.url, batch_size=2, concurrency=2, rate_limit_per_minute=None,
+                   max_retries=3, backoff_base_seconds=0.01, backoff_max_seconds=0.05)
+    options.update(overrides)
+    return IpApiBatchClient(GeoIpApiConfig(**options))
+
+
+def _ips(n: int) -> list[str]:
+    return [f"10.0.0.{i}" for i in range(n)]
+
+
+def test_retries_on_429_and_5xx(stub):
+    stub.plans['10.0.0.0'] = [(429, {'Retry-After': '0'}), (503, {}), (500, {})]
+    client = _client(stub)
+    results, stats = client.query(_ips(4))
+    client.close()
+
+    assert [r['query'] for r in results] == _ips(4)
+    assert stats.batches == 2
+    assert stats.failed_batches == 0
+    assert stats.retries == 3
+    assert stats.throttled == 1
+    # 第一个批次共请求 4 次，第二个批次 1 次
+    assert len(stub.requests) == 5
+
+
+def test_partial_failure_is_counted(stub):
+    # 第二个批次一直返回 502，重试耗尽；第三个批次返回不可重试的 400
+    stub.plans['10.0.0.2'] = [(502, {})] * 10
+    stub.plans['10.0.0.4'] = [(400, {})]
+    client = _client(stub, max_retries=2)
+    results, stats = client.query(_ips(6))
+    client.close()
+
+    assert [r['query'] for r in results] == ['10.0.0.0', '10.0.0.1']
+    assert stats.batches == 3
+    assert stats.failed_batches == 2
+    assert stats.failed_ips == ['10.0.0.2', '10.0.0.3', '10.0.0.4', '10.0.0.5']
+    assert stats.retries == 2
+    # 502 的批次请求 3 次，400 的批次不重试
+    assert sum(1 for _, ips in stub.requests if ips[0] == '10.0.0.2') == 3
+    assert sum(1 for _, ips in stub.requests if ips[0] == '10.0.0.4') == 1
+    summary = {row['item']: row['value'] for row in stats.summary()}
+    assert summary['未能查询的 IP 数'] == 4
+
+
+def test_rate_limit_spaces_requests(stub):
+    # 每分钟 600 次 (每秒 10 次)，突发 1 次: 5 个批次至少需要 0.4 秒
+    client = _client(stub, batch_size=1, concurrency=4, rate_limit_per_minute=600, rate_limit_burst=1)
+    started = time.monotonic()
+    results, stats = client.query(_ips(5))
+    elapsed = time.monotonic() - started
+    client.close()
+
+    assert len(results) == 5
+    assert elapsed >= 0.4 - 0.02
+    arrivals = sorted(t for t, _ in stub.requests)
+    assert arrivals[-1] - arrivals[0] >= 0.4 - 0.02
+
+
+def test_token_bucket_allows_burst_then_limits():
+    bucket = TokenBucket(rate=20, burst=3)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.04
+    for _ in range(4):
+        bucket.acquire()
+    # 突发之后每 0.05 秒一个令牌
+    assert time.monotonic() - started >= 0.2 - 0.02
+
+
+class _Response:
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+def test_retry_delay_prefers_server_hint_and_caps_backoff():
+    assert retry_delay(0, _Response({'Retry-After': '7'}), 1.0, 60.0) == 7.0
+    assert retry_delay(0, _Response({'X-Ttl': '120'}), 1.0, 60.0) == 60.0
+    for attempt in range(8):
+        delay = retry_delay(attempt, None, 1.0, 10.0)
+        expected = min(2 ** attempt, 10.0)
+        assert 0.5 * expected <= delay <= expected
+
+
+def test_api_geo_analyzer_joins_counts(stub):
+    from src.analyzers.api_geo_analyzer import ApiGeoAnalyzer
+    from src.config import AppConfig
+    from src.log_parser import LogParser
+
+    config = AppConfig(
+        input={'source_type': 'local', 'path': '.'},
+        parser={'format': 'huawei_cdn'},
+        analysis={'modules': ['geo_ip_api'],
+                  'geoip': {'provider': 'api', 'cache': {'enabled': False},
+                            'api': {'endpoint': stub.url, 'rate_limit_per_minute': None}}},
+        output={'reporters': ['cli'], 'report_path': '.'},
+    )
+    line = ('[16/Nov/2025:10:00:00 +0800] {ip} 1 "-" "HTTP/1.1" "GET" "img.example.com" "/a" 200 1 HIT "UA" "-" '
+            '10.0.0.1')
+    chunk = LogParser(config).parse_batch([line.format(ip=ip) for ip in ['1.1.1.1', '2.2.2.2', '1.1.1.1']])
+    analyzer = ApiGeoAnalyzer(config)
+    results = analyzer.finalize(analyzer.update(analyzer.init_state(), chunk))
+
+    details = results['ip_geo_details']
+    assert details[['ip', 'count']].values.tolist() == [['1.1.1.1', 2], ['2.2.2.2', 1]]
+    assert results['country_counts'].to_dict() == {'China': 3}
@@ -0,0 +1,162 @@
+"""日志链接的分页获取与并发预取下载 (本地模拟的链接与文件服务)"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src.clients.log_downloader import LogPrefetcher
+from src.config import InputApiConfig
+from src.input_handler import LogSource
+
+
+class FakeLinkServer:
+    """
+    模拟华为云 CDN 的日志链接接口 (/v1.0/cdn/logs，按 page_number / page_size 分页) 与日志文件下载 (/files/<名称>)。
+    文件下载可设置延迟与首次请求返回的状态码，并记录同时进行中的下载数的最大值。
+    """
+    def __init__(self, links: int = 0, report_total: int | None = None, files: dict[str, bytes] | None = None,
+                 delay: float = 0.0):
+        self.links = [f"f{i}.gz" for i in range(links)]
+        self.report_total = report_total
+        self.files = files or {}
+        self.delay = delay
+        self.fail_once: dict[str, int] = {}
+        self.pages: list[int] = []
+        self.downloads: list[str] = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/v1.0/cdn/logs':
+                    self._send(200, server.page(parse_qs(url.query)))
+                else:
+                    self._send(*server.download(url.path.rsplit('/', 1)[-1]))
+
+            def _send(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def page(self, query: dict) -> bytes:
+        number, size = int(query['page_number'][0]), int(query['page_size'][0])
+        with self.lock:
+            self.pages.append(number)
+        names = self.links[(number - 1) * size:number * size]
+        data = {'logs': [{'name': name, 'link': f"{self.url}/files/{name}", 'size': 1, 'start_time': 0,
+                          'end_time': 0} for name in names]}
+        if self.report_total is not None:
+            data['total'] = self.report_total
+        return json.dumps(data).encode()
+
+    def download(self, name: str) -> tuple[int, bytes]:
+        with self.lock:
+            self.downloads.append(name)
+            if name not in self.files:
+                return 404, b''
+            if self.fail_once.get(name):
+                self.fail_once[name] -= 1
+                return 503, b''
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            return 200, self.files[name]
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _api_config(server: FakeLinkServer, **overrides) -> InputApiConfig:
+    options = dict(domain_name='img.example.com', start_time='2025-11-01T00:00:00Z', end_time='2025-11-02T00:00:00Z',
+                   access_key='ak', secret_key='sk', endpoint=server.url)
+    options.update(overrides)
+    return InputApiConfig(**options)
+
+
+@pytest.mark.parametrize('links, report_total, pages', [
+    (2500, 2500, [1, 2, 3]),   # 以 total 判断最后一页
+    (1500, None, [1, 2]),      # 没有 total 时以不满一页结束
+    (2000, None, [1, 2, 3]),   # 恰好整页时以空页结束
+    (1200, 5000, [1, 2, 3]),   # total 偏大时遇到空页也会结束
+    (0, 0, [1]),
+])
+def test_link_pagination_terminates(links, report_total, pages):
+    pytest.importorskip('huaweicloudsdkcdn')
+    from src.clients.huawei_cdn_client import HuaweiCdnApiClient
+
+    server = FakeLinkServer(links, report_total)
+    try:
+        result = HuaweiCdnApiClient(_api_config(server)).get_log_download_links()
+    finally:
+        server.close()
+    assert server.pages == pages
+    assert result == [f"{server.url}/files/f{i}.gz" for i in range(links)]
+
+
+def test_prefetch_respects_concurrency_and_window(tmp_path):
+    files = {f"f{i}.gz": bytes([i]) * (100_000 + i) for i in range(6)}
+    server = FakeLinkServer(files=files, delay=0.2)
+    server.fail_once['f3.gz'] = 1
+    sources = [LogSource(name=name, url=f"{server.url}/files/{name}", download_path=tmp_path / name)
+               for name in files]
+    prefetcher = LogPrefetcher(_api_config(server, download_workers=2, prefetch_window=3))
+    received, requested_before = [], []
+    try:
+        for source in prefetcher.iter_sources(sources):
+            requested_before.append(len(set(server.downloads)))
+            received.append(source)
+            time.sleep(0.05)
+    finally:
+        server.close()
+
+    # 按原始顺序产出，下载完成的文件替换为本地路径
+    assert [source.name for source in received] == list(files)
+    assert all(source.path.read_bytes() == files[source.name] for source in received)
+    # 同时下载的文件数不超过下载线程数，已提交但未被消费的文件数不超过预取窗口
+    assert server.max_active == 2
+    assert requested_before[0] <= 3
+    assert all(count <= i + 3 for i, count in enumerate(requested_before))
+    # 每个文件的下载统计
+    stats = {s.name: s for s in prefetcher.stats}
+    assert set(stats) == set(files)
+    for name, data in files.items():
+        assert stats[name].bytes == len(data)
+        assert stats[name].seconds >= 0.2
+        assert 0 < stats[name].mb_per_second <= len(data) / 1024 / 1024 / 0.2
+    assert stats['f3.gz'].retries == 1
+    assert sum(s.retries for s in stats.values()) == 1
+
+
+def test_prefetch_skips_failed_download(tmp_path):
+    files = {'a.gz': b'a' * 10, 'b.gz': b'b' * 10}
+    server = FakeLinkServer(files=files)
+    sources = [LogSource(name='a.gz', url=f"{server.url}/files/missing.gz"),
+               LogSource(name='b.gz', url=f"{server.url}/files/b.gz")]
+    prefetcher = LogPrefetcher(_api_config(server, download_workers=2, download_retries=0))
+    try:
+        received = list(prefetcher.iter_sources(sources))
+    finally:
+        server.close()
+    # 未配置保存位置的文件下载到临时目录，处理完后删除
+    assert [source.name for source in received] == ['b.gz']
+    assert received[0].temporary
+    assert not received[0].path.exists()
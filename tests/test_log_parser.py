@@ -0,0 +1,74 @@
+"""批量解析 (parse_line_batches) 与逐行解析的参考实现 (parse_batch_reference) 结果一致"""
+import ipaddress
+
+import pandas as pd
+import pytest
+
+from src.config import AppConfig, ParserConfig
+from src.log_parser import LogParser
+from src.log_schema import decode_frame
+
+LINES = [
+    '[16/Nov/2025:10:00:00 +0800] 162.151.61.191 2025 "-" "HTTP/1.1" "GET" "img.example.com" "/img/155.png" 304 73974 MISS "Mozilla/5.0 (X)" "-" 10.0.0.1',
+    '[16/Nov/2025:10:00:07 +0800] 54.196.89.102 1930 "https://example.com/" "HTTP/1.1" "GET" "img.example.com" "/img/42.png" 404 35262 HIT "Mozilla/5.0 (X)" "-" 10.0.0.1',
+    # IPv6 客户端
+    '[16/Nov/2025:10:00:59 +0800] 2001:db8::1 12 "-" "HTTP/2.0" "POST" "api.example.com" "/v1/items?id=3" 500 0 MISS "curl/8.0" "-" 10.0.0.1',
+    '[16/Nov/2025:10:01:00 +0800] ::ffff:10.1.2.3 7 "-" "HTTP/1.1" "GET" "api.example.com" "/" 200 1 HIT "curl/8.0" "-" 10.0.0.1',
+    # 秒数为 60 (无效时间)
+    '[16/Nov/2025:10:00:60 +0800] 54.196.89.102 1 "-" "HTTP/1.1" "GET" "img.example.com" "/a" 200 1 HIT "UA" "-" 10.0.0.1',
+    # 无效的日期与时区
+    '[32/Nov/2025:10:00:00 +0800] 54.196.89.102 1 "-" "HTTP/1.1" "GET" "img.example.com" "/a" 200 1 HIT "UA" "-" 10.0.0.1',
+    '[16/Foo/2025:10:00:00 +0800] 54.196.89.102 1 "-" "HTTP/1.1" "GET" "img.example.com" "/a" 200 1 HIT "UA" "-" 10.0.0.1',
+    '[16/Nov/2025:10:00:00 +99] 54.196.89.102 1 "-" "HTTP/1.1" "GET" "img.example.com" "/a" 200 1 HIT "UA" "-" 10.0.0.1',
+    # 无效的 IP
+    '[16/Nov/2025:10:00:00 +0800] 999.1.1.1 1 "-" "HTTP/1.1" "GET" "img.example.com" "/a" 200 1 HIT "UA" "-" 10.0.0.1',
+    # 格式不符的行
+    '[16/Nov/2025:10:00:00 +0800] 54.196.89.102 1 "-" "HTTP/1.1" "GET" "img.example.com" "/a" 2',
+    'garbage',
+    '',
+    # 中文路径与不同的时区
+    '[16/Nov/2025:23:59:59 -0500] 1.2.3.4 3 "https://example.com/页面" "HTTP/1.1" "GET" "img.example.com" "/图片/1.png" 206 10 MISS "UA" "-" 10.0.0.1',
+    # 超出取值范围的状态码与响应时间 (按上限截断)
+    '[16/Nov/2025:10:00:01 +0800] 5.6.7.8 99999999999 "-" "HTTP/1.1" "GET" "img.example.com" "/big" 99999 1 HIT "UA" "-" 10.0.0.1',
+]
+
+
+@pytest.fixture
+def parser() -> LogParser:
+    return LogParser(AppConfig.model_construct(parser=ParserConfig(format='huawei_cdn', chunk_size=4)))
+
+
+def _parse_fast(parser: LogParser, lines: list[str]) -> pd.DataFrame:
+    batches = [[line.encode('utf-8') for line in lines[:5]], [line.encode('utf-8') for line in lines[5:]]]
+    chunks = list(parser.parse_line_batches(batches))
+    return pd.concat([decode_frame(chunk) for chunk in chunks], ignore_index=True)
+
+
+def test_batch_matches_reference(parser):
+    fast = _parse_fast(parser, LINES)
+    reference = decode_frame(parser.parse_batch_reference(LINES))
+    pd.testing.assert_frame_equal(fast, reference)
+    # 只有 6 行有效 (两个 IPv4、两个 IPv6 与最后两行)
+    assert len(fast) == 6
+    expected = ['162.151.61.191', '54.196.89.102', '2001:db8::1', '::ffff:10.1.2.3', '1.2.3.4', '5.6.7.8']
+    assert fast['client_ip'].tolist() == [str(ipaddress.ip_address(ip)) for ip in expected]
+
+
+def test_text_batch_matches_reference(parser):
+    fast = pd.concat([decode_frame(chunk) for chunk in parser.parse_chunks(LINES)], ignore_index=True)
+    pd.testing.assert_frame_equal(fast, decode_frame(parser.parse_batch_reference(LINES)))
+
+
+def test_timestamps_are_utc_epochs(parser):
+    fast = _parse_fast(parser, LINES)
+    # 16/Nov/2025:10:00:00 +0800 == 2025-11-16T02:00:00Z
+    assert fast['timestamp'].iloc[0] == 1763258400
+    # 秒数 59 走按分钟记忆化的路径
+    assert fast['timestamp'].iloc[2] == 1763258400 + 59
+
+
+def test_out_of_range_values_are_clamped(parser):
+    for frame in (_parse_fast(parser, LINES), decode_frame(parser.parse_batch_reference(LINES))):
+        row = frame[frame['path'] == '/big'].iloc[0]
+        assert row['status_code'] == 65535
+        assert row['response_time_ms'] == 4294967295
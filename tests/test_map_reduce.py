@@ -0,0 +1,145 @@
+"""分片处理: map 各分片后 reduce 的报告与单进程运行完全相同；部分结果文件只接受白名单中的对象"""
+import json
+import pickle
+import random
+import re
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from benchmarks.generate_logs import write_logs
+from src.analysis_engine import AnalysisEngine
+from src.analyzers import raw_logs
+from src.config import load_config
+from src.geo_cache import GeoCache
+from src.ingestion import iter_parsed_chunks
+from src.main import generate_reports
+from src.map_reduce import PARTIAL_FORMAT, PARTIAL_VERSION, MapRunner, ReduceRunner, read_partial, select_files
+
+CONFIG_FILE = Path(__file__).parents[1] / 'config' / 'config.yaml'
+
+
+@pytest.fixture(scope='module')
+def log_dir(tmp_path_factory) -> Path:
+    root = tmp_path_factory.mktemp('logs')
+    write_logs(root / 'cdn.gz', 30_000, files=5, ipv6_ratio=0.1, bad_line_ratio=0.01, seed=7)
+    write_logs(root / 'sub' / 'late.gz', 3_000, seed=8, start=datetime.fromisoformat('2025-11-17T00:00:00+08:00'))
+    write_logs(root / 'empty.gz', 0)
+    return root
+
+
+def _config(log_dir: Path, out: Path, name: str):
+    config = load_config(str(CONFIG_FILE))
+    config.input.source_type = 'local'
+    config.input.path = str(log_dir)
+    config.input.file_pattern = '**/*.gz'
+    config.input.cache.enabled = False
+    config.analysis.modules = ['basic_stats', 'latency']
+    config.analysis.raw_logs_sample_limit = -1
+    config.output.reporters = ['cli', 'html']
+    config.output.report_path = str(out)
+    config.output.report_name = name
+    return config
+
+
+def _report(results: dict, config, capsys) -> tuple[str, str]:
+    capsys.readouterr()
+    generate_reports(results, config)
+    cli = capsys.readouterr().out
+    html = (Path(config.output.report_path) / f'{config.output.report_name}.html').read_text(encoding='utf-8')
+    # 只有生成时间与报告路径不同
+    return re.sub(r'\S*报告已生成.*', '', cli), re.sub(r'生成时间: [^<]*', '', html)
+
+
+def test_reduce_matches_single_run(log_dir, tmp_path, capsys, monkeypatch):
+    # 原始日志样本的一部分写入临时文件，检查其随部分结果一起传递
+    monkeypatch.setattr(raw_logs, 'SPILL_ROWS', 4_000)
+    config = _config(log_dir, tmp_path, 'single')
+    with AnalysisEngine(config) as engine:
+        single = _report(engine.run_chunks(iter_parsed_chunks(config, 1)), config, capsys)
+    assert engine.rows_processed > 30_000
+
+    config = _config(log_dir, tmp_path, 'sharded')
+    partials = []
+    for shard in range(3):
+        paths = select_files(config, shard_index=shard, shard_count=3)
+        partials.append(tmp_path / f'part{shard}.part')
+        runner = MapRunner(config, 1)
+        try:
+            runner.run(paths, partials[-1])
+        finally:
+            runner.close()
+    random.Random(1).shuffle(partials)
+
+    # 两级 reduce: 先合并其中两个部分结果，再与第三个合并
+    merged = ReduceRunner(config)
+    assert merged.load(partials[:2])
+    merged.write(tmp_path / 'merged.part')
+    merged.close()
+    runner = ReduceRunner(config)
+    try:
+        assert runner.load([partials[2], tmp_path / 'merged.part'])
+        assert runner.rows == engine.rows_processed
+        sharded = _report(runner.results(), config, capsys)
+    finally:
+        runner.close()
+    assert sharded == single
+
+
+def _write_raw(path: Path, header: dict, body: object) -> None:
+    with open(path, 'wb') as f:
+        f.write(json.dumps(header).encode('utf-8') + b'\n')
+        pickle.dump(body, f)
+
+
+class _Exploit:
+    def __init__(self, marker: Path):
+        self.marker = marker
+
+    def __reduce__(self):
+        return open, (str(self.marker), 'w')
+
+
+def test_partial_rejects_unknown_globals(tmp_path):
+    marker = tmp_path / 'marker'
+    header = {'format': PARTIAL_FORMAT, 'version': PARTIAL_VERSION, 'state_key': 'x', 'filters': {}}
+    _write_raw(tmp_path / 'evil.part', header, [{'key': 'a', 'rows': 1, 'states': _Exploit(marker)}])
+    assert read_partial(tmp_path / 'evil.part') is None
+    assert not marker.exists()
+
+
+class _Reexported:
+    """以 reduce 时调用 callable(*args) 的形式序列化，模块名改写为分析器模块"""
+    def __init__(self, callable_, *args):
+        self.callable, self.args = callable_, args
+
+    def __reduce__(self):
+        return self.callable, self.args
+
+
+def test_partial_rejects_reexported_classes(tmp_path):
+    # geo_analyzer 模块中导入的 Path 与 GeoCache 不是中间状态的类，不能借分析器模块的名字通过
+    database = tmp_path / 'attacker.sqlite'
+    payload = _Reexported(GeoCache, _Reexported(Path, str(database)), 'ns', 1.0, 10)
+    body = pickle.dumps([payload], protocol=2)
+    body = body.replace(b'csrc.geo_cache\nGeoCache\n', b'csrc.analyzers.geo_analyzer\nGeoCache\n')
+    body = body.replace(b'cpathlib\nPath\n', b'csrc.analyzers.geo_analyzer\nPath\n')
+    assert b'csrc.analyzers.geo_analyzer\nPath\n' in body
+    header = {'format': PARTIAL_FORMAT, 'version': PARTIAL_VERSION, 'state_key': 'x', 'filters': {}}
+    with open(tmp_path / 'evil.part', 'wb') as f:
+        f.write(json.dumps(header).encode('utf-8') + b'\n' + body)
+    assert read_partial(tmp_path / 'evil.part') is None
+    assert not database.exists()
+
+
+def test_partial_header_checked_before_unpickling(tmp_path):
+    marker = tmp_path / 'marker'
+    # 旧版本的文件与普通的 pickle 文件在读取中间状态之前就被拒绝
+    _write_raw(tmp_path / 'old.part', {'format': PARTIAL_FORMAT, 'version': PARTIAL_VERSION - 1},
+               [_Exploit(marker)])
+    with open(tmp_path / 'plain.part', 'wb') as f:
+        pickle.dump({'format': PARTIAL_FORMAT, 'version': PARTIAL_VERSION, 'segments': []}, f)
+    assert read_partial(tmp_path / 'old.part') is None
+    assert read_partial(tmp_path / 'plain.part') is None
+    assert not marker.exists()
@@ -0,0 +1,35 @@
+"""没有 resource 模块 (Windows) 时导入与写出指标"""
+import json
+import subprocess
+import sys
+
+from src import metrics as metrics_module
+from src.metrics import PipelineMetrics
+
+
+def test_import_without_resource():
+    # sys.modules 中的 None 使 import 抛出 ImportError，与 Windows 上相同
+    code = ("import sys; sys.modules['resource'] = None; sys.modules['psutil'] = None\n"
+            "import src.main, src.metrics\n"
+            "assert src.metrics.resource is None\n"
+            "assert src.metrics.metrics.snapshot()['peak_rss_bytes'] is None")
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_write_without_resource(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics_module, 'resource', None)
+    monkeypatch.setitem(sys.modules, 'psutil', None)
+    recorder = PipelineMetrics()
+    recorder.incr('lines.read', 3)
+    snapshot = recorder.snapshot()
+    assert snapshot['peak_rss_bytes'] is None and snapshot['peak_rss_children_bytes'] is None
+
+    recorder.write_json(tmp_path / 'm.json')
+    assert json.loads((tmp_path / 'm.json').read_text(encoding='utf-8'))['peak_rss_bytes'] is None
+    recorder.write_prometheus(tmp_path / 'm.prom')
+    text = (tmp_path / 'm.prom').read_text(encoding='utf-8')
+    assert 'peak_rss' not in text and 'cdn_log_events{name="lines.read"} 3' in text
+
+
+def test_peak_rss_with_resource():
+    assert PipelineMetrics().snapshot()['peak_rss_bytes'] > 0
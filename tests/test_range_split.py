@@ -0,0 +1,100 @@
+"""按范围拆分 (RangeSplitter): 依次读取各范围得到的行与解析结果与顺序读取整个文件完全一致"""
+import gzip
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from benchmarks.generate_logs import write_logs
+from src.bulk_reader import read_line_batches
+from src.config import AppConfig, ParserConfig
+from src.log_parser import LogParser
+from src.log_schema import decode_frame
+from src.range_split import RangeSplitter, read_range
+
+RANGE_SIZE = 16 * 1024
+
+
+@pytest.fixture(scope='module')
+def data(tmp_path_factory) -> bytes:
+    path = tmp_path_factory.mktemp('generated') / 'lines.gz'
+    write_logs(path, 2_000, ipv6_ratio=0.1, bad_line_ratio=0.02, seed=21)
+    with gzip.open(path, 'rb') as f:
+        lines = f.read().splitlines(keepends=True)
+    # 空行、CRLF 与比拆分范围更长的行
+    lines[100:100] = [b'\n', b'\r\n', lines[100].rstrip(b'\n') + b'\r\n', b'x' * (RANGE_SIZE * 3) + b'\n']
+    return b''.join(lines)
+
+
+def _sequential(path: Path) -> list[bytes]:
+    return [line for batch in read_line_batches(path) for line in batch]
+
+
+def _split(splitter: RangeSplitter, path: Path) -> list[bytes]:
+    ranges = splitter.plan(path)
+    assert ranges is not None and len(ranges) > 2
+    # 各范围首尾相接，覆盖整个文件
+    assert ranges[0].start == 0 and all(a.end == b.start for a, b in zip(ranges, ranges[1:]))
+    return [line for file_range in ranges for batch in read_range(file_range) for line in batch]
+
+
+def _parse(lines: list[bytes]) -> pd.DataFrame:
+    parser = LogParser(AppConfig.model_construct(parser=ParserConfig(format='huawei_cdn', chunk_size=500)))
+    return pd.concat([decode_frame(chunk) for chunk in parser.parse_line_batches([lines])], ignore_index=True)
+
+
+@pytest.mark.parametrize('trailing_newline', [True, False])
+def test_plain_file(data, tmp_path, trailing_newline):
+    path = tmp_path / 'access.log'
+    path.write_bytes(data if trailing_newline else data.rstrip(b'\n'))
+    splitter = RangeSplitter(tmp_path / 'index', RANGE_SIZE)
+    lines = _split(splitter, path)
+    assert lines == _sequential(path)
+    pd.testing.assert_frame_equal(_parse(lines), _parse(_sequential(path)))
+
+
+def _write_members(path: Path, data: bytes, cuts: list[int]) -> None:
+    """按 cuts 把数据切分为多个 gzip 成员拼接在一起 (成员边界可以在行中间)"""
+    bounds = [0, *cuts, len(data)]
+    with open(path, 'wb') as f:
+        for start, end in zip(bounds, bounds[1:]):
+            f.write(gzip.compress(data[start:end]))
+
+
+@pytest.mark.parametrize('trailing_newline', [True, False])
+def test_multi_member_gzip(data, tmp_path, monkeypatch, trailing_newline):
+    # 不使用 indexed_gzip，按 gzip 成员的边界拆分
+    monkeypatch.setattr('src.range_split.indexed_gzip', None)
+    data = data if trailing_newline else data.rstrip(b'\n')
+    path = tmp_path / 'access.log.gz'
+    # 成员边界: 行首、行中间与换行符之前
+    line_start = data.index(b'\n', len(data) // 4) + 1
+    cuts = [line_start, len(data) // 2 + 7, data.index(b'\n', 3 * len(data) // 4)]
+    _write_members(path, data, cuts)
+    splitter = RangeSplitter(tmp_path / 'index', RANGE_SIZE * 2)
+
+    # 第一次顺序读取时建立检查点索引，读取结果不变
+    assert splitter.plan(path) is None
+    assert [line for batch in splitter.read_batches(path) for line in batch] == _sequential(path)
+    lines = _split(splitter, path)
+    assert lines == _sequential(path)
+    pd.testing.assert_frame_equal(_parse(lines), _parse(_sequential(path)))
+
+
+def test_single_member_gzip_is_not_split(data, tmp_path, monkeypatch):
+    monkeypatch.setattr('src.range_split.indexed_gzip', None)
+    path = tmp_path / 'access.log.gz'
+    path.write_bytes(gzip.compress(data))
+    splitter = RangeSplitter(tmp_path / 'index', RANGE_SIZE)
+    list(splitter.read_batches(path))
+    assert splitter.plan(path) is None
+
+
+def test_indexed_gzip(data, tmp_path):
+    pytest.importorskip('indexed_gzip')
+    path = tmp_path / 'access.log.gz'
+    # 单个 gzip 成员，由检查点索引从任意位置开始解压
+    path.write_bytes(gzip.compress(data))
+    splitter = RangeSplitter(tmp_path / 'index', RANGE_SIZE)
+    assert [line for batch in splitter.read_batches(path) for line in batch] == _sequential(path)
+    assert _split(splitter, path) == _sequential(path)
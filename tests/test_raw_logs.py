@@ -0,0 +1,145 @@
+"""原始日志样本 (RawLogSample): 行数上限、合并顺序、溢写到临时文件、序列化与按批写入 Excel"""
+import copy
+import gzip
+import os
+import pickle
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import xlsxwriter
+
+from src.analyzers import raw_logs
+from src.analyzers.raw_logs import RawLogSample
+from src.config import AppConfig
+from src.log_schema import encode_frame
+from src.reporters import excel_reporter
+from src.reporters.excel_reporter import ExcelReporter
+
+
+def _chunk(start: int, rows: int) -> pd.DataFrame:
+    """第 start ~ start+rows-1 条日志组成的紧凑数据块 (路径与 IP 各不相同，便于检查顺序)"""
+    numbers = range(start, start + rows)
+    return encode_frame(pd.DataFrame({
+        'timestamp': [1763258400 + n for n in numbers],
+        'client_ip': [f'10.0.{n // 256}.{n % 256}' if n % 2 else f'2001:db8::{n:x}' for n in numbers],
+        'response_time_ms': [n % 50 for n in numbers],
+        'status_code': [200 if n % 3 else 404 for n in numbers],
+        'response_size_bytes': [n * 10 for n in numbers],
+        'method': ['GET'] * rows,
+        'domain': [f'd{n % 3}.example.com' for n in numbers],
+        'path': [f'/p/{n}' for n in numbers],
+        'protocol': ['HTTP/1.1'] * rows,
+        'user_agent': ['UA'] * rows,
+        'referer': ['-'] * rows,
+        'cache_hit_status': ['HIT' if n % 2 else 'MISS' for n in numbers],
+    }))
+
+
+def _paths(sample: RawLogSample) -> list[str]:
+    return sample.head(len(sample))['path'].tolist()
+
+
+def _expected(start: int, stop: int) -> list[str]:
+    return [f'/p/{n}' for n in range(start, stop)]
+
+
+def _build(limit: int, bounds: list[tuple[int, int]]) -> RawLogSample:
+    sample = RawLogSample(limit)
+    for start, rows in bounds:
+        sample.add(_chunk(start, rows))
+    return sample
+
+
+def test_limit_and_merge_order():
+    a, b = _build(7, [(0, 4), (4, 4)]), _build(7, [(100, 5)])
+    assert len(a) == 7 and _paths(a) == _expected(0, 7)
+    merged = _build(7, [(0, 3)]).merge(b)
+    assert _paths(merged) == _expected(0, 3) + _expected(100, 104)
+    # 合并不修改参与合并的样本
+    assert len(b) == 5
+    assert len(RawLogSample(0).merge(b)) == 0
+
+
+def test_head_and_empty_sample():
+    empty = RawLogSample(-1)
+    header = empty.head(0)
+    assert len(header) == 0 and str(header['timestamp'].dtype) == 'datetime64[s, Asia/Shanghai]'
+    assert list(header.columns) == list(_build(-1, [(0, 2)]).head(1).columns)
+    sample = _build(-1, [(0, 3), (3, 3)])
+    head = sample.head(4)
+    assert head['path'].tolist() == _expected(0, 4)
+    assert head['client_ip'].tolist()[:2] == ['2001:db8::', '10.0.0.1']
+    assert head['timestamp'].iloc[0] == pd.Timestamp('2025-11-16 10:00:00', tz='Asia/Shanghai')
+
+
+def test_spill_to_temp_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(raw_logs, 'SPILL_ROWS', 5)
+    monkeypatch.setattr(raw_logs, 'READ_CHUNK_ROWS', 2)
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+    a = _build(-1, [(0, 3), (3, 3), (6, 1)])
+    b = _build(-1, [(50, 6)])
+    assert len(list(tmp_path.iterdir())) == 2
+    merged = a.merge(b)
+    assert _paths(merged) == _expected(0, 7) + _expected(50, 56)
+    # 溢写文件按 READ_CHUNK_ROWS 行读取
+    sizes = [len(frame) for frame in merged.iter_frames(4)]
+    assert max(sizes) == 2 and sum(sizes) == 13
+
+    # 截断合并时共享同一个溢写文件，只读取前几行
+    limited = _build(9, [(0, 6)]).merge(_build(9, [(50, 6)]))
+    assert _paths(limited) == _expected(0, 6) + _expected(50, 53)
+
+    # 序列化 (增量状态、部分结果) 后写入新的临时文件，与原样本互不影响
+    restored = pickle.loads(pickle.dumps(merged))
+    copied = copy.deepcopy(merged)
+    del a, b, merged, limited
+    assert _paths(restored) == _paths(copied) == _expected(0, 7) + _expected(50, 56)
+    del restored, copied
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def reporter(tmp_path, monkeypatch):
+    monkeypatch.setattr(excel_reporter, 'EXCEL_MAX_ROWS', 4)
+    monkeypatch.setattr(excel_reporter, 'WRITE_BATCH_ROWS', 2)
+    reporter = ExcelReporter({}, AppConfig.model_construct())
+    reporter.workbook = xlsxwriter.Workbook(str(tmp_path / 'r.xlsx'), {'constant_memory': True})
+    reporter.datetime_format = reporter.workbook.add_format({'num_format': 'YYYY-MM-DD HH:MM:SS'})
+    return reporter
+
+
+def test_excel_sheets_roll_over(reporter, tmp_path):
+    sample = _build(-1, [(0, 5), (5, 2)])
+    reporter._write_raw_logs(sample, None, None)
+    reporter.workbook.close()
+    sheets = pd.read_excel(tmp_path / 'r.xlsx', sheet_name=None)
+    assert list(sheets) == ['RawLogsSample', 'RawLogsSample_2', 'RawLogsSample_3']
+    assert [len(sheet) for sheet in sheets.values()] == [3, 3, 1]
+    written = pd.concat(sheets.values(), ignore_index=True)
+    expected = sample.head(len(sample))
+    assert written['path'].tolist() == expected['path'].tolist()
+    assert (written['timestamp'] == expected['timestamp'].dt.tz_localize(None)).all()
+
+
+def test_excel_empty_sample_writes_header(reporter, tmp_path):
+    reporter._write_raw_logs(RawLogSample(-1), None, None)
+    reporter.workbook.close()
+    sheet = pd.read_excel(tmp_path / 'r.xlsx', sheet_name='RawLogsSample')
+    assert len(sheet) == 0 and sheet.columns[0] == 'timestamp'
+
+
+@pytest.mark.parametrize('sidecar_format', ['csv', 'parquet'])
+def test_sidecar_written_by_format(reporter, tmp_path, sidecar_format):
+    sample = _build(-1, [(0, 3), (3, 2)])
+    # 固定报告名时旁路文件先写入临时文件名，格式不能由扩展名判断
+    path = tmp_path / '.r_raw_logs.tmp'
+    reporter._write_raw_logs(sample, path, 'r_raw_logs', sidecar_format)
+    reporter.workbook.close()
+    if sidecar_format == 'parquet':
+        written = pq.read_table(path).to_pandas()
+    else:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            written = pd.read_csv(f)
+    assert written['path'].tolist() == _expected(0, 5)
+    assert os.path.getsize(path) > 0
@@ -0,0 +1,94 @@
+"""汇总存储: 子目录中的同名文件分别写入，时间范围内的日分区与小时分区合并后与过滤到同一范围的完整运行相同"""
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from benchmarks.generate_logs import write_logs
+from src.analysis_engine import AnalysisEngine
+from src.filters import parse_time_bound
+from src.ingestion import iter_parsed_chunks
+from src.rollup_store import RollupRunner
+from tests.test_map_reduce import _config
+
+
+@pytest.fixture(scope='module')
+def log_dir(tmp_path_factory) -> Path:
+    root = tmp_path_factory.mktemp('logs')
+    # 两个子目录中的同名文件，时间跨越多个自然日且互相重叠
+    # (IP 与路径的数量少于 Top N 与跟踪的路径数，结果包含所有的键，与合并顺序无关)
+    write_logs(root / 'a' / 'cdn.gz', 6_000, seed=3, ips=200, paths=300, span_hours=40,
+               start=datetime.fromisoformat('2025-11-15T20:00:00+08:00'))
+    write_logs(root / 'b' / 'cdn.gz', 4_000, seed=4, ips=200, paths=300, span_hours=30, ipv6_ratio=0.2,
+               start=datetime.fromisoformat('2025-11-16T06:00:00+08:00'))
+    return root
+
+
+def _rollup_config(log_dir: Path, tmp_path: Path, name: str):
+    config = _config(log_dir, tmp_path, name)
+    config.input.rollup.path = str(tmp_path / 'rollup.sqlite')
+    config.analysis.top_n_count = 1_000
+    config.analysis.latency.path_capacity = 1_000
+    config.analysis.group_by_dimensions = ['client_ip', 'domain', 'path', 'cache_hit_status']
+    return config
+
+
+def _normalized(results: dict) -> dict:
+    """
+    汇总查询按时间顺序合并分区，与按文件顺序处理相比，计数相同的键的先后顺序与原始日志样本不同，
+    因此各表按内容排序后比较，不比较原始日志样本
+    """
+    normalized = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            normalized[key] = _normalized(value)
+        elif isinstance(value, (pd.Series, pd.DataFrame)):
+            frame = value.to_frame() if isinstance(value, pd.Series) else value
+            # 按排名编号的行号与顺序有关，不参与比较
+            frame = frame.reset_index(drop=isinstance(frame.index, pd.RangeIndex))
+            normalized[key] = frame.sort_values(list(frame.columns)).reset_index(drop=True)
+    return normalized
+
+
+def _assert_same(left: dict, right: dict) -> None:
+    assert left.keys() == right.keys()
+    for key, value in left.items():
+        if isinstance(value, dict):
+            _assert_same(value, right[key])
+        else:
+            pd.testing.assert_frame_equal(value, right[key])
+
+
+@pytest.fixture(scope='module')
+def rollup(log_dir, tmp_path_factory):
+    runner = RollupRunner(_rollup_config(log_dir, tmp_path_factory.mktemp('rollup'), 'rollup'))
+    try:
+        yield runner
+    finally:
+        runner.store.close()
+        runner.engine.close()
+
+
+def test_same_name_files_in_subdirectories(rollup):
+    assert rollup.ingest() == 10_000
+    assert sorted(rollup.store.ingested_files()) == ['a/cdn.gz', 'b/cdn.gz']
+    # 再次运行时两个文件都已写入
+    assert rollup.ingest() == 0
+
+
+# 第一个范围包含完整的 11 月 16 日 (日分区) 与两端不足一天的小时分区
+@pytest.mark.parametrize('since, until', [('2025-11-15T22:00', '2025-11-17T03:00'),
+                                          ('2025-11-16T07:00', '2025-11-16T13:00'),
+                                          (None, '2025-11-16'), ('2025-11-17', None)])
+def test_range_matches_filtered_full_run(log_dir, rollup, tmp_path, since, until):
+    rollup.ingest()
+    results = rollup.results(parse_time_bound(since) if since else None,
+                             parse_time_bound(until, end=True) if until else None)
+
+    config = _rollup_config(log_dir, tmp_path, 'full')
+    config.filters.since, config.filters.until = since, until
+    with AnalysisEngine(config) as engine:
+        full = engine.run_chunks(iter_parsed_chunks(config, 1))
+    assert engine.rows_processed == rollup.engine.rows_processed > 0
+    _assert_same(_normalized(results), _normalized(full))